@@ -17,13 +17,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import time
 
 from smtLayer import generalUtils
 from smtLayer import msgs
 from smtLayer.vmUtils import execCmdThruIUCV, invokeSMCLI
 from smtLayer.vmUtils import isLoggedOn
-from smtLayer.vmUtils import waitForOSState, waitForVMState
+from smtLayer.vmUtils import waitForOSState, waitForShutdown
+from smtLayer.vmUtils import waitForVMState
 
 modId = 'PVM'
 vmOSUpStates = ['on', 'up']
@@ -777,7 +777,9 @@ def softDeactivate(rh):
         strCmd = "shutdown -h now"
         iucvResults = execCmdThruIUCV(rh, rh.userid, strCmd, timeout = 60)
         if iucvResults['overallRC'] == 0:
-            time.sleep(15)
+            # Let the OS shut down, most guests log off by themselves
+            # at the end, or give it 15 seconds before the log off.
+            waitForShutdown(rh, rh.userid, 15)
         else:
             # Shutdown failed.  Let CP take down the system
             # after we log the results.
@@ -0,0 +1,360 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# SMAPI Transports for Systems Management Ultra Thin Layer
+#
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+SMAPI transports run the smcli requests built by vmUtils.invokeSMCLI.
+
+SubprocessTransport forks 'sudo smcli' for each request.
+
+HelperTransport starts one long-lived helper process (the main routine of
+this module) and sends all the requests to it over its stdin/stdout pipes.
+Each request and response is a single JSON line carrying a request id, so
+several requests may be in flight at once. Run the helper itself under sudo
+with the --direct option to also save the sudo of each request.
+
+The helper started with --fake answers from FakeSMAPIResponder instead of
+running smcli, so the transport can be tested without z/VM.
+"""
+
+import argparse
+import json
+import shlex
+import subprocess
+from subprocess import CalledProcessError
+import sys
+import threading
+
+from zvmsdk import config
+
+version = '1.0.0'         # Version of this script
+
+SMCLI = '/opt/zthin/bin/smcli'
+TRANSPORT_SUBPROCESS = 'subprocess'
+TRANSPORT_HELPER = 'helper'
+
+# Max number of requests run at once by the helper
+DEFAULT_HELPER_WORKERS = 16
+# Seconds a request waits for the helper beyond the SMAPI socket timeout
+# that smcli applies, the helper is deemed hung after that
+HELPER_TIMEOUT_MARGIN = 60
+# SMAPI socket timeout of the requests without --timeout argument
+DEFAULT_REQUEST_TIMEOUT = 900
+
+_transport = None
+_transportLock = threading.Lock()
+
+
+def _encodeOutput(output):
+    # latin-1 maps each byte to one character, the smcli output bytes
+    # are kept as is through JSON.
+    return output.decode('latin-1')
+
+
+def _decodeOutput(output):
+    return output.encode('latin-1')
+
+
+class SubprocessTransport(object):
+    """
+    Run each smcli request in a new 'sudo smcli' process.
+    """
+
+    def invoke(self, args):
+        """
+        Run smcli with the specified arguments.
+
+        Input:
+           List of smcli arguments, starting with the API name.
+
+        Output:
+           Output bytes of smcli.
+           CalledProcessError is raised when smcli exits with non-zero rc.
+        """
+        return subprocess.check_output(['sudo', SMCLI] + args,
+                                       close_fds=True)
+
+
+def _requestTimeout(args):
+    # smcli gives up after the SMAPI socket timeout of its --timeout
+    # argument
+    try:
+        timeout = int(args[args.index('--timeout') + 1])
+    except (ValueError, IndexError):
+        timeout = DEFAULT_REQUEST_TIMEOUT
+    return timeout + HELPER_TIMEOUT_MARGIN
+
+
+class _PendingRequest(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.rc = None
+        self.output = None
+        self.error = None
+
+
+class HelperTransport(object):
+    """
+    Send the smcli requests to a long-lived helper process.
+
+    The helper is (re)started on demand. When it can not be started, or a
+    request can not be written to it, the requests fall back to the
+    subprocess transport. A helper not answering a request in time is
+    killed and restarted on the next request.
+    """
+
+    def __init__(self, command=None):
+        if command:
+            self.command = shlex.split(command)
+        else:
+            self.command = [sys.executable, '-m', 'smtLayer.smapiTransport']
+        self.fallback = SubprocessTransport()
+        self.process = None
+        self.lock = threading.Lock()
+        self.writeLock = threading.Lock()
+        self.pending = {}
+        self.reqCnt = 0
+
+    def _start(self):
+        # Caller holds self.lock
+        if self.process is not None and self.process.poll() is None:
+            return self.process
+        self.process = subprocess.Popen(self.command,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        close_fds=True)
+        # Each helper process answers its own pending requests
+        self.pending = {}
+        reader = threading.Thread(target=self._readLoop,
+                                  args=(self.process, self.pending))
+        reader.daemon = True
+        reader.start()
+        return self.process
+
+    def _readLoop(self, process, pending):
+        for line in process.stdout:
+            try:
+                resp = json.loads(line)
+            except ValueError:
+                continue
+            with self.lock:
+                waiter = pending.pop(resp.get('id'), None)
+            if waiter is not None:
+                waiter.rc = resp['rc']
+                waiter.output = _decodeOutput(resp['output'])
+                waiter.event.set()
+
+        # The helper exited, fail the requests it did not answer.
+        process.wait()
+        with self.lock:
+            if self.process is process:
+                self.process = None
+            waiters = list(pending.values())
+            pending.clear()
+        for waiter in waiters:
+            waiter.error = RuntimeError("SMAPI helper exited with rc %s" %
+                                        process.returncode)
+            waiter.event.set()
+
+    def invoke(self, args):
+        """
+        Run smcli with the specified arguments through the helper.
+
+        Input:
+           List of smcli arguments, starting with the API name.
+
+        Output:
+           Output bytes of smcli.
+           CalledProcessError is raised when smcli exits with non-zero rc.
+        """
+        waiter = _PendingRequest()
+        with self.lock:
+            try:
+                process = self._start()
+            except OSError:
+                return self.fallback.invoke(args)
+            self.reqCnt += 1
+            reqId = self.reqCnt
+            pending = self.pending
+            pending[reqId] = waiter
+
+        line = json.dumps({'id': reqId, 'args': args}) + '\n'
+        try:
+            with self.writeLock:
+                process.stdin.write(line.encode())
+                process.stdin.flush()
+        except (IOError, OSError, ValueError):
+            # The helper did not get the request, it is safe to run it
+            # with smcli directly.
+            with self.lock:
+                pending.pop(reqId, None)
+            return self.fallback.invoke(args)
+
+        # smcli applies the SMAPI socket timeout by itself, a helper not
+        # answering in time is hung and is restarted. The request is not
+        # run again, it may have been run by the hung helper.
+        timeout = _requestTimeout(args)
+        if not waiter.event.wait(timeout):
+            with self.lock:
+                pending.pop(reqId, None)
+            self._kill(process)
+            raise RuntimeError("SMAPI helper did not answer in %d seconds" %
+                               timeout)
+        if waiter.error is not None:
+            raise waiter.error
+        if waiter.rc != 0:
+            raise CalledProcessError(waiter.rc, ['sudo', SMCLI] + args,
+                                     output=waiter.output)
+        return waiter.output
+
+    def _kill(self, process):
+        # The next request starts a new helper, the reader of the killed
+        # one fails the requests it did not answer.
+        with self.lock:
+            if self.process is process:
+                self.process = None
+        try:
+            process.kill()
+        except OSError:
+            pass
+
+    def stop(self):
+        with self.lock:
+            process = self.process
+        if process is not None:
+            process.stdin.close()
+            process.wait()
+
+
+def getTransport():
+    """
+    Get the SMAPI transport configured by [zvm] smapi_transport.
+    """
+    global _transport
+    with _transportLock:
+        if _transport is None:
+            if config.CONF.zvm.smapi_transport == TRANSPORT_HELPER:
+                _transport = HelperTransport(
+                    config.CONF.zvm.smapi_helper_command)
+            else:
+                _transport = SubprocessTransport()
+        return _transport
+
+
+class FakeSMAPIResponder(object):
+    """
+    Answer smcli requests without z/VM.
+
+    Every API succeeds with an empty response unless a canned response is
+    defined for it. A canned response is a dict of 'rc' and 'output', the
+    output containing the RC header as smcli --addRCheader prints it.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+
+    def invoke(self, args):
+        api = args[0] if args else ''
+        resp = self.responses.get(api, {})
+        rc = resp.get('rc', 0)
+        output = resp.get('output', '0 0 0 (details) None\n')
+        return rc, output.encode()
+
+
+class _DirectRunner(object):
+    """
+    Run the smcli requests read by the helper.
+    """
+
+    def __init__(self, useSudo=True):
+        self.prefix = ['sudo', SMCLI] if useSudo else [SMCLI]
+
+    def invoke(self, args):
+        proc = subprocess.Popen(self.prefix + args,
+                                stdout=subprocess.PIPE,
+                                close_fds=True)
+        output = proc.communicate()[0]
+        return proc.returncode, output
+
+
+def _serveRequest(runner, line, out, outLock, slots):
+    req = {}
+    try:
+        try:
+            req = json.loads(line)
+            rc, output = runner.invoke(req['args'])
+        except Exception as e:
+            rc, output = 1, ("25 1 0 (details) SMAPI helper failed to run "
+                             "the request: %s\n" % e).encode()
+        resp = json.dumps({'id': req.get('id'), 'rc': rc,
+                           'output': _encodeOutput(output)}) + '\n'
+        with outLock:
+            out.write(resp.encode())
+            out.flush()
+    finally:
+        slots.release()
+
+
+def serveHelper(runner, inp, out, workers=DEFAULT_HELPER_WORKERS):
+    """
+    Helper main loop, answer the requests read from inp until EOF.
+    """
+    outLock = threading.Lock()
+    slots = threading.BoundedSemaphore(workers)
+    threads = []
+    for line in inp:
+        if not line.strip():
+            continue
+        slots.acquire()
+        thread = threading.Thread(target=_serveRequest,
+                                  args=(runner, line, out, outLock, slots))
+        thread.start()
+        threads = [t for t in threads if t.is_alive()]
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SMAPI helper process')
+    parser.add_argument('--direct', action='store_true',
+                        help='run smcli without sudo, for a helper that '
+                             'runs under sudo itself')
+    parser.add_argument('--fake', metavar='RESPONSES', nargs='?',
+                        const='',
+                        help='answer from the fake SMAPI responder, with '
+                             'canned responses read from a JSON file')
+    parser.add_argument('--workers', type=int,
+                        default=DEFAULT_HELPER_WORKERS,
+                        help='max number of requests run at once')
+    args = parser.parse_args(argv)
+
+    if args.fake is not None:
+        responses = {}
+        if args.fake:
+            with open(args.fake) as f:
+                responses = json.load(f)
+        runner = FakeSMAPIResponder(responses)
+    else:
+        runner = _DirectRunner(useSudo=not args.direct)
+    serveHelper(runner, sys.stdin.buffer, sys.stdout.buffer,
+                max(args.workers, 1))
+
+
+if __name__ == '__main__':
+    main()
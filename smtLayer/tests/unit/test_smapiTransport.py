@@ -0,0 +1,175 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import io
+import json
+import mock
+import os
+from subprocess import CalledProcessError
+import sys
+import tempfile
+import threading
+
+from smtLayer import ReqHandle
+from smtLayer import smapiTransport
+from smtLayer import vmUtils
+from smtLayer.tests.unit import base
+
+
+FAKE_RESPONSES = {
+    'Image_Query_DM': {
+        'rc': 0,
+        'output': '0 0 0 (details) None\nUSER FAKEUID LBYONLY 2048m 64G G\n'},
+    'Image_Activate': {
+        'rc': 8,
+        'output': '8 200 8 (details) Image not found\n'},
+    }
+
+
+class SMTsmapiTransportTestCase(base.SMTTestCase):
+    """Test cases for smapiTransport.py in smtLayer."""
+
+    def setUp(self):
+        super(SMTsmapiTransportTestCase, self).setUp()
+        fd, self.respFile = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            json.dump(FAKE_RESPONSES, f)
+        self.addCleanup(os.remove, self.respFile)
+        self.transport = smapiTransport.HelperTransport(
+            '%s -m smtLayer.smapiTransport --fake %s' % (sys.executable,
+                                                         self.respFile))
+        self.addCleanup(self.transport.stop)
+
+    def test_subprocess_invoke(self):
+        with mock.patch('subprocess.check_output') as exec_cmd:
+            exec_cmd.return_value = b'0 0 0 (details) None\n'
+            out = smapiTransport.SubprocessTransport().invoke(
+                ['Image_Query_DM', '-T', 'fakeuid'])
+        self.assertEqual(b'0 0 0 (details) None\n', out)
+        exec_cmd.assert_called_once_with(
+            ['sudo', '/opt/zthin/bin/smcli', 'Image_Query_DM', '-T',
+             'fakeuid'], close_fds=True)
+
+    def test_helper_invoke(self):
+        out = self.transport.invoke(['Image_Query_DM', '-T', 'fakeuid'])
+        self.assertEqual(FAKE_RESPONSES['Image_Query_DM']['output'].encode(),
+                         out)
+        # Not canned APIs succeed with an empty response
+        out = self.transport.invoke(['Image_Deactivate', '-T', 'fakeuid'])
+        self.assertEqual(b'0 0 0 (details) None\n', out)
+
+    def test_helper_invoke_failed(self):
+        try:
+            self.transport.invoke(['Image_Activate', '-T', 'fakeuid'])
+        except CalledProcessError as e:
+            self.assertEqual(8, e.returncode)
+            self.assertEqual(b'8 200 8 (details) Image not found\n',
+                             e.output)
+        else:
+            self.fail("CalledProcessError not raised")
+
+    def test_helper_invoke_concurrent(self):
+        self.transport.invoke(['Image_Query_DM'])
+        pid = self.transport.process.pid
+        results = []
+
+        def _invoke():
+            results.append(self.transport.invoke(['Image_Query_DM']))
+
+        threads = [threading.Thread(target=_invoke) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(20, len(results))
+        # All the requests went to the same helper process
+        self.assertEqual(21, self.transport.reqCnt)
+        self.assertEqual(pid, self.transport.process.pid)
+
+    def test_helper_restart(self):
+        self.transport.invoke(['Image_Query_DM'])
+        first = self.transport.process
+        self.transport.stop()
+        self.transport.invoke(['Image_Query_DM'])
+        self.assertIsNot(first, self.transport.process)
+
+    def test_helper_fallback(self):
+        transport = smapiTransport.HelperTransport('/not/exist/helper')
+        with mock.patch('subprocess.check_output') as exec_cmd:
+            exec_cmd.return_value = b'0 0 0 (details) None\n'
+            out = transport.invoke(['Image_Query_DM'])
+        self.assertEqual(b'0 0 0 (details) None\n', out)
+
+    def test_helper_write_failed_fallback(self):
+        self.transport.invoke(['Image_Query_DM'])
+        stdin = self.transport.process.stdin
+        self.addCleanup(setattr, self.transport.process, 'stdin', stdin)
+        self.transport.process.stdin = mock.Mock()
+        self.transport.process.stdin.write.side_effect = IOError(
+            32, 'Broken pipe')
+        with mock.patch('subprocess.check_output') as exec_cmd:
+            exec_cmd.return_value = b'0 0 0 (details) None\n'
+            out = self.transport.invoke(['Image_Deactivate', '-T', 'fakeuid'])
+        self.assertEqual(b'0 0 0 (details) None\n', out)
+        exec_cmd.assert_called_once_with(
+            ['sudo', '/opt/zthin/bin/smcli', 'Image_Deactivate', '-T',
+             'fakeuid'], close_fds=True)
+        self.assertEqual({}, self.transport.pending)
+
+    @mock.patch.object(smapiTransport, 'HELPER_TIMEOUT_MARGIN', 0)
+    def test_helper_hung(self):
+        transport = smapiTransport.HelperTransport(
+            '%s -c "import sys, time; sys.stdin.readline(); time.sleep(60)"'
+            % sys.executable)
+        self.assertRaises(RuntimeError, transport.invoke,
+                          ['Image_Query_DM', '--timeout', '1'])
+        # The hung helper is killed, the next request starts a new one
+        self.assertIsNone(transport.process)
+        self.assertEqual({}, transport.pending)
+
+    def test_request_timeout(self):
+        self.assertEqual(
+            300, smapiTransport._requestTimeout(['Image_Query_DM',
+                                                 '--timeout', '240']))
+        self.assertEqual(
+            960, smapiTransport._requestTimeout(['Image_Query_DM']))
+
+    def test_invokeSMCLI_helper(self):
+        rh = ReqHandle.ReqHandle(captureLogs=False)
+        with mock.patch.object(smapiTransport, 'getTransport') as get:
+            get.return_value = self.transport
+            res = vmUtils.invokeSMCLI(rh, 'Image_Query_DM', ['-T', 'FAKEUID'])
+            self.assertEqual(0, res['overallRC'])
+            self.assertEqual('USER FAKEUID LBYONLY 2048m 64G G\n',
+                             res['response'])
+            res = vmUtils.invokeSMCLI(rh, 'Image_Activate', ['-T', 'FAKEUID'])
+            self.assertEqual(8, res['overallRC'])
+            self.assertEqual(200, res['rc'])
+            self.assertEqual(8, res['rs'])
+
+    def test_serveHelper(self):
+        responder = smapiTransport.FakeSMAPIResponder(FAKE_RESPONSES)
+        inp = io.BytesIO(b'{"id": 1, "args": ["Image_Activate"]}\n'
+                         b'not json\n')
+        out = io.BytesIO()
+        smapiTransport.serveHelper(responder, inp, out, workers=1)
+        resps = sorted([json.loads(line) for line in
+                        out.getvalue().splitlines()],
+                       key=lambda r: r['id'] or 0)
+        self.assertEqual([None, 1], [r['id'] for r in resps])
+        self.assertEqual(1, resps[0]['rc'])
+        self.assertEqual(8, resps[1]['rc'])
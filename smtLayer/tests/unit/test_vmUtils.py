@@ -18,6 +18,8 @@
 #    under the License.
 
 import mock
+import threading
+import time
 
 from smtLayer import vmUtils
 from smtLayer import ReqHandle
@@ -52,3 +54,102 @@ class SMTvmUtilsTestCase(base.SMTTestCase):
                 ['sudo', '/opt/zthin/bin/smcli', 'Image_Query_DM',
                  '--addRCheader', '-T', 'fakeuid',
                  '--timeout', '240'], close_fds=True)
+
+    def test_getLoggedOnUsers(self):
+        rh = ReqHandle.ReqHandle(captureLogs=False)
+        with mock.patch('subprocess.check_output') as exec_cmd:
+            exec_cmd.return_value = (
+                b"OPERATOR - SYSC    , FTPSERVE - DSC     , TCPIP    - DSC\n"
+                b"userid1  - SSI     , USERID2  - L0003\n"
+                b"VSM     - TCPIP\n")
+            res = vmUtils.getLoggedOnUsers(rh)
+        self.assertEqual({'OPERATOR', 'FTPSERVE', 'TCPIP', 'USERID1',
+                          'USERID2'}, res)
+
+    def test_parseQueryNames(self):
+        res = vmUtils.parseQueryNames(
+            "OPERATOR - SYSC    , userid1  - SSI\n"
+            "USERID2  - L0003\n"
+            "VSM     - TCPIP\n")
+        self.assertEqual({'OPERATOR': 'SYSC', 'USERID1': 'SSI',
+                          'USERID2': 'L0003'}, res)
+
+    @mock.patch.object(vmUtils, 'execCmdThruIUCV')
+    @mock.patch.object(vmUtils, 'getLoggedOnUsers')
+    def test_stateWatcher_poll_batched(self, loggedOn, iucv):
+        rh = ReqHandle.ReqHandle(captureLogs=False)
+        loggedOn.return_value = {'USER1', 'USER2'}
+        iucv.return_value = {'overallRC': 0}
+        waiters = [
+            vmUtils._StateWaiter(rh, 'user1', 'vm', 'on', 10, 5),
+            vmUtils._StateWaiter(rh, 'USER3', 'vm', 'on', 10, 5),
+            vmUtils._StateWaiter(rh, 'USER2', 'os', 'up', 10, 5),
+            vmUtils._StateWaiter(rh, 'USER2', 'os', 'up', 10, 5),
+            vmUtils._StateWaiter(rh, 'USER3', 'os', 'down', 10, 5)]
+        watcher = vmUtils.StateWatcher()
+        watcher._poll(waiters)
+
+        # One query for all the waits, one ping for the guest logged on,
+        # both logged to the request handle of the watcher
+        self.assertIsNot(rh, watcher.rh)
+        loggedOn.assert_called_once_with(watcher.rh)
+        iucv.assert_called_once_with(watcher.rh, 'USER2', "echo 'ping'",
+                                     timeout=1)
+        self.assertEqual(['found', None, 'found', 'found', 'found'],
+                         [waiter.status for waiter in waiters])
+
+    @mock.patch.object(vmUtils, 'execCmdThruIUCV')
+    @mock.patch.object(vmUtils, 'getLoggedOnUsers')
+    def test_stateWatcher_poll_ping_hung(self, loggedOn, iucv):
+        rh = ReqHandle.ReqHandle(captureLogs=False)
+        loggedOn.return_value = {'USER1', 'USER2'}
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def ping(rh, userid, strCmd, timeout=None):
+            if userid == 'USER1':
+                release.wait(10)
+            return {'overallRC': 0}
+
+        iucv.side_effect = ping
+        waiters = [
+            vmUtils._StateWaiter(rh, 'USER1', 'os', 'up', 10, 5),
+            vmUtils._StateWaiter(rh, 'USER2', 'os', 'up', 10, 5),
+            vmUtils._StateWaiter(rh, 'USER1', 'vm', 'on', 10, 5)]
+        start = time.time()
+        vmUtils.StateWatcher()._poll(waiters, 0.2)
+
+        # The hung guest does not hold up the other waits
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual([None, 'found', 'found'],
+                         [waiter.status for waiter in waiters])
+
+    @mock.patch.object(vmUtils, 'WATCHER_MIN_INTERVAL', 0.01)
+    @mock.patch.object(vmUtils, 'getLoggedOnUsers')
+    def test_waitForVMState(self, loggedOn):
+        rh = ReqHandle.ReqHandle(captureLogs=False)
+        loggedOn.side_effect = [set(), set(), {'USER1'}]
+        res = vmUtils.waitForVMState(rh, 'USER1', 'on', maxQueries=5,
+                                     sleepSecs=1)
+        self.assertEqual(0, res['overallRC'])
+        self.assertEqual(3, loggedOn.call_count)
+
+    @mock.patch.object(vmUtils, 'WATCHER_MIN_INTERVAL', 0.01)
+    @mock.patch.object(vmUtils, 'getLoggedOnUsers')
+    def test_waitForVMState_poll_error(self, loggedOn):
+        # An unexpected error is retried at the next tick
+        rh = ReqHandle.ReqHandle(captureLogs=False)
+        loggedOn.side_effect = [RuntimeError('boom'), {'USER1'}]
+        res = vmUtils.waitForVMState(rh, 'USER1', 'on', maxQueries=5,
+                                     sleepSecs=1)
+        self.assertEqual(0, res['overallRC'])
+        self.assertEqual(2, loggedOn.call_count)
+
+    @mock.patch.object(vmUtils, 'WATCHER_MIN_INTERVAL', 0.01)
+    @mock.patch.object(vmUtils, 'getLoggedOnUsers')
+    def test_waitForVMState_timeout(self, loggedOn):
+        rh = ReqHandle.ReqHandle(captureLogs=False)
+        loggedOn.return_value = set()
+        res = vmUtils.waitForVMState(rh, 'USER1', 'on', maxQueries=1,
+                                     sleepSecs=1)
+        self.assertEqual(414, res['rs'])
@@ -17,12 +17,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from concurrent import futures
 import re
 import subprocess
 from subprocess import CalledProcessError
+import threading
 import time
 
 from smtLayer import msgs
+from smtLayer import smapiTransport
 from smtLayer import vmStatus
 
 from zvmsdk import config
@@ -725,7 +728,7 @@ def invokeSMCLI(rh, api, parms, hideInLog=[]):
 
     cmd = []
     cmd.append('sudo')
-    cmd.append('/opt/zthin/bin/smcli')
+    cmd.append(smapiTransport.SMCLI)
     cmd.append(api)
     cmd.append('--addRCheader')
 
@@ -755,8 +758,7 @@ def invokeSMCLI(rh, api, parms, hideInLog=[]):
     status = vmStatus.GetSMAPIStatus()
 
     try:
-        smcliResp = subprocess.check_output(cmd + parms,
-            close_fds=True)
+        smcliResp = smapiTransport.getTransport().invoke(cmd[2:] + parms)
         if isinstance(smcliResp, bytes):
             smcliResp = bytes.decode(smcliResp, errors='replace')
 
@@ -1087,6 +1089,269 @@ def punch2reader(rh, userid, fileLoc, spoolClass):
     return rh.results['overallRC']
 
 
+# Seconds between the first polls of the state watcher, the interval
+# doubles while no waited state is reached
+WATCHER_MIN_INTERVAL = 1
+# Max number of guests pinged through IUCV at the same time by the watcher
+WATCHER_PING_WORKERS = 16
+
+
+class _StateWaiter(object):
+    """A wait for a guest to enter a state, subscribed to StateWatcher."""
+
+    def __init__(self, rh, userid, kind, desiredState, timeout,
+                 maxInterval):
+        self.rh = rh
+        self.userid = userid.upper()
+        # 'vm' for the virtual machine state, 'os' for the OS state
+        self.kind = kind
+        self.desiredState = desiredState
+        self.deadline = time.time() + timeout
+        self.maxInterval = max(maxInterval, WATCHER_MIN_INTERVAL)
+        self.status = None
+        self.results = None
+        self.done = threading.Event()
+
+    def finish(self, status, results=None):
+        if not self.done.is_set():
+            self.status = status
+            self.results = results
+            self.done.set()
+
+
+class StateWatcher(object):
+    """
+    Poll the state of all the guests being waited on.
+
+    A wait subscribes to the watcher instead of polling its own guest. At
+    each tick one 'vmcp query names' gets the logged on users for all the
+    waits, and the OS of each logged on guest waited to be up or down is
+    pinged once through IUCV, whatever the number of waits on it. The
+    guests are pinged in parallel and each ping times out after the tick
+    interval, so that a hung guest does not hold up the other waits. The
+    interval between two ticks starts at WATCHER_MIN_INTERVAL when a wait
+    subscribes and doubles up to the smallest poll interval of the waits.
+    The polling thread ends when no wait is left.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.waiters = []
+        self.running = False
+        self.interval = WATCHER_MIN_INTERVAL
+        self.pingExecutor = None
+        # Request handle of the polls, the one of a waiter does not get
+        # the logs of the other waits
+        self.rh = None
+
+    def waitFor(self, rh, userid, kind, desiredState, timeout,
+                maxInterval):
+        """
+        Wait for a guest to enter a state.
+
+        Input:
+           Request Handle
+           userid whose state is to be monitored
+           'vm' to watch the virtual machine state 'on' or 'off',
+              'os' to watch the operating system state 'up' or 'down'
+           Desired state
+           Maximum seconds to wait
+           Maximum seconds between two polls
+
+        Output:
+           Tuple of the status 'found', 'timeout' or 'error', and the
+           results of the failing command for 'error'
+        """
+        waiter = _StateWaiter(rh, userid, kind, desiredState, timeout,
+                              maxInterval)
+        with self.cond:
+            self.waiters.append(waiter)
+            # Poll at once for the new wait
+            self.interval = WATCHER_MIN_INTERVAL
+            if self.running:
+                self.cond.notify()
+            else:
+                self.running = True
+                thread = threading.Thread(target=self._run,
+                                          name='smt-state-watcher')
+                thread.daemon = True
+                thread.start()
+        waiter.done.wait()
+        # The results of a failed poll are shared by its waits
+        return waiter.status, dict(waiter.results or {})
+
+    def _run(self):
+        while True:
+            with self.cond:
+                now = time.time()
+                for waiter in self.waiters:
+                    if now >= waiter.deadline:
+                        waiter.finish('timeout')
+                self.waiters = [waiter for waiter in self.waiters
+                                if not waiter.done.is_set()]
+                if not self.waiters:
+                    self.running = False
+                    return
+                waiters = list(self.waiters)
+                maxInterval = min(waiter.maxInterval for waiter in waiters)
+                deadline = min(waiter.deadline for waiter in waiters)
+                # A ping must not overrun the tick nor the nearest deadline
+                pingTimeout = max(min(self.interval, maxInterval,
+                                      deadline - now),
+                                  WATCHER_MIN_INTERVAL)
+
+            try:
+                self._poll(waiters, pingTimeout)
+            except Exception as e:
+                # All other exceptions, the poll is retried at the next
+                # tick and the waits time out at their own deadline.
+                self._getReqHandle(waiters[0].rh).printSysLog(
+                    msgs.msg['0421'][1] % (modId, 'state poll',
+                                           type(e).__name__, str(e)))
+
+            with self.cond:
+                waiters = [waiter for waiter in self.waiters
+                           if not waiter.done.is_set()]
+                if not waiters:
+                    continue
+                maxInterval = min(waiter.maxInterval for waiter in waiters)
+                interval = min(self.interval, maxInterval)
+                self.interval = min(self.interval * 2, maxInterval)
+                deadline = min(waiter.deadline for waiter in waiters)
+                self.cond.wait(max(0, min(interval,
+                                          deadline - time.time())))
+
+    def _poll(self, waiters, pingTimeout=WATCHER_MIN_INTERVAL):
+        rh = self._getReqHandle(waiters[0].rh)
+        try:
+            loggedOn = getLoggedOnUsers(rh)
+        except CalledProcessError as e:
+            out = e.output
+            if isinstance(out, bytes):
+                out = bytes.decode(out)
+            results = dict(msgs.msg['0415'][0])
+            results['rs'] = e.returncode
+            results['response'] = msgs.msg['0415'][1] % (
+                modId, " ".join(e.cmd), e.returncode, out)
+            for waiter in waiters:
+                if waiter.kind == 'vm':
+                    waiter.finish('error', results)
+            # The OS states are still got by pinging the guests
+            loggedOn = None
+
+        pings = {}
+        for waiter in waiters:
+            if waiter.done.is_set():
+                continue
+            if waiter.kind == 'vm':
+                state = 'on' if waiter.userid in loggedOn else 'off'
+            elif loggedOn is not None and waiter.userid not in loggedOn:
+                state = 'down'
+            else:
+                if waiter.userid not in pings:
+                    pings[waiter.userid] = self._getPingExecutor().submit(
+                        execCmdThruIUCV, rh, waiter.userid,
+                        "echo 'ping'", timeout=pingTimeout)
+                continue
+            if state == waiter.desiredState:
+                waiter.finish('found')
+        if not pings:
+            return
+
+        # A ping not answered in time leaves the OS state unknown until
+        # the next tick
+        futures.wait(list(pings.values()), timeout=pingTimeout)
+        for waiter in waiters:
+            ping = pings.get(waiter.userid)
+            if (waiter.done.is_set() or waiter.kind != 'os' or
+                    ping is None or not ping.done()):
+                continue
+            if ping.exception() is None and ping.result()['overallRC'] == 0:
+                state = 'up'
+            else:
+                state = 'down'
+            if state == waiter.desiredState:
+                waiter.finish('found')
+
+    def _getReqHandle(self, waiterRh):
+        # Only the watcher thread creates it, no lock is needed
+        if self.rh is None:
+            # ReqHandle imports the modules which import vmUtils
+            from smtLayer import ReqHandle
+            kwArgs = {'requestId': 'STATE_WATCHER', 'captureLogs': False}
+            if waiterRh.daemon:
+                kwArgs['smt'] = waiterRh.daemon
+            self.rh = ReqHandle.ReqHandle(**kwArgs)
+        return self.rh
+
+    def _getPingExecutor(self):
+        # Only the watcher thread pings, no lock is needed
+        if self.pingExecutor is None:
+            self.pingExecutor = futures.ThreadPoolExecutor(
+                WATCHER_PING_WORKERS)
+        return self.pingExecutor
+
+
+_stateWatcher = StateWatcher()
+
+
+def getLoggedOnUsers(rh):
+    """
+    Get the users logged on to z/VM with one 'vmcp query names'.
+
+    Input:
+       Request Handle
+
+    Output:
+       Set of the userids in upper case, including the users logged on
+       to the other members of the SSI cluster.
+
+    Note:
+       CalledProcessError is raised when the query fails.
+    """
+    cmd = ["sudo", "/sbin/vmcp", "--buffer=1M", "query", "names"]
+    rh.printSysLog("Invoking: " + " ".join(cmd))
+    out = subprocess.check_output(
+        cmd,
+        close_fds=True,
+        stderr=subprocess.STDOUT)
+    if isinstance(out, bytes):
+        out = bytes.decode(out)
+    return set(parseQueryNames(out))
+
+
+def parseQueryNames(out):
+    """
+    Parse the output of 'vmcp query names'.
+
+    The output lists the users as 'USERID - TERM' separated by commas,
+    several on each line, for example:
+    OPERATOR - SYSC    , FTPSERVE - DSC     , TCPIP    - DSC
+    USERID1  - SSI     , USERID2  - L0003
+    VSM     - TCPIP
+
+    TERM is 'SSI' for the users logged on to another member of the SSI
+    cluster. The trailing VSM line lists the virtual system managers and
+    is not a user.
+
+    Input:
+       Output of the command
+
+    Output:
+       Dictionary of {userid: term}, both in upper case
+    """
+    names = {}
+    for line in out.splitlines():
+        if line.strip().upper().startswith('VSM '):
+            continue
+        for entry in line.split(','):
+            userid, sep, term = entry.partition(' - ')
+            userid = userid.strip().upper()
+            if sep and userid:
+                names[userid] = term.strip().upper()
+    return names
+
+
 def waitForOSState(rh, userid, desiredState, maxQueries=90, sleepSecs=5):
     """
     Wait for the virtual OS to go into the indicated state.
@@ -1107,7 +1372,8 @@ def waitForOSState(rh, userid, desiredState, maxQueries=90, sleepSecs=5):
           response  - Updated with an error message if wait times out.
 
     Note:
-
+       The state is polled by the shared StateWatcher, for at most
+       maxQueries * sleepSecs seconds.
     """
 
     rh.printSysLog("Enter vmUtils.waitForOSState, userid: " + userid +
@@ -1115,31 +1381,20 @@ def waitForOSState(rh, userid, desiredState, maxQueries=90, sleepSecs=5):
                            " maxWait: " + str(maxQueries) +
                            " sleepSecs: " + str(sleepSecs))
 
-    results = {}
-
-    strCmd = "echo 'ping'"
-    stateFnd = False
-
-    for i in range(1, maxQueries + 1):
-        results = execCmdThruIUCV(rh, rh.userid, strCmd)
-        if results['overallRC'] == 0:
-            if desiredState == 'up':
-                stateFnd = True
-                break
-        else:
-            if desiredState == 'down':
-                stateFnd = True
-                break
-
-        if i < maxQueries:
-            time.sleep(sleepSecs)
+    maxQueries = int(maxQueries)
+    sleepSecs = int(sleepSecs)
+    status, results = _stateWatcher.waitFor(rh, userid, 'os', desiredState,
+                                            maxQueries * sleepSecs,
+                                            sleepSecs)
 
-    if stateFnd is True:
+    if status == 'found':
         results = {
                 'overallRC': 0,
                 'rc': 0,
                 'rs': 0,
             }
+    elif status == 'error':
+        rh.printLn("ES", results['response'])
     else:
         maxWait = maxQueries * sleepSecs
         rh.printLn("ES", msgs.msg['0413'][1] % (modId, userid,
@@ -1169,7 +1424,8 @@ def waitForVMState(rh, userid, desiredState, maxQueries=90, sleepSecs=5):
           rs        - RS returned from SMCLI if overallRC = 0.
 
     Note:
-
+       The state is polled by the shared StateWatcher, for at most
+       maxQueries * sleepSecs seconds.
     """
 
     rh.printSysLog("Enter vmUtils.waitForVMState, userid: " + userid +
@@ -1177,64 +1433,20 @@ def waitForVMState(rh, userid, desiredState, maxQueries=90, sleepSecs=5):
                            " maxWait: " + str(maxQueries) +
                            " sleepSecs: " + str(sleepSecs))
 
-    results = {}
     maxQueries = int(maxQueries)
+    sleepSecs = int(sleepSecs)
+    status, results = _stateWatcher.waitFor(rh, userid, 'vm', desiredState,
+                                            maxQueries * sleepSecs,
+                                            sleepSecs)
 
-    cmd = ["sudo", "/sbin/vmcp", "query", "user", userid]
-    strCmd = " ".join(cmd)
-    stateFnd = False
-
-    for i in range(1, maxQueries + 1):
-        rh.printSysLog("Invoking: " + strCmd)
-        try:
-            out = subprocess.check_output(
-                cmd,
-                close_fds=True,
-                stderr=subprocess.STDOUT)
-            if isinstance(out, bytes):
-                out = bytes.decode(out)
-
-            rh.printSysLog("Query user output: " + out)
-
-            if desiredState == 'on':
-                stateFnd = True
-                break
-        except CalledProcessError as e:
-            out = e.output
-            if isinstance(out, bytes):
-                out = bytes.decode(out)
-
-            rh.printSysLog("Query user output: " + out)
-
-            match = re.search('(^HCP\w\w\w045E|^HCP\w\w\w361E)', out)
-            if match:
-                # Logged off
-                if desiredState == 'off':
-                    stateFnd = True
-                    break
-            else:
-                # Abnormal failure
-                rh.printLn("ES", msgs.msg['0415'][1] % (modId, strCmd,
-                    e.returncode, out))
-                results = msgs.msg['0415'][0]
-                results['rs'] = e.returncode
-                break
-        except Exception as e:
-            # All other exceptions.
-            rh.printLn("ES", msgs.msg['0421'][1] % (modId, strCmd,
-                type(e).__name__, str(e)))
-            results = msgs.msg['0421'][0]
-
-        if i < maxQueries:
-            # Sleep a bit before looping.
-            time.sleep(sleepSecs)
-
-    if stateFnd is True:
+    if status == 'found':
         results = {
                 'overallRC': 0,
                 'rc': 0,
                 'rs': 0,
             }
+    elif status == 'error':
+        rh.printLn("ES", results['response'])
     else:
         maxWait = maxQueries * sleepSecs
         rh.printLn("ES", msgs.msg['0414'][1] % (modId, userid,
@@ -1246,6 +1458,23 @@ def waitForVMState(rh, userid, desiredState, maxQueries=90, sleepSecs=5):
     return results
 
 
+def waitForShutdown(rh, userid, maxWait):
+    """
+    Give a guest being shut down time to log off by itself.
+
+    Input:
+       Request Handle
+       userid of the guest
+       Maximum seconds to wait
+
+    Output:
+       True if the guest logged off, False otherwise
+    """
+    status, results = _stateWatcher.waitFor(rh, userid, 'vm', 'off',
+                                            maxWait, WATCHER_MIN_INTERVAL)
+    return status == 'found'
+
+
 def purgeReader(rh):
     """
     Purge reader of the specified userid.
@@ -31,8 +31,11 @@ class baseConnection(object):
 
 class socketConnection(baseConnection):
 
-    def __init__(self, ip_addr='127.0.0.1', port=2000, timeout=3600):
-        self.client = socketclient.SDKSocketClient(ip_addr, port, timeout)
+    def __init__(self, ip_addr='127.0.0.1', port=2000, timeout=3600,
+                 persistent=False, pool_size=4):
+        self.client = socketclient.SDKSocketClient(ip_addr, port, timeout,
+                                                   persistent=persistent,
+                                                   pool_size=pool_size)
 
     def request(self, api_name, *api_args, **api_kwargs):
         return self.client.call(api_name, *api_args, **api_kwargs)
@@ -41,9 +44,10 @@ class socketConnection(baseConnection):
 class restConnection(baseConnection):
 
     def __init__(self, ip_addr='127.0.0.1', port=8080, ssl_enabled=False,
-                 verify=False, token_path=None, auth=None):
+                 verify=False, token_path=None, auth=None, pool_size=10):
         self.client = restclient.RESTClient(ip_addr, port, ssl_enabled, verify,
-                                            token_path, auth)
+                                            token_path, auth,
+                                            pool_size=pool_size)
 
     def request(self, api_name, *api_args, **api_kwargs):
         return self.client.call(api_name, *api_args, **api_kwargs)
@@ -53,7 +57,7 @@ class ZVMConnector(object):
 
     def __init__(self, ip_addr=None, port=None, timeout=3600,
                  connection_type=None, ssl_enabled=False, verify=False,
-                 token_path=None, auth=None):
+                 token_path=None, auth=None, persistent=False, pool_size=4):
         """
         :param str ip_addr:         IP address of SDK server
         :param int port:            Port of SDK server daemon
@@ -69,6 +73,12 @@ class ZVMConnector(object):
                                     to use. Default to False.
         :param str token_path:      The path of token file.
         :param str auth:            Type of authentication ('none' or 'token')
+        :param boolean persistent:  Only for 'socket' connection type.
+                                    Whether to multiplex the requests on
+                                    pooled persistent connections instead
+                                    of opening one connection per request.
+        :param int pool_size:       Max number of persistent connections
+                                    opened to the SDK server.
         """
         if (connection_type is not None and
                 connection_type.lower() == CONN_TYPE_SOCKET):
@@ -77,18 +87,21 @@ class ZVMConnector(object):
             connection_type = CONN_TYPE_REST
         self.conn = self._get_connection(ip_addr, port, timeout,
                                          connection_type, ssl_enabled, verify,
-                                         token_path, auth)
+                                         token_path, auth, persistent,
+                                         pool_size)
 
     def _get_connection(self, ip_addr, port, timeout,
                         connection_type, ssl_enabled, verify,
-                        token_path, auth):
+                        token_path, auth, persistent=False, pool_size=4):
         if connection_type == CONN_TYPE_SOCKET:
             return socketConnection(ip_addr or '127.0.0.1', port or 2000,
-                                    timeout)
+                                    timeout, persistent=persistent,
+                                    pool_size=pool_size)
         else:
             return restConnection(ip_addr or '127.0.0.1', port or 8080,
                                   ssl_enabled=ssl_enabled, verify=verify,
-                                  token_path=token_path, auth=auth)
+                                  token_path=token_path, auth=auth,
+                                  pool_size=pool_size)
 
     def send_request(self, api_name, *api_args, **api_kwargs):
         """Refer to SDK API documentation.
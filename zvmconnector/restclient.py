@@ -15,12 +15,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import json
 import os
 import requests
 import six
 import tempfile
 import threading
+import time
 import uuid
 
 from zvmsdk import config
@@ -32,6 +34,8 @@ CONF = config.CONF
 # TODO:set up configuration file only for RESTClient and configure this value
 TOKEN_LOCK = threading.Lock()
 CHUNKSIZE = 4096
+# Seconds before its expiration a token is replaced by a new one
+TOKEN_REFRESH_MARGIN = 30
 
 
 REST_REQUEST_ERROR = [{'overallRC': 101, 'modID': 110, 'rc': 101},
@@ -156,6 +160,17 @@ def req_guest_inspect_stats(start_index, *args, **kwargs):
     return url, body
 
 
+def req_guest_get_power_state_bulk(start_index, *args, **kwargs):
+    if type(args[start_index]) is str:
+        url = '/guests/power_state?userid=%s' % args[start_index]
+    else:
+        userids = ','.join(args[start_index])
+        url = '/guests/power_state?userid=%s' % userids
+    body = None
+
+    return url, body
+
+
 def req_guest_inspect_vnics(start_index, *args, **kwargs):
     if type(args[start_index]) is str:
         url = '/guests/interfacestats?userid=%s' % args[start_index]
@@ -213,6 +228,25 @@ def req_guest_softstop(start_index, *args, **kwargs):
     return url, body
 
 
+def req_guest_start_many(start_index, *args, **kwargs):
+    url = '/guests/action'
+    body = {'action': 'start',
+            'userid_list': args[start_index]}
+    fill_kwargs_in_body(body, **kwargs)
+    return url, body
+
+
+def req_guest_stop_many(start_index, *args, **kwargs):
+    url = '/guests/action'
+    if kwargs.pop('soft', False):
+        body = {'action': 'softstop'}
+    else:
+        body = {'action': 'stop'}
+    body['userid_list'] = args[start_index]
+    fill_kwargs_in_body(body, **kwargs)
+    return url, body
+
+
 def req_guest_pause(start_index, *args, **kwargs):
     url = '/guests/%s/action'
     body = {'action': 'pause'}
@@ -660,6 +694,32 @@ def req_image_get_root_disk_size(start_index, *args, **kwargs):
     return url, body
 
 
+def req_job_submit(start_index, *args, **kwargs):
+    url = '/jobs'
+    body = {'job': {'operation': args[start_index],
+                    'params': kwargs}}
+    return url, body
+
+
+def req_job_query(start_index, *args, **kwargs):
+    url = '/jobs/%s'
+    wait = kwargs.get('wait', 0)
+    if wait:
+        url += '?wait=%s' % wait
+    body = None
+    return url, body
+
+
+def req_job_list(start_index, *args, **kwargs):
+    url = '/jobs'
+    filters = ['%s=%s' % (key, kwargs[key]) for key in ('target', 'state')
+               if kwargs.get(key) is not None]
+    if filters:
+        url += '?' + '&'.join(filters)
+    body = None
+    return url, body
+
+
 def req_file_import(start_index, *args, **kwargs):
     url = '/files'
     file_spath = args[start_index]
@@ -771,6 +831,11 @@ DATABASE = {
         'args_required': 1,
         'params_path': 0,
         'request': req_guest_inspect_vnics},
+    'guest_get_power_state_bulk': {
+        'method': 'GET',
+        'args_required': 1,
+        'params_path': 0,
+        'request': req_guest_get_power_state_bulk},
     'guests_get_nic_info': {
         'method': 'GET',
         'args_required': 0,
@@ -801,6 +866,16 @@ DATABASE = {
         'args_required': 1,
         'params_path': 1,
         'request': req_guest_softstop},
+    'guest_start_many': {
+        'method': 'POST',
+        'args_required': 1,
+        'params_path': 0,
+        'request': req_guest_start_many},
+    'guest_stop_many': {
+        'method': 'POST',
+        'args_required': 1,
+        'params_path': 0,
+        'request': req_guest_stop_many},
     'guest_pause': {
         'method': 'POST',
         'args_required': 1,
@@ -1089,6 +1164,21 @@ DATABASE = {
         'args_required': 1,
         'params_path': 1,
         'request': req_image_get_root_disk_size},
+    'job_submit': {
+        'method': 'POST',
+        'args_required': 1,
+        'params_path': 0,
+        'request': req_job_submit},
+    'job_query': {
+        'method': 'GET',
+        'args_required': 1,
+        'params_path': 1,
+        'request': req_job_query},
+    'job_list': {
+        'method': 'GET',
+        'args_required': 0,
+        'params_path': 0,
+        'request': req_job_list},
     'file_import': {
         'method': 'PUT',
         'args_required': 1,
@@ -1153,10 +1243,17 @@ def get_data_file(fpath):
 
 
 class RESTClient(object):
+    """Client of the SDK REST API.
+
+    The client can be shared by many threads. The requests are sent on a
+    pool of at most pool_size kept-alive connections, a connection failing
+    to open is retried up to retries times. With the token auth, the token
+    got from the server is used until just before it expires.
+    """
 
     def __init__(self, ip='127.0.0.1', port=8888,
                  ssl_enabled=False, verify=False,
-                 token_path=None, auth=None):
+                 token_path=None, auth=None, pool_size=10, retries=3):
         # SSL enable or not
         if ssl_enabled:
             self.base_url = "https://" + ip + ":" + str(port)
@@ -1172,6 +1269,20 @@ class RESTClient(object):
         # need send token to validate
         # This is client, so must NOT use zvmsdk.conf file setting
         self.auth = auth
+        self.session = requests.Session()
+        # Only the connections failing to open are retried, a request
+        # sent is never replayed, its body may be a consumed stream
+        retry = requests.adapters.Retry(total=retries, connect=retries,
+                                        read=0, status=0, redirect=0)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=pool_size,
+                                                max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._token = None
+        # None when the expiration of the token is unknown
+        self._token_expires = None
+        self._token_lock = threading.Lock()
 
     def _check_arguments(self, api_name, *args, **kwargs):
         # check api_name exist or not
@@ -1211,8 +1322,8 @@ class RESTClient(object):
 
         url = self.base_url + '/token'
         method = 'POST'
-        response = requests.request(method, url, headers=_headers,
-                                    verify=self.verify)
+        response = self.session.request(method, url, headers=_headers,
+                                        verify=self.verify)
         if response.status_code == 503:
             # service unavailable
             raise ServiceUnavailable(response)
@@ -1224,6 +1335,38 @@ class RESTClient(object):
 
         return token
 
+    @staticmethod
+    def _get_token_expiration(token):
+        """Get when a JWT token expires, None when it is unknown."""
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(
+                payload.encode('ascii')).decode('utf-8'))
+            return float(claims['exp'])
+        except Exception:
+            # For example the token of a server with the auth disabled
+            return None
+
+    def _get_cached_token(self):
+        """Get the token got last time from the server, or a new token when
+        there is none or it is about to expire."""
+        with self._token_lock:
+            if (self._token is None or
+                    (self._token_expires is not None and
+                     time.time() > self._token_expires -
+                     TOKEN_REFRESH_MARGIN)):
+                self._token = self._get_token()
+                self._token_expires = self._get_token_expiration(
+                    self._token)
+            return self._token
+
+    def _invalidate_token(self, token):
+        with self._token_lock:
+            # Another thread may have got a new token already
+            if self._token == token:
+                self._token = None
+
     def _get_url_body_headers(self, api_name, *args, **kwargs):
         headers = {}
         headers['Content-Type'] = 'application/json'
@@ -1274,21 +1417,31 @@ class RESTClient(object):
                 # if data is a file-like object
                 body = body
 
-        if self.auth == 'token' and self.token_path is not None:
-            _headers['X-Auth-Token'] = self._get_token()
+        use_token = self.auth == 'token' and self.token_path is not None
+        if use_token:
+            _headers['X-Auth-Token'] = self._get_cached_token()
 
         content_type = headers['Content-Type']
         stream = content_type == 'application/octet-stream'
+        response = self._send(method, url, body, _headers, stream)
+        if (use_token and response.status_code == 401 and
+                (body is None or isinstance(body, six.string_types))):
+            # The token was revoked, for example the admin token changed,
+            # get a new one and send the request again
+            self._invalidate_token(_headers['X-Auth-Token'])
+            _headers['X-Auth-Token'] = self._get_cached_token()
+            response = self._send(method, url, body, _headers, stream)
+        return response
+
+    def _send(self, method, url, body, headers, stream):
         if stream:
-            response = requests.request(method, url, data=body,
-                                        headers=_headers,
+            return self.session.request(method, url, data=body,
+                                        headers=headers,
                                         verify=self.verify,
                                         stream=stream)
-        else:
-            response = requests.request(method, url, data=body,
-                                        headers=_headers,
-                                        verify=self.verify)
-        return response
+        return self.session.request(method, url, data=body,
+                                    headers=headers,
+                                    verify=self.verify)
 
     def call(self, api_name, *args, **kwargs):
         try:
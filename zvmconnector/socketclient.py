@@ -16,9 +16,13 @@
 #    under the License.
 
 
+import itertools
 import json
 import six
 import socket
+import struct
+import threading
+import zlib
 
 
 SDKCLIENT_MODID = 110
@@ -32,7 +36,9 @@ SOCKET_ERROR = [{'overallRC': 101, 'modID': SDKCLIENT_MODID, 'rc': 101},
                  5: ("Client got socket error when sending API call to "
                      "SDK server, error: %(error)s"),
                  6: ("Client got socket error when receiving response "
-                     "from SDK server, error: %(error)s")},
+                     "from SDK server, error: %(error)s"),
+                 7: ("Client got invalid frame from SDK server, "
+                     "error: %(error)s")},
                 "SDK client or server get socket error",
                 ]
 INVALID_API_ERROR = [{'overallRC': 400, 'modID': SDKCLIENT_MODID, 'rc': 400},
@@ -40,25 +46,403 @@ INVALID_API_ERROR = [{'overallRC': 400, 'modID': SDKCLIENT_MODID, 'rc': 400},
                      "Invalid API name"
                      ]
 
+# Framed wire protocol. Every frame is a fixed size header followed by the
+# payload:
+#   magic (2 bytes) | version (1 byte) | flags (1 byte) |
+#   request id (4 bytes) | payload length (4 bytes)
+# A message (the JSON request list [func_name, args, kwargs], or the JSON
+# results dict) is streamed as one or more frames of the same request id,
+# every frame but the last one has FLAG_MORE set. The server echoes the
+# request id back so that several requests can be in flight on one
+# persistent connection and be answered out of order.
+FRAME_MAGIC = b'ZF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('!2sBBII')
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+# More frames of the same message follow
+FLAG_MORE = 0x01
+# The message is zlib compressed, the response of a compressed request
+# is compressed too
+FLAG_ZLIB = 0x02
+# The client keeps the connection open for further requests
+FLAG_KEEPALIVE = 0x04
+# Size of the frames a streamed message is cut into
+STREAM_CHUNK_SIZE = 64 * 1024
+_MAX_REQUEST_ID = 0xFFFFFFFF
+_JSON_ENCODER = json.JSONEncoder()
+
+
+def pack_frame(request_id, payload, flags=0):
+    """Build one frame of the framed protocol."""
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags,
+                             request_id, len(payload)) + payload
+
+
+def iter_json(obj):
+    """Encode obj to JSON piece by piece, without building the full string.
+    """
+    for piece in _JSON_ENCODER.iterencode(obj):
+        yield piece.encode()
+
+
+def iter_frames(request_id, chunks, flags=0):
+    """Cut a message given as an iterable of bytes into frames.
+
+    The chunks are coalesced into frames of STREAM_CHUNK_SIZE bytes, and
+    compressed on the fly when flags has FLAG_ZLIB set.
+    """
+    compressor = zlib.compressobj() if flags & FLAG_ZLIB else None
+    flags &= ~FLAG_MORE
+    buf = bytearray()
+    for chunk in chunks:
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        buf += chunk
+        while len(buf) >= STREAM_CHUNK_SIZE:
+            yield pack_frame(request_id, bytes(buf[:STREAM_CHUNK_SIZE]),
+                             flags | FLAG_MORE)
+            del buf[:STREAM_CHUNK_SIZE]
+    if compressor is not None:
+        buf += compressor.flush()
+    yield pack_frame(request_id, bytes(buf), flags)
+
+
+class FrameError(Exception):
+    """Raised when the peer sends data not following the frame protocol."""
+    pass
+
+
+class _PartialMessage(object):
+    """The frames received so far of a message."""
+
+    def __init__(self, flags):
+        self.flags = flags & ~FLAG_MORE
+        self.chunks = []
+        if flags & FLAG_ZLIB:
+            self.decompressor = zlib.decompressobj()
+        else:
+            self.decompressor = None
+
+    def add(self, payload):
+        if self.decompressor is not None:
+            try:
+                payload = self.decompressor.decompress(payload)
+            except zlib.error as err:
+                raise FrameError("invalid compressed payload: %s" % err)
+        self.chunks.append(payload)
+
+    def payload(self):
+        if self.decompressor is not None:
+            self.chunks.append(self.decompressor.flush())
+        return b''.join(self.chunks)
+
+
+def _unpack_header(header):
+    """Check a frame header, return (flags, request_id, payload size)."""
+    magic, version, flags, request_id, size = FRAME_HEADER.unpack(header)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise FrameError("unexpected frame header %r" % header)
+    if size > MAX_FRAME_SIZE:
+        raise FrameError("frame size %d exceeds the limit %d" %
+                         (size, MAX_FRAME_SIZE))
+    return flags, request_id, size
+
+
+def _assemble(partial, request_id, flags, payload):
+    """Add a frame to the incomplete messages kept in the partial dict.
+
+    :returns: tuple of (request_id, flags, payload) when the frame
+              completes a message, otherwise None.
+    """
+    message = partial.get(request_id)
+    if message is None:
+        message = _PartialMessage(flags)
+        if flags & FLAG_MORE:
+            partial[request_id] = message
+    message.add(payload)
+    if flags & FLAG_MORE:
+        return None
+    partial.pop(request_id, None)
+    return (request_id, message.flags, message.payload())
+
+
+class FrameDecoder(object):
+    """Decode the messages from data fed in, for non-blocking sockets."""
+
+    def __init__(self):
+        self.buffered = bytearray()
+        self._partial = {}
+
+    def feed(self, data):
+        """Add received data, return the list of completed messages."""
+        self.buffered += data
+        messages = []
+        while len(self.buffered) >= FRAME_HEADER.size:
+            flags, request_id, size = _unpack_header(
+                bytes(self.buffered[:FRAME_HEADER.size]))
+            end = FRAME_HEADER.size + size
+            if len(self.buffered) < end:
+                break
+            payload = bytes(self.buffered[FRAME_HEADER.size:end])
+            del self.buffered[:end]
+            message = _assemble(self._partial, request_id, flags, payload)
+            if message is not None:
+                messages.append(message)
+        return messages
+
+
+class FrameReader(object):
+    """Read frames and messages from a socket.
+
+    :param sock:      the connected socket
+    :param buffered:  bytes already read from the socket, they are consumed
+                      before reading from the socket again
+    """
+
+    def __init__(self, sock, buffered=b''):
+        self.sock = sock
+        self.buffered = buffered
+        self._partial = {}
+
+    def _read_exactly(self, size):
+        chunks = []
+        if self.buffered:
+            chunks.append(self.buffered[:size])
+            self.buffered = self.buffered[size:]
+        received = len(chunks[0]) if chunks else 0
+        while received < size:
+            chunk = self.sock.recv(min(size - received, STREAM_CHUNK_SIZE))
+            if not chunk:
+                if received == 0:
+                    return None
+                raise FrameError("connection closed in the middle of a "
+                                 "frame, %d of %d bytes received" %
+                                 (received, size))
+            chunks.append(chunk)
+            received += len(chunk)
+        return b''.join(chunks)
+
+    def read_frame(self):
+        """Read one frame.
+
+        :returns: tuple of (request_id, flags, payload), or None when the
+                  peer closed the connection between two frames.
+        """
+        header = self._read_exactly(FRAME_HEADER.size)
+        if header is None:
+            return None
+        flags, request_id, size = _unpack_header(header)
+        payload = self._read_exactly(size) if size else b''
+        if payload is None:
+            raise FrameError("connection closed before frame payload")
+        return (request_id, flags, payload)
+
+    def read_message(self):
+        """Read frames until a message is complete.
+
+        Frames of several messages may be interleaved, the incomplete ones
+        are kept until their last frame is read.
+
+        :returns: tuple of (request_id, flags, payload) where payload is
+                  the uncompressed message, or None when the peer closed
+                  the connection between two messages.
+        """
+        while True:
+            frame = self.read_frame()
+            if frame is None:
+                if self._partial:
+                    raise FrameError("connection closed with %d incomplete "
+                                     "messages" % len(self._partial))
+                return None
+            message = _assemble(self._partial, *frame)
+            if message is not None:
+                return message
+
+
+class _PendingRequest(object):
+    """A request waiting for its response on a persistent connection."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.payload = None
+        self.error = None
+
+
+class PersistentConnection(object):
+    """A connection to SDK server shared by several in-flight requests.
+
+    Requests are written under a send lock, and a reader thread routes the
+    responses to the waiting callers by request id.
+    """
+
+    def __init__(self, addr, port, timeout):
+        self.sock = socket.create_connection((addr, port), timeout)
+        # The reader thread blocks on recv, the request timeout is applied
+        # when waiting for the response instead.
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.closed = False
+        self._send_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._reader = threading.Thread(target=self._read_loop)
+        self._reader.daemon = True
+        self._reader.start()
+
+    @property
+    def inflight(self):
+        return len(self._pending)
+
+    def send_request(self, payload, flags=0):
+        """Send a request, return the request id to wait on."""
+        waiter = _PendingRequest()
+        with self._pending_lock:
+            if self.closed:
+                raise socket.error("connection to SDK server is closed")
+            request_id = next(self._ids) % _MAX_REQUEST_ID + 1
+            self._pending[request_id] = waiter
+        try:
+            # Each frame is sent under the lock on its own, so that a big
+            # request does not hold back the other senders.
+            for frame in iter_frames(request_id, [payload],
+                                     flags | FLAG_KEEPALIVE):
+                with self._send_lock:
+                    self.sock.sendall(frame)
+        except socket.error:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            self.close()
+            raise
+        return request_id, waiter
+
+    def wait_response(self, request_id, waiter, timeout):
+        """Wait the response payload of a sent request."""
+        if not waiter.event.wait(timeout):
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise socket.timeout("timed out waiting response of request "
+                                 "%d" % request_id)
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.payload
+
+    def _read_loop(self):
+        reader = FrameReader(self.sock)
+        error = socket.error("connection closed by SDK server")
+        try:
+            while True:
+                message = reader.read_message()
+                if message is None:
+                    break
+                request_id, _flags, payload = message
+                with self._pending_lock:
+                    waiter = self._pending.pop(request_id, None)
+                # The waiter is gone if the caller already timed out
+                if waiter is not None:
+                    waiter.payload = payload
+                    waiter.event.set()
+        except (socket.error, FrameError) as err:
+            error = err
+        self._fail_pending(error)
+
+    def _fail_pending(self, error):
+        with self._pending_lock:
+            self.closed = True
+            pending = self._pending
+            self._pending = {}
+        for waiter in pending.values():
+            waiter.error = error
+            waiter.event.set()
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+    def close(self):
+        with self._pending_lock:
+            self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+
+class SDKConnectionPool(object):
+    """Pool of persistent connections to one SDK server.
+
+    A new connection is opened only when every pooled connection is busy,
+    once the pool is full the least loaded connection is shared.
+    """
+
+    def __init__(self, addr, port, size, timeout):
+        self.addr = addr
+        self.port = port
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self._conns = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            self._conns = [c for c in self._conns if not c.closed]
+            for conn in self._conns:
+                if conn.inflight == 0:
+                    return conn
+            if len(self._conns) < self.size:
+                conn = PersistentConnection(self.addr, self.port,
+                                            self.timeout)
+                self._conns.append(conn)
+                return conn
+            return min(self._conns, key=lambda c: c.inflight)
+
+    def close(self):
+        with self._lock:
+            conns = self._conns
+            self._conns = []
+        for conn in conns:
+            conn.close()
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_connection_pool(addr, port, size, timeout):
+    """Get the process-wide connection pool of the SDK server addr:port."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get((addr, port))
+        if pool is None:
+            pool = SDKConnectionPool(addr, port, size, timeout)
+            _POOLS[(addr, port)] = pool
+        return pool
+
 
 class SDKSocketClient(object):
 
-    def __init__(self, addr='127.0.0.1', port=2000, request_timeout=3600):
+    def __init__(self, addr='127.0.0.1', port=2000, request_timeout=3600,
+                 persistent=False, pool_size=4, compress=False):
         self.addr = addr
         self.port = port
         # request_timeout is used to set the client socket timeout when
         # waiting results returned from server.
         self.timeout = request_timeout
+        # In persistent mode the API calls are multiplexed on the pooled
+        # connections instead of opening a new socket for each call.
+        self.persistent = persistent
+        self.pool_size = pool_size
+        # Whether to zlib compress the requests and responses on the wire
+        self.flags = FLAG_ZLIB if compress else 0
 
     def _construct_api_name_error(self, msg):
-        results = INVALID_API_ERROR[0]
+        results = dict(INVALID_API_ERROR[0])
         results.update({'rs': 1,
                         'errmsg': INVALID_API_ERROR[1][1] % {'msg': msg},
                         'output': ''})
         return results
 
     def _construct_socket_error(self, rs, **kwargs):
-        results = SOCKET_ERROR[0]
+        results = dict(SOCKET_ERROR[0])
         results.update({'rs': rs,
                         'errmsg': SOCKET_ERROR[1][rs] % kwargs,
                         'output': ''})
@@ -71,6 +455,9 @@ class SDKSocketClient(object):
                    'string, type: %s specified.') % type(func)
             return self._construct_api_name_error(msg)
 
+        if self.persistent:
+            return self._call_persistent(func, api_args, api_kwargs)
+
         # Create client socket
         try:
             cs = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -92,35 +479,27 @@ class SDKSocketClient(object):
             api_data = json.dumps((func, api_args, api_kwargs))
             api_data = api_data.encode()
 
-            # Send the API call data to SDK server
-            sent = 0
-            total_len = len(api_data)
-            got_error = False
+            # Send the API call data to SDK server, the plain JSON request
+            # is understood by every server version so it is framed only
+            # when a framed protocol feature is needed
             try:
-                while (sent < total_len):
-                    this_sent = cs.send(api_data[sent:])
-                    if this_sent == 0:
-                        got_error = True
-                        break
-                    sent += this_sent
+                if self.flags:
+                    for frame in iter_frames(1, [api_data], self.flags):
+                        cs.sendall(frame)
+                else:
+                    cs.sendall(api_data)
             except socket.error as err:
                 return self._construct_socket_error(5,
                                                     error=six.text_type(err))
 
-            if got_error or sent != total_len:
-                return self._construct_socket_error(3, sent=sent,
-                                                    api=api_data)
-
             # Receive data from server
-            return_blocks = []
             try:
-                while True:
-                    block = cs.recv(4096)
-                    if not block:
-                        break
-                    block = bytes.decode(block)
-                    return_blocks.append(block)
-            except socket.error as err:
+                if self.flags:
+                    message = FrameReader(cs).read_message()
+                    payload = message[2] if message is not None else b''
+                else:
+                    payload = self._recv_all(cs)
+            except (socket.error, FrameError) as err:
                 # When the sdkserver cann't handle all the client request,
                 # some client request would be rejected.
                 # Under this case, the client socket can successfully
@@ -133,12 +512,58 @@ class SDKSocketClient(object):
             # socket left.
             cs.close()
 
-        # Transform the received stream to standard result form
+        # Transform the received message to standard result form
         # This client assumes that the server would return result in
         # the standard result form, so client just return the received
         # data
-        if return_blocks:
-            results = json.loads(''.join(return_blocks))
-        else:
-            results = self._construct_socket_error(4)
-        return results
+        if not payload:
+            return self._construct_socket_error(4)
+        return self._load_results(payload)
+
+    def _recv_all(self, cs):
+        """Read the unframed results until the server closes."""
+        return_blocks = []
+        while True:
+            block = cs.recv(4096)
+            if not block:
+                break
+            return_blocks.append(block)
+        return b''.join(return_blocks)
+
+    def _call_persistent(self, func, api_args, api_kwargs):
+        """Send API call on a pooled persistent connection"""
+        api_data = json.dumps((func, api_args, api_kwargs)).encode()
+        pool = get_connection_pool(self.addr, self.port, self.pool_size,
+                                   self.timeout)
+        # A pooled connection may have been closed by the server since it
+        # was last used, the request is never received in that case so it
+        # is safe to retry once on a new connection.
+        for attempt in range(2):
+            try:
+                conn = pool.get()
+            except socket.error as err:
+                return self._construct_socket_error(2, addr=self.addr,
+                                                    port=self.port,
+                                                    error=six.text_type(err))
+            try:
+                request_id, waiter = conn.send_request(api_data, self.flags)
+                break
+            except socket.error as err:
+                if attempt:
+                    return self._construct_socket_error(
+                        5, error=six.text_type(err))
+
+        try:
+            payload = conn.wait_response(request_id, waiter, self.timeout)
+        except (socket.error, FrameError) as err:
+            return self._construct_socket_error(6, error=six.text_type(err))
+
+        if not payload:
+            return self._construct_socket_error(4)
+        return self._load_results(payload)
+
+    def _load_results(self, payload):
+        try:
+            return json.loads(bytes.decode(payload))
+        except ValueError as err:
+            return self._construct_socket_error(7, error=six.text_type(err))
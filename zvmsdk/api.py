@@ -16,15 +16,18 @@
 #    under the License.
 
 
+import inspect
 import netaddr
 import six
 import ast
+from concurrent import futures
 
 from zvmsdk import config
 from zvmsdk import constants
 from zvmsdk import exception
 from zvmsdk import hostops
 from zvmsdk import imageops
+from zvmsdk import jobs
 from zvmsdk import log
 from zvmsdk import monitor
 from zvmsdk import networkops
@@ -38,6 +41,11 @@ from zvmsdk import utils as zvmutils
 CONF = config.CONF
 LOG = log.LOG
 
+# The APIs that can be run in the background with job_submit
+ASYNC_OPERATIONS = ('guest_create', 'guest_deploy', 'guest_capture',
+                    'guest_live_migrate', 'image_import', 'volume_attach',
+                    'volume_attach_many')
+
 
 def check_guest_exist(check_index=0):
     """Check guest exist in database.
@@ -100,6 +108,7 @@ class SDKAPI(object):
         self._imageops = imageops.get_imageops()
         self._monitor = monitor.get_monitor()
         self._volumeop = volumeop.get_volumeop()
+        self._deploy_scheduler = jobs.get_deploy_scheduler()
         self._GuestDbOperator = database.GuestDbOperator()
         self._NetworkDbOperator = database.NetworkDbOperator()
 
@@ -159,6 +168,108 @@ class SDKAPI(object):
         with zvmutils.log_and_reraise_sdkbase_error(action):
             self._vmops.guest_softstop(userid, **kwargs)
 
+    def guest_start_many(self, userid_list, timeout=0):
+        """Power on several virtual machines at the same time.
+
+        :param list userid_list: the ids of the virtual machines to be
+                                 power on
+        :param int timeout: the timeout of waiting each virtual machine
+                            reachable, default as 0, which mean not wait
+                            for virtual machine reachable status
+
+        :returns: dictionary of the result of each virtual machine in the
+                  form {'UID1': {'overallRC': 0, 'modID': None, 'rc': 0,
+                  'rs': 0, 'errmsg': ''}, 'UID2': ...}
+        """
+        def _start(userid, state):
+            # A guest already on only needs the wait for it reachable
+            if state != 'on' or timeout > 0:
+                self._vmops.guest_start(userid, timeout)
+
+        return self._power_many(userid_list, "start guest '%s'", _start)
+
+    def guest_stop_many(self, userid_list, soft=False, **kwargs):
+        """Power off several virtual machines at the same time.
+
+        :param list userid_list: the ids of the virtual machines to be
+                                 power off
+        :param bool soft: whether to shutdown the OS of each virtual
+                          machine before logging it off, as
+                          guest_softstop does
+        :param dict kwargs:
+               - timeout=<value>:
+                 Integer, time to wait for each VM to deactivate, the
+                 recommended value is 300
+               - poll_interval=<value>
+                 Integer, how often to signal guest while waiting for it
+                 to be deactivate, the recommended value is 20
+
+        :returns: dictionary of the result of each virtual machine in the
+                  form {'UID1': {'overallRC': 0, 'modID': None, 'rc': 0,
+                  'rs': 0, 'errmsg': ''}, 'UID2': ...}
+        """
+        if soft:
+            action = "soft stop guest '%s'"
+            stop = self._vmops.guest_softstop
+        else:
+            action = "stop guest '%s'"
+            stop = self._vmops.guest_stop
+
+        def _stop(userid, state):
+            if state != 'off':
+                stop(userid, **kwargs)
+
+        return self._power_many(userid_list, action, _stop)
+
+    def _power_many(self, userid_list, action, func):
+        """Call func(userid, power_state) for each guest on a pool of at
+        most [guest] power_workers threads, and return the result of
+        each guest."""
+        userids = []
+        for userid in userid_list:
+            if userid.upper() not in userids:
+                userids.append(userid.upper())
+        if not userids:
+            return {}
+
+        # One query gets the guests already in the desired state
+        try:
+            states = self._vmops.get_power_state_bulk(userids)
+        except exception.SDKBaseException as err:
+            LOG.warning("Failed to get the power state of guests %s, "
+                        "they are all powered on or off: %s" %
+                        (userids, err.format_message()))
+            states = {}
+
+        def _power(userid):
+            try:
+                self._vmops.check_guests_exist_in_db([userid])
+                with zvmutils.log_and_reraise_sdkbase_error(action % userid):
+                    func(userid, states.get(userid))
+            except exception.SDKBaseException as err:
+                results = err.results or exception.SDKInternalError(
+                    msg=err.format_message()).results
+                return {'overallRC': results['overallRC'],
+                        'modID': results['modID'],
+                        'rc': results['rc'],
+                        'rs': results['rs'],
+                        'errmsg': err.format_message()}
+            except Exception as err:
+                LOG.error("Failed to %s: %s" % (action % userid,
+                                                 six.text_type(err)))
+                err = exception.SDKInternalError(msg=six.text_type(err))
+                return {'overallRC': err.results['overallRC'],
+                        'modID': err.results['modID'],
+                        'rc': err.results['rc'],
+                        'rs': err.results['rs'],
+                        'errmsg': err.format_message()}
+            return {'overallRC': 0, 'modID': None, 'rc': 0, 'rs': 0,
+                    'errmsg': ''}
+
+        workers = min(max(CONF.guest.power_workers, 1), len(userids))
+        with futures.ThreadPoolExecutor(workers) as executor:
+            return dict(zip(userids, executor.map(_power, userids)))
+
     @check_guest_exist()
     def guest_reboot(self, userid):
         """Reboot a virtual machine
@@ -214,6 +325,20 @@ class SDKAPI(object):
         with zvmutils.log_and_reraise_sdkbase_error(action):
             return self._vmops.get_power_state(userid)
 
+    @check_guest_exist()
+    def guest_get_power_state_bulk(self, userid_list):
+        """Returns power state of several guests with one query.
+
+        :param userid_list: a single userid string or a list of guest userids
+        :returns: dictionary of the power states in the form
+                  {'UID1': 'on', 'UID2': 'off'}
+        """
+        if not isinstance(userid_list, list):
+            userid_list = [userid_list]
+        action = "get power state of guests '%s'" % str(userid_list)
+        with zvmutils.log_and_reraise_sdkbase_error(action):
+            return self._vmops.get_power_state_bulk(userid_list)
+
     @check_guest_exist()
     def guest_get_info(self, userid):
         """Get the status of a virtual machine.
@@ -624,6 +749,119 @@ class SDKAPI(object):
             self._vmops.guest_deploy(userid, image_name, transportfiles,
                                      remotehost, vdev, hostname, skipdiskcopy)
 
+    @check_guest_exist()
+    def guest_deploy_async(self, userid, image_name, transportfiles=None,
+                           remotehost=None, vdev=None, hostname=None,
+                           skipdiskcopy=False, disk_pool=None):
+        """ Queue the deploy of the image to VM and return at once.
+
+        The deploy is run in the background like guest_deploy does, use
+        job_query with the returned job id to get its progress and result.
+        The number of deploys running at the same time is limited in total
+        and per disk pool.
+
+        :param userid: (str) the user id of the VM
+        :param image_name: (str) If the skipdiskcopy is False, this would be
+               used as the name of image that used to deploy the VM;
+               Otherwise, this value should be the OS version.
+        :param transportfiles: (str) the files that used to customize the VM
+        :param remotehost: the server where the transportfiles located, the
+               format is username@IP, eg nova@192.168.99.1
+        :param vdev: (str) the device that image will be deploy to
+        :param hostname: (str) the hostname of the VM. This parameter will be
+               ignored if transportfiles present.
+        :param skipdiskcopy: (bool) whether to skip the disk copy process.
+               If True, the OS version should be specified in the parameter
+               image_name.
+        :param disk_pool: (str) the disk pool the root disk of the VM is in,
+               the default is the disk_pool option in the zvm section.
+
+        :returns: the job, a dictionary with keys job_id, operation, target,
+                  queue, state, progress, step, result, error, created_at
+                  and updated_at
+        :rtype: dict
+        """
+        def deploy(job):
+            self._vmops.guest_deploy(userid, image_name, transportfiles,
+                                     remotehost, vdev, hostname, skipdiskcopy,
+                                     progress=job.set_progress)
+
+        disk_pool = disk_pool or CONF.zvm.disk_pool
+        job = self._deploy_scheduler.submit('guest_deploy', deploy,
+                                            target=userid, queue=disk_pool)
+        return job.to_dict()
+
+    def job_submit(self, operation, **params):
+        """ Run an SDK API in the background and return at once.
+
+        The API is called with params on a pool of threads separate from
+        the SDK server workers, use job_query with the returned job id to
+        get its progress and result.
+
+        :param operation: (str) the name of the API, one of guest_create,
+               guest_deploy, guest_capture, guest_live_migrate, image_import,
+               volume_attach and volume_attach_many
+        :param params: the parameters of the API, passed by name. The
+               guest_deploy jobs also accept disk_pool, see
+               guest_deploy_async.
+
+        :returns: the job, a dictionary with keys job_id, operation, target,
+                  queue, state, progress, step, result, error, created_at
+                  and updated_at
+        :rtype: dict
+        """
+        if operation not in ASYNC_OPERATIONS:
+            raise exception.SDKInvalidInputFormat(
+                msg=("operation should be one of %s" %
+                     ', '.join(ASYNC_OPERATIONS)))
+        func = getattr(self, operation)
+        if operation == 'guest_deploy':
+            func = self.guest_deploy_async
+        try:
+            # The API decorators get the parameters by position
+            bound = inspect.signature(func).bind(**params)
+        except TypeError as err:
+            raise exception.SDKInvalidInputFormat(
+                msg=("invalid parameters of %s: %s" %
+                     (operation, six.text_type(err))))
+        if operation == 'guest_deploy':
+            return func(*bound.args, **bound.kwargs)
+
+        target = params.get('userid', params.get('image_name'))
+        if target is None and isinstance(params.get('connection_info'), dict):
+            target = params['connection_info'].get('assigner_id')
+        job = jobs.get_job_scheduler().submit(
+            operation, lambda job: func(*bound.args, **bound.kwargs),
+            target=target, queue=operation)
+        return job.to_dict()
+
+    def job_query(self, job_id, wait=0):
+        """ Get the state of a job.
+
+        :param job_id: (str) the id of the job returned when it was submitted
+        :param wait: (int) the maximum number of seconds to wait for the job
+               to finish, 0 means the state is returned at once. The wait
+               is capped to a few seconds, query again while the job is
+               queued or running
+        :returns: the job, a dictionary with keys job_id, operation, target,
+                  queue, state, progress, step, result, error, created_at
+                  and updated_at. state is one of queued, running, succeeded
+                  and failed, error is set when the job failed.
+        :rtype: dict
+        """
+        return jobs.query_job(job_id, wait=wait)
+
+    def job_list(self, target=None, state=None):
+        """ List the jobs, the most recently created first.
+
+        :param target: (str) only list the jobs of this userid or image name
+        :param state: (str) only list the jobs in this state, one of queued,
+               running, succeeded and failed
+        :returns: a list of jobs, see job_query
+        :rtype: list
+        """
+        return jobs.list_jobs(target=target, state=state)
+
     @check_guest_exist()
     def guest_capture(self, userid, image_name, capture_type='rootonly',
                       compress_level=6):
@@ -773,6 +1011,8 @@ class SDKAPI(object):
                     LOG.info("Guest %s comments updated." % userid)
                 # We just return no matter onboarding or migration
                 # since the guest exists
+                vmops.get_guest_index().add(userid)
+                self._monitor.namelist_add([userid])
                 return
 
             # add one record for new VM for both onboarding and migration,
@@ -808,6 +1048,8 @@ class SDKAPI(object):
                 with zvmutils.log_and_reraise_sdkbase_error(action):
                     self._NetworkDbOperator.switch_add_record(
                                 userid, interface, port, switch)
+            vmops.get_guest_index().add(userid)
+            self._monitor.namelist_add([userid])
             LOG.info("Guest %s registered." % userid)
 
     # Deregister the guest (not delete), this function has no relationship with
@@ -831,6 +1073,8 @@ class SDKAPI(object):
         action = "delete guest '%s' from database" % userid
         with zvmutils.log_and_reraise_sdkbase_error(action):
             self._GuestDbOperator.delete_guest_by_userid(userid)
+        vmops.get_guest_index().remove(userid)
+        self._monitor.namelist_remove([userid])
         LOG.info("Guest %s deregistered." % userid)
 
     @check_guest_exist()
@@ -885,6 +1129,7 @@ class SDKAPI(object):
             with zvmutils.log_and_reraise_sdkbase_error(action):
                 self._GuestDbOperator.update_guest_by_userid(userid,
                                                     comments=comments)
+            vmops.get_guest_index().remove(userid)
 
             # Skip IUCV authorization for RHCOS guests
             is_rhcos = 'rhcos' in self._GuestDbOperator.get_guest_by_userid(
@@ -1090,12 +1335,15 @@ class SDKAPI(object):
 
         action = "create guest '%s'" % userid
         with zvmutils.log_and_reraise_sdkbase_error(action):
-            return self._vmops.create_vm(userid, vcpus, memory, disk_list,
+            info = self._vmops.create_vm(userid, vcpus, memory, disk_list,
                                          user_profile, max_cpu, max_mem,
                                          ipl_from, ipl_param, ipl_loadparam,
                                          dedicate_vdevs, loaddev, account,
                                          comment_list, cschedule, cshare,
                                          rdomain, pcif)
+        # add userid into smapi namelist
+        self._monitor.namelist_add([userid])
+        return info
 
     @check_guest_exist()
     def guest_live_resize_cpus(self, userid, cpu_cnt, cpu_share=''):
@@ -1424,7 +1672,9 @@ class SDKAPI(object):
 
         action = "delete guest '%s'" % userid
         with zvmutils.log_and_reraise_sdkbase_error(action):
-            return self._vmops.delete_vm(userid)
+            self._vmops.delete_vm(userid)
+        # remove userid from smapi namelist
+        self._monitor.namelist_remove([userid])
 
     @check_guest_exist()
     def guest_inspect_stats(self, userid_list):
@@ -2088,6 +2338,21 @@ class SDKAPI(object):
         """
         self._volumeop.attach_volume_to_instance(connection_info)
 
+    def volume_attach_many(self, userid, connection_infos):
+        """ Attach several volumes to a guest in one pass. The FCP database
+            is updated for all the volumes at once, every FCP device is
+            dedicated to the guest once and the volumes are configured in
+            the guest with one run of the attach scripts. If attaching any
+            volume fails, none of them is attached.
+
+        :param str userid: the user id of the guest
+        :param list connection_infos: a list of connection_info dicts as
+               accepted by volume_attach, one per volume. All of them must
+               target the guest userid with the same os_version, root
+               volumes are not allowed.
+        """
+        self._volumeop.attach_volumes_to_instance(userid, connection_infos)
+
     def volume_refresh_bootmap(self, fcpchannels, wwpns, lun,
                                wwid='',
                                transportfiles=None, guest_networks=None, fcp_template_id=None):
@@ -302,6 +302,49 @@ netboot directory accordingly. Two kinds of image repository looks like:
 /var/lib/zvmsdk/images/netboot/<image_osversion>/<imagename>
 /var/lib/zvmsdk/images/staging/<image_osversion>/<imagename>
     '''),
+    Opt('download_workers',
+        section='image',
+        default=8,
+        opt_type='int',
+        help='''
+Number of threads downloading an image imported over http in parallel.
+
+Each thread downloads one chunk of the image at a time with a ranged
+request, the connections to the http server are reused by the threads.
+'''),
+    Opt('download_chunk_size',
+        section='image',
+        default=8,
+        opt_type='int',
+        help='''
+Size in megabytes of the chunks an image imported over http is downloaded in.
+
+At most twice download_workers chunks of an image are held in memory.
+'''),
+    Opt('download_retries',
+        section='image',
+        default=3,
+        opt_type='int',
+        help='''
+Number of times the download of a chunk of an image is retried.
+
+A retry resumes the chunk from where the failed request stopped. When the
+download still fails, the downloaded chunks are kept in the downloads
+folder of the image repository and a later import of the same url resumes
+the download.
+'''),
+    Opt('download_max_age',
+        section='image',
+        default=86400,
+        opt_type='int',
+        help='''
+Seconds the partial downloads of failed image imports are kept.
+
+When an image import starts, the files in the downloads folder of the
+image repository not modified for this number of seconds are removed, so
+the downloads that are never resumed do not fill the image repository.
+When this value is below or equal to zero, they are never removed.
+'''),
     # file options
     Opt('file_repository',
         section='file',
@@ -381,6 +424,77 @@ This will take effect only when you set softstop_retries item.
 What's more, the value of softstop_timeout/softstop_interval is
 the times retried.
     '''),
+    Opt('index_refresh_interval',
+        section='guest',
+        default=300,
+        opt_type='int',
+        help='''
+The interval in seconds to rebuild the index of guests managed by SDK.
+
+Most guest APIs check the guests exist with an in-memory index of the
+guests managed by SDK and of the guests logged on to other members of
+the SSI cluster. The index is kept current by the guest create, delete,
+register, deregister and migrate APIs, and rebuilt from the database and
+z/VM at this interval to catch changes made out of SDK. The guests
+logged on to the other SSI members are also cached for this interval
+when listing the guests of this z/VM. When this value is below or equal
+to zero, the index is rebuilt and the SSI members queried on every check.
+Only one rebuild runs at a time, the checks made meanwhile use the index
+being replaced.
+'''
+        ),
+    Opt('template_cache_dir',
+        section='guest',
+        default='/var/lib/zvmsdk/templates',
+        help='''
+Directory to store the compiled templates of the guest configuration scripts.
+
+The Jinja templates used to build the volume attach and detach scripts
+and the grow root volume script are compiled once per process and kept in
+memory. The compiled bytecode is also stored in this directory, so the
+templates are not compiled again when the SDK server restarts. When this
+value is empty or the directory can not be created, the bytecode is kept
+in memory only.
+'''
+        ),
+    Opt('deploy_workers',
+        section='guest',
+        default=16,
+        opt_type='int',
+        help='''
+Maximum number of image deploys submitted with guest_deploy_async that run
+at the same time.
+
+The deploys are run by a pool of threads separate from the SDK server
+workers, so the server can still serve other requests while many guests
+are being deployed.
+'''
+        ),
+    Opt('deploy_per_disk_pool',
+        section='guest',
+        default=4,
+        opt_type='int',
+        help='''
+Maximum number of image deploys to the same disk pool that run at the same
+time.
+
+Unpacking an image is I/O bound on the disk pool the root disk is in, this
+option limits the deploys competing for a disk pool. The queued deploys of
+the disk pools are started in turn, in the order they were submitted.
+'''
+        ),
+    Opt('power_workers',
+        section='guest',
+        default=10,
+        opt_type='int',
+        help='''
+Maximum number of guests powered on or off at the same time by
+guest_start_many and guest_stop_many.
+
+Each guest is activated or deactivated by its own SMAPI request, this
+option limits the requests sent at the same time to the SMAPI servers.
+'''
+        ),
     # monitor options
     Opt('cache_interval',
         section='monitor',
@@ -402,6 +516,45 @@ will be disabled and each inspect call will need to call the backend
 utilities to get the inspected guest's monitor data.
         '''
         ),
+    Opt('cache_max_entries',
+        section='monitor',
+        default=10000,
+        opt_type='int',
+        help='''
+Maximum number of guests kept in each type of cached monitor data.
+
+When the cache is full the least recently inspected guests are evicted
+first.
+'''
+        ),
+    Opt('cache_refresh',
+        section='monitor',
+        default=False,
+        opt_type='bool',
+        help='''
+Refresh the cached monitor data in the background.
+
+When enabled, a background thread queries the CPU, memory and NIC data
+of all the guests each cache_interval, shortly before the cached data
+expires, so inspect calls are answered from the cache without waiting
+for the SDK backend utilities. It has no effect when the cache is
+disabled.
+'''
+        ),
+    Opt('namelist_reconcile_interval',
+        section='monitor',
+        default=3600,
+        opt_type='int',
+        help='''
+The interval in seconds to sync the monitor namelist with SMAPI.
+
+The guests managed by SDK are added to the SMAPI namelist used to query
+their CPU and memory data when they are created or registered, and the
+namelist is kept in memory. At this interval the namelist is queried
+from SMAPI again, and the managed guests missing in it, for example
+after a failed add, are added.
+'''
+        ),
     # wsgi options
     # this option is used when sending http request
     # to sdk wsgi, default to none so no token validation
@@ -505,6 +658,97 @@ The maximum number of worker thread in SDK server to handle client requests.
 
 These worker threads would work concurrently to handle requests from client.
 This value should be adjusted according to the system resource and workload.
+'''
+        ),
+    Opt('server_mode',
+        section='sdkserver',
+        opt_type='str',
+        default='thread',
+        help='''
+The core used by the SDK server to handle client connections.
+
+Possible values:
+'thread': Each accepted connection is queued and handled by a worker thread,
+          the worker threads exit once the request queue is empty.
+'event': A single event loop thread accepts the connections and does all the
+         socket reads and writes, the SDK API calls run in a long-lived pool
+         of max_worker_count threads. The per API limits defined in
+         api_concurrency_limits only apply to this mode.
+'''
+        ),
+    Opt('listen_backlog',
+        section='sdkserver',
+        opt_type='int',
+        default=128,
+        help='''
+The backlog of the SDK server listening socket.
+
+This is the number of connections the kernel keeps waiting to be accepted,
+increase it if clients get their connections refused during request spikes.
+'''
+        ),
+    Opt('api_concurrency_limits',
+        section='sdkserver',
+        opt_type='str',
+        default='',
+        help='''
+The maximum number of concurrent calls of some SDK APIs.
+
+This only takes effect when server_mode is 'event'. The value is a comma
+separated list of api_name:limit pairs, for example
+'guest_deploy:8,guest_capture:4'. The calls of an API above its limit wait
+until a running one finishes, so that slow APIs can not occupy all the
+worker threads. The APIs not listed are not limited.
+'''
+        ),
+    Opt('persistent_connection',
+        section='sdkserver',
+        opt_type='bool',
+        default=True,
+        help='''
+Whether the SDK REST service keeps persistent connections to the SDK server.
+
+When enabled, the requests of the SDK REST service are sent to the SDK server
+on a pool of long-lived connections, and several in-flight requests share one
+connection. When disabled, a new connection is opened and closed for each
+request.
+'''
+        ),
+    Opt('connection_pool_size',
+        section='sdkserver',
+        opt_type='int',
+        default=4,
+        help='''
+The maximum number of persistent connections opened to the SDK server.
+
+This only takes effect when persistent_connection is enabled. A new connection
+is opened only when all the existing connections have requests in flight.
+'''
+        ),
+    Opt('job_workers',
+        section='sdkserver',
+        opt_type='int',
+        default=8,
+        help='''
+The maximum number of jobs submitted with job_submit that run at the same time.
+
+The jobs run on threads separate from the SDK server workers, so that long
+operations like guest_capture or image_import do not hold the workers while
+they run. When all the job threads are busy, the operations of the waiting
+jobs are started in turn. Deploys are limited by the deploy_workers and
+deploy_per_disk_pool options of the guest section instead.
+'''
+        ),
+    Opt('job_expiration',
+        section='sdkserver',
+        opt_type='int',
+        default=604800,
+        help='''
+The number of seconds the finished jobs are kept in the jobs database.
+
+The state of the jobs is kept in the jobs database, so it can still be
+queried after the SDK server restarts. The jobs that finished more than this
+number of seconds ago are deleted.
 '''
         ),
     # database options
@@ -519,6 +763,21 @@ SDK databases are used to store a set of tables which contain the
 information of network, volume, image, etc. This option is used to
 tell SDK where to store the database files, make sure the process
 running SDK is able to read write and execute the directory.
+'''
+        ),
+    Opt('wal_mode',
+        section='database',
+        default=True,
+        opt_type='bool',
+        help='''
+Use the WAL journal mode for the SDK databases.
+
+In WAL mode the database reads run in parallel through a connection
+per thread and are not blocked by the writes, which still go through
+one connection at a time. Disable it when the database directory is
+on a file system that does not support the shared memory used by WAL,
+such as a network file system; all reads and writes are then
+serialized through one connection.
 '''
         ),
     Opt('refresh_bootmap_timeout',
@@ -569,6 +828,64 @@ Possible value:
 1 : use get_fcp_pair_with_same_index
 '''
       ),
+    Opt('free_fcp_index',
+        section='volume',
+        default=True,
+        opt_type='bool',
+        help='''
+Pick free FCP devices from an in-memory index.
+
+When enabled, the free FCP devices of each FCP Multipath Template are
+kept in memory per path and PCHID, and updated along with the FCP
+devices reserved, released or synced from z/VM, so that get_fcp_pair
+picks the FCP devices without querying the FCP database. When disabled,
+the free FCP devices are queried from the FCP database on each
+allocation.
+'''
+        ),
+    Opt('fcp_sync_batch_size',
+        section='volume',
+        default=200,
+        opt_type='int',
+        help='''
+The maximum number of FCP devices synced with z/VM in one transaction.
+
+Only the FCP devices changed in z/VM are synced into the FCP database,
+in batches of this size. The FCP database is locked for the time of one
+batch rather than of the whole sync, so that the volume operations are
+not blocked by the sync of a large number of FCP devices.
+'''
+        ),
+    Opt('fcp_sync_interval',
+        section='volume',
+        default=0,
+        opt_type='int',
+        help='''
+The interval in seconds the FCP database is synced with z/VM in
+background.
+
+When it is greater than 0, the FCP database is synced with z/VM in a
+background thread, at startup and then periodically, and the drift found
+and the time spent are recorded. Otherwise, the FCP database is synced
+at startup, which blocks the startup until the sync completes. In both
+cases the FCP database is also synced before the FCP devices are
+allocated or released.
+'''
+        ),
+    Opt('fcp_workers',
+        section='volume',
+        default=8,
+        opt_type='int',
+        help='''
+The maximum number of FCP devices dedicated or undedicated at once.
+
+When a volume is attached or detached, the FCP devices of all its paths
+are dedicated to or undedicated from the virtual machine concurrently,
+the calls to z/VM of all the volume operations on this host share a
+pool of this size. Set it to 1 to handle the FCP devices one after
+another.
+'''
+        ),
  Opt('force_capture_disk',
         section='zvm',
         required=False,
@@ -616,6 +933,36 @@ The default value is 900 seconds.
 SMAPIs are socket-based systems management application programming interfaces.
 If the SMAPI socket connection of a long-duration operation exceeds this timeout,
 the SMAPI long-duration operation will fail.
+'''
+        ),
+    Opt('smapi_transport',
+        section='zvm',
+        required=False,
+        default='subprocess',
+        opt_type='str',
+        help='''
+How the SMAPI requests are sent to smcli.
+
+Possible values:
+'subprocess': Run 'sudo smcli' in a new process for each request.
+'helper': Send all the requests over a pipe to one long-lived helper
+          process, which runs smcli for them. Several requests can be in
+          flight at once. See smapi_helper_command.
+'''
+        ),
+    Opt('smapi_helper_command',
+        section='zvm',
+        required=False,
+        default='',
+        opt_type='str',
+        help='''
+The command starting the SMAPI helper process.
+
+This only takes effect when smapi_transport is 'helper'. By default the helper
+runs as the current user with the same python interpreter and calls
+'sudo smcli' for each request. To save the sudo of each request, allow the
+helper in sudoers and run it as root, for example:
+'sudo /usr/bin/python3 -m smtLayer.smapiTransport --direct'
 '''
         ),
     # tests options
@@ -17,12 +17,11 @@
 
 
 import os
-import dist
-import tarfile
-import shutil
 import stat
 
 from zvmsdk import config
+from zvmsdk import dist
+from zvmsdk import utils
 
 
 CONF = config.CONF
@@ -69,11 +68,6 @@ def get_cfg_str(network_interface_info, os_version):
     return cfg_str
 
 
-def generate_net_file(network_interface_info, net_file_path, os_version):
-    cfg_str = get_cfg_str(network_interface_info, os_version)
-    generate_file(cfg_str, net_file_path)
-
-
 def get_znetconfig_str(os_version):
     linuxdist = dist.LinuxDistManager().get_linux_dist(os_version)()
     udev_settle = linuxdist.get_znetconfig_contents()
@@ -82,11 +76,6 @@ def get_znetconfig_str(os_version):
     return znetconfig
 
 
-def generate_znetconfig_file(znetconfig_path, os_version):
-    znetconfig = get_znetconfig_str(os_version)
-    generate_file(znetconfig, znetconfig_path)
-
-
 def get_meta_data_str():
     meta_data = '{\"files\":[{\"path\":' +\
         '\"/etc/sysconfig/network-scripts/ifcfg-enccw0.0.1000\", '
@@ -102,17 +91,6 @@ def get_meta_data_str():
     return meta_data
 
 
-def generate_meta_data(meta_data_path):
-    meta_data = get_meta_data_str()
-    generate_file(meta_data, meta_data_path)
-
-
-def generate_file(file_content, path):
-    f = open(path, 'w')
-    f.write(file_content)
-    f.close()
-
-
 def create_config_drive(network_interface_info, os_version):
     """Generate config driver for zVM guest vm.
 
@@ -127,30 +105,16 @@ def create_config_drive(network_interface_info, os_version):
     temp_path = CONF.guest.temp_path
     if not os.path.exists(temp_path):
         os.mkdir(temp_path)
-    cfg_dir = os.path.join(temp_path, 'openstack')
-    if os.path.exists(cfg_dir):
-        shutil.rmtree(cfg_dir)
-    content_dir = os.path.join(cfg_dir, 'content')
-    latest_dir = os.path.join(cfg_dir, 'latest')
-    os.mkdir(cfg_dir)
-    os.mkdir(content_dir)
-    os.mkdir(latest_dir)
-
-    net_file = os.path.join(content_dir, '0000')
-    generate_net_file(network_interface_info, net_file, os_version)
-    znetconfig_file = os.path.join(content_dir, '0001')
-    generate_znetconfig_file(znetconfig_file, os_version)
-    meta_data_path = os.path.join(latest_dir, 'meta_data.json')
-    generate_meta_data(meta_data_path)
-    network_data_path = os.path.join(latest_dir, 'network_data.json')
-    generate_file('{}', network_data_path)
-    vendor_data_path = os.path.join(latest_dir, 'vendor_data.json')
-    generate_file('{}', vendor_data_path)
-
+    # The config drive is built in memory, only the tar package is written
+    # to temp_path.
+    members = [('openstack', None),
+               ('openstack/content', None),
+               ('openstack/content/0000',
+                get_cfg_str(network_interface_info, os_version)),
+               ('openstack/content/0001', get_znetconfig_str(os_version)),
+               ('openstack/latest', None),
+               ('openstack/latest/meta_data.json', get_meta_data_str()),
+               ('openstack/latest/network_data.json', '{}'),
+               ('openstack/latest/vendor_data.json', '{}')]
     tar_path = os.path.join(temp_path, 'cfgdrive.tgz')
-    tar = tarfile.open(tar_path, "w:gz")
-    os.chdir(temp_path)
-    tar.add('openstack')
-    tar.close()
-
-    return tar_path
+    return utils.write_tar(tar_path, members, compression='gz')
@@ -135,6 +135,7 @@ DATABASE_NETWORK = 'sdk_network.sqlite'
 DATABASE_GUEST = 'sdk_guest.sqlite'
 DATABASE_IMAGE = 'sdk_image.sqlite'
 DATABASE_FCP = 'sdk_fcp.sqlite'
+DATABASE_JOB = 'sdk_job.sqlite'
 
 IMAGE_TYPE = {
     'DEPLOY': 'netboot',
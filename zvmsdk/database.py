@@ -38,117 +38,348 @@ LOG = log.LOG
 
 
 _DIR_MODE = 0o755
-_NETWORK_CONN = None
-_IMAGE_CONN = None
-_GUEST_CONN = None
-_FCP_CONN = None
-_DBLOCK_VOLUME = threading.RLock()
-_DBLOCK_NETWORK = threading.RLock()
-_DBLOCK_IMAGE = threading.RLock()
-_DBLOCK_GUEST = threading.RLock()
-_DBLOCK_FCP = threading.RLock()
 
 
-@contextlib.contextmanager
-def get_network_conn():
-    global _NETWORK_CONN
-    if not _NETWORK_CONN:
-        _NETWORK_CONN = _init_db_conn(const.DATABASE_NETWORK)
+class DBConnectionManager(object):
+    """Connections to one SQLite database file.
+
+    All the writes go through a single connection serialized by a lock.
+    When the database is in WAL journal mode each thread reads through a
+    connection of its own, so reads proceed in parallel and are not held
+    back by a slow write transaction. A thread holding the writer reads
+    through the writer to see its own uncommitted changes.
+    """
+
+    def __init__(self, db_file, row_factory=None):
+        self.db_file = db_file
+        self.row_factory = row_factory
+        self.lock = threading.RLock()
+        self.wal = False
+        self._path = None
+        self._writer = None
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path,
+                               check_same_thread=False,
+                               isolation_level=None)
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        return conn
+
+    def _open(self):
+        # Caller holds self.lock
+        if self._writer is not None:
+            return self._writer
+        self._path = _init_db_path(self.db_file)
+        conn = self._connect()
+        journal_mode = 'WAL' if CONF.database.wal_mode else 'DELETE'
+        mode = conn.execute("PRAGMA journal_mode=%s" % journal_mode)
+        self.wal = mode.fetchone()[0].lower() == 'wal'
+        self._writer = conn
+        return conn
+
+    @contextlib.contextmanager
+    def writer(self):
+        with self.lock:
+            conn = self._open()
+            self._local.depth = getattr(self._local, 'depth', 0) + 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+
+    @contextlib.contextmanager
+    def reader(self):
+        if self._writer is None:
+            with self.lock:
+                self._open()
+        if not self.wal or getattr(self._local, 'depth', 0):
+            with self.writer() as conn:
+                yield conn
+            return
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        yield conn
+
+    def connection(self, readonly=False):
+        return self.reader() if readonly else self.writer()
 
-    _DBLOCK_NETWORK.acquire()
+
+_NETWORK_DB = DBConnectionManager(const.DATABASE_NETWORK)
+_IMAGE_DB = DBConnectionManager(const.DATABASE_IMAGE)
+_GUEST_DB = DBConnectionManager(const.DATABASE_GUEST)
+# enable access columns by name
+_FCP_DB = DBConnectionManager(const.DATABASE_FCP, row_factory=sqlite3.Row)
+_JOB_DB = DBConnectionManager(const.DATABASE_JOB, row_factory=sqlite3.Row)
+
+
+@contextlib.contextmanager
+def get_network_conn(readonly=False):
     try:
-        yield _NETWORK_CONN
+        with _NETWORK_DB.connection(readonly) as conn:
+            yield conn
     except Exception as err:
         msg = "Execute SQL statements error: %s" % six.text_type(err)
         LOG.error(msg)
         raise exception.SDKNetworkOperationError(rs=1, msg=msg)
-    finally:
-        _DBLOCK_NETWORK.release()
 
 
 @contextlib.contextmanager
-def get_image_conn():
-    global _IMAGE_CONN
-    if not _IMAGE_CONN:
-        _IMAGE_CONN = _init_db_conn(const.DATABASE_IMAGE)
-
-    _DBLOCK_IMAGE.acquire()
+def get_image_conn(readonly=False):
     try:
-        yield _IMAGE_CONN
+        with _IMAGE_DB.connection(readonly) as conn:
+            yield conn
     except Exception as err:
         LOG.error("Execute SQL statements error: %s", six.text_type(err))
         raise exception.SDKDatabaseException(msg=err)
-    finally:
-        _DBLOCK_IMAGE.release()
 
 
 @contextlib.contextmanager
-def get_guest_conn():
-    global _GUEST_CONN
-    if not _GUEST_CONN:
-        _GUEST_CONN = _init_db_conn(const.DATABASE_GUEST)
-
-    _DBLOCK_GUEST.acquire()
+def get_guest_conn(readonly=False):
     try:
-        yield _GUEST_CONN
+        with _GUEST_DB.connection(readonly) as conn:
+            yield conn
     except Exception as err:
         msg = "Execute SQL statements error: %s" % six.text_type(err)
         LOG.error(msg)
         raise exception.SDKGuestOperationError(rs=1, msg=msg)
-    finally:
-        _DBLOCK_GUEST.release()
 
 
 @contextlib.contextmanager
-def get_fcp_conn():
-    global _FCP_CONN
-    if not _FCP_CONN:
-        _FCP_CONN = _init_db_conn(const.DATABASE_FCP)
-        # enable access columns by name
-        _FCP_CONN.row_factory = sqlite3.Row
-    _DBLOCK_FCP.acquire()
+def get_job_conn(readonly=False):
     try:
-        # sqlite DB not allow to start a transaction within a transaction,
-        # so, only begin a transaction when no other alive transaction
-        if not _FCP_CONN.in_transaction:
-            _FCP_CONN.execute("BEGIN")
-            skip_commit = False
-        else:
-            skip_commit = True
-        yield _FCP_CONN
-    except exception.SDKBaseException as err:
-        # rollback only if _FCP_CONN.execute("BEGIN")
-        # is invoked when entering the contextmanager
-        if not skip_commit:
-            _FCP_CONN.execute("ROLLBACK")
-        msg = "Got SDK exception in FCP DB operation: %s" % six.text_type(err)
-        LOG.error(msg)
-        raise
+        with _JOB_DB.connection(readonly) as conn:
+            yield conn
     except Exception as err:
-        # rollback only if _FCP_CONN.execute("BEGIN")
-        # is invoked when entering the contextmanager
-        if not skip_commit:
-            _FCP_CONN.execute("ROLLBACK")
-        msg = "Execute SQL statements error: %s" % six.text_type(err)
-        LOG.error(msg)
-        raise exception.SDKGuestOperationError(rs=1, msg=msg)
-    else:
-        # commit only if _FCP_CONN.execute("BEGIN")
-        # is invoked when entering the contextmanager
-        if not skip_commit:
-            _FCP_CONN.execute("COMMIT")
-    finally:
-        _DBLOCK_FCP.release()
+        LOG.error("Execute SQL statements error: %s", six.text_type(err))
+        raise exception.SDKDatabaseException(msg=err)
 
 
-def _init_db_conn(db_file):
+@contextlib.contextmanager
+def get_fcp_conn(readonly=False):
+    with _FCP_DB.connection(readonly) as conn:
+        try:
+            # sqlite DB not allow to start a transaction within a
+            # transaction, so, only begin a transaction when no other
+            # alive transaction
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+                skip_commit = False
+            else:
+                skip_commit = True
+            yield conn
+        except exception.SDKBaseException as err:
+            # rollback only if conn.execute("BEGIN")
+            # is invoked when entering the contextmanager
+            if not skip_commit:
+                conn.execute("ROLLBACK")
+                _FREE_FCP_INDEX.clear()
+            msg = ("Got SDK exception in FCP DB operation: %s" %
+                   six.text_type(err))
+            LOG.error(msg)
+            raise
+        except Exception as err:
+            # rollback only if conn.execute("BEGIN")
+            # is invoked when entering the contextmanager
+            if not skip_commit:
+                conn.execute("ROLLBACK")
+                _FREE_FCP_INDEX.clear()
+            msg = "Execute SQL statements error: %s" % six.text_type(err)
+            LOG.error(msg)
+            raise exception.SDKGuestOperationError(rs=1, msg=msg)
+        else:
+            # commit only if conn.execute("BEGIN")
+            # is invoked when entering the contextmanager
+            if not skip_commit:
+                conn.execute("COMMIT")
+
+
+def _init_db_path(db_file):
     db_dir = CONF.database.dir
     if not os.path.exists(db_dir):
         os.makedirs(db_dir, _DIR_MODE)
-    database = os.path.join(db_dir, db_file)
-    return sqlite3.connect(database,
-                           check_same_thread=False,
-                           isolation_level=None)
+    return os.path.join(db_dir, db_file)
+
+
+class _FreeSet(object):
+    """A set of FCP device IDs supporting a constant time random pick."""
+
+    def __init__(self):
+        self._items = []
+        self._pos = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def add(self, item):
+        if item not in self._pos:
+            self._pos[item] = len(self._items)
+            self._items.append(item)
+
+    def discard(self, item):
+        pos = self._pos.pop(item, None)
+        if pos is None:
+            return
+        # move the last item into the hole
+        last = self._items.pop()
+        if pos < len(self._items):
+            self._items[pos] = last
+            self._pos[last] = pos
+
+    def choice(self):
+        return random.choice(self._items)
+
+
+class FreeFCPIndex(object):
+    """In-memory index of the free FCP devices of FCP Multipath Templates.
+
+    The free FCP devices (connections=0, reserved=0, state is free and
+    both WWPNs are set) of a template are indexed per path and PCHID, so
+    that allocating FCP devices picks from the index instead of joining
+    template_fcp_mapping and fcp. A template is loaded from the DB on its
+    first use. The DMLs of FCPDbOperator on the fcp table refresh the FCP
+    devices they changed through track(). Any other write to the FCP DB,
+    such as editing a template, is detected by the change counter of the
+    writer connection and drops the index, so does a rollback; the
+    templates are then loaded again on next use.
+
+    The caller holds the FCP DB writer, which serializes the index.
+    """
+
+    # max number of SQL variables per query
+    _CHUNK = 500
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # template id -> {path: {pchid: _FreeSet of FCP device IDs}}
+        self._templates = {}
+        # FCP device ID -> {template id: path}, of the loaded templates
+        self._members = {}
+        # FCP device ID -> (pchid, wwpn_npiv, wwpn_phy), of the free ones
+        self._free = {}
+        # total_changes of the writer connection the index is in sync with
+        self._changes = None
+
+    @staticmethod
+    def _is_free(row):
+        return (row['connections'] == 0 and row['reserved'] == 0 and
+                row['state'].lower() == 'free' and
+                row['wwpn_npiv'] != '' and row['wwpn_phy'] != '')
+
+    def _check(self, conn):
+        if self._changes != conn.total_changes:
+            self.clear()
+            self._changes = conn.total_changes
+
+    def _add_free(self, fcp_id, row):
+        pchid = row['pchid'].upper()
+        self._free[fcp_id] = (pchid, row['wwpn_npiv'], row['wwpn_phy'])
+        for tmpl_id, path in self._members[fcp_id].items():
+            pchids = self._templates[tmpl_id][path]
+            pchids.setdefault(pchid, _FreeSet()).add(fcp_id)
+
+    def _discard_free(self, fcp_id):
+        info = self._free.pop(fcp_id, None)
+        if info is None:
+            return
+        for tmpl_id, path in self._members[fcp_id].items():
+            pchids = self._templates[tmpl_id][path]
+            free = pchids.get(info[0])
+            if free is not None:
+                free.discard(fcp_id)
+                if not free:
+                    del pchids[info[0]]
+
+    def _load(self, conn, tmpl_id):
+        tmpl_id = tmpl_id.lower()
+        paths = self._templates.get(tmpl_id)
+        if paths is not None:
+            return paths
+        paths = self._templates[tmpl_id] = {}
+        # LEFT JOIN, the FCP devices of the template may be not in fcp
+        result = conn.execute(
+            "SELECT tf.fcp_id, tf.path, fcp.connections, fcp.reserved, "
+            "fcp.state, fcp.pchid, fcp.wwpn_npiv, fcp.wwpn_phy "
+            "FROM template_fcp_mapping AS tf "
+            "LEFT JOIN fcp "
+            "ON tf.fcp_id=fcp.fcp_id "
+            "WHERE tf.tmpl_id=?", (tmpl_id,))
+        for row in result.fetchall():
+            fcp_id = row['fcp_id'].lower()
+            self._members.setdefault(fcp_id, {})[tmpl_id] = row['path']
+            paths.setdefault(row['path'], {})
+            if row['connections'] is not None and self._is_free(row):
+                self._add_free(fcp_id, row)
+        return paths
+
+    def _refresh(self, conn, fcp_ids):
+        fcp_ids = list(set(f.lower() for f in fcp_ids) & set(self._members))
+        rows = {}
+        for i in range(0, len(fcp_ids), self._CHUNK):
+            chunk = fcp_ids[i:i + self._CHUNK]
+            result = conn.execute(
+                "SELECT fcp_id, connections, reserved, state, pchid, "
+                "wwpn_npiv, wwpn_phy FROM fcp "
+                "WHERE fcp_id IN (%s)" % ','.join('?' * len(chunk)), chunk)
+            for row in result.fetchall():
+                rows[row['fcp_id'].lower()] = row
+        for fcp_id in fcp_ids:
+            self._discard_free(fcp_id)
+            row = rows.get(fcp_id)
+            if row is not None and self._is_free(row):
+                self._add_free(fcp_id, row)
+
+    @contextlib.contextmanager
+    def track(self, conn, fcp_ids):
+        """Refresh the FCP devices changed by the SQL run in the block.
+
+        :param conn: the FCP DB writer connection
+        :param fcp_ids: (list) the IDs of the FCP devices changed
+        """
+        in_sync = self._changes == conn.total_changes
+        yield
+        if in_sync:
+            self._refresh(conn, fcp_ids)
+            self._changes = conn.total_changes
+
+    def free_pchids(self, conn, tmpl_id):
+        """Same as FCPDbOperator.get_free_pchids_by_fcp_template."""
+        self._check(conn)
+        paths = self._load(conn, tmpl_id)
+        return {path: sorted(paths[path])
+                for path in sorted(paths) if paths[path]}
+
+    def pick(self, conn, tmpl_id, path, pchid):
+        """Randomly pick a free FCP device of the path and PCHID.
+
+        :return: (dict) the FCP device, None if no free one
+            for example:
+            {'fcp_id': '1B02', 'path': 1, 'pchid': 'BBBB',
+             'wwpn_npiv': 'aa', 'wwpn_phy': 'xx'}
+        """
+        self._check(conn)
+        paths = self._load(conn, tmpl_id)
+        free = paths.get(path, {}).get(pchid.upper())
+        if not free:
+            return None
+        fcp_id = free.choice()
+        pchid, wwpn_npiv, wwpn_phy = self._free[fcp_id]
+        return {'fcp_id': fcp_id.upper(),
+                'wwpn_npiv': wwpn_npiv,
+                'wwpn_phy': wwpn_phy,
+                'path': path,
+                'pchid': pchid}
+
+
+_FREE_FCP_INDEX = FreeFCPIndex()
 
 
 class NetworkDbOperator(object):
@@ -170,7 +401,7 @@ class NetworkDbOperator(object):
             conn.execute(create_table_sql)
 
     def _get_switch_by_user_interface(self, userid, interface):
-        with get_network_conn() as conn:
+        with get_network_conn(readonly=True) as conn:
             res = conn.execute("SELECT * FROM switch "
                                "WHERE userid=? and interface=?",
                                (userid, interface))
@@ -258,13 +489,13 @@ class NetworkDbOperator(object):
         return switch_result
 
     def switch_select_table(self):
-        with get_network_conn() as conn:
+        with get_network_conn(readonly=True) as conn:
             result = conn.execute("SELECT * FROM switch")
             nic_settings = result.fetchall()
         return self._parse_switch_record(nic_settings)
 
     def switch_select_record_for_userid(self, userid):
-        with get_network_conn() as conn:
+        with get_network_conn(readonly=True) as conn:
             result = conn.execute("SELECT * FROM switch "
                                   "WHERE userid=?", (userid,))
             switch_info = result.fetchall()
@@ -291,7 +522,7 @@ class NetworkDbOperator(object):
         # remove the tailing ' and'
         sql_cmd = sql_cmd.strip(' and')
 
-        with get_network_conn() as conn:
+        with get_network_conn(readonly=True) as conn:
             result = conn.execute(sql_cmd, sql_var)
             switch_list = result.fetchall()
 
@@ -390,12 +621,28 @@ class FCPDbOperator(object):
             'path           integer     NOT NULL,'
             'PRIMARY KEY (fcp_id, tmpl_id))')
 
+        # secondary indexes:
+        #   the primary keys only serve the lookups by FCP device ID,
+        #   the FCP devices are also looked up by template (and path),
+        #   by assigner and by PCHID.
+        fcp_info_indexes = [
+            'CREATE INDEX IF NOT EXISTS tf_tmpl_path '
+            'ON template_fcp_mapping (tmpl_id, path)',
+            'CREATE INDEX IF NOT EXISTS ts_tmpl '
+            'ON template_sp_mapping (tmpl_id)',
+            'CREATE INDEX IF NOT EXISTS fcp_assigner '
+            'ON fcp (assigner_id)',
+            'CREATE INDEX IF NOT EXISTS fcp_pchid '
+            'ON fcp (pchid)']
+
         # create all the tables
         LOG.info("Initializing FCP database.")
         with get_fcp_conn() as conn:
             for table_name in fcp_info_tables:
                 create_table_sql = fcp_info_tables[table_name]
                 conn.execute(create_table_sql)
+            for create_index_sql in fcp_info_indexes:
+                conn.execute(create_index_sql)
         LOG.info("FCP database initialized.")
 
     #########################################################
@@ -408,8 +655,9 @@ class FCPDbOperator(object):
         for fcp_id in fcp_ids:
             fcp_update_info.append((fcp_id,))
         with get_fcp_conn() as conn:
-            conn.executemany("UPDATE fcp SET reserved=0, tmpl_id='' "
-                             "WHERE fcp_id=?", fcp_update_info)
+            with _FREE_FCP_INDEX.track(conn, fcp_ids):
+                conn.executemany("UPDATE fcp SET reserved=0, tmpl_id='' "
+                                 "WHERE fcp_id=?", fcp_update_info)
 
     def reserve_fcps(self, fcp_ids, assigner_id, fcp_template_id):
         fcp_update_info = []
@@ -417,9 +665,10 @@ class FCPDbOperator(object):
             fcp_update_info.append(
                 (assigner_id, fcp_template_id, fcp_id))
         with get_fcp_conn() as conn:
-            conn.executemany("UPDATE fcp "
-                             "SET reserved=1, assigner_id=?, tmpl_id=? "
-                             "WHERE fcp_id=?", fcp_update_info)
+            with _FREE_FCP_INDEX.track(conn, fcp_ids):
+                conn.executemany("UPDATE fcp "
+                                 "SET reserved=1, assigner_id=?, tmpl_id=? "
+                                 "WHERE fcp_id=?", fcp_update_info)
 
     def bulk_insert_zvm_fcp_info_into_fcp_table(self, fcp_info_list: list):
         """Insert multiple records into fcp table witch fcp info queried
@@ -435,19 +684,22 @@ class FCPDbOperator(object):
           'user2')]
         """
         with get_fcp_conn() as conn:
-            conn.executemany("INSERT INTO fcp (fcp_id, wwpn_npiv, wwpn_phy, "
-                             "chpid, pchid, state, owner) "
-                             "VALUES (?, ?, ?, ?, ?, ?, ?)", fcp_info_list)
+            with _FREE_FCP_INDEX.track(conn, [f[0] for f in fcp_info_list]):
+                conn.executemany("INSERT INTO fcp (fcp_id, wwpn_npiv, "
+                                 "wwpn_phy, chpid, pchid, state, owner) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 fcp_info_list)
 
     def bulk_delete_from_fcp_table(self, fcp_id_list: list):
         """Delete multiple FCP records from fcp table
         The fcp_id_list is list of FCP IDs, for example:
         ['1a00', '1b01', '1c02']
         """
-        fcp_id_list = [(fcp_id,) for fcp_id in fcp_id_list]
+        fcp_records = [(fcp_id,) for fcp_id in fcp_id_list]
         with get_fcp_conn() as conn:
-            conn.executemany("DELETE FROM fcp "
-                             "WHERE fcp_id=?", fcp_id_list)
+            with _FREE_FCP_INDEX.track(conn, fcp_id_list):
+                conn.executemany("DELETE FROM fcp "
+                                 "WHERE fcp_id=?", fcp_records)
 
     def bulk_update_zvm_fcp_info_in_fcp_table(self, fcp_info_list: list):
         """Update multiple records with FCP info queried from z/VM.
@@ -474,9 +726,10 @@ class FCPDbOperator(object):
             new_record = list(fcp[1:]) + [fcp[0]]
             data_to_update.append(new_record)
         with get_fcp_conn() as conn:
-            conn.executemany("UPDATE fcp SET wwpn_npiv=?, wwpn_phy=?, "
-                             "chpid=?, pchid=?, state=?, owner=? WHERE "
-                             "fcp_id=?", data_to_update)
+            with _FREE_FCP_INDEX.track(conn, [f[0] for f in fcp_info_list]):
+                conn.executemany("UPDATE fcp SET wwpn_npiv=?, wwpn_phy=?, "
+                                 "chpid=?, pchid=?, state=?, owner=? WHERE "
+                                 "fcp_id=?", data_to_update)
 
     def bulk_update_state_in_fcp_table(self, fcp_id_list: list,
                                        new_state: str):
@@ -487,15 +740,20 @@ class FCPDbOperator(object):
             new_record = [new_state, id]
             data_to_update.append(new_record)
         with get_fcp_conn() as conn:
-            conn.executemany("UPDATE fcp set state=? "
-                             "WHERE fcp_id=?", data_to_update)
+            with _FREE_FCP_INDEX.track(conn, fcp_id_list):
+                conn.executemany("UPDATE fcp set state=? "
+                                 "WHERE fcp_id=?", data_to_update)
 
     def reset_fcps_of_assigner(self, userid):
         """Reset fcp records for a given assigner."""
         with get_fcp_conn() as conn:
-            conn.execute("UPDATE fcp SET assigner_id='', reserved=0, "
-                         "connections=0, tmpl_id='' WHERE assigner_id=?",
-                         (userid,))
+            result = conn.execute("SELECT fcp_id FROM fcp "
+                                  "WHERE assigner_id=?", (userid,))
+            fcp_ids = [row['fcp_id'] for row in result.fetchall()]
+            with _FREE_FCP_INDEX.track(conn, fcp_ids):
+                conn.execute("UPDATE fcp SET assigner_id='', reserved=0, "
+                             "connections=0, tmpl_id='' WHERE assigner_id=?",
+                             (userid,))
             LOG.debug("FCP records for user %s are reset in "
                       "fcp table" % userid)
 
@@ -535,6 +793,39 @@ class FCPDbOperator(object):
                                                        modID=self._module_id)
         return fcp_info
 
+    def get_fcps_by_ids(self, fcp_ids):
+        """Get the fcp records of the FCP devices in fcp_ids.
+        Format of return is the same as get_all_fcps_of_assigner,
+        the FCP devices not in fcp table are ignored.
+        """
+        fcp_ids = list(fcp_ids)
+        fcp_info = []
+        with get_fcp_conn() as conn:
+            for i in range(0, len(fcp_ids), FreeFCPIndex._CHUNK):
+                chunk = fcp_ids[i:i + FreeFCPIndex._CHUNK]
+                result = conn.execute("SELECT fcp_id, assigner_id, "
+                                      "connections, reserved, wwpn_npiv, "
+                                      "wwpn_phy, chpid, pchid, state, owner, "
+                                      "tmpl_id FROM fcp WHERE fcp_id IN "
+                                      "(%s)" % ','.join('?' * len(chunk)),
+                                      chunk)
+                fcp_info.extend(result.fetchall())
+        return fcp_info
+
+    def get_zvm_info_of_all_fcps(self):
+        """Get the columns synced from z/VM of all fcp records.
+        Format of return is like:
+        [
+          (fcp_id, wwpn_npiv, wwpn_phy, chpid, pchid, state, owner),
+          ('1a06', 'c05076de33000355', 'c05076de33002641', '27', '02e4',
+           'active', 'user1')
+        ]
+        """
+        with get_fcp_conn(readonly=True) as conn:
+            result = conn.execute("SELECT fcp_id, wwpn_npiv, wwpn_phy, "
+                                  "chpid, pchid, state, owner FROM fcp")
+            return result.fetchall()
+
     def get_usage_of_fcp(self, fcp_id):
         connections = 0
         reserved = 0
@@ -560,10 +851,11 @@ class FCPDbOperator(object):
     def update_usage_of_fcp(self, fcp, assigner_id, reserved, connections,
                             fcp_template_id):
         with get_fcp_conn() as conn:
-            conn.execute("UPDATE fcp SET assigner_id=?, reserved=?, "
-                         "connections=?, tmpl_id=? WHERE fcp_id=?",
-                         (assigner_id, reserved, connections,
-                          fcp_template_id, fcp))
+            with _FREE_FCP_INDEX.track(conn, [fcp]):
+                conn.execute("UPDATE fcp SET assigner_id=?, reserved=?, "
+                             "connections=?, tmpl_id=? WHERE fcp_id=?",
+                             (assigner_id, reserved, connections,
+                              fcp_template_id, fcp))
 
     def increase_connections_by_assigner(self, fcp, assigner_id):
         """Increase connections of the given FCP device
@@ -585,8 +877,10 @@ class FCPDbOperator(object):
                                                        modID=self._module_id)
             connections = fcp_info['connections'] + 1
 
-            conn.execute("UPDATE fcp SET connections=? WHERE fcp_id=? "
-                         "AND assigner_id=?", (connections, fcp, assigner_id))
+            with _FREE_FCP_INDEX.track(conn, [fcp]):
+                conn.execute("UPDATE fcp SET connections=? WHERE fcp_id=? "
+                             "AND assigner_id=?",
+                             (connections, fcp, assigner_id))
             # check the result
             result = conn.execute("SELECT connections FROM fcp "
                                   "WHERE fcp_id=?", (fcp,))
@@ -624,9 +918,10 @@ class FCPDbOperator(object):
                 LOG.warning("Warning: connections of fcp is negative",
                             fcp)
             # decrease connections by 1
-            conn.execute("UPDATE fcp SET connections=? "
-                         "WHERE fcp_id=?",
-                         (connections, fcp))
+            with _FREE_FCP_INDEX.track(conn, [fcp]):
+                conn.execute("UPDATE fcp SET connections=? "
+                             "WHERE fcp_id=?",
+                             (connections, fcp))
             # check the result
             result = conn.execute("SELECT connections FROM fcp "
                                   "WHERE fcp_id=?", (fcp, ))
@@ -650,7 +945,7 @@ class FCPDbOperator(object):
         return connections
 
     def get_all(self):
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
 
             result = conn.execute("SELECT fcp_id, "
                                   "assigner_id, "
@@ -671,7 +966,7 @@ class FCPDbOperator(object):
     @staticmethod
     def get_inuse_fcp_device_by_fcp_template(fcp_template_id):
         """ Get the FCP devices allocated from the template """
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             query_sql = conn.execute("SELECT fcp_id FROM fcp "
                                      "WHERE tmpl_id=?",
                                      (fcp_template_id,))
@@ -703,7 +998,7 @@ class FCPDbOperator(object):
                          record)
 
     def get_path_count(self, fcp_template_id):
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             # Get distinct path list in DB
             result = conn.execute(
                 "SELECT DISTINCT path FROM template_fcp_mapping "
@@ -753,7 +1048,7 @@ class FCPDbOperator(object):
     #               DML for Table template                  #
     #########################################################
     def fcp_template_exist_in_db(self, fcp_template_id: str):
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             query_sql = conn.execute("SELECT id FROM template "
                                      "WHERE id=?", (fcp_template_id,))
             query_ids = query_sql.fetchall()
@@ -763,7 +1058,7 @@ class FCPDbOperator(object):
             return False
 
     def get_min_fcp_paths_count_from_db(self, fcp_template_id):
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             query_sql = conn.execute("SELECT min_fcp_paths_count FROM template "
                                      "WHERE id=?", (fcp_template_id,))
             min_fcp_paths_count = query_sql.fetchone()
@@ -800,7 +1095,7 @@ class FCPDbOperator(object):
     #          DML for Table template_sp_mapping            #
     #########################################################
     def sp_name_exist_in_db(self, sp_name: str):
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             query_sp = conn.execute("SELECT sp_name FROM template_sp_mapping "
                                     "WHERE sp_name=?", (sp_name,))
             query_sp_names = query_sp.fetchall()
@@ -865,7 +1160,7 @@ class FCPDbOperator(object):
            {'fcp_id':'1C04', 'path':4, 'pchid':'B', 'wwpn_npiv':'bb', 'wwpn_phy':'yy'},
            {'fcp_id':'1E05', 'path':5, 'pchid':'E', 'wwpn_npiv':'cc', 'wwpn_phy':'zz'}]
         """
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                 "SELECT "
                 "fcp.fcp_id, fcp.wwpn_npiv, fcp.wwpn_phy, tf.path, fcp.pchid "
@@ -894,7 +1189,7 @@ class FCPDbOperator(object):
            {'fcp_id':'1C04', 'path':4, 'pchid':'C', 'wwpn_npiv':'bb', 'wwpn_phy':'yy', 'connections':0},
            {'fcp_id':'1E05', 'path':5, 'pchid':'E', 'wwpn_npiv':'cc', 'wwpn_phy':'zz', 'connections':0}]
         """
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                 "SELECT fcp.fcp_id, fcp.wwpn_npiv, "
                 "fcp.wwpn_phy, fcp.connections, tf.path, fcp.pchid "
@@ -953,7 +1248,7 @@ class FCPDbOperator(object):
         fcp_list = []
         empty_fcp_list_reason = ''
         fcp_pair_map = {}
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             # count_per_path examples:
             # in normal cases, all path has same count, eg.
             #   4 paths: [7, 7, 7, 7]
@@ -1105,7 +1400,8 @@ class FCPDbOperator(object):
             #  ('1a03', '.......', '......', 0,   'eeee'),
             #  ('1b03', '.......', '......', 1,   'cccc'),
             #  ('1c03', '.......', '......', 2,   'cccc')]
-            for comb in fcp_combinations.copy():
+            valid_combinations = []
+            for comb in fcp_combinations:
                 # pchids ex:
                 # ['EEEE', 'CCCC', 'CCCC']
                 pchids = [item[-1].upper() for item in comb]
@@ -1134,9 +1430,12 @@ class FCPDbOperator(object):
                 # take PCHIDs 'EEEE' and 'CCCC' as example:
                 # min(3/1, 1/2) -> min(3, 0.5) -> 0.5
                 weight = min(weights.values())
-                # remove invalid comb
-                if weight < 1:
-                    fcp_combinations.remove(comb)
+                # keep valid comb only
+                if weight >= 1:
+                    valid_combinations.append(comb)
+            # filter in place rather than list.remove each invalid comb,
+            # which costs O(n) per removal
+            fcp_combinations[:] = valid_combinations
         # pchids_without_enough_free_cap ex:
         # {'CCCC': 1, 'EEEE': 0}
         pchids_without_enough_free_cap = dict()
@@ -1224,10 +1523,19 @@ class FCPDbOperator(object):
                                   pchid_info[pchid]['allocated'])
                 free_count_in_pchid_info[pchid.upper()] = free_fcp_count
             LOG.info('free_count_in_pchid_info: {}'.format(free_count_in_pchid_info))
+            # weight_per_pchids:
+            # the weight only depends on the PCHIDs of the comb rather than
+            # on their paths, so it is calculated once per sorted PCHIDs. Ex:
+            # {('CCCC', 'CCCC', 'EEEE'): 8.5}
+            weight_per_pchids = dict()
             # comb:
             # path as key, PCHID as value. Ex:
             # {3: 'CCCC', 4: 'CCCC', 5: 'EEEE'}
             for comb in pchids_per_path_combinations:
+                pchids = tuple(sorted(comb.values()))
+                if pchids in weight_per_pchids:
+                    comb['weight'] = weight_per_pchids[pchids]
+                    continue
                 # comb_fcp_count_per_pchid:
                 # PCHID as key, occurance-count-in-comb as value. Ex:
                 # {'EEEE': 1, 'CCCC': 2}
@@ -1236,8 +1544,8 @@ class FCPDbOperator(object):
                 # it indicates 1 FCP device from 'EEEE' and 2 from 'CCCC'
                 # will be consumed to satisfy one time of FCP device allocation.
                 comb_fcp_count_per_pchid = {
-                    pchid: (list(comb.values()).count(pchid))
-                    for pchid in set(comb.values())}
+                    pchid: pchids.count(pchid)
+                    for pchid in set(pchids)}
                 # weights ex:
                 # {'EEEE': 20/1, 'CCCC': 17/2}
                 weights = {p: free_count_in_pchid_info[p] / comb_fcp_count_per_pchid[p]
@@ -1256,20 +1564,21 @@ class FCPDbOperator(object):
                 # comb ex:
                 # {3: 'CCCC', 4: 'CCCC', 5: 'EEEE', 'weight': 8.5}
                 comb['weight'] = weight
+                weight_per_pchids[pchids] = weight
             # log
-            LOG.info(
+            LOG.debug(
                 'after _calculate_weight, pchids_per_path_combinations: '
-                '{}'.format(pchids_per_path_combinations))
+                '%s', pchids_per_path_combinations)
 
         def _remove_invalid_weight(pchids_per_path_combinations):
             """remove the combinations whose weight is less than 1"""
-            for comb in pchids_per_path_combinations.copy():
-                if comb['weight'] < 1:
-                    pchids_per_path_combinations.remove(comb)
+            pchids_per_path_combinations[:] = [
+                comb for comb in pchids_per_path_combinations
+                if comb['weight'] >= 1]
             # log
-            LOG.info(
+            LOG.debug(
                 'after _remove_invalid_weight, pchids_per_path_combinations: '
-                '{}'.format(pchids_per_path_combinations))
+                '%s', pchids_per_path_combinations)
 
         def _select_max_weight(pchids_per_path_combinations):
             """ keep only the combinations with max weight """
@@ -1277,13 +1586,13 @@ class FCPDbOperator(object):
             max_weight = max(
                 p['weight'] for p in pchids_per_path_combinations)
             # keep only the combinations with max weight
-            for comb in pchids_per_path_combinations.copy():
-                if comb['weight'] != max_weight:
-                    pchids_per_path_combinations.remove(comb)
+            pchids_per_path_combinations[:] = [
+                comb for comb in pchids_per_path_combinations
+                if comb['weight'] == max_weight]
             # log
-            LOG.info(
+            LOG.debug(
                 'after _select_max_weight, pchids_per_path_combinations: '
-                '{}'.format(pchids_per_path_combinations))
+                '%s', pchids_per_path_combinations)
 
         def _select_most_distributed_pchids(pchids_per_path_combinations):
             """ keep only the combinations with most distributed PCHIDs """
@@ -1295,13 +1604,13 @@ class FCPDbOperator(object):
             max_pchid_count = max(
                 len(set(p.values())) for p in pchids_per_path_combinations)
             # keep only the combinations with most distributed PCHIDs
-            for comb in pchids_per_path_combinations.copy():
-                if len(set(comb.values())) != max_pchid_count:
-                    pchids_per_path_combinations.remove(comb)
+            pchids_per_path_combinations[:] = [
+                comb for comb in pchids_per_path_combinations
+                if len(set(comb.values())) == max_pchid_count]
             # log
-            LOG.info(
+            LOG.debug(
                 'after _select_most_distributed_pchids, pchids_per_path_combinations: '
-                '{}'.format(pchids_per_path_combinations))
+                '%s', pchids_per_path_combinations)
 
         def _get_one_random_fcp_combinations(fcp_template_id, final_pchid_per_path):
             """ randomly choose one FCP device per path
@@ -1311,6 +1620,15 @@ class FCPDbOperator(object):
             @return: None
             """
             LOG.info('final_pchid_per_path: {}'.format(final_pchid_per_path))
+            if CONF.volume.free_fcp_index:
+                with get_fcp_conn() as conn:
+                    fcp_comb = [_FREE_FCP_INDEX.pick(conn, fcp_template_id,
+                                                     path, pchid)
+                                for path, pchid in final_pchid_per_path.items()]
+                LOG.info(
+                    'after _get_one_random_fcp_combinations, '
+                    'fcp_list: {}'.format(fcp_comb))
+                return fcp_comb
             # pchid_path_filter ex:
             # "(tf.path=1 AND fcp.pchid='BBBB') OR
             #  (tf.path=4 AND fcp.pchid='CCCC') OR
@@ -1334,7 +1652,7 @@ class FCPDbOperator(object):
                 "ORDER BY tf.path, fcp.pchid, fcp.fcp_id").format(
                 fcp_template_id, pchid_path_filter)
 
-            with get_fcp_conn() as conn:
+            with get_fcp_conn(readonly=True) as conn:
                 query_sql = conn.execute(sql)
                 fcps = query_sql.fetchall()
             # tmp_dict:
@@ -1956,7 +2274,7 @@ class FCPDbOperator(object):
             for example: ['0240', '0260']
         """
         pchids = []
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                 "SELECT DISTINCT fcp.pchid "
                 "FROM template_fcp_mapping"
@@ -1979,7 +2297,7 @@ class FCPDbOperator(object):
             }
         """
         pchids = dict()
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                 "SELECT pchid, fcp_id "
                 "FROM fcp "
@@ -2026,7 +2344,7 @@ class FCPDbOperator(object):
                "LEFT OUTER JOIN template_sp_mapping "
                "ON template.id=template_sp_mapping.tmpl_id")
 
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             if template_id_list:
                 result = conn.execute(
                     cmd + " WHERE template.id "
@@ -2048,7 +2366,7 @@ class FCPDbOperator(object):
         for example: ['02E0', '02C0']
         """
         pchids = []
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                     "SELECT DISTINCT fcp.pchid "
                     "FROM template_fcp_mapping AS tf "
@@ -2071,8 +2389,11 @@ class FCPDbOperator(object):
             {'1': ['01E0', '02A0'],
              '3': ['02A0', '03FC']}
         """
+        if CONF.volume.free_fcp_index:
+            with get_fcp_conn() as conn:
+                return _FREE_FCP_INDEX.free_pchids(conn, fcp_template_id)
         pchids = dict()
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                 "SELECT DISTINCT path, pchid "
                 "FROM template_fcp_mapping AS tf "
@@ -2106,7 +2427,7 @@ class FCPDbOperator(object):
         when the  template is more than one SP's default,
         then it will show up several times in the result.
         """
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             if host_default:
                 result = conn.execute(
                     "SELECT t.id, t.name, t.description, t.is_default, "
@@ -2135,7 +2456,7 @@ class FCPDbOperator(object):
                "INNER JOIN template AS t "
                "ON ts.tmpl_id=t.id")
         raw = []
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             if (len(sp_host_list) == 1 and
                     sp_host_list[0].lower() == 'all'):
                 result = conn.execute(cmd)
@@ -2150,7 +2471,7 @@ class FCPDbOperator(object):
     def get_fcp_template_by_assigner_id(self, assigner_id):
         """Get a templates list of specified assigner.
         """
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                 "SELECT t.id, t.name, t.description, t.is_default, "
                 "t.min_fcp_paths_count, ts.sp_name "
@@ -2215,7 +2536,7 @@ class FCPDbOperator(object):
             "LEFT OUTER JOIN fcp "
             "ON tf.fcp_id=fcp.fcp_id")
 
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             if template_id_list:
                 tmpl_result = conn.execute(
                     tmpl_cmd + " WHERE t.id IN (%s)" %
@@ -2293,7 +2614,7 @@ class FCPDbOperator(object):
             }
         """
         pchid_to_phy_wwpn_dict = {}
-        with get_fcp_conn() as conn:
+        with get_fcp_conn(readonly=True) as conn:
             result = conn.execute(
                     "SELECT DISTINCT pchid, wwpn_phy "
                     "FROM fcp "
@@ -2351,7 +2672,7 @@ class ImageDbOperator(object):
         image record will be returned."""
 
         if imagename:
-            with get_image_conn() as conn:
+            with get_image_conn(readonly=True) as conn:
                 result = conn.execute("SELECT * FROM image WHERE "
                                       "imagename=?", (imagename,))
                 image_list = result.fetchall()
@@ -2360,7 +2681,7 @@ class ImageDbOperator(object):
                 raise exception.SDKObjectNotExistError(obj_desc=obj_desc,
                                                    modID=self._module_id)
         else:
-            with get_image_conn() as conn:
+            with get_image_conn(readonly=True) as conn:
                 result = conn.execute("SELECT * FROM image")
                 image_list = result.fetchall()
 
@@ -2470,7 +2791,7 @@ class GuestDbOperator(object):
                 "DELETE FROM guests WHERE userid=?", (userid,))
 
     def get_guest_metadata_with_userid(self, userid):
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT metadata FROM guests "
                                "WHERE userid=?", (userid,))
             guests = res.fetchall()
@@ -2547,20 +2868,20 @@ class GuestDbOperator(object):
             conn.execute(sql_cmd, sql_var)
 
     def get_guest_list(self):
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT * FROM guests")
             guests = res.fetchall()
         return guests
 
     def get_migrated_guest_list(self):
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT userid FROM guests "
                                "WHERE comments LIKE '%\"migrated\": 1%'")
             guests = res.fetchall()
         return guests
 
     def get_migrated_guest_info_list(self):
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT * FROM guests "
                                "WHERE comments LIKE '%\"migrated\": 1%'")
             guests = res.fetchall()
@@ -2571,7 +2892,7 @@ class GuestDbOperator(object):
         output should be like: {'k1': 'v1', 'k2': 'v2'}'
         """
         userid = userid
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT comments FROM guests "
                                "WHERE userid=?", (userid,))
 
@@ -2586,7 +2907,7 @@ class GuestDbOperator(object):
         output should be like: "a=1,b=2,c=3"
         """
         userid = userid
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT * FROM guests "
                                "WHERE userid=?", (userid,))
             guest = res.fetchall()
@@ -2615,7 +2936,7 @@ class GuestDbOperator(object):
         return dic
 
     def get_guest_by_id(self, guest_id):
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT * FROM guests "
                                "WHERE id=?", (guest_id,))
             guest = res.fetchall()
@@ -2630,7 +2951,7 @@ class GuestDbOperator(object):
 
     def get_guest_by_userid(self, userid):
         userid = userid
-        with get_guest_conn() as conn:
+        with get_guest_conn(readonly=True) as conn:
             res = conn.execute("SELECT * FROM guests "
                                "WHERE userid=?", (userid,))
             guest = res.fetchall()
@@ -2642,3 +2963,97 @@ class GuestDbOperator(object):
             return None
         # Code shouldn't come here, just in case
         return None
+
+
+class JobDbOperator(object):
+    """Persist the state of the jobs run in the background, see
+    zvmsdk.jobs."""
+
+    _FIELDS = ('job_id', 'operation', 'target', 'queue', 'state', 'progress',
+               'step', 'result', 'error', 'created_at', 'updated_at')
+
+    def __init__(self):
+        self._create_jobs_table()
+
+    def _create_jobs_table(self):
+        sql = ' '.join((
+            'CREATE TABLE IF NOT EXISTS jobs(',
+            'job_id         char(32)     PRIMARY KEY,',
+            'operation      varchar(64)  NOT NULL,',
+            'target         varchar(255),',
+            'queue          varchar(255),',
+            'state          varchar(16)  NOT NULL,',
+            'progress       integer      DEFAULT 0,',
+            'step           varchar(255),',
+            'result         text,',
+            'error          text,',
+            'created_at     real,',
+            'updated_at     real)'))
+        with get_job_conn() as conn:
+            conn.execute(sql)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at "
+                         "ON jobs (updated_at)")
+
+    def _to_dict(self, row):
+        job = dict(zip(self._FIELDS, row))
+        for key in ('result', 'error'):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def save_job(self, job):
+        """Insert or update the job, job is a dictionary as returned by
+        zvmsdk.jobs.Job.to_dict."""
+        values = [job[key] for key in self._FIELDS]
+        for key in ('result', 'error'):
+            index = self._FIELDS.index(key)
+            if values[index] is not None:
+                values[index] = json.dumps(values[index], default=str)
+        with get_job_conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs (%s) VALUES (%s)" %
+                         (', '.join(self._FIELDS),
+                          ', '.join('?' * len(self._FIELDS))),
+                         values)
+
+    def get_job(self, job_id):
+        with get_job_conn(readonly=True) as conn:
+            row = conn.execute("SELECT %s FROM jobs WHERE job_id=?" %
+                               ', '.join(self._FIELDS),
+                               (job_id,)).fetchone()
+        return None if row is None else self._to_dict(row)
+
+    def get_jobs(self, target=None, state=None):
+        """Get the jobs, the most recently created first."""
+        sql = "SELECT %s FROM jobs" % ', '.join(self._FIELDS)
+        conditions = []
+        params = []
+        if target is not None:
+            conditions.append("target=?")
+            params.append(target)
+        if state is not None:
+            conditions.append("state=?")
+            params.append(state)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC"
+        with get_job_conn(readonly=True) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def fail_unfinished_jobs(self, states, error, updated_at):
+        """Set the jobs in one of states to failed with error, it is used
+        for the jobs left unfinished when the SDK server stopped."""
+        with get_job_conn() as conn:
+            res = conn.execute(
+                "UPDATE jobs SET state='failed', error=?, updated_at=? "
+                "WHERE state IN (%s)" % ', '.join('?' * len(states)),
+                [json.dumps(error), updated_at] + list(states))
+            return res.rowcount
+
+    def delete_jobs_before(self, updated_at, states):
+        """Delete the jobs in one of states updated before updated_at."""
+        with get_job_conn() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE updated_at<? AND state IN (%s)" %
+                ', '.join('?' * len(states)),
+                [updated_at] + list(states))
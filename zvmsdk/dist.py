@@ -20,7 +20,9 @@ import abc
 import netaddr
 import os
 import six
-from jinja2 import Environment, FileSystemLoader
+import threading
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from jinja2 import PrefixLoader
 
 from zvmsdk import config
 from zvmsdk import exception
@@ -31,6 +33,80 @@ from zvmsdk import smtclient
 CONF = config.CONF
 LOG = log.LOG
 
+# Modules having a templates directory of guest configuration scripts
+_TEMPLATE_MODULES = ('vmactions', 'volumeops')
+_template_env = None
+_templates = {}
+_template_lock = threading.Lock()
+
+
+def _get_bytecode_cache():
+    cache_dir = CONF.guest.template_cache_dir
+    if not cache_dir:
+        return None
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+    except OSError as err:
+        LOG.warning("Failed to create the template cache directory %s: %s, "
+                    "the compiled templates are kept in memory only."
+                    % (cache_dir, err))
+        return None
+    if not os.access(cache_dir, os.W_OK):
+        LOG.warning("The template cache directory %s is not writable, "
+                    "the compiled templates are kept in memory only."
+                    % cache_dir)
+        return None
+    return FileSystemBytecodeCache(cache_dir)
+
+
+def _get_template_env():
+    # Caller holds _template_lock
+    global _template_env
+    if _template_env is None:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        loader = PrefixLoader(
+            {module: FileSystemLoader(os.path.join(base_path, module,
+                                                   'templates'))
+             for module in _TEMPLATE_MODULES})
+        # The templates are shipped with the SDK, they are compiled once and
+        # never checked for changes.
+        _template_env = Environment(loader=loader, auto_reload=False,
+                                    bytecode_cache=_get_bytecode_cache())
+    return _template_env
+
+
+def get_template(module, template_name):
+    """Get the compiled template template_name of module.
+
+    The templates are compiled on first use and shared by the whole process.
+    """
+    key = module + '/' + template_name
+    template = _templates.get(key)
+    if template is None:
+        with _template_lock:
+            template = _templates.get(key)
+            if template is None:
+                template = _get_template_env().get_template(key)
+                _templates[key] = template
+    return template
+
+
+def load_templates():
+    """Compile all the templates of the guest configuration scripts."""
+    with _template_lock:
+        names = _get_template_env().list_templates()
+    for name in names:
+        get_template(*name.split('/', 1))
+
+
+def reset_templates():
+    """Drop the compiled templates, they are compiled again on next use."""
+    global _template_env
+    with _template_lock:
+        _template_env = None
+        _templates.clear()
+
 
 @six.add_metaclass(abc.ABCMeta)
 class LinuxDist(object):
@@ -323,15 +399,7 @@ class LinuxDist(object):
         return lines
 
     def get_template(self, module, template_name):
-        relative_path = module + "/templates"
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        template_file_path = os.path.join(base_path, relative_path,
-                                          template_name)
-        template_file_directory = os.path.dirname(template_file_path)
-        template_loader = FileSystemLoader(searchpath=template_file_directory)
-        env = Environment(loader=template_loader)
-        template = env.get_template(template_name)
-        return template
+        return get_template(module, template_name)
 
     def get_extend_partition_cmds(self):
         template = self.get_template("vmactions", "grow_root_volume.j2")
@@ -110,11 +110,9 @@ class HOSTOps(object):
             # guests on other z/VMs in the same SSI cluster, need
             # get rid of these guests.
             if self._smtclient.host_get_ssi_info():
-                new_guest_list = []
-                for userid in guest_list:
-                    if not zvmutils.check_userid_on_others(userid):
-                        new_guest_list.append(userid)
-                guest_list = new_guest_list
+                on_others = zvmutils.get_userids_on_others()
+                guest_list = [userid for userid in guest_list
+                              if userid.upper() not in on_others]
             return guest_list
 
     def _cache_enabled(self):
@@ -0,0 +1,325 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import collections
+import threading
+import time
+import traceback
+import uuid
+from concurrent import futures
+
+from zvmsdk import config
+from zvmsdk import database
+from zvmsdk import exception
+from zvmsdk import log
+
+
+LOG = log.LOG
+CONF = config.CONF
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+# Number of finished jobs kept in memory, the older ones are only in the DB
+MAX_FINISHED_JOBS = 1000
+# Seconds between two deletions of the expired jobs from the DB
+_PURGE_INTERVAL = 3600
+# Max seconds a job query waits for the job to finish. The query holds an
+# SDK server worker while waiting, so a longer wait is cut short and the
+# caller polls again.
+MAX_QUERY_WAIT = 10
+
+_SCHEDULERS = []
+_SCHEDULERS_LOCK = threading.Lock()
+_DEPLOY_SCHEDULER = None
+_JOB_SCHEDULER = None
+_JOB_DB = None
+
+
+def _get_job_db():
+    # Caller holds _SCHEDULERS_LOCK
+    global _JOB_DB
+    if _JOB_DB is None:
+        _JOB_DB = database.JobDbOperator()
+        # The jobs of a former SDK server process can not finish any more
+        error = Job._internal_error("The SDK server stopped before the job "
+                                    "finished")
+        count = _JOB_DB.fail_unfinished_jobs((JOB_QUEUED, JOB_RUNNING),
+                                             error, time.time())
+        if count:
+            LOG.warning("%s jobs left unfinished by the former SDK server "
+                        "are set to failed" % count)
+    return _JOB_DB
+
+
+def get_deploy_scheduler():
+    global _DEPLOY_SCHEDULER
+    with _SCHEDULERS_LOCK:
+        if _DEPLOY_SCHEDULER is None:
+            _DEPLOY_SCHEDULER = JobScheduler(CONF.guest.deploy_workers,
+                                             CONF.guest.deploy_per_disk_pool,
+                                             _get_job_db())
+            _SCHEDULERS.append(_DEPLOY_SCHEDULER)
+        return _DEPLOY_SCHEDULER
+
+
+def get_job_scheduler():
+    """Get the scheduler of the jobs other than deploys, their queue is
+    their operation."""
+    global _JOB_SCHEDULER
+    with _SCHEDULERS_LOCK:
+        if _JOB_SCHEDULER is None:
+            _JOB_SCHEDULER = JobScheduler(CONF.sdkserver.job_workers,
+                                          CONF.sdkserver.job_workers,
+                                          _get_job_db())
+            _SCHEDULERS.append(_JOB_SCHEDULER)
+        return _JOB_SCHEDULER
+
+
+def query_job(job_id, wait=0):
+    """Get a job as a dictionary, waiting at most wait seconds, and no more
+    than MAX_QUERY_WAIT, for it to finish."""
+    with _SCHEDULERS_LOCK:
+        schedulers = list(_SCHEDULERS)
+        job_db = _get_job_db()
+    for scheduler in schedulers:
+        job = scheduler.get(job_id)
+        if job is not None:
+            if wait:
+                job.wait(min(wait, MAX_QUERY_WAIT))
+            return job.to_dict()
+    job = job_db.get_job(job_id)
+    if job is None:
+        raise exception.SDKObjectNotExistError(
+            obj_desc="Job '%s'" % job_id, modID='zvmsdk')
+    return job
+
+
+def list_jobs(target=None, state=None):
+    with _SCHEDULERS_LOCK:
+        job_db = _get_job_db()
+    return job_db.get_jobs(target=target, state=state)
+
+
+class Job(object):
+    """An operation run in the background by a JobScheduler."""
+
+    def __init__(self, operation, func, target=None, queue=None,
+                 on_change=None):
+        self.job_id = uuid.uuid4().hex
+        self.operation = operation
+        self.target = target
+        self.queue = queue
+        self.state = JOB_QUEUED
+        self.progress = 0
+        self.step = ''
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._func = func
+        self._on_change = on_change or (lambda job: None)
+        self._done = threading.Event()
+
+    def set_progress(self, percent, step):
+        """Record the percentage done and the step being run, it is passed
+        to the operations as their progress callback."""
+        self.progress = percent
+        self.step = step
+        self.updated_at = time.time()
+        self._on_change(self)
+
+    def wait(self, timeout=None):
+        """Wait for the job to finish, return whether it finished."""
+        return self._done.wait(timeout)
+
+    def run(self):
+        self.state = JOB_RUNNING
+        self.updated_at = time.time()
+        self._on_change(self)
+        try:
+            self.result = self._func(self)
+        except exception.SDKBaseException as err:
+            LOG.error("Job %s %s of %s failed: %s" %
+                      (self.job_id, self.operation, self.target,
+                       traceback.format_exc()))
+            if err.results is None:
+                self.error = self._internal_error(err.format_message())
+            else:
+                self.error = {'overallRC': err.results['overallRC'],
+                              'modID': err.results['modID'],
+                              'rc': err.results['rc'],
+                              'rs': err.results['rs'],
+                              'errmsg': err.format_message()}
+            self.state = JOB_FAILED
+        except Exception as err:
+            LOG.error("Job %s %s of %s failed: %s" %
+                      (self.job_id, self.operation, self.target,
+                       traceback.format_exc()))
+            self.error = self._internal_error(repr(err))
+            self.state = JOB_FAILED
+        else:
+            self.progress = 100
+            self.step = ''
+            self.state = JOB_SUCCEEDED
+        self.updated_at = time.time()
+        self._on_change(self)
+        self._done.set()
+
+    @staticmethod
+    def _internal_error(msg):
+        err = exception.SDKInternalError(msg=msg)
+        return {'overallRC': err.results['overallRC'],
+                'modID': err.results['modID'],
+                'rc': err.results['rc'],
+                'rs': err.results['rs'],
+                'errmsg': err.format_message()}
+
+    @property
+    def finished(self):
+        return self.state in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self):
+        return {'job_id': self.job_id,
+                'operation': self.operation,
+                'target': self.target,
+                'queue': self.queue,
+                'state': self.state,
+                'progress': self.progress,
+                'step': self.step,
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'updated_at': self.updated_at}
+
+
+class JobScheduler(object):
+    """Run jobs on a bounded pool of threads.
+
+    Each job is put in a queue, for example the disk pool a deploy writes
+    to. At most queue_limit jobs of a queue run at the same time. When a
+    thread is free, the queues having a job that can run are served in
+    turn, and the jobs of a queue are run in the order they were submitted.
+    The state of the jobs is saved in job_db when it changes.
+    """
+
+    def __init__(self, workers, queue_limit, job_db=None):
+        self._workers = max(workers, 1)
+        self._job_db = job_db
+        self._last_purge = 0
+        self._queue_limit = max(queue_limit, 1)
+        self._lock = threading.Lock()
+        self._executor = futures.ThreadPoolExecutor(self._workers)
+        # queue -> the jobs of the queue waiting to run
+        self._waiting = collections.OrderedDict()
+        # queue -> number of the jobs of the queue running
+        self._running = collections.defaultdict(int)
+        # queue -> when a job of the queue was last started
+        self._served = {}
+        self._dispatched = 0
+        self._jobs = collections.OrderedDict()
+        self._finished = collections.deque()
+
+    def submit(self, operation, func, target=None, queue=None):
+        """Submit a job calling func with the job as argument.
+
+        :returns: the job
+        """
+        job = Job(operation, func, target=target, queue=queue,
+                  on_change=self._save)
+        self._save(job)
+        self._purge()
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._waiting.setdefault(queue, collections.deque()).append(job)
+            self._dispatch()
+        LOG.info("Job %s %s of %s is queued in %s" %
+                 (job.job_id, operation, target, queue))
+        return job
+
+    def get(self, job_id):
+        """Get a job submitted to this scheduler, None when it is not kept
+        in memory."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _save(self, job):
+        if self._job_db is None:
+            return
+        try:
+            self._job_db.save_job(job.to_dict())
+        except exception.SDKBaseException:
+            # The job goes on, its state is still in memory
+            LOG.error("Failed to save job %s: %s" %
+                      (job.job_id, traceback.format_exc()))
+
+    def _purge(self):
+        now = time.time()
+        if self._job_db is None or now - self._last_purge < _PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        try:
+            self._job_db.delete_jobs_before(
+                now - CONF.sdkserver.job_expiration,
+                (JOB_SUCCEEDED, JOB_FAILED))
+        except exception.SDKBaseException:
+            LOG.error("Failed to delete the expired jobs: %s" %
+                      traceback.format_exc())
+
+    def _next_job(self):
+        ready = [queue for queue in self._waiting
+                 if self._running.get(queue, 0) < self._queue_limit]
+        if not ready:
+            return None
+        # Serve the queue served the longest time ago
+        queue = min(ready, key=lambda q: self._served.get(q, 0))
+        self._dispatched += 1
+        self._served[queue] = self._dispatched
+        waiting = self._waiting[queue]
+        job = waiting.popleft()
+        if not waiting:
+            del self._waiting[queue]
+        return job
+
+    def _dispatch(self):
+        # It is called with self._lock held
+        while sum(self._running.values()) < self._workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running[job.queue] += 1
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                self._running[job.queue] -= 1
+                if not self._running[job.queue]:
+                    del self._running[job.queue]
+                self._finished.append(job.job_id)
+                while len(self._finished) > MAX_FINISHED_JOBS:
+                    self._jobs.pop(self._finished.popleft(), None)
+                self._dispatch()
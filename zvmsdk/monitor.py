@@ -15,10 +15,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import threading
 import time
 
 from zvmsdk import config
+from zvmsdk import exception
 from zvmsdk import log
 from zvmsdk import smtclient
 from zvmsdk import utils as zvmutils
@@ -43,6 +45,15 @@ class ZVMMonitor(object):
         self._cache = MeteringCache(self._TYPES)
         self._smtclient = smtclient.get_smtclient()
         self._namelist = zvmutils.get_namelist()
+        # In-memory mirror of the userids in the SMAPI namelist, synced
+        # from SMAPI on first use and then kept by the namelist hooks.
+        # None when the namelist content is unknown.
+        self._namelist_members = None
+        self._namelist_expiration = 0
+        self._namelist_lock = threading.RLock()
+        self._refresher = None
+        if CONF.monitor.cache_refresh:
+            self.start_refresher()
 
     def inspect_stats(self, uid_list):
         cpumem_data = self._get_inspect_data('cpumem', uid_list)
@@ -95,7 +106,7 @@ class ZVMMonitor(object):
 
     def _get_inspect_data(self, type, uid_list):
         inspect_data = {}
-        update_needed = False
+        missed_uids = []
         for uid in uid_list:
             if not zvmutils.valid_userid(uid):
                 continue
@@ -103,16 +114,21 @@ class ZVMMonitor(object):
             if cache_data is not None:
                 inspect_data[uid] = cache_data
             else:
-                if self._smtclient.get_power_state(uid) == 'on':
-                    update_needed = True
-                    inspect_data = {}
-                    break
+                missed_uids.append(uid)
 
-        # If all data are found in cache, just return
-        if not update_needed:
+        # If all data are found in cache, or all the guests missed are
+        # powered off and have no data, just return. The power state of
+        # all of them is got with one query.
+        if not missed_uids:
+            return inspect_data
+        power_states = self._smtclient.get_power_state_bulk(missed_uids)
+        if 'on' not in power_states.values():
             return inspect_data
 
         # Call client to query latest data
+        return self._update_data(type, uid_list)
+
+    def _update_data(self, type, uid_list):
         rdata = {}
         if type == 'cpumem':
             rdata = self._update_cpumem_data(uid_list)
@@ -121,15 +137,93 @@ class ZVMMonitor(object):
 
         return rdata
 
-    def _update_cpumem_data(self, uid_list):
-
-        namelist_uids = self._smtclient.namelist_query(self._namelist)
-        sdk_managed_uids = self._smtclient.get_vm_list()
-        mis_uids = list((set(uid_list) -
-                     set(namelist_uids)).intersection(set(sdk_managed_uids)))
+    def start_refresher(self):
+        """Start the thread which pre-warms the cache in background."""
+        if self._refresher is not None or not self._cache_enabled():
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop)
+        self._refresher.daemon = True
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            for type in self._TYPES:
+                try:
+                    self._update_data(type, [])
+                except Exception as err:
+                    LOG.warning("Failed to refresh the %s monitor data "
+                                "cache: %s" % (type, err))
+            # Refresh shortly before the cached data expires
+            time.sleep(max(CONF.monitor.cache_interval * 0.9, 1))
+
+    def _get_namelist_members(self):
+        """Get the mirror of the namelist, None when it is unknown.
+
+        The mirror is synced from SMAPI on first use, then again every
+        [monitor] namelist_reconcile_interval seconds so that it catches
+        up with the changes made out of SDK.
+        """
+        with zvmutils.acquire_lock(self._namelist_lock):
+            if (self._namelist_members is None or
+                    time.time() >= self._namelist_expiration):
+                self.reconcile_namelist()
+            return self._namelist_members
+
+    def reconcile_namelist(self):
+        """Add the guests managed by SDK missing in the namelist.
+
+        The namelist is queried from SMAPI and the managed guests missing
+        in it are added, the other guests in it are left alone. When the
+        query fails the namelist content is unknown, all the managed
+        guests are added and the namelist is queried again on next use.
+        """
+        with zvmutils.acquire_lock(self._namelist_lock):
+            self._namelist_expiration = (
+                time.time() + CONF.monitor.namelist_reconcile_interval)
+            try:
+                namelist_uids = self._smtclient.namelist_query(
+                    self._namelist, raise_exception=True)
+                self._namelist_members = set(uid.upper()
+                                             for uid in namelist_uids)
+            except exception.SDKBaseException as err:
+                LOG.warning("Failed to query the namelist %s: %s" %
+                            (self._namelist, err))
+                self._namelist_members = None
+            sdk_managed_uids = set(uid.upper() for uid in
+                                   self._smtclient.get_vm_list())
+            self._namelist_add(self._namelist_members, sdk_managed_uids)
+
+    def _namelist_add(self, members, uid_list):
+        # Caller holds self._namelist_lock, members is None when the
+        # namelist content is unknown. Only the successful adds are
+        # mirrored, the failed ones are retried by the next reconcile.
+        for uid in sorted(set(uid.upper() for uid in uid_list)):
+            if members is None or uid not in members:
+                added = self._smtclient.namelist_add(self._namelist, uid)
+                if added and members is not None:
+                    members.add(uid)
+
+    def namelist_add(self, uid_list):
+        """Add guests to the namelist, skip the ones already in it."""
+        with zvmutils.acquire_lock(self._namelist_lock):
+            self._namelist_add(self._get_namelist_members(), uid_list)
+
+    def namelist_remove(self, uid_list):
+        """Remove guests from the namelist, skip the ones not in it."""
+        with zvmutils.acquire_lock(self._namelist_lock):
+            members = self._get_namelist_members()
+            for uid in sorted(set(uid.upper() for uid in uid_list)):
+                if members is None or uid in members:
+                    removed = self._smtclient.namelist_remove(self._namelist,
+                                                              uid)
+                    if removed and members is not None:
+                        members.discard(uid)
 
-        for muid in mis_uids:
-            self._smtclient.namelist_add(self._namelist, muid)
+    def _update_cpumem_data(self, uid_list):
+        # The guests managed by SDK are kept in the namelist by the
+        # namelist hooks, the namelist is only synced from SMAPI on first
+        # use and every namelist_reconcile_interval.
+        self._get_namelist_members()
 
         rdata = {}
         if self._cache_enabled():
@@ -172,24 +266,39 @@ class ZVMMonitor(object):
 
 
 class MeteringCache(object):
-    """Cache for metering data."""
+    """Cache for metering data.
 
-    def __init__(self, types):
+    Each entry expires cache_interval seconds after it was set. Each type
+    keeps at most max_entries entries, the least recently used ones are
+    evicted first. refresh builds the new data of a type aside and swaps
+    it in at once, so readers only wait for the swap.
+    """
+
+    def __init__(self, types, max_entries=None):
         self._cache = {}
         self._types = types
-        self._lock = threading.RLock()
+        self._max_entries = max_entries or CONF.monitor.cache_max_entries
+        self._lock = threading.Lock()
         self._reset(types)
 
     def _reset(self, types):
         with zvmutils.acquire_lock(self._lock):
             for type in types:
-                self._cache[type] = {'expiration': time.time(),
-                                    'data': {},
-                                    }
+                self._cache[type] = {'expiration': {},
+                                     'data': collections.OrderedDict(),
+                                     }
 
     def _get_ctype_cache(self, ctype):
         return self._cache[ctype]
 
+    def _expiration(self):
+        return time.time() + float(CONF.monitor.cache_interval)
+
+    def _evict(self, target_cache):
+        while len(target_cache['data']) > self._max_entries:
+            key = target_cache['data'].popitem(last=False)[0]
+            target_cache['expiration'].pop(key, None)
+
     def set(self, ctype, key, data):
         """Set or update cache content.
 
@@ -197,37 +306,49 @@ class MeteringCache(object):
         :param key: the key to be set value
         :param data: cache data
         """
+        expiration = self._expiration()
         with zvmutils.acquire_lock(self._lock):
             target_cache = self._get_ctype_cache(ctype)
             target_cache['data'][key] = data
+            target_cache['data'].move_to_end(key)
+            target_cache['expiration'][key] = expiration
+            self._evict(target_cache)
 
     def get(self, ctype, key):
         with zvmutils.acquire_lock(self._lock):
             target_cache = self._get_ctype_cache(ctype)
-            if (time.time() > target_cache['expiration']):
+            expiration = target_cache['expiration'].get(key)
+            if expiration is None:
                 return None
-            else:
-                return target_cache['data'].get(key, None)
+            if time.time() > expiration:
+                del target_cache['data'][key]
+                del target_cache['expiration'][key]
+                return None
+            target_cache['data'].move_to_end(key)
+            return target_cache['data'][key]
 
     def delete(self, ctype, key):
         with zvmutils.acquire_lock(self._lock):
             target_cache = self._get_ctype_cache(ctype)
             if key in target_cache['data']:
                 del target_cache['data'][key]
+                del target_cache['expiration'][key]
 
     def clear(self, ctype='all'):
-        with zvmutils.acquire_lock(self._lock):
-            if ctype == 'all':
-                self._reset()
-            else:
-                target_cache = self._get_ctype_cache(ctype)
-                target_cache['data'] = {}
+        if ctype == 'all':
+            self._reset(self._types)
+        else:
+            with zvmutils.acquire_lock(self._lock):
+                self._cache[ctype] = {'expiration': {},
+                                      'data': collections.OrderedDict(),
+                                      }
 
     def refresh(self, ctype, data):
+        expiration = self._expiration()
+        new_data = collections.OrderedDict(data)
+        new_cache = {'expiration': dict.fromkeys(new_data, expiration),
+                     'data': new_data,
+                     }
+        self._evict(new_cache)
         with zvmutils.acquire_lock(self._lock):
-            self.clear(ctype)
-            target_cache = self._get_ctype_cache(ctype)
-            target_cache['expiration'] = (time.time() +
-                                            float(CONF.monitor.cache_interval))
-            for (k, v) in data.items():
-                self.set(ctype, k, v)
+            self._cache[ctype] = new_cache
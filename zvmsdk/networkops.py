@@ -18,13 +18,13 @@
 
 import os
 import shutil
-import tarfile
 import yaml
 
 from zvmsdk import config
 from zvmsdk import dist
 from zvmsdk import log
 from zvmsdk import smtclient
+from zvmsdk import utils as zvmutils
 
 
 _NetworkOPS = None
@@ -176,19 +176,22 @@ class NetworkOPS(object):
         if len(net_cmd_file) > 0:
             path_contents.extend(net_cmd_file)
 
+        # The files are built in memory, only the network doscript
+        # is written into network_file_path to be punched.
+        members = []
         for (path, contents) in path_contents:
             key = "%04i" % len(content_dir)
             files_map.append({'target_path': path,
                         'source_file': "%s" % key})
             content_dir[key] = contents
-            file_name = os.path.join(network_file_path, key)
             if 'yaml' in path:
-                self._add_yaml_file(file_name, contents)
-            else:
-                self._add_file(file_name, contents)
+                contents = yaml.dump(contents)
+            members.append((key, contents))
 
-        self._create_invokeScript(network_file_path, clean_cmd, files_map)
-        network_doscript = self._create_network_doscript(network_file_path)
+        members.append(('invokeScript.sh',
+                        self._create_invokeScript(clean_cmd, files_map)))
+        network_doscript = self._create_network_doscript(network_file_path,
+                                                         members)
 
         # get command about zvmguestconfigure
         active_cmds = ''
@@ -201,10 +204,6 @@ class NetworkOPS(object):
         with open(file_name, "w") as f:
             f.write(data)
 
-    def _add_yaml_file(self, file_name, data):
-        with open(file_name, 'w') as stream:
-            yaml.dump(data, stream)
-
     def _create_znetconfig(self, commands, linuxdist, append_cmd,
                            active=False):
         LOG.debug('Creating znetconfig file')
@@ -228,18 +227,15 @@ class NetworkOPS(object):
 
         return net_cmd_file
 
-    def _create_invokeScript(self, network_file_path, commands,
-                             files_map):
+    def _create_invokeScript(self, commands, files_map):
         """invokeScript: Configure zLinux os network
 
         invokeScript is included in the network.doscript, it is used to put
         the network configuration file to the directory where it belongs and
-        call znetconfig to configure the network
+        call znetconfig to configure the network. The content of the script
+        is returned.
         """
-        LOG.debug('Creating invokeScript shell in the folder %s'
-                  % network_file_path)
-        invokeScript = "invokeScript.sh"
-
+        LOG.debug('Creating invokeScript shell')
         conf = "#!/bin/bash \n"
         command = commands
         for file in files_map:
@@ -252,29 +248,21 @@ class NetworkOPS(object):
         command += 'sleep 2\n'
         command += '/bin/bash /tmp/znetconfig.sh\n'
         command += 'rm -rf invokeScript.sh\n'
+        return conf + command
 
-        scriptfile = os.path.join(network_file_path, invokeScript)
-        with open(scriptfile, "w") as f:
-            f.write(conf)
-            f.write(command)
-
-    def _create_network_doscript(self, network_file_path):
+    def _create_network_doscript(self, network_file_path, members):
         """doscript: contains a invokeScript.sh which will do the special work
 
         The network.doscript contains network configuration files and it will
         be used by zvmguestconfigure to configure zLinux os network when it
-        starts up
+        starts up. The tar package is built in memory from members, a list
+        of (file name, content), and reused for the same network layout.
         """
         # Generate the tar package for punch
         LOG.debug('Creating network doscript in the folder %s'
                   % network_file_path)
         network_doscript = os.path.join(network_file_path, 'network.doscript')
-        tar = tarfile.open(network_doscript, "w")
-        for file in os.listdir(network_file_path):
-            file_name = os.path.join(network_file_path, file)
-            tar.add(file_name, arcname=file)
-        tar.close()
-        return network_doscript
+        return zvmutils.write_tar(network_doscript, members)
 
     def get_nic_info(self, userid=None, nic_id=None, vswitch=None):
         return self._smtclient.get_nic_info(userid=userid, nic_id=nic_id,
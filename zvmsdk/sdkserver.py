@@ -16,13 +16,17 @@
 #    under the License.
 
 
+import collections
+import functools
 import json
+import selectors
 import six
 import socket
 import sys
 import threading
 import traceback
 
+from zvmconnector import socketclient
 from zvmsdk import api
 from zvmsdk import config
 from zvmsdk import exception
@@ -39,6 +43,46 @@ CONF = config.CONF
 LOG = log.LOG
 
 
+class _PersistentClient(object):
+    """A client connection kept open for several requests
+
+    The connection is closed once the reader finished and all the requests
+    read from it have been answered.
+    """
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.send_lock = threading.Lock()
+        self.ref_lock = threading.Lock()
+        # The reader holds one reference until the client closes
+        self.refs = 1
+
+    def acquire(self):
+        with self.ref_lock:
+            self.refs += 1
+
+    def release(self):
+        with self.ref_lock:
+            self.refs -= 1
+            if self.refs > 0:
+                return
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+    def send(self, request_id, results, flags):
+        # The results are streamed frame by frame, and each frame is sent
+        # under the lock on its own so that a large response does not hold
+        # back the responses of the other requests.
+        flags &= socketclient.FLAG_ZLIB
+        for frame in socketclient.iter_frames(
+                request_id, socketclient.iter_json(results), flags):
+            with self.send_lock:
+                self.sock.sendall(frame)
+
+
 class SDKServer(object):
     def __init__(self):
         # Initailize SDK API
@@ -46,6 +90,8 @@ class SDKServer(object):
         self.server_socket = None
         self.request_queue = Queue.Queue(maxsize=
                                          CONF.sdkserver.request_queue_size)
+        self.worker_lock = threading.Lock()
+        self.worker_count = 0
 
     def log_error(self, msg):
         thread = threading.current_thread().name
@@ -91,50 +137,66 @@ class SDKServer(object):
         """ send back results to client in the json format of:
         {'overallRC': x, 'modID': x, 'rc': x, 'rs': x, 'errmsg': 'msg',
          'output': 'out'}
+
+        The results are encoded and sent piece by piece, so that a large
+        output is never copied into one big string.
         """
-        json_results = json.dumps(results)
-        json_results = json_results.encode()
-
-        sent = 0
-        total_len = len(json_results)
-        got_error = False
-        while (sent < total_len):
-            this_sent = client.send(json_results[sent:])
-            if this_sent == 0:
-                got_error = True
-                break
-            sent += this_sent
-        if got_error or sent != total_len:
+        buf = bytearray()
+        try:
+            for piece in socketclient.iter_json(results):
+                buf += piece
+                if len(buf) >= socketclient.STREAM_CHUNK_SIZE:
+                    client.sendall(buf)
+                    del buf[:]
+            client.sendall(buf)
+        except socket.error as err:
             self.log_error("(%s:%s) Failed to send back results to client, "
-                           "results: %s" % (addr[0], addr[1], json_results))
+                           "error: %s" % (addr[0], addr[1], err))
         else:
             self.log_debug("(%s:%s) Results sent back to client successfully."
                            % (addr[0], addr[1]))
 
-    def serve_API(self, client, addr):
-        """ Read client request and call target SDK API"""
-        self.log_debug("(%s:%s) Handling new request from client." %
-                       (addr[0], addr[1]))
-        results = None
+    def recv_request(self, client, data):
+        """Read a request of the unframed protocol
+
+        Such clients send the bare json request without a size header and
+        wait for the results, so keep reading until the data is a complete
+        json document.
+        """
+        while True:
+            if data.rstrip().endswith(b']'):
+                try:
+                    json.loads(bytes.decode(data))
+                    return data
+                except ValueError:
+                    pass
+            block = client.recv(socketclient.STREAM_CHUNK_SIZE)
+            if not block:
+                return data
+            data += block
+
+    def call_api(self, addr, data):
+        """Decode the request data, call target SDK API and return results
+
+        The request data should be the json form of
+        [funcname, args_list, kwargs_dict].
+        """
         try:
-            data = client.recv(4096)
-            data = bytes.decode(data)
-            # When client failed to send the data or quit before sending the
-            # data, server side would receive null data.
-            # In such case, server would not send back any info and just
-            # terminate this thread.
-            if not data:
-                self.log_warn("(%s:%s) Failed to receive data from client." %
-                              (addr[0], addr[1]))
-                return
             api_data = json.loads(data)
+        except ValueError as e:
+            msg = ("(%s:%s) SDK server got unexpected exception: "
+                   "%s" % (addr[0], addr[1], repr(e)))
+            return self.construct_internal_error(msg)
+        return self.invoke_api(addr, api_data)
 
+    def invoke_api(self, addr, api_data):
+        """Call target SDK API of a decoded request and return results"""
+        try:
             # API_data should be in the form [funcname, args_list, kwargs_dict]
             if not isinstance(api_data, list) or len(api_data) != 3:
                 msg = ("(%s:%s) SDK server got wrong input: '%s' from client."
-                       % (addr[0], addr[1], data))
-                results = self.construct_internal_error(msg)
-                return
+                       % (addr[0], addr[1], api_data))
+                return self.construct_internal_error(msg)
 
             # Check called API is supported by SDK
             (func_name, api_args, api_kwargs) = api_data
@@ -146,8 +208,7 @@ class SDKServer(object):
             except AttributeError:
                 msg = ("(%s:%s) SDK server got wrong API name: %s from"
                        "client." % (addr[0], addr[1], func_name))
-                results = self.construct_api_name_error(msg)
-                return
+                return self.construct_api_name_error(msg)
 
             # invoke target API function
             return_data = api_func(*api_args, **api_kwargs)
@@ -183,10 +244,52 @@ class SDKServer(object):
                        'rc': 0, 'rs': 0,
                        'errmsg': '',
                        'output': return_data}
-        # Send back the final results
+        return results
+
+    def serve_API(self, client, addr):
+        """ Read client request and call target SDK API"""
+        self.log_debug("(%s:%s) Handling new request from client." %
+                       (addr[0], addr[1]))
+        results = None
         try:
-            if results is not None:
-                self.send_results(client, addr, results)
+            data = client.recv(4096)
+            # Clients of the persistent connection protocol start with the
+            # frame magic, the connection is handed over to a reader thread
+            # and stays open after this request.
+            while (data and len(data) < len(socketclient.FRAME_MAGIC) and
+                   socketclient.FRAME_MAGIC.startswith(data)):
+                more = client.recv(4096)
+                if not more:
+                    break
+                data += more
+            if data.startswith(socketclient.FRAME_MAGIC):
+                reader = socketclient.FrameReader(client, data)
+                message = reader.read_message()
+                if message is None:
+                    return
+                request_id, flags, payload = message
+                if flags & socketclient.FLAG_KEEPALIVE:
+                    # The client keeps the connection open for further
+                    # requests, it is handed over to a reader thread.
+                    self.start_persistent(client, addr, reader, message)
+                    client = None
+                    return
+                results = self.call_api(addr, bytes.decode(payload))
+                self.send_frames(client, request_id, results, flags)
+                return
+            data = self.recv_request(client, data)
+            data = bytes.decode(data)
+            # When client failed to send the data or quit before sending the
+            # data, server side would receive null data.
+            # In such case, server would not send back any info and just
+            # terminate this thread.
+            if not data:
+                self.log_warn("(%s:%s) Failed to receive data from client." %
+                              (addr[0], addr[1]))
+                return
+            results = self.call_api(addr, data)
+            # Send back the final results
+            self.send_results(client, addr, results)
         except Exception as e:
             # This should not happen in normal case.
             # A special case is the server side socket is closed/removed
@@ -195,28 +298,123 @@ class SDKServer(object):
         finally:
             # Close the connection to make sure the thread socket got
             # closed even when it got unexpected exceptions.
-            self.log_debug("(%s:%s) Finish handling request, closing "
-                           "socket." % (addr[0], addr[1]))
-            client.close()
+            if client is not None:
+                self.log_debug("(%s:%s) Finish handling request, closing "
+                               "socket." % (addr[0], addr[1]))
+                client.close()
+
+    def send_frames(self, client, request_id, results, flags):
+        """Stream the results as frames of the framed protocol"""
+        # The response is compressed when the request was
+        flags &= socketclient.FLAG_ZLIB
+        for frame in socketclient.iter_frames(
+                request_id, socketclient.iter_json(results), flags):
+            client.sendall(frame)
+
+    def start_persistent(self, client, addr, reader, message):
+        """Serve a persistent connection in a dedicated reader thread
+
+        The reader thread does not count as a worker, the requests read
+        from the connection are queued and handled by the workers. The
+        first request is queued by the reader too, the calling worker
+        must not block on the queue the workers drain.
+        """
+        conn = _PersistentClient(client, addr)
+        thread = threading.Thread(target=self.serve_persistent,
+                                  args=(conn, reader, message))
+        thread.daemon = True
+        self.log_debug("(%s:%s) Client switched to persistent connection, "
+                       "starting reader: %s" % (addr[0], addr[1],
+                                                thread.name))
+        thread.start()
+
+    def serve_persistent(self, conn, reader, message):
+        """Read the requests of a persistent connection"""
+        addr = conn.addr
+        try:
+            self.submit_message(conn, *message)
+            while True:
+                message = reader.read_message()
+                if message is None:
+                    self.log_debug("(%s:%s) Persistent connection closed by "
+                                   "client." % (addr[0], addr[1]))
+                    break
+                self.submit_message(conn, *message)
+        except Exception as e:
+            self.log_error("(%s:%s) Failed to read request from persistent "
+                           "connection: %s" % (addr[0], addr[1], repr(e)))
+        finally:
+            conn.release()
+
+    def submit_message(self, conn, request_id, flags, payload):
+        """Queue a request read from a persistent connection
+
+        It is called by the reader thread of the connection, which is not
+        a worker, so it waits for a slot when the queue is full and the
+        client stops being read meanwhile.
+        """
+        conn.acquire()
+        self.dispatch(self.serve_message, (conn, request_id, flags, payload))
+
+    def serve_message(self, conn, request_id, flags, payload):
+        """Handle one request read from a persistent connection"""
+        addr = conn.addr
+        try:
+            results = self.call_api(addr, bytes.decode(payload))
+            conn.send(request_id, results, flags)
+            self.log_debug("(%s:%s) Results of request %d sent back to "
+                           "client successfully." % (addr[0], addr[1],
+                                                     request_id))
+        except Exception as e:
+            self.log_error("(%s:%s) Failed to send back results of request "
+                           "%d: %s" % (addr[0], addr[1], request_id,
+                                       repr(e)))
+        finally:
+            conn.release()
+
+    def dispatch(self, handler, args):
+        """Queue a work item and start a new worker if needed"""
+        # This put() function would be blocked here until there's
+        # a slot in the queue
+        self.request_queue.put((handler, args))
+        self.start_worker()
+
+    def start_worker(self):
+        """Start a new worker if the max worker count is not reached"""
+        with self.worker_lock:
+            if self.worker_count < CONF.sdkserver.max_worker_count:
+                self.worker_count += 1
+                thread = threading.Thread(target=self.worker_loop)
+                self.log_debug("Worker count: %d, starting new worker: %s" %
+                               (self.worker_count - 1, thread.name))
+                thread.start()
 
     def worker_loop(self):
-        # The worker thread would continuously fetch request from queue
+        # The worker thread would continuously fetch work item from queue
         # in a while loop.
         while True:
+            # The worker count is updated together with the queue check so
+            # that an item put after the last worker exited always gets a
+            # new worker started by dispatch().
+            with self.worker_lock:
+                try:
+                    # This get() function raise Empty exception when
+                    # there's no available item in queue
+                    handler, args = self.request_queue.get(block=False)
+                except Queue.Empty:
+                    self.log_debug("No more item in request queue, worker "
+                                   "will exit now.")
+                    self.worker_count -= 1
+                    break
+                except Exception as err:
+                    self.log_error("Failed to get request item from queue, "
+                                   "error: %s. Worker will exit now." %
+                                   repr(err))
+                    self.worker_count -= 1
+                    break
             try:
-                # This get() function raise Empty exception when there's no
-                # available item in queue
-                clt_socket, clt_addr = self.request_queue.get(block=False)
-            except Queue.Empty:
-                self.log_debug("No more item in request queue, worker will "
-                               "exit now.")
-                break
-            except Exception as err:
-                self.log_error("Failed to get request item from queue, error: "
-                               "%s. Worker will exit now." % repr(err))
-                break
-            else:
-                self.serve_API(clt_socket, clt_addr)
+                handler(*args)
+            finally:
                 self.request_queue.task_done()
 
     def setup(self):
@@ -242,7 +440,7 @@ class SDKServer(object):
             sys.exit(1)
 
         # Start listening
-        server_sock.listen(5)
+        server_sock.listen(CONF.sdkserver.listen_backlog)
         self.log_info("SDK server now listening")
 
     def run(self):
@@ -252,19 +450,332 @@ class SDKServer(object):
             conn, addr = self.server_socket.accept()
             self.log_debug("(%s:%s) Client connected." % (addr[0],
                                                            addr[1]))
-            # This put() function would be blocked here until there's
-            # a slot in the queue
-            self.request_queue.put((conn, addr))
-            thread_count = threading.active_count()
-            if thread_count <= CONF.sdkserver.max_worker_count:
-                thread = threading.Thread(target=self.worker_loop)
-                self.log_debug("Worker count: %d, starting new worker: %s" %
-                               (thread_count - 1, thread.name))
-                thread.start()
+            self.dispatch(self.serve_API, (conn, addr))
+
+
+def parse_api_limits(value):
+    """Parse the api_concurrency_limits option to a dict
+
+    The option is a comma separated list of api_name:limit pairs.
+    """
+    limits = {}
+    if not value:
+        return limits
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            api_name, limit = item.split(':')
+            limits[api_name.strip()] = max(int(limit), 1)
+        except ValueError:
+            LOG.warning("Ignore invalid API concurrency limit '%s', it "
+                        "should be in the form of api_name:limit." % item)
+    return limits
+
+
+class APIExecutor(object):
+    """Long-lived, size-bounded pool of threads calling the SDK APIs
+
+    The threads are started once and never exit. An API with a concurrency
+    limit never occupies more than that number of threads, its further
+    calls are held back until a running one finishes, so that slow APIs
+    can not starve the others.
+    """
+
+    def __init__(self, size, limits=None):
+        self.limits = limits or {}
+        self.running = collections.defaultdict(int)
+        self.deferred = collections.defaultdict(collections.deque)
+        self.lock = threading.Lock()
+        self.tasks = Queue.Queue()
+        for i in range(max(size, 1)):
+            thread = threading.Thread(target=self._work,
+                                      name='sdkapi-worker-%d' % i)
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, api_name, func, *args):
+        with self.lock:
+            limit = self.limits.get(api_name)
+            if limit is not None and self.running[api_name] >= limit:
+                self.deferred[api_name].append((func, args))
+                return
+            self.running[api_name] += 1
+        self.tasks.put((api_name, func, args))
+
+    def _work(self):
+        while True:
+            api_name, func, args = self.tasks.get()
+            try:
+                func(*args)
+            except Exception:
+                LOG.error("SDK API worker got unexpected exception: %s" %
+                          traceback.format_exc())
+            finally:
+                self._finish(api_name)
+
+    def _finish(self, api_name):
+        with self.lock:
+            deferred = self.deferred.get(api_name)
+            if not deferred:
+                self.running[api_name] -= 1
+                return
+            # Hand the running slot over to the next held back call
+            func, args = deferred.popleft()
+        self.tasks.put((api_name, func, args))
+
+
+class _EventConnection(object):
+    """State of a client connection of the event driven server"""
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        # None until the first bytes tell whether the client is framed
+        self.framed = None
+        self.decoder = socketclient.FrameDecoder()
+        self.inbuf = bytearray()
+        self.keepalive = False
+        self.read_closed = False
+        self.closed = False
+        # Events registered in the selector
+        self.events = 0
+        # Requests read, and the ones being handled by the API executor
+        self.requests = 0
+        self.inflight = 0
+        # Iterators of the bytes to send, and the bytes being sent
+        self.outbox = collections.deque()
+        self.outbuf = b''
+
+
+class EventSDKServer(SDKServer):
+    """SDK server core driven by an event loop
+
+    A single thread accepts the connections and does all the socket reads
+    and writes, the blocking SDK API calls run in an APIExecutor. The
+    executor threads hand the results back to the loop through a wakeup
+    socket.
+    """
+
+    def __init__(self):
+        super(EventSDKServer, self).__init__()
+        self.selector = selectors.DefaultSelector()
+        self.executor = APIExecutor(
+            CONF.sdkserver.max_worker_count,
+            parse_api_limits(CONF.sdkserver.api_concurrency_limits))
+        self.ready_lock = threading.Lock()
+        self.ready = collections.deque()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+
+    def setup(self):
+        super(EventSDKServer, self).setup()
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ,
+                               self.accept)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ,
+                               self.send_ready)
+
+    def run(self):
+        while True:
+            for key, mask in self.selector.select():
+                key.data(mask)
+
+    def accept(self, mask):
+        # Accept all the pending connections
+        while True:
+            try:
+                sock, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            self.log_debug("(%s:%s) Client connected." % (addr[0], addr[1]))
+            sock.setblocking(False)
+            conn = _EventConnection(sock, addr)
+            self.update(conn)
+
+    def handle_io(self, conn, mask):
+        try:
+            if mask & selectors.EVENT_READ:
+                self.handle_read(conn)
+            if mask & selectors.EVENT_WRITE and not conn.closed:
+                self.flush(conn)
+        except Exception as e:
+            self.log_error("(%s:%s) Closing the connection on error: %s" %
+                           (conn.addr[0], conn.addr[1], repr(e)))
+            self.close(conn)
+
+    def handle_read(self, conn):
+        try:
+            data = conn.sock.recv(socketclient.STREAM_CHUNK_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        if not data:
+            conn.read_closed = True
+            if not conn.framed and conn.inbuf and not conn.inflight:
+                # Unframed client sent an incomplete request
+                self.submit(conn, 0, 0, bytes(conn.inbuf))
+                conn.inbuf = bytearray()
+            self.update(conn)
+            return
+
+        if conn.framed is None:
+            conn.inbuf += data
+            magic = socketclient.FRAME_MAGIC
+            if (len(conn.inbuf) < len(magic) and
+                    magic.startswith(bytes(conn.inbuf))):
+                return
+            conn.framed = conn.inbuf.startswith(magic)
+            data = bytes(conn.inbuf)
+            conn.inbuf = bytearray()
+
+        if conn.framed:
+            for request_id, flags, payload in conn.decoder.feed(data):
+                conn.keepalive = bool(flags & socketclient.FLAG_KEEPALIVE)
+                self.submit(conn, request_id, flags, payload)
+        elif not conn.inflight:
+            # Unframed clients send one request per connection, keep
+            # reading until it is a complete json document.
+            conn.inbuf += data
+            if conn.inbuf.rstrip().endswith(b']'):
+                try:
+                    json.loads(bytes.decode(bytes(conn.inbuf)))
+                except ValueError:
+                    return
+                self.submit(conn, 0, 0, bytes(conn.inbuf))
+                conn.inbuf = bytearray()
+
+    def submit(self, conn, request_id, flags, payload):
+        conn.requests += 1
+        try:
+            api_data = json.loads(bytes.decode(payload))
+        except ValueError as e:
+            msg = ("(%s:%s) SDK server got unexpected exception: "
+                   "%s" % (conn.addr[0], conn.addr[1], repr(e)))
+            self.complete(conn, request_id, flags,
+                          self.construct_internal_error(msg))
+            return
+        api_name = None
+        if isinstance(api_data, list) and api_data:
+            api_name = api_data[0]
+        conn.inflight += 1
+        self.executor.submit(api_name, self.execute, conn, request_id, flags,
+                             api_data)
+
+    def execute(self, conn, request_id, flags, api_data):
+        # Runs in the executor threads
+        results = self.invoke_api(conn.addr, api_data)
+        with self.ready_lock:
+            self.ready.append((conn, request_id, flags, results, True))
+        try:
+            self.wakeup_w.send(b'\0')
+        except (BlockingIOError, InterruptedError):
+            # The wakeup socket is full, the loop is going to wake up
+            pass
+
+    def send_ready(self, mask):
+        try:
+            while self.wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while True:
+            with self.ready_lock:
+                if not self.ready:
+                    return
+                item = self.ready.popleft()
+            self.complete(*item)
+
+    def complete(self, conn, request_id, flags, results, executed=False):
+        if executed:
+            conn.inflight -= 1
+        if conn.closed:
+            return
+        if conn.framed:
+            flags &= socketclient.FLAG_ZLIB
+            conn.outbox.append(socketclient.iter_frames(
+                request_id, socketclient.iter_json(results), flags))
+        else:
+            conn.outbox.append(socketclient.iter_json(results))
+        try:
+            self.flush(conn)
+        except Exception as e:
+            self.log_error("(%s:%s) Failed to send back results to client, "
+                           "error: %s" % (conn.addr[0], conn.addr[1],
+                                          repr(e)))
+            self.close(conn)
+
+    def flush(self, conn):
+        """Send as much of the pending output as the socket accepts"""
+        while True:
+            if not conn.outbuf:
+                conn.outbuf = self._next_chunk(conn)
+                if not conn.outbuf:
+                    break
+            try:
+                sent = conn.sock.send(conn.outbuf)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            conn.outbuf = conn.outbuf[sent:]
+            if conn.outbuf:
+                # Wait until the socket is writable again
+                break
+        self.update(conn)
+
+    def _next_chunk(self, conn):
+        buf = bytearray()
+        while conn.outbox and len(buf) < socketclient.STREAM_CHUNK_SIZE:
+            try:
+                buf += next(conn.outbox[0])
+            except StopIteration:
+                conn.outbox.popleft()
+        return bytes(buf)
+
+    def update(self, conn):
+        """Close the connection or update the events to wait for"""
+        if conn.closed:
+            return
+        sending = bool(conn.outbuf or conn.outbox)
+        if not sending and not conn.inflight:
+            # One-shot clients are done once their request is answered,
+            # persistent clients once they closed the connection.
+            if conn.read_closed or (conn.requests and not conn.keepalive):
+                self.close(conn)
+                return
+        events = 0
+        if not conn.read_closed:
+            events |= selectors.EVENT_READ
+        if sending:
+            events |= selectors.EVENT_WRITE
+        if events == conn.events:
+            return
+        callback = functools.partial(self.handle_io, conn)
+        if not events:
+            self.selector.unregister(conn.sock)
+        elif not conn.events:
+            self.selector.register(conn.sock, events, callback)
+        else:
+            self.selector.modify(conn.sock, events, callback)
+        conn.events = events
+
+    def close(self, conn):
+        if conn.closed:
+            return
+        conn.closed = True
+        self.log_debug("(%s:%s) Finish handling request, closing socket." %
+                       (conn.addr[0], conn.addr[1]))
+        if conn.events:
+            self.selector.unregister(conn.sock)
+            conn.events = 0
+        conn.sock.close()
 
 
 def start_daemon():
-    server = SDKServer()
+    if CONF.sdkserver.server_mode == 'event':
+        server = EventSDKServer()
+    else:
+        server = SDKServer()
     try:
         server.setup()
         server.run()
@@ -27,6 +27,7 @@ from zvmsdk.sdkwsgi.handlers import smapi
 from zvmsdk.sdkwsgi.handlers import healthy  # deprecated
 from zvmsdk.sdkwsgi.handlers import host
 from zvmsdk.sdkwsgi.handlers import image
+from zvmsdk.sdkwsgi.handlers import job
 from zvmsdk.sdkwsgi.handlers import tokens
 from zvmsdk.sdkwsgi.handlers import version
 from zvmsdk.sdkwsgi.handlers import volume
@@ -52,6 +53,9 @@ ROUTE_LIST = (
     ('/guests/interfacestats', {
         'GET': guest.guest_get_interface_stats
     }),
+    ('/guests/power_state', {
+        'GET': guest.guest_get_power_state_bulk
+    }),
     ('/guests/nics', {
         'GET': guest.guests_get_nic_info
     }),
@@ -59,6 +63,9 @@ ROUTE_LIST = (
         'POST': volume.volume_attach,
         'DELETE': volume.volume_detach,
     }),
+    ('/guests/action', {
+        'POST': guest.guests_action,
+    }),
     ('/volumes/conn/{userid}', {
         'GET': volume.get_volume_connector,
     }),
@@ -160,6 +167,13 @@ ROUTE_LIST = (
     ('/images/{name}/root_disk_size', {
         'GET': image.image_get_root_disk_size,
     }),
+    ('/jobs', {
+        'POST': job.job_submit,
+        'GET': job.job_list,
+    }),
+    ('/jobs/{job_id}', {
+        'GET': job.job_get,
+    }),
     ('/files', {
         'PUT': file.file_import,
         'POST': file.file_export,
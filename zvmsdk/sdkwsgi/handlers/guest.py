@@ -42,9 +42,12 @@ CONF = config.CONF
 
 class VMHandler(object):
     def __init__(self):
-        self.client = connector.ZVMConnector(connection_type='socket',
-                                             ip_addr=CONF.sdkserver.bind_addr,
-                                             port=CONF.sdkserver.bind_port)
+        self.client = connector.ZVMConnector(
+            connection_type='socket',
+            ip_addr=CONF.sdkserver.bind_addr,
+            port=CONF.sdkserver.bind_port,
+            persistent=CONF.sdkserver.persistent_connection,
+            pool_size=CONF.sdkserver.connection_pool_size)
 
     @validation.schema(guest.create)
     def create(self, body):
@@ -161,6 +164,12 @@ class VMHandler(object):
                                         userid_list)
         return info
 
+    @validation.query_schema(guest.userid_list_array_query)
+    def get_power_state_bulk(self, req, userid_list):
+        info = self.client.send_request('guest_get_power_state_bulk',
+                                        userid_list)
+        return info
+
     @validation.query_schema(guest.userid_list_array_query)
     def inspect_vnics(self, req, userid_list):
         info = self.client.send_request('guest_inspect_vnics',
@@ -268,9 +277,12 @@ class VMHandler(object):
 class VMAction(object):
 
     def __init__(self):
-        self.client = connector.ZVMConnector(connection_type='socket',
-                                             ip_addr=CONF.sdkserver.bind_addr,
-                                             port=CONF.sdkserver.bind_port)
+        self.client = connector.ZVMConnector(
+            connection_type='socket',
+            ip_addr=CONF.sdkserver.bind_addr,
+            port=CONF.sdkserver.bind_port,
+            persistent=CONF.sdkserver.persistent_connection,
+            pool_size=CONF.sdkserver.connection_pool_size)
         self.dd_semaphore = threading.BoundedSemaphore(
             value=CONF.wsgi.max_concurrent_deploy_capture)
 
@@ -303,6 +315,38 @@ class VMAction(object):
 
         return info
 
+    @validation.schema(guest.start_many)
+    def start_many(self, body):
+        timeout = body.get('timeout', 0)
+        info = self.client.send_request('guest_start_many',
+                                        body['userid_list'], timeout)
+
+        return info
+
+    @validation.schema(guest.stop_many)
+    def stop_many(self, body):
+        timeout = body.get('timeout', None)
+        poll_interval = body.get('poll_interval', None)
+
+        info = self.client.send_request('guest_stop_many',
+                                        body['userid_list'],
+                                        timeout=timeout,
+                                        poll_interval=poll_interval)
+
+        return info
+
+    @validation.schema(guest.stop_many)
+    def softstop_many(self, body):
+        timeout = body.get('timeout', None)
+        poll_interval = body.get('poll_interval', None)
+
+        info = self.client.send_request('guest_stop_many',
+                                        body['userid_list'], soft=True,
+                                        timeout=timeout,
+                                        poll_interval=poll_interval)
+
+        return info
+
     def pause(self, userid, body):
         info = self.client.send_request('guest_pause', userid)
 
@@ -755,6 +799,39 @@ def guest_action(req):
     return req.response
 
 
+@util.SdkWsgify
+@tokens.validate
+def guests_action(req):
+
+    def _guests_action(req):
+        action = get_action()
+        body = util.extract_json(req.body)
+        if len(body) == 0 or 'action' not in body:
+            msg = 'action not exist or is empty'
+            LOG.info(msg)
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+
+        method = body['action']
+        # The actions run on several guests at the same time
+        funcs = {'start': action.start_many,
+                 'stop': action.stop_many,
+                 'softstop': action.softstop_many}
+        if method in funcs:
+            body.pop('action')
+            return funcs[method](body=body)
+        else:
+            msg = 'action %s is invalid' % method
+            raise webob.exc.HTTPBadRequest(msg)
+
+    info = _guests_action(req)
+
+    info_json = json.dumps(info)
+    req.response.body = utils.to_utf8(info_json)
+    req.response.content_type = 'application/json'
+    req.response.status = util.get_http_code_from_sdk_return(info)
+    return req.response
+
+
 @util.SdkWsgify
 @tokens.validate
 def guest_delete(req):
@@ -907,6 +984,26 @@ def guest_get_stats(req):
     return req.response
 
 
+@util.SdkWsgify
+@tokens.validate
+def guest_get_power_state_bulk(req):
+
+    userid_list = _get_userid_list(req)
+
+    def _guest_get_power_state_bulk(req, userid_list):
+        action = get_handler()
+        return action.get_power_state_bulk(req, userid_list)
+
+    info = _guest_get_power_state_bulk(req, userid_list)
+
+    info_json = json.dumps(info)
+    req.response.status = util.get_http_code_from_sdk_return(info,
+        additional_handler=util.handle_not_found)
+    req.response.body = utils.to_utf8(info_json)
+    req.response.content_type = 'application/json'
+    return req.response
+
+
 @util.SdkWsgify
 @tokens.validate
 def guest_get_interface_stats(req):
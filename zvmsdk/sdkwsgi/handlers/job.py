@@ -0,0 +1,137 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Handler for the jobs of the sdk API."""
+import json
+
+from zvmconnector import connector
+from zvmsdk import config
+from zvmsdk import exception
+from zvmsdk import log
+from zvmsdk import utils
+from zvmsdk.sdkwsgi.handlers import tokens
+from zvmsdk.sdkwsgi.schemas import job
+from zvmsdk.sdkwsgi import util
+from zvmsdk.sdkwsgi import validation
+
+
+_JOBACTION = None
+CONF = config.CONF
+LOG = log.LOG
+
+# The validators of the params of each operation, compiled once
+_PARAMS_VALIDATORS = dict((operation, validation.validator(schema))
+                          for operation, schema in job.params.items())
+
+
+class JobAction(object):
+
+    def __init__(self):
+        self.client = connector.ZVMConnector(
+            connection_type='socket',
+            ip_addr=CONF.sdkserver.bind_addr,
+            port=CONF.sdkserver.bind_port,
+            persistent=CONF.sdkserver.persistent_connection,
+            pool_size=CONF.sdkserver.connection_pool_size)
+
+    @validation.schema(job.submit)
+    def submit(self, body):
+        job = body['job']
+        params = job.get('params', {})
+        _PARAMS_VALIDATORS[job['operation']].validate(params)
+        info = self.client.send_request('job_submit', job['operation'],
+                                        **params)
+        return info
+
+    def get(self, job_id, wait):
+        info = self.client.send_request('job_query', job_id, wait=wait)
+        return info
+
+    @validation.query_schema(job.query)
+    def list(self, req, target, state):
+        info = self.client.send_request('job_list', target=target,
+                                        state=state)
+        return info
+
+
+def get_action():
+    global _JOBACTION
+    if _JOBACTION is None:
+        _JOBACTION = JobAction()
+    return _JOBACTION
+
+
+@util.SdkWsgify
+@tokens.validate
+def job_submit(req):
+
+    def _job_submit(req):
+        action = get_action()
+        body = util.extract_json(req.body)
+        return action.submit(body=body)
+
+    info = _job_submit(req)
+
+    info_json = json.dumps(info)
+    req.response.body = utils.to_utf8(info_json)
+    req.response.status = util.get_http_code_from_sdk_return(info,
+                                                             default=202)
+    req.response.content_type = 'application/json'
+    return req.response
+
+
+@util.SdkWsgify
+@tokens.validate
+def job_get(req):
+
+    def _job_get(job_id, wait):
+        action = get_action()
+        return action.get(job_id, wait)
+
+    job_id = util.wsgi_path_item(req.environ, 'job_id')
+    wait = req.GET.get('wait', '0')
+    # The SDK server caps the wait, the client polls again when the job
+    # is not finished
+    if not wait.isdigit():
+        raise exception.ValidationError(
+            detail="wait should be a non-negative integer")
+    info = _job_get(job_id, int(wait))
+
+    info_json = json.dumps(info)
+    req.response.body = utils.to_utf8(info_json)
+    req.response.status = util.get_http_code_from_sdk_return(info)
+    req.response.content_type = 'application/json'
+    return req.response
+
+
+@util.SdkWsgify
+@tokens.validate
+def job_list(req):
+
+    def _job_list(req, target, state):
+        action = get_action()
+        return action.list(req, target, state)
+
+    target = req.GET.get('target')
+    state = req.GET.get('state')
+    info = _job_list(req, target, state)
+
+    info_json = json.dumps(info)
+    req.response.body = utils.to_utf8(info_json)
+    req.response.status = util.get_http_code_from_sdk_return(info)
+    req.response.content_type = 'application/json'
+    return req.response
@@ -17,11 +17,13 @@
 
 """Handler for the root of the sdk API."""
 
+import collections
 import datetime
 import functools
 import jwt
 import os
 import threading
+import time
 
 from zvmsdk import config
 from zvmsdk import exception
@@ -35,24 +37,82 @@ LOG = log.LOG
 DEFAULT_TOKEN_VALIDATION_PERIOD = 3600
 TOKEN_LOCK = threading.Lock()
 
+# Seconds between two checks of the admin token file for a change
+ADMIN_TOKEN_CHECK_INTERVAL = 1
+# The admin token last read, with the file it was read from
+_ADMIN_TOKEN = {'path': None, 'stat': None, 'token': None, 'checked': 0}
 
-def get_admin_token(path):
-    if os.path.exists(path):
-        TOKEN_LOCK.acquire()
-        try:
-            with open(path, 'r') as fd:
-                token = fd.read().strip()
-        except Exception:
-            LOG.debug('token file open failed.')
-            raise exception.ZVMUnauthorized()
-        finally:
-            TOKEN_LOCK.release()
-    else:
+# Max number of the user tokens kept once verified
+VERIFIED_TOKENS_SIZE = 1024
+# (admin token, user token) -> when the user token expires, None when it
+# does not expire. The admin token is in the key so that a user token
+# verified with a former admin token is never accepted with a new one.
+_VERIFIED_TOKENS = collections.OrderedDict()
+_VERIFIED_TOKENS_LOCK = threading.Lock()
+
+
+def _read_admin_token(path):
+    try:
+        st = os.stat(path)
+    except OSError:
         LOG.debug('token configuration file not found.')
         raise exception.ZVMUnauthorized()
+    stat = (st.st_mtime, st.st_size, st.st_ino)
+    if path == _ADMIN_TOKEN['path'] and stat == _ADMIN_TOKEN['stat']:
+        return _ADMIN_TOKEN['token']
+    try:
+        with open(path, 'r') as fd:
+            token = fd.read().strip()
+    except Exception:
+        LOG.debug('token file open failed.')
+        raise exception.ZVMUnauthorized()
+    if token != _ADMIN_TOKEN['token']:
+        # Free the user tokens verified with the former admin token, they
+        # can not match the new one anyway
+        with _VERIFIED_TOKENS_LOCK:
+            _VERIFIED_TOKENS.clear()
+    _ADMIN_TOKEN.update(path=path, stat=stat, token=token)
+    return token
+
+
+def get_admin_token(path):
+    """Get the admin token from the token file.
+
+    The token is kept in memory, the file is read again when its mtime or
+    size changes, checked at most every ADMIN_TOKEN_CHECK_INTERVAL seconds.
+    """
+    now = time.time()
+    if (path == _ADMIN_TOKEN['path'] and
+            now - _ADMIN_TOKEN['checked'] < ADMIN_TOKEN_CHECK_INTERVAL):
+        return _ADMIN_TOKEN['token']
+    with TOKEN_LOCK:
+        token = _read_admin_token(path)
+        _ADMIN_TOKEN['checked'] = now
     return token
 
 
+def _is_verified(admin_token, user_token):
+    key = (admin_token, user_token)
+    with _VERIFIED_TOKENS_LOCK:
+        if key not in _VERIFIED_TOKENS:
+            return False
+        expires = _VERIFIED_TOKENS[key]
+        if expires is not None and time.time() >= expires:
+            del _VERIFIED_TOKENS[key]
+            return False
+        _VERIFIED_TOKENS.move_to_end(key)
+        return True
+
+
+def _add_verified(admin_token, user_token, expires):
+    key = (admin_token, user_token)
+    with _VERIFIED_TOKENS_LOCK:
+        _VERIFIED_TOKENS[key] = expires
+        _VERIFIED_TOKENS.move_to_end(key)
+        while len(_VERIFIED_TOKENS) > VERIFIED_TOKENS_SIZE:
+            _VERIFIED_TOKENS.popitem(last=False)
+
+
 @util.SdkWsgify
 def create(req):
     # Check if token validation closed
@@ -101,8 +161,12 @@ def validate(function):
 
         token_file_path = CONF.wsgi.token_path
         admin_token = get_admin_token(token_file_path)
+        user_token = req.headers['X-Auth-Token']
+        if _is_verified(admin_token, user_token):
+            return function(req, *args, **kwargs)
         try:
-            jwt.decode(req.headers['X-Auth-Token'], admin_token, algorithms="HS256")
+            payload = jwt.decode(user_token, admin_token, algorithms="HS256")
+            _add_verified(admin_token, user_token, payload.get('exp'))
         except jwt.ExpiredSignatureError:
             LOG.debug('token validation failed because it is expired')
             raise exception.ZVMUnauthorized()
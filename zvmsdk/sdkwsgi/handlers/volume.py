@@ -36,9 +36,12 @@ LOG = log.LOG
 
 class VolumeAction(object):
     def __init__(self):
-        self.client = connector.ZVMConnector(connection_type='socket',
-                                             ip_addr=CONF.sdkserver.bind_addr,
-                                             port=CONF.sdkserver.bind_port)
+        self.client = connector.ZVMConnector(
+            connection_type='socket',
+            ip_addr=CONF.sdkserver.bind_addr,
+            port=CONF.sdkserver.bind_port,
+            persistent=CONF.sdkserver.persistent_connection,
+            pool_size=CONF.sdkserver.connection_pool_size)
 
     @validation.schema(volume.attach)
     def attach(self, body):
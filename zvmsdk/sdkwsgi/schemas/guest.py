@@ -329,3 +329,32 @@ softstop = {
     },
     'additionalProperties': False,
 }
+
+start_many = {
+    'type': 'object',
+    'properties': {
+        'userid_list': {
+            'type': 'array',
+            'items': parameter_types.userid,
+            'minItems': 1,
+        },
+        'timeout': parameter_types.non_negative_integer,
+    },
+    'required': ['userid_list'],
+    'additionalProperties': False,
+}
+
+stop_many = {
+    'type': 'object',
+    'properties': {
+        'userid_list': {
+            'type': 'array',
+            'items': parameter_types.userid,
+            'minItems': 1,
+        },
+        'timeout': parameter_types.non_negative_integer,
+        'poll_interval': parameter_types.non_negative_integer,
+    },
+    'required': ['userid_list'],
+    'additionalProperties': False,
+}
@@ -0,0 +1,110 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from zvmsdk.sdkwsgi.schemas import guest
+from zvmsdk.sdkwsgi.schemas import image
+from zvmsdk.sdkwsgi.schemas import volume
+from zvmsdk.sdkwsgi.validation import parameter_types
+
+
+submit = {
+    'type': 'object',
+    'properties': {
+        'job': {
+            'type': 'object',
+            'properties': {
+                'operation': {
+                    'type': 'string',
+                    'enum': ['guest_create', 'guest_deploy', 'guest_capture',
+                             'guest_live_migrate', 'image_import',
+                             'volume_attach', 'volume_attach_many']
+                },
+                'params': {'type': 'object'}
+            },
+            'required': ['operation'],
+            'additionalProperties': False
+        },
+    },
+    'required': ['job'],
+    'additionalProperties': False
+}
+
+
+def _params(properties, required):
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': required,
+        'additionalProperties': False
+    }
+
+
+# The params of each operation are checked with the schemas of the REST
+# route of the operation, with the keys renamed to the API parameters.
+_create = dict(guest.create['properties']['guest']['properties'])
+_create['comment_list'] = _create.pop('comments')
+
+_deploy = dict(guest.deploy['properties'])
+_deploy['image_name'] = _deploy.pop('image')
+_deploy.update({'userid': parameter_types.userid,
+                'disk_pool': parameter_types.disk_pool})
+
+_capture = dict(guest.capture['properties'])
+_capture['image_name'] = _capture.pop('image')
+_capture['userid'] = parameter_types.userid
+
+_live_migrate = dict(guest.live_migrate_vm['properties'])
+_live_migrate['lgr_action'] = _live_migrate.pop('operation')
+_live_migrate['userid'] = parameter_types.userid
+
+params = {
+    'guest_create': _params(_create, ['userid', 'vcpus', 'memory']),
+    'guest_deploy': _params(_deploy, ['userid', 'image_name']),
+    'guest_capture': _params(_capture, ['userid', 'image_name']),
+    'guest_live_migrate': _params(
+        _live_migrate,
+        ['userid', 'dest_zcc_userid', 'destination', 'parms',
+         'lgr_action']),
+    'image_import': _params(
+        image.create['properties']['image']['properties'],
+        ['image_name', 'url', 'image_meta']),
+    'volume_attach': _params(
+        {'connection_info':
+            volume.attach['properties']['info']['properties']['connection']},
+        ['connection_info']),
+    'volume_attach_many': _params(
+        {'userid': parameter_types.userid,
+         'connection_infos': {
+             'type': 'array',
+             'minItems': 1,
+             'items': parameter_types.connection_info}},
+        ['userid', 'connection_infos']),
+}
+
+
+query = {
+    'type': 'object',
+    'properties': {
+        'target': parameter_types.single_param({'type': 'string',
+                                                'minLength': 1,
+                                                'maxLength': 255}),
+        'state': parameter_types.single_param({
+            'type': 'string',
+            'enum': ['queued', 'running', 'succeeded', 'failed']}),
+    },
+    'additionalProperties': False
+}
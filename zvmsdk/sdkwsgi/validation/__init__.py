@@ -27,19 +27,24 @@ import six
 from zvmsdk import exception
 
 
-def _schema_validation_helper(schema, target, args, kwargs, is_body=True):
-    schema_validator = _SchemaValidator(
-        schema, is_body=is_body)
+def _schema_validation_helper(schema_validator, target):
     schema_validator.validate(target)
 
 
+def validator(target_schema):
+    """Compile a schema, the validate method of the returned validator
+    raises ValidationError when the target does not match."""
+    return _SchemaValidator(target_schema)
+
+
 def schema(request_body_schema):
+    # The schema is compiled once, its validator is shared by the requests
+    schema_validator = _SchemaValidator(request_body_schema)
 
     def add_validator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            _schema_validation_helper(request_body_schema, kwargs['body'],
-                                      args, kwargs)
+            _schema_validation_helper(schema_validator, kwargs['body'])
             return func(*args, **kwargs)
         return wrapper
 
@@ -68,22 +73,29 @@ class FormatChecker(jsonschema.FormatChecker):
 class _SchemaValidator(object):
     validator = None
     validator_org = jsonschema.Draft4Validator
+    # The validator class extended with the custom keywords, and the
+    # format checker, they are built once and shared by all the schemas
+    _validator_cls = None
+    _format_checker = None
 
     def __init__(self, schema, relax_additional_properties=False,
                  is_body=True):
         self.is_body = is_body
 
-        validators = {
-            'dummy': self._dummy
-        }
+        cls = type(self)
+        if cls._validator_cls is None:
+            validators = {
+                'dummy': cls._dummy
+            }
+            cls._validator_cls = jsonschema.validators.extend(
+                self.validator_org, validators)
+            cls._format_checker = FormatChecker()
 
-        validator_cls = jsonschema.validators.extend(self.validator_org,
-                                                     validators)
+        self.validator = cls._validator_cls(
+            schema, format_checker=cls._format_checker)
 
-        format_checker = FormatChecker()
-        self.validator = validator_cls(schema, format_checker=format_checker)
-
-    def _dummy(self, validator, minimum, instance, schema):
+    @staticmethod
+    def _dummy(validator, minimum, instance, schema):
         pass
 
     def validate(self, *args, **kwargs):
@@ -134,6 +146,8 @@ def query_schema(query_params_schema, min_version=None,
                  max_version=None):
     """Register a schema to validate request query parameters."""
 
+    schema_validator = _SchemaValidator(query_params_schema, is_body=False)
+
     def add_validator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
@@ -143,15 +157,13 @@ def query_schema(query_params_schema, min_version=None,
                 req = args[1]
 
             if req.environ['wsgiorg.routing_args'][1]:
-                if _schema_validation_helper(query_params_schema,
-                                        req.environ['wsgiorg.routing_args'][1],
-                                        args, kwargs, is_body=False):
+                if _schema_validation_helper(schema_validator,
+                                        req.environ['wsgiorg.routing_args'][1]):
                     _remove_unexpected_query_parameters(query_params_schema,
                                                          req)
             else:
-                if _schema_validation_helper(query_params_schema,
-                                            req.GET.dict_of_lists(),
-                                            args, kwargs, is_body=False):
+                if _schema_validation_helper(schema_validator,
+                                            req.GET.dict_of_lists()):
                     _remove_unexpected_query_parameters(query_params_schema,
                                                          req)
             return func(*args, **kwargs)
@@ -15,9 +15,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import binascii
 import functools
 import hashlib
+import json
 import math
+from concurrent import futures
 # On SLES12, we found that if you import urllib.parse later
 # than requests, you will find a error like 'not able to load
 # urllib.parse, this is because urllib will be in sys.modules
@@ -32,6 +35,7 @@ import requests
 import threading
 import os
 import re
+import shlex
 import six
 import string
 import subprocess
@@ -54,6 +58,10 @@ LOG = log.LOG
 
 _LOCK = threading.Lock()
 CHUNKSIZE = 4096
+# Buffer size of the image import pipeline, a multiple of the page size
+IMPORT_CHUNKSIZE = 4 * 1024 * 1024
+# Bytes of the image header holding the root disk size and units
+IMAGE_HEADER_SIZE = 48
 
 DIRMAINT_ERROR_MESSAGE = ("https://www-40.ibm.com/servers/resourcelink/"
     "svc0302a.nsf/pages/zVMV7R2gc246282?OpenDocument")
@@ -85,6 +93,9 @@ class SMTClient(object):
         self._GuestDbOperator = database.GuestDbOperator()
         self._ImageDbOperator = database.ImageDbOperator()
         self._FCPDbOperator = database.FCPDbOperator()
+        # image file -> ((mtime, size), header) of the deployed images
+        self._image_headers = {}
+        self._image_headers_lock = threading.Lock()
 
     def _request(self, requestData):
         try:
@@ -537,6 +548,17 @@ class SMTClient(object):
             status = results['response'][0].partition(': ')[2]
         return status
 
+    def get_power_state_bulk(self, userid_list):
+        """Get power status of several z/VM instances with one CP query.
+
+        A guest is on when it is listed by 'query names', on this
+        host or on another SSI member, the same as 'PowerVM status'.
+        """
+        LOG.debug('Querying power stat of %s' % userid_list)
+        names = zvmutils.query_names()
+        return dict((userid, 'on' if userid.upper() in names else 'off')
+                    for userid in userid_list)
+
     def _check_power_state(self, userid, action):
         # Get the vm status
         power_state = self.get_power_state(userid)
@@ -1024,9 +1046,35 @@ class SMTClient(object):
                     paths_dict[fcp] = wwpn_list
         return paths_dict
 
+    def _get_image_header(self, image_file):
+        """Get the first 64 bytes of an image file, they are read once
+        per image file rather than on every deploy."""
+        try:
+            stat = os.stat(image_file)
+        except OSError as err:
+            LOG.warning("Failed to get the header of image file %s: %s"
+                        % (image_file, six.text_type(err)))
+            return None
+        key = (stat.st_mtime, stat.st_size)
+        with self._image_headers_lock:
+            cached = self._image_headers.get(image_file)
+            if cached and cached[0] == key:
+                return cached[1]
+        with open(image_file, 'rb') as f:
+            header = f.read(64)
+        with self._image_headers_lock:
+            self._image_headers[image_file] = (key, header)
+        return header
+
     def guest_deploy(self, userid, image_name, transportfiles=None,
-                     remotehost=None, vdev=None, skipdiskcopy=False):
-        """ Deploy image and punch config driver to target """
+                     remotehost=None, vdev=None, skipdiskcopy=False,
+                     progress=None):
+        """ Deploy image and punch config driver to target
+
+        :param progress: called with the percentage done and the step being
+               run as the deploy goes on
+        """
+        progress = progress or (lambda percent, step: None)
         # (TODO: add the support of multiple disks deploy)
         if skipdiskcopy:
             msg = ('Start guest_deploy without unpackdiskimage, guest: %(vm)s'
@@ -1038,12 +1086,11 @@ class SMTClient(object):
             LOG.info(msg)
             image_file = '/'.join([self._get_image_path_by_name(image_name),
                                    CONF.zvm.user_root_vdev])
-            cmd = ['/usr/bin/hexdump', '-C', '-n', '64', image_file]
-            with zvmutils.expect_and_reraise_internal_error(modID='guest'):
-                (rc, output) = zvmutils.execute(cmd)
-                msg = ('Image header info in guest_deploy: rc: %d, header:\n%s'
-                       % (rc, output))
-                LOG.info(msg)
+            header = self._get_image_header(image_file)
+            if header is not None:
+                LOG.info('Image header info in guest_deploy: %s'
+                         % binascii.hexlify(header).decode())
+            progress(10, 'unpacking image')
             # Unpack image file to root disk
             vdev = vdev or CONF.zvm.user_root_vdev
             cmd = ['sudo', '/opt/zthin/bin/unpackdiskimage', userid, vdev,
@@ -1067,6 +1114,7 @@ class SMTClient(object):
             # Copy transport file to local
             msg = ('Start to send customized file to vm %s' % userid)
             LOG.info(msg)
+            progress(70, 'punching transport files')
 
             try:
                 tmp_trans_dir = tempfile.mkdtemp()
@@ -1100,6 +1148,7 @@ class SMTClient(object):
                 # remove the local temp config drive folder
                 self._pathutils.clean_temp_folder(tmp_trans_dir)
         # Authorize iucv client
+        progress(90, 'authorizing iucv client')
         client_id = None
         # try to re-use previous iucv authorized userid at first
         if os.path.exists(const.IUCV_AUTH_USERID_PATH):
@@ -1129,8 +1178,9 @@ class SMTClient(object):
 
     def guest_deploy_rhcos(self, userid, image_name, transportfiles,
                            remotehost=None, vdev=None, hostname=None,
-                           skipdiskcopy=False):
+                           skipdiskcopy=False, progress=None):
         """ Deploy image"""
+        progress = progress or (lambda percent, step: None)
         # (TODO: add the support of multiple disks deploy)
         if transportfiles is None:
             err_msg = 'Ignition file is required when deploying RHCOS image'
@@ -1174,6 +1224,7 @@ class SMTClient(object):
                                                            err_info=err_msg)
                 transportfiles = local_trans
 
+            progress(10, 'unpacking image')
             cmd = self._get_unpackdiskimage_cmd_rhcos(userid, image_name,
                                                       transportfiles, vdev,
                                                       image_file, hostname,
@@ -2586,9 +2637,6 @@ class SMTClient(object):
     def delete_vm(self, userid):
         self.delete_userid(userid)
 
-        # remove userid from smapi namelist
-        self.namelist_remove(zvmutils.get_namelist(), userid)
-
         # revoke userid from vswitch
         action = "revoke id %s authority from vswitch" % userid
         with zvmutils.log_and_reraise_sdkbase_error(action):
@@ -2694,7 +2742,10 @@ class SMTClient(object):
         try:
             import_image_fn = urlparse.urlparse(url).path.split('/')[-1]
             import_image_fpath = '/'.join([target_folder, import_image_fn])
-            self._scheme2backend(urlparse.urlparse(url).scheme).image_import(
+            # The backend streams the image to import_image_fpath, its
+            # md5sum, size and header are got on the way.
+            imported = self._scheme2backend(
+                urlparse.urlparse(url).scheme).image_import(
                                                     image_name, url,
                                                     import_image_fpath,
                                                     remote_host=remote_host)
@@ -2702,7 +2753,7 @@ class SMTClient(object):
             # Check md5 after import to ensure import a correct image
             # TODO change to use query image name in DB
             expect_md5sum = image_meta.get('md5sum')
-            real_md5sum = self._get_md5sum(import_image_fpath)
+            real_md5sum = imported.md5sum
             if expect_md5sum and expect_md5sum != real_md5sum:
                 msg = ("The md5sum after import is not same as source image,"
                        " the image has been broken")
@@ -2728,11 +2779,12 @@ class SMTClient(object):
             # TODO: put multiple disk image into consideration, update the
             # disk_size_units and image_size db field
             if not self.is_rhcos(image_os_version):
-                disk_size_units = self._get_disk_size_units(final_image_fpath)
+                disk_size_units = self._parse_disk_size_units(
+                                        imported.header, final_image_fpath)
             else:
-                disk_size_units = self._get_disk_size_units_rhcos(
-                                                            final_image_fpath)
-            image_size = self._get_image_size(final_image_fpath)
+                disk_size_units = self._size_to_disk_size_units_rhcos(
+                                                            imported.size)
+            image_size = str(imported.size)
 
             # TODO: update the real_md5sum field to include each disk image
             self._ImageDbOperator.image_add_record(image_name,
@@ -2836,6 +2888,28 @@ class SMTClient(object):
         LOG.debug("The image's root_disk_units is %s" % root_disk_units)
         return root_disk_units
 
+    def _parse_disk_size_units(self, header, image_path):
+        """Get the root disk size and units from the first
+        IMAGE_HEADER_SIZE bytes of an image, the same fields read by
+        _get_disk_size_units from the hexdump of the image."""
+        header = header[:IMAGE_HEADER_SIZE].decode('latin-1')
+        try:
+            root_disk_size = int(header[20:32])
+            disk_units = header[33:36]
+            root_disk_units = ':'.join([str(root_disk_size), disk_units])
+        except ValueError:
+            msg = ("Image file at %s is missing built-in disk size "
+                   "metadata, it was probably not captured by SDK" %
+                   image_path)
+            LOG.error(msg)
+            raise exception.SDKImageOperationError(rs=6)
+
+        if 'FBA' not in header and 'CKD' not in header:
+            raise exception.SDKImageOperationError(rs=7)
+
+        LOG.debug("The image's root_disk_units is %s" % root_disk_units)
+        return root_disk_units
+
     def _get_disk_size_units_rhcos(self, image_path):
         command = "fdisk -b 4096 -l %s | head -2 | awk '{print $5}'" % (
                                                                 image_path)
@@ -2863,7 +2937,10 @@ class SMTClient(object):
             raise exception.SDKImageOperationError(rs=8)
 
         image_size = output.split()[0]
+        return self._size_to_disk_size_units_rhcos(image_size)
 
+    def _size_to_disk_size_units_rhcos(self, image_size):
+        """Convert the size in bytes of a RHCOS image to cylinders."""
         try:
             cyl = (float(image_size)) / 737280
             cyl = str(int(math.ceil(cyl)))
@@ -3691,17 +3768,21 @@ class SMTClient(object):
             LOG.warning(six.text_type(err))
 
     def namelist_add(self, namelist, userid):
+        """Add userid to the namelist, return whether it succeeded."""
         rd = ''.join(("SMAPI %s API Name_List_Add " % namelist,
                       "--operands -n %s" % userid))
-        self._request_with_error_ignored(rd)
+        return self._request_with_error_ignored(rd) is not None
 
     def namelist_remove(self, namelist, userid):
+        """Remove userid from the namelist, return whether it succeeded."""
         rd = ''.join(("SMAPI %s API Name_List_Remove " % namelist,
                       "--operands -n %s" % userid))
-        self._request_with_error_ignored(rd)
+        return self._request_with_error_ignored(rd) is not None
 
-    def namelist_query(self, namelist):
+    def namelist_query(self, namelist, raise_exception=False):
         rd = "SMAPI %s API Name_List_Query" % namelist
+        if raise_exception:
+            return self._request(rd)['response']
         resp = self._request_with_error_ignored(rd)
         if resp is not None:
             return resp['response']
@@ -4590,27 +4671,121 @@ class SMTClient(object):
         return ''
 
 
+class ImageImportStream(object):
+    """Write an image being imported to the image repository.
+
+    The md5sum and the size of the image are computed and its header is
+    kept while the image is written, so the imported image is not read
+    again.
+    """
+
+    def __init__(self, target, resume=False):
+        self.target = target
+        self.size = 0
+        self.header = b''
+        self._md5 = hashlib.md5()
+        if resume and os.path.exists(target):
+            self._fh = open(target, 'r+b')
+        else:
+            self._fh = open(target, 'wb')
+
+    @property
+    def md5sum(self):
+        return self._md5.hexdigest()
+
+    def update(self, data):
+        """Account data following the data accounted so far, without
+        writing it."""
+        if len(self.header) < IMAGE_HEADER_SIZE:
+            self.header += bytes(data[:IMAGE_HEADER_SIZE - len(self.header)])
+        self._md5.update(data)
+        self.size += len(data)
+
+    def update_from_file(self, offset, length):
+        """Account length bytes already written at offset."""
+        fd = self._fh.fileno()
+        end = offset + length
+        while offset < end:
+            data = os.pread(fd, min(IMPORT_CHUNKSIZE, end - offset), offset)
+            if not data:
+                raise IOError("%s is shorter than %s bytes" %
+                              (self.target, end))
+            self.update(data)
+            offset += len(data)
+
+    def write(self, data):
+        self.update(data)
+        self._fh.write(data)
+
+    def pwrite(self, data, offset):
+        """Write data at offset, it can be called by several threads.
+
+        The data is not accounted, update is called for it once the data
+        before it is accounted.
+        """
+        fd = self._fh.fileno()
+        view = memoryview(data)
+        while view:
+            n = os.pwrite(fd, view, offset)
+            view = view[n:]
+            offset += n
+
+    def copy_from(self, source):
+        """Write all the data read from the file object source."""
+        buf = bytearray(IMPORT_CHUNKSIZE)
+        view = memoryview(buf)
+        while True:
+            n = source.readinto(buf)
+            if not n:
+                break
+            self.write(view[:n])
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 class FilesystemBackend(object):
     @classmethod
     def image_import(cls, image_name, url, target, **kwargs):
-        """Import image from remote host to local image repository using scp.
+        """Import image from remote host to local image repository using ssh.
         If remote_host not specified, it means the source file exist in local
         file system, just copy the image to image repository
+
+        :returns: the ImageImportStream the image was written with
         """
         source = urlparse.urlparse(url).path
         if kwargs['remote_host']:
             if '@' in kwargs['remote_host']:
-                source_path = ':'.join([kwargs['remote_host'], source])
-                command = ' '.join(['/usr/bin/scp',
-                                    "-P", CONF.zvm.remotehost_sshd_port,
-                                    "-o StrictHostKeyChecking=no",
-                                    '-r ', source_path, target])
-                (rc, output) = zvmutils.execute(command)
-                if rc:
+                # Stream the image through ssh rather than scp it, so the
+                # image is checked while it is written.
+                command = ['/usr/bin/ssh',
+                           '-p', CONF.zvm.remotehost_sshd_port,
+                           '-o', 'StrictHostKeyChecking=no',
+                           kwargs['remote_host'],
+                           'cat %s' % shlex.quote(source)]
+                with ImageImportStream(target) as stream:
+                    proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE,
+                                            close_fds=True)
+                    try:
+                        stream.copy_from(proc.stdout)
+                    finally:
+                        proc.stdout.close()
+                        output = proc.stderr.read()
+                        proc.wait()
+                if proc.returncode:
+                    output = output.decode('utf-8', 'replace')
                     msg = ("Copying image file from remote filesystem failed"
                            " with reason: %s" % output)
                     LOG.error(msg)
                     raise exception.SDKImageOperationError(rs=10, err=output)
+                return stream
             else:
                 msg = ("The specified remote_host %s format invalid" %
                         kwargs['remote_host'])
@@ -4620,7 +4795,10 @@ class FilesystemBackend(object):
         else:
             LOG.debug("Remote_host not specified, will copy from local")
             try:
-                shutil.copyfile(source, target)
+                with open(source, 'rb') as src:
+                    with ImageImportStream(target) as stream:
+                        stream.copy_from(src)
+                return stream
             except Exception as err:
                 msg = ("Import image from local file system failed"
                        " with reason %s" % six.text_type(err))
@@ -4663,21 +4841,68 @@ class FilesystemBackend(object):
 class HTTPBackend(object):
     @classmethod
     def image_import(cls, image_name, url, target, **kwargs):
-        import_image = MultiThreadDownloader(image_name, url,
-                                             target)
-        import_image.run()
+        """Download the image over http to the local image repository.
 
+        :returns: the ImageImportStream the image was written with
+        """
+        return MultiThreadDownloader(image_name, url, target).run()
+
+
+# Connect and read timeout of the requests downloading images
+HTTP_TIMEOUT = (30, 300)
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+def get_http_session():
+    """Get the requests session shared by the image downloads, its
+    connection pool holds a connection per download thread."""
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            pool_size = max(CONF.image.download_workers, 1)
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+
+class MultiThreadDownloader(object):
+    """Download an image with ranged requests of a chunk each, several
+    chunks at a time.
+
+    The chunks are written at their position in the file as they arrive
+    and accounted by the ImageImportStream in order, at most twice
+    download_workers chunks are held in memory. The image is downloaded to
+    the downloads folder of the image repository, along with a state file
+    recording the downloaded chunks, so a failed download is resumed by a
+    later import of the same url when the server identifies the image
+    version with an ETag or a Last-Modified header. The downloads not
+    resumed for [image] download_max_age seconds are removed.
+    """
 
-class MultiThreadDownloader(threading.Thread):
     def __init__(self, image_name, url, target):
-        super(MultiThreadDownloader, self).__init__()
+        self.image_name = image_name
         self.url = url
-        # Set thread number
-        self.threadnum = 8
-        r = requests.head(self.url)
-        # Get the size of the download resource
-        self.totalsize = int(r.headers['Content-Length'])
         self.target = target
+        self.workers = max(CONF.image.download_workers, 1)
+        self.chunksize = max(CONF.image.download_chunk_size, 1) * 1024 * 1024
+        self.retries = max(CONF.image.download_retries, 0)
+        self.session = get_http_session()
+        download_dir = os.path.join(CONF.image.sdk_image_repository,
+                                    'downloads')
+        if not os.path.isdir(download_dir):
+            os.makedirs(download_dir)
+        self._remove_expired(download_dir)
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        self.part_path = os.path.join(download_dir, name)
+        self.state_path = self.part_path + '.state'
+        self.totalsize = None
+        self.validator = ''
+        self.done = set()
 
     def handle_download_errors(func):
         @functools.wraps(func)
@@ -4685,7 +4910,6 @@ class MultiThreadDownloader(threading.Thread):
             try:
                 return func(self, *args, **kwargs)
             except Exception as err:
-                self.fd.close()
                 msg = ("Download image from http server failed: %s" %
                        six.text_type(err))
                 LOG.error(msg)
@@ -4693,44 +4917,179 @@ class MultiThreadDownloader(threading.Thread):
                                                     err=six.text_type(err))
         return wrapper
 
-    def get_range(self):
-        ranges = []
-        offset = int(self.totalsize / self.threadnum)
-        for i in range(self.threadnum):
-            if i == self.threadnum - 1:
-                ranges.append((i * offset, ''))
-            else:
-                # Get the process range for each thread
-                ranges.append((i * offset, (i + 1) * offset))
-        return ranges
-
-    def download(self, start, end):
-        headers = {'Range': 'Bytes=%s-%s' % (start, end),
-                   'Accept-Encoding': '*'}
-        # Get the data
-        res = requests.get(self.url, headers=headers)
-        # seek to the right position for writing data
-        LOG.debug("Downloading file range %s:%s success" % (start, end))
-
-        with _LOCK:
-            self.fd.seek(start)
-            self.fd.write(res.content)
+    @staticmethod
+    def _remove_expired(download_dir):
+        if CONF.image.download_max_age <= 0:
+            return
+        expiration = time.time() - CONF.image.download_max_age
+        for name in os.listdir(download_dir):
+            path = os.path.join(download_dir, name)
+            try:
+                if os.path.getmtime(path) < expiration:
+                    LOG.info("Removing the expired partial download %s" %
+                             path)
+                    os.remove(path)
+            except OSError as err:
+                # Removed by another import meanwhile
+                LOG.debug("Failed to remove %s: %s" %
+                          (path, six.text_type(err)))
+
+    def _load_state(self):
+        """Get the chunks downloaded by a former import of the url, when
+        the image did not change since."""
+        # Without validator a changed image can not be told apart
+        if not self.validator:
+            return set()
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return set()
+        if (state.get('url') != self.url or
+                state.get('size') != self.totalsize or
+                state.get('validator') != self.validator or
+                state.get('chunk_size') != self.chunksize or
+                not os.path.exists(self.part_path)):
+            return set()
+        return set(state.get('done', []))
+
+    def _save_state(self):
+        state = {'url': self.url, 'size': self.totalsize,
+                 'validator': self.validator, 'chunk_size': self.chunksize,
+                 'done': sorted(self.done)}
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp_path, self.state_path)
+
+    def _clean_state(self):
+        for path in (self.state_path, self.part_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def download(self, stream, index):
+        """Download a chunk and write it to the stream, the request is
+        retried from where it stopped when it fails."""
+        start = index * self.chunksize
+        end = min(start + self.chunksize, self.totalsize)
+        data = bytearray()
+        attempt = 0
+        while start + len(data) < end:
+            offset = start + len(data)
+            headers = {'Range': 'bytes=%s-%s' % (offset, end - 1),
+                       'Accept-Encoding': 'identity'}
+            try:
+                with self.session.get(self.url, headers=headers, stream=True,
+                                      timeout=HTTP_TIMEOUT) as res:
+                    res.raise_for_status()
+                    if res.status_code != 206:
+                        raise IOError("the http server does not support "
+                                      "ranged requests")
+                    for piece in res.iter_content(IMPORT_CHUNKSIZE):
+                        piece = piece[:end - offset]
+                        stream.pwrite(piece, offset)
+                        data += piece
+                        offset += len(piece)
+                if start + len(data) < end:
+                    raise requests.exceptions.ChunkedEncodingError(
+                        "the response ended at %s, before %s" % (offset, end))
+            except requests.exceptions.RequestException as err:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                LOG.warning("Downloading file range %s:%s failed: %s, "
+                            "retrying from %s" % (start, end - 1,
+                                                  six.text_type(err), offset))
+                time.sleep(min(2 ** attempt, 30))
+        LOG.debug("Downloading file range %s:%s success" % (start, end - 1))
+        return data
+
+    def _download_sequential(self):
+        with ImageImportStream(self.part_path) as stream:
+            with self.session.get(self.url, stream=True,
+                                  timeout=HTTP_TIMEOUT) as res:
+                res.raise_for_status()
+                for piece in res.iter_content(IMPORT_CHUNKSIZE):
+                    stream.write(piece)
+        return stream
+
+    def _download_chunks(self):
+        resumed = self._load_state()
+        self.done = set(resumed)
+        if resumed:
+            LOG.info("Resuming the download of %s, %s chunks were "
+                     "downloaded" % (self.url, len(resumed)))
+        nchunks = int(math.ceil(float(self.totalsize) / self.chunksize))
+        window = 2 * self.workers
+        pending = {}
+        running = {}
+        cursor = 0
+        next_chunk = 0
+        with ImageImportStream(self.part_path, resume=bool(resumed)) as stream:
+            self._save_state()
+            executor = futures.ThreadPoolExecutor(self.workers)
+            try:
+                while True:
+                    # Account the chunks following the accounted ones
+                    while cursor < nchunks:
+                        if cursor in pending:
+                            stream.update(pending.pop(cursor))
+                        elif cursor in resumed:
+                            start = cursor * self.chunksize
+                            stream.update_from_file(
+                                start,
+                                min(self.chunksize, self.totalsize - start))
+                        else:
+                            break
+                        cursor += 1
+                    if cursor == nchunks:
+                        break
+                    while (next_chunk < nchunks and
+                           next_chunk < cursor + window):
+                        if next_chunk not in resumed:
+                            future = executor.submit(self.download, stream,
+                                                     next_chunk)
+                            running[future] = next_chunk
+                        next_chunk += 1
+                    finished, _ = futures.wait(
+                        running, return_when=futures.FIRST_COMPLETED)
+                    for future in finished:
+                        index = running.pop(future)
+                        pending[index] = future.result()
+                        self.done.add(index)
+                    self._save_state()
+            finally:
+                for future in running:
+                    future.cancel()
+                executor.shutdown(wait=True)
+                if running:
+                    # Record the chunks downloaded before the failure
+                    self.done.update(running[f] for f in running
+                                     if f.done() and not f.cancelled() and
+                                     f.exception() is None)
+                    self._save_state()
+        return stream
 
     @handle_download_errors
     def run(self):
-        self.fd = open(self.target, 'w')
-        thread_list = []
-        n = 0
-        for ran in self.get_range():
-            start, end = ran
-            LOG.debug('thread %d start:%s,end:%s' % (n, start, end))
-            n += 1
-            # Open thread
-            thread = threading.Thread(target=self.download, args=(start, end))
-            thread.start()
-            thread_list.append(thread)
-
-        for i in thread_list:
-            i.join()
-        LOG.info('Download %s success' % (self.name))
-        self.fd.close()
+        res = self.session.head(self.url, allow_redirects=True,
+                                timeout=HTTP_TIMEOUT)
+        res.raise_for_status()
+        if 'Content-Length' in res.headers:
+            self.totalsize = int(res.headers['Content-Length'])
+        self.validator = (res.headers.get('ETag') or
+                          res.headers.get('Last-Modified') or '')
+        if (self.totalsize is None or
+                res.headers.get('Accept-Ranges') != 'bytes'):
+            LOG.info("Ranged requests are not supported for %s, it is "
+                     "downloaded with a single request" % self.url)
+            stream = self._download_sequential()
+        else:
+            stream = self._download_chunks()
+            if stream.size != self.totalsize:
+                raise IOError("downloaded %s bytes, expected %s"
+                              % (stream.size, self.totalsize))
+        os.rename(self.part_path, self.target)
+        self._clean_state()
+        LOG.info('Download %s success' % self.url)
+        return stream
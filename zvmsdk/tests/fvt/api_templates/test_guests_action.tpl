@@ -0,0 +1,23 @@
+{
+    "rs": 0,
+    "overallRC": 0,
+    "modID": null,
+    "rc": 0,
+    "errmsg": "",
+    "output": {
+        "USERID1": {
+            "overallRC": 0,
+            "modID": null,
+            "rc": 0,
+            "rs": 0,
+            "errmsg": ""
+        },
+        "USERID2": {
+            "overallRC": 404,
+            "modID": 10,
+            "rc": 404,
+            "rs": 1,
+            "errmsg": "Guest 'USERID2' does not exist."
+        }
+    }
+}
@@ -0,0 +1,6 @@
+{
+   "action": "softstop",
+   "userid_list": ["USERID1", "USERID2"],
+   "timeout": 300,
+   "poll_interval": 20
+}
@@ -0,0 +1,11 @@
+{
+    "rs": 0,
+    "overallRC": 0,
+    "modID": null,
+    "rc": 0,
+    "errmsg": "",
+    "output": {
+        "USERID1": "on",
+        "USERID2": "off"
+    }
+}
@@ -0,0 +1,10 @@
+{
+   "job": {
+      "operation": "guest_capture",
+      "params": {
+         "userid": "USERID1",
+         "image_name": "image1",
+         "capture_type": "rootonly"
+      }
+   }
+}
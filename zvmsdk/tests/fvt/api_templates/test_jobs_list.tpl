@@ -0,0 +1,22 @@
+{
+    "rs": 0,
+    "overallRC": 0,
+    "modID": null,
+    "rc": 0,
+    "errmsg": "",
+    "output": [
+        {
+            "job_id": "5c6e7e1e6a7d4d46a1a1f1f0e5c3a2b4",
+            "operation": "guest_capture",
+            "target": "USERID1",
+            "queue": "guest_capture",
+            "state": "running",
+            "progress": 20,
+            "step": "",
+            "result": null,
+            "error": null,
+            "created_at": 1792300000.123,
+            "updated_at": 1792300012.456
+        }
+    ]
+}
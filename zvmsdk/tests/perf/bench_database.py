@@ -0,0 +1,116 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark of the database reads running beside slow writes.
+
+Several threads read the guest table while one thread runs write
+transactions that hold the writer for a while, like the FCP allocation
+does. The read throughput is measured with the WAL mode disabled, when
+all the reads wait for the single connection, and enabled.
+
+Run it with: python -m zvmsdk.tests.perf.bench_database
+"""
+
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+from zvmsdk import config
+from zvmsdk import database
+
+
+CONF = config.CONF
+
+
+def _run(wal_mode, readers, duration, write_hold, guests):
+    CONF.database.wal_mode = wal_mode
+    manager = database.DBConnectionManager('bench_%s.sqlite' %
+                                           ('wal' if wal_mode else 'lock'))
+    with manager.writer() as conn:
+        conn.execute("CREATE TABLE guests (id integer primary key, "
+                     "userid varchar(8), comments text)")
+        conn.executemany("INSERT INTO guests (userid, comments) "
+                         "VALUES (?, ?)",
+                         [('USER%04d' % i, '{}') for i in range(guests)])
+
+    stop = threading.Event()
+    reads = [0] * readers
+
+    def _read(index):
+        while not stop.is_set():
+            with manager.reader() as conn:
+                conn.execute("SELECT * FROM guests").fetchall()
+            reads[index] += 1
+
+    def _write():
+        while not stop.is_set():
+            with manager.writer() as conn:
+                conn.execute("BEGIN")
+                conn.execute("UPDATE guests SET comments=? WHERE id=1",
+                             (str(time.time()),))
+                time.sleep(write_hold)
+                conn.execute("COMMIT")
+            time.sleep(write_hold / 10)
+
+    threads = [threading.Thread(target=_read, args=(i,))
+               for i in range(readers)]
+    threads.append(threading.Thread(target=_write))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / duration
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=3)
+    parser.add_argument('--write-hold', type=float, default=0.05,
+                        help='seconds each write transaction lasts')
+    parser.add_argument('--guests', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    db_dir = tempfile.mkdtemp()
+    old_dir = CONF.database.dir
+    old_wal = CONF.database.wal_mode
+    CONF.database.dir = db_dir
+    try:
+        results = {}
+        for wal_mode in (False, True):
+            results[wal_mode] = _run(wal_mode, args.readers, args.duration,
+                                     args.write_hold, args.guests)
+    finally:
+        CONF.database.dir = old_dir
+        CONF.database.wal_mode = old_wal
+        shutil.rmtree(db_dir)
+
+    print("readers: %d, write hold: %.3fs, guests: %d" %
+          (args.readers, args.write_hold, args.guests))
+    print("single locked connection: %10.1f reads/s" % results[False])
+    print("WAL, reader per thread:   %10.1f reads/s" % results[True])
+    print("speedup:                  %10.1fx" %
+          (results[True] / max(results[False], 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark of the FCP device allocation.
+
+An FCP Multipath Template with thousands of FCP devices spread over
+several paths and PCHIDs is created, then FCP devices are allocated the
+way get_volume_connector does: get_fcp_devices picks one FCP device per
+path, reserve_fcps reserves them. Every other allocation is released so
+the template never runs out of free FCP devices. The allocation time is
+measured with the free FCP devices queried from the DB and picked from
+the in-memory index.
+
+Run it with: python -m zvmsdk.tests.perf.bench_fcp
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+from zvmsdk import config
+from zvmsdk import database
+from zvmsdk import utils
+
+
+CONF = config.CONF
+
+
+def _prepare(db_op, fcps, paths, pchids):
+    per_path = fcps // paths
+    devices = ';'.join('%x%03x-%x%03x' % (path + 1, 0, path + 1, per_path - 1)
+                       for path in range(paths))
+    db_op.create_fcp_template('bench', 'bench', '',
+                              utils.expand_fcp_list(devices),
+                              host_default=True, default_sp_list=[])
+    fcp_info = []
+    for path in range(paths):
+        for i in range(per_path):
+            fcp_info.append(('%x%03x' % (path + 1, i),
+                             'c05076de3300%04x' % len(fcp_info),
+                             'c05076de3300%04x' % (i % pchids),
+                             '27', '%04X' % (0x100 + i % pchids),
+                             'free', 'none'))
+    db_op.bulk_insert_zvm_fcp_info_into_fcp_table(fcp_info)
+    return {'%04X' % (0x100 + i): {'allocated': 0, 'max': fcps}
+            for i in range(pchids)}
+
+
+def _run(db_op, pchid_info, allocations):
+    reserved = []
+    start = time.time()
+    for i in range(allocations):
+        with database.get_fcp_conn():
+            fcp_list, reason = db_op.get_fcp_devices('bench', pchid_info)
+            fcp_ids = [fcp['fcp_id'] for fcp in fcp_list]
+            db_op.reserve_fcps(fcp_ids, 'USER%04d' % i, 'bench')
+        if i % 2:
+            db_op.unreserve_fcps(fcp_ids)
+        else:
+            reserved.extend(fcp_ids)
+    elapsed = time.time() - start
+    db_op.unreserve_fcps(reserved)
+    return elapsed / allocations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--fcps', type=int, default=10000)
+    parser.add_argument('--paths', type=int, default=4)
+    parser.add_argument('--pchids', type=int, default=8)
+    parser.add_argument('--allocations', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    db_dir = tempfile.mkdtemp()
+    old_dir = CONF.database.dir
+    old_index = CONF.volume.free_fcp_index
+    CONF.database.dir = db_dir
+    try:
+        db_op = database.FCPDbOperator()
+        pchid_info = _prepare(db_op, args.fcps, args.paths, args.pchids)
+        results = {}
+        for free_fcp_index in (False, True):
+            CONF.volume.free_fcp_index = free_fcp_index
+            results[free_fcp_index] = _run(db_op, pchid_info,
+                                           args.allocations)
+    finally:
+        CONF.database.dir = old_dir
+        CONF.volume.free_fcp_index = old_index
+        shutil.rmtree(db_dir)
+
+    print("FCP devices: %d, paths: %d, PCHIDs: %d, allocations: %d" %
+          (args.fcps, args.paths, args.pchids, args.allocations))
+    print("query free FCP devices:   %10.2f ms/allocation" %
+          (results[False] * 1000))
+    print("free FCP device index:    %10.2f ms/allocation" %
+          (results[True] * 1000))
+    print("speedup:                  %10.1fx" %
+          (results[False] / max(results[True], 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark of the volume attach script rendering.
+
+get_volume_attach_configuration_cmds is called for every Linux
+distribution class supporting it. The time per render is measured with a
+new Jinja environment loading and compiling the template for each render,
+as it was done before, and with the compiled templates shared by the
+process.
+
+Run it with: python -m zvmsdk.tests.perf.bench_templates
+"""
+
+import argparse
+import inspect
+import os
+import time
+
+import jinja2
+import mock
+
+from zvmsdk import config
+from zvmsdk import dist
+from zvmsdk import exception
+
+
+CONF = config.CONF
+
+
+def _uncached_get_template(self, module, template_name):
+    base_path = os.path.dirname(os.path.abspath(dist.__file__))
+    loader = jinja2.FileSystemLoader(
+        searchpath=os.path.join(base_path, module, 'templates'))
+    return jinja2.Environment(loader=loader).get_template(template_name)
+
+
+def _dist_classes():
+    classes = []
+    for name, cls in sorted(vars(dist).items()):
+        if (inspect.isclass(cls) and issubclass(cls, dist.LinuxDist) and
+                not inspect.isabstract(cls)):
+            try:
+                cls().get_volume_attach_configuration_cmds(
+                    '1a10 1b10', '5005076802100c1b', '0' * 16, True,
+                    '/dev/sdb')
+            except exception.SDKFunctionNotImplementError:
+                continue
+            classes.append((name, cls))
+    return classes
+
+
+def _run(linuxdist, renders):
+    start = time.time()
+    for i in range(renders):
+        linuxdist.get_volume_attach_configuration_cmds(
+            '1a10 1b10', '5005076802100c1b 5005076802200c1b',
+            '%04x000000000000' % i, True, '/dev/sdb')
+    return (time.time() - start) / renders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--renders', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    old_cache_dir = CONF.guest.template_cache_dir
+    CONF.guest.template_cache_dir = ''
+    try:
+        dist.reset_templates()
+        dist.load_templates()
+        print("%-10s %16s %16s %8s" % ('distro', 'uncached ms', 'cached ms',
+                                       'speedup'))
+        for name, cls in _dist_classes():
+            linuxdist = cls()
+            with mock.patch.object(dist.LinuxDist, 'get_template',
+                                   _uncached_get_template):
+                uncached = _run(linuxdist, args.renders)
+            cached = _run(linuxdist, args.renders)
+            print("%-10s %16.3f %16.3f %7.1fx" %
+                  (name, uncached * 1000, cached * 1000,
+                   uncached / max(cached, 1e-9)))
+    finally:
+        CONF.guest.template_cache_dir = old_cache_dir
+        dist.reset_templates()
+
+
+if __name__ == '__main__':
+    main()
@@ -40,6 +40,7 @@ class SDKTestCase(unittest.TestCase):
         set_conf('image', 'sdk_image_repository', '/tmp/')
         set_conf('zvm', 'namelist', 'TSTNLIST')
         set_conf('logging', 'log_dir', '/tmp/zvmsdk_ut_logs/')
+        set_conf('guest', 'template_cache_dir', '')
 
     @classmethod
     def tearDownClass(cls):
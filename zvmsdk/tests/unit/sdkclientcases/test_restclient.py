@@ -14,9 +14,13 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import base64
 import json
 import mock
 import requests
+import socket
+import threading
+import time
 import unittest
 
 
@@ -52,7 +56,7 @@ class RESTClientTestCase(unittest.TestCase):
         token = '1234567890'
         return token
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_list(self, get_token, request):
         method = 'GET'
@@ -68,7 +72,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_delete(self, get_token, request):
         method = 'DELETE'
@@ -84,7 +88,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_definition_info(self, get_token, request):
         method = 'GET'
@@ -100,7 +104,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_create(self, get_token, request):
         # method = 'POST'
@@ -125,7 +129,7 @@ class RESTClientTestCase(unittest.TestCase):
         #                             data=body, headers=header,
         #                             verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_inspect_stats(self, get_token, request):
         method = 'GET'
@@ -149,7 +153,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_inspect_vnics(self, get_token, request):
         method = 'GET'
@@ -173,7 +177,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guests_get_nic_info(self, get_token, request):
         method = 'GET'
@@ -193,7 +197,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_start(self, get_token, request):
         method = 'POST'
@@ -210,7 +214,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_stop(self, get_token, request):
         method = 'POST'
@@ -227,7 +231,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_softstop(self, get_token, request):
         method = 'POST'
@@ -244,7 +248,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_softstop_parameter_set_zero(self, get_token, request):
         method = 'POST'
@@ -262,7 +266,44 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_guest_start_many(self, get_token, request):
+        method = 'POST'
+        url = '/guests/action'
+        body = {'action': 'start', 'userid_list': ['ID1', 'ID2'],
+                'timeout': 300}
+        body = json.dumps(body)
+        header = self.headers
+        full_uri = self.base_url + url
+        request.return_value = self.response
+        get_token.return_value = self._tmp_token()
+
+        self.client.call("guest_start_many", ['ID1', 'ID2'], timeout=300)
+        request.assert_called_with(method, full_uri,
+                                   data=body, headers=header,
+                                   verify=False)
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_guest_stop_many(self, get_token, request):
+        method = 'POST'
+        url = '/guests/action'
+        body = {'action': 'softstop', 'userid_list': ['ID1', 'ID2'],
+                'timeout': 300}
+        body = json.dumps(body)
+        header = self.headers
+        full_uri = self.base_url + url
+        request.return_value = self.response
+        get_token.return_value = self._tmp_token()
+
+        self.client.call("guest_stop_many", ['ID1', 'ID2'], soft=True,
+                         timeout=300)
+        request.assert_called_with(method, full_uri,
+                                   data=body, headers=header,
+                                   verify=False)
+
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_pause(self, get_token, request):
         method = 'POST'
@@ -279,7 +320,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_unpause(self, get_token, request):
         method = 'POST'
@@ -296,7 +337,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_reboot(self, get_token, request):
         method = 'POST'
@@ -313,7 +354,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_reset(self, get_token, request):
         method = 'POST'
@@ -330,7 +371,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_console_output(self, get_token, request):
         method = 'POST'
@@ -347,32 +388,32 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_live_migrate(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_register(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_deregister(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_live_resize_cpus(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_resize_cpus(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_resize_mem(self, get_token, request):
         method = 'POST'
@@ -391,7 +432,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_live_resize_mem(self, get_token, request):
         method = 'POST'
@@ -410,7 +451,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_grow_root_volume(self, get_token, request):
         method = 'POST'
@@ -429,7 +470,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_capture(self, get_token, request):
         method = 'POST'
@@ -448,7 +489,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_deploy(self, get_token, request):
         method = 'POST'
@@ -467,7 +508,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_power_state_real(self, get_token, request):
         method = 'GET'
@@ -483,7 +524,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_info(self, get_token, request):
         method = 'GET'
@@ -499,7 +540,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_info_ssl(self, get_token, request):
         method = 'GET'
@@ -515,7 +556,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_user_direct(self, get_token, request):
         method = 'GET'
@@ -531,12 +572,12 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_adapters_info(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_create_nic(self, get_token, request):
         # method = 'POST'
@@ -559,7 +600,7 @@ class RESTClientTestCase(unittest.TestCase):
         #                            data=body, headers=header,
         #                            verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_delete_nic(self, get_token, request):
         method = 'DELETE'
@@ -577,7 +618,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_nic_couple_to_vswitch(self, get_token, request):
         method = 'PUT'
@@ -597,7 +638,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_nic_couple_to_vswitch_vlan_id(self, get_token, request):
         method = 'PUT'
@@ -618,7 +659,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_nic_uncouple_from_vswitch(self, get_token, request):
         method = 'PUT'
@@ -637,7 +678,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_create_network_interface(self, get_token, request):
         method = 'POST'
@@ -659,7 +700,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_delete_network_interface(self, get_token, request):
         method = 'DELETE'
@@ -690,7 +731,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_get_power_state(self, get_token, request):
         method = 'GET'
@@ -706,7 +747,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_create_disks(self, get_token, request):
         method = 'POST'
@@ -724,7 +765,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_delete_disks(self, get_token, request):
         method = 'DELETE'
@@ -742,7 +783,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_guest_config_minidisks(self, get_token, request):
         method = 'PUT'
@@ -760,22 +801,22 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_volume_attach(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_volume_detach(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_volume_refresh_bootmap(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_get_volume_connector(self, get_token, request):
         method = 'GET'
@@ -800,7 +841,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=json.dumps(body), headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_get_fcp_templates(self, get_token, request):
         method = 'GET'
@@ -849,7 +890,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_get_fcp_templates_details(self, get_token, request):
         method = 'GET'
@@ -880,7 +921,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_delete_fcp_template(self, get_token, request):
         method = 'DELETE'
@@ -896,7 +937,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_get_fcp_usage(self, get_token, request):
         method = 'GET'
@@ -912,7 +953,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_set_fcp_usage(self, get_token, request):
         method = 'PUT'
@@ -942,7 +983,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_create_fcp_template(self, get_token, request):
         method = 'POST'
@@ -977,7 +1018,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_edit_fcp_template(self, get_token, request):
         method = 'PUT'
@@ -995,7 +1036,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_host_get_info(self, get_token, request):
         method = 'GET'
@@ -1011,7 +1052,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_host_get_guest_list(self, get_token, request):
         method = 'GET'
@@ -1027,7 +1068,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_host_get_diskpool_volumes(self, get_token, request):
         method = 'GET'
@@ -1050,23 +1091,23 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_host_diskpool_get_info(self, get_token, request):
         # wait host_diskpool_get_info bug fixed
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_host_get_volume_info(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_host_get_ssi_info(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_image_import(self, get_token, request):
         method = 'POST'
@@ -1088,7 +1129,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_image_query(self, get_token, request):
         method = 'GET'
@@ -1111,7 +1152,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_image_delete(self, get_token, request):
         method = 'DELETE'
@@ -1127,7 +1168,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_image_export(self, get_token, request):
         method = 'PUT'
@@ -1146,7 +1187,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_image_get_root_disk_size(self, get_token, request):
         method = 'GET'
@@ -1162,17 +1203,78 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_job_submit(self, get_token, request):
+        method = 'POST'
+        url = '/jobs'
+        body = {'job': {'operation': 'guest_capture',
+                        'params': {'userid': 'USER1',
+                                   'image_name': 'image1'}}}
+        body = json.dumps(body)
+        header = self.headers
+        full_uri = self.base_url + url
+        request.return_value = self.response
+        get_token.return_value = self._tmp_token()
+
+        self.client.call("job_submit", 'guest_capture', userid='USER1',
+                         image_name='image1')
+        request.assert_called_with(method, full_uri,
+                                   data=body, headers=header,
+                                   verify=False)
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_job_query(self, get_token, request):
+        method = 'GET'
+        url = '/jobs/fakejobid'
+        body = None
+        header = self.headers
+        full_uri = self.base_url + url
+        request.return_value = self.response
+        get_token.return_value = self._tmp_token()
+
+        self.client.call("job_query", 'fakejobid')
+        request.assert_called_with(method, full_uri,
+                                   data=body, headers=header,
+                                   verify=False)
+
+        full_uri = self.base_url + '/jobs/fakejobid?wait=30'
+        self.client.call("job_query", 'fakejobid', wait=30)
+        request.assert_called_with(method, full_uri,
+                                   data=body, headers=header,
+                                   verify=False)
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_job_list(self, get_token, request):
+        method = 'GET'
+        body = None
+        header = self.headers
+        request.return_value = self.response
+        get_token.return_value = self._tmp_token()
+
+        self.client.call("job_list")
+        request.assert_called_with(method, self.base_url + '/jobs',
+                                   data=body, headers=header,
+                                   verify=False)
+
+        self.client.call("job_list", target='USER1', state='running')
+        request.assert_called_with(
+            method, self.base_url + '/jobs?target=USER1&state=running',
+            data=body, headers=header, verify=False)
+
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_file_import(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_file_export(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_token_create(self, get_token, request):
         method = 'POST'
@@ -1188,7 +1290,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_vswitch_get_list(self, get_token, request):
         method = 'GET'
@@ -1204,7 +1306,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_vswitch_create(self, get_token, request):
         method = 'POST'
@@ -1221,7 +1323,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_vswitch_delete(self, get_token, request):
         method = 'DELETE'
@@ -1237,12 +1339,12 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_vswitch_query(self, get_token, request):
         pass
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_vswitch_grant_user(self, get_token, request):
         method = 'PUT'
@@ -1259,7 +1361,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_vswitch_revoke_user(self, get_token, request):
         method = 'PUT'
@@ -1276,7 +1378,7 @@ class RESTClientTestCase(unittest.TestCase):
                                    data=body, headers=header,
                                    verify=False)
 
-    @mock.patch.object(requests, 'request')
+    @mock.patch.object(requests.Session, 'request')
     @mock.patch('zvmconnector.restclient.RESTClient._get_token')
     def test_vswitch_set_vlan_id_for_user(self, get_token, request):
         method = 'PUT'
@@ -1294,3 +1396,97 @@ class RESTClientTestCase(unittest.TestCase):
         request.assert_called_with(method, full_uri,
                                    data=body, headers=header,
                                    verify=False)
+
+
+class RESTClientTokenTestCase(unittest.TestCase):
+    """Testcases for the token and connection reuse of RESTClient."""
+    def setUp(self):
+        self.client = restclient.RESTClient(token_path='/fake/token',
+                                            auth='token')
+        self.response = FakeResp()
+        self.response.status_code = 200
+
+    def _jwt(self, expires_in):
+        payload = json.dumps({'exp': int(time.time() + expires_in)})
+        payload = base64.urlsafe_b64encode(payload.encode('utf-8'))
+        return 'header.%s.signature' % payload.decode('ascii').rstrip('=')
+
+    def test_session_pool(self):
+        client = restclient.RESTClient(pool_size=16, retries=2)
+        adapter = client.session.get_adapter('http://127.0.0.1:8888')
+        self.assertEqual(16, adapter._pool_maxsize)
+        self.assertEqual(2, adapter.max_retries.total)
+        self.assertEqual(2, adapter.max_retries.connect)
+        self.assertEqual(0, adapter.max_retries.read)
+
+    def test_read_error_not_retried(self):
+        # The server reads each request and closes without answering
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(('127.0.0.1', 0))
+        server.listen(5)
+        received = []
+
+        def _serve():
+            while True:
+                try:
+                    conn, addr = server.accept()
+                except socket.error:
+                    return
+                received.append(conn.recv(65536))
+                conn.close()
+
+        thread = threading.Thread(target=_serve)
+        thread.daemon = True
+        thread.start()
+        client = restclient.RESTClient(port=server.getsockname()[1],
+                                       retries=3)
+        results = client.call('guest_delete', 'userid01')
+        self.assertEqual(101, results['overallRC'])
+        self.assertEqual(1, len(received))
+
+    def test_get_token_expiration(self):
+        token = self._jwt(100)
+        self.assertAlmostEqual(time.time() + 100,
+                               self.client._get_token_expiration(token),
+                               delta=2)
+        self.assertIsNone(self.client._get_token_expiration(
+            'server-auth-closed'))
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_token_reused(self, get_token, request):
+        token = self._jwt(3600)
+        get_token.return_value = token
+        request.return_value = self.response
+
+        self.client.call("guest_list")
+        self.client.call("guest_list")
+        get_token.assert_called_once_with()
+        self.assertEqual(2, request.call_count)
+        self.assertEqual(token,
+                         request.call_args[1]['headers']['X-Auth-Token'])
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_token_refreshed_before_expiration(self, get_token, request):
+        get_token.side_effect = [self._jwt(10), self._jwt(3600)]
+        request.return_value = self.response
+
+        self.client.call("guest_list")
+        self.client.call("guest_list")
+        self.client.call("guest_list")
+        self.assertEqual(2, get_token.call_count)
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch('zvmconnector.restclient.RESTClient._get_token')
+    def test_token_renewed_when_unauthorized(self, get_token, request):
+        get_token.side_effect = ['token1', 'token2']
+        unauthorized = FakeResp()
+        unauthorized.status_code = 401
+        request.side_effect = [unauthorized, self.response]
+
+        self.client.call("guest_list")
+        self.assertEqual(2, request.call_count)
+        self.assertEqual('token2',
+                         request.call_args[1]['headers']['X-Auth-Token'])
@@ -0,0 +1,103 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark of the sdkwsgi request body validation.
+
+The bodies of some routes are validated against their schema. The time
+per request is measured with a new validator built for each request, as
+it was done before, and with the validator compiled once by
+validation.schema and shared by the requests.
+
+Run it with: python -m zvmsdk.tests.unit.sdkwsgi.bench_validation
+"""
+
+import argparse
+import time
+
+from zvmsdk.sdkwsgi.schemas import guest
+from zvmsdk.sdkwsgi.schemas import image
+from zvmsdk.sdkwsgi.schemas import volume
+from zvmsdk.sdkwsgi import validation
+
+
+ROUTES = [
+    ('POST /guests', guest.create,
+     {'guest': {'userid': 'TESTVM01', 'vcpus': 2, 'memory': 2048,
+                'user_profile': 'PROFILE1', 'max_cpu': 8, 'max_mem': '8G',
+                'disk_list': [{'size': '10g', 'is_boot_disk': True,
+                               'disk_pool': 'ECKD:POOL1'},
+                              {'size': '20g', 'format': 'ext4',
+                               'disk_pool': 'FBA:POOL2'}],
+                'comments': ['comment1', 'comment2']}}),
+    ('POST /guests/{userid}/action deploy', guest.deploy,
+     {'image': 'rhel9', 'vdev': '0100', 'hostname': 'testvm01'}),
+    ('POST /guests/volumes', volume.attach,
+     {'info': {'connection': {'assigner_id': 'TESTVM01',
+                              'zvm_fcp': ['1a10', '1b10'],
+                              'target_wwpn': ['0x5005076802100c1b',
+                                              '0x5005076802200c1b'],
+                              'target_lun': '0x0000000000000000',
+                              'multipath': True,
+                              'os_version': 'rhel9',
+                              'mount_point': '/dev/sdb'}}}),
+    ('POST /volumes/fcptemplates', volume.create_fcp_template,
+     {'name': 'template1', 'description': 'test template',
+      'fcp_devices': '1a10-1a1f;1b10-1b1f', 'host_default': False,
+      'storage_providers': ['provider1'], 'min_fcp_paths_count': 2}),
+    ('POST /images', image.create,
+     {'image': {'image_name': 'rhel9', 'url': 'file:///tmp/rhel9.img',
+                'image_meta': {'os_version': 'rhel9',
+                               'md5sum': '0' * 32},
+                'remote_host': 'root@192.168.0.1'}}),
+]
+
+
+def _new_validator_validate(schema, body):
+    # A validator class, a format checker and a validator per request
+    validator = validation._SchemaValidator
+    validator._validator_cls = None
+    validator(schema).validate(body)
+
+
+def _run(func, schema, body, requests):
+    start = time.time()
+    for i in range(requests):
+        func(schema, body)
+    return (time.time() - start) / requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    print("%-40s %12s %12s %8s" % ('route', 'new us', 'shared us',
+                                   'speedup'))
+    for route, schema, body in ROUTES:
+        shared = validation._SchemaValidator(schema)
+        shared.validate(body)
+        uncached = _run(_new_validator_validate, schema, body, args.requests)
+        cached = _run(lambda schema, body: shared.validate(body), schema,
+                      body, args.requests)
+        print("%-40s %12.1f %12.1f %7.1fx" %
+              (route, uncached * 1e6, cached * 1e6,
+               uncached / max(cached, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
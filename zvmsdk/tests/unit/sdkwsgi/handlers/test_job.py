@@ -0,0 +1,64 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest
+
+from zvmsdk import exception
+from zvmsdk.sdkwsgi.handlers import job
+
+
+class HandlersJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.action = job.JobAction()
+        patcher = mock.patch.object(self.action.client, 'send_request')
+        self.send_request = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.send_request.return_value = {'overallRC': 0}
+
+    def test_submit(self):
+        params = {'userid': 'USERID1', 'image_name': 'image1',
+                  'capture_type': 'alldisks'}
+        body = {'job': {'operation': 'guest_capture', 'params': params}}
+        self.action.submit(body=body)
+        self.send_request.assert_called_once_with('job_submit',
+                                                  'guest_capture', **params)
+
+    def test_submit_guest_create(self):
+        params = {'userid': 'USERID1', 'vcpus': 1, 'memory': 1024,
+                  'comment_list': ['comment']}
+        body = {'job': {'operation': 'guest_create', 'params': params}}
+        self.action.submit(body=body)
+        self.send_request.assert_called_once_with('job_submit',
+                                                  'guest_create', **params)
+
+    def test_submit_invalid_params(self):
+        # The params are checked with the schema of the operation route
+        for operation, params in (
+                ('guest_create', {'userid': 'USERID123456', 'vcpus': 1,
+                                  'memory': 1024}),
+                ('guest_create', {'userid': 'USERID1', 'vcpus': 1}),
+                ('guest_deploy', {'userid': 'USERID1', 'image_name': 'i1',
+                                  'unknown': 1}),
+                ('image_import', {'image_name': 'image1'}),
+                ('volume_attach_many', {'userid': 'USERID1',
+                                        'connection_infos': []})):
+            body = {'job': {'operation': operation, 'params': params}}
+            self.assertRaises(exception.ValidationError,
+                              self.action.submit, body=body)
+        self.send_request.assert_not_called()
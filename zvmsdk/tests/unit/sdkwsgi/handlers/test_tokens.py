@@ -0,0 +1,120 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import jwt
+import mock
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from zvmsdk import config
+from zvmsdk import exception
+from zvmsdk.sdkwsgi.handlers import tokens
+
+
+CONF = config.CONF
+
+
+class HandlersTokensTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.token_path = os.path.join(self.tmpdir, 'token.dat')
+        self._write_admin_token('admin1')
+        for name, value in (('auth', 'token'),
+                            ('token_path', self.token_path)):
+            self.addCleanup(setattr, CONF.wsgi, name,
+                            getattr(CONF.wsgi, name))
+            setattr(CONF.wsgi, name, value)
+        self.addCleanup(tokens._ADMIN_TOKEN.update,
+                        path=None, stat=None, token=None, checked=0)
+        self.addCleanup(tokens._VERIFIED_TOKENS.clear)
+        self.func = mock.Mock(return_value='done')
+        self.validated = tokens.validate(self.func)
+
+    def _write_admin_token(self, token):
+        with open(self.token_path, 'w') as fd:
+            fd.write(token)
+        # Make the change visible even within the mtime resolution
+        os.utime(self.token_path, (time.time(), time.time() + 10))
+        tokens._ADMIN_TOKEN['checked'] = 0
+
+    def _request(self, user_token):
+        req = mock.Mock()
+        req.headers = {'X-Auth-Token': user_token}
+        return req
+
+    def test_get_admin_token_reloaded(self):
+        self.assertEqual('admin1', tokens.get_admin_token(self.token_path))
+        with mock.patch('six.moves.builtins.open') as mock_open:
+            self.assertEqual('admin1',
+                             tokens.get_admin_token(self.token_path))
+            tokens._ADMIN_TOKEN['checked'] = 0
+            self.assertEqual('admin1',
+                             tokens.get_admin_token(self.token_path))
+            mock_open.assert_not_called()
+        self._write_admin_token('admin2')
+        self.assertEqual('admin2', tokens.get_admin_token(self.token_path))
+
+    def test_get_admin_token_not_found(self):
+        self.assertRaises(exception.ZVMUnauthorized,
+                          tokens.get_admin_token,
+                          os.path.join(self.tmpdir, 'fake'))
+
+    def test_validate_verified_once(self):
+        user_token = jwt.encode({'exp': int(time.time() + 600)}, 'admin1')
+        with mock.patch.object(jwt, 'decode', wraps=jwt.decode) as decode:
+            self.assertEqual('done', self.validated(self._request(user_token)))
+            self.assertEqual('done', self.validated(self._request(user_token)))
+            decode.assert_called_once_with(user_token, 'admin1',
+                                           algorithms="HS256")
+
+    def test_validate_expired(self):
+        user_token = jwt.encode({'exp': int(time.time() + 600)}, 'admin1')
+        self.validated(self._request(user_token))
+        self.assertTrue(tokens._is_verified('admin1', user_token))
+        with mock.patch.object(time, 'time',
+                               return_value=time.time() + 601):
+            self.assertFalse(tokens._is_verified('admin1', user_token))
+        self.assertNotIn(('admin1', user_token), tokens._VERIFIED_TOKENS)
+
+    def test_validate_admin_token_changed(self):
+        user_token = jwt.encode({'exp': int(time.time() + 600)}, 'admin1')
+        self.validated(self._request(user_token))
+        self._write_admin_token('admin2')
+        self.assertRaises(exception.ZVMUnauthorized,
+                          self.validated, self._request(user_token))
+
+    def test_verified_tokens_bounded(self):
+        with mock.patch.object(tokens, 'VERIFIED_TOKENS_SIZE', 2):
+            for user_token in ('t1', 't2', 't3'):
+                tokens._add_verified('admin1', user_token, None)
+        self.assertEqual([('admin1', 't2'), ('admin1', 't3')],
+                         list(tokens._VERIFIED_TOKENS))
+
+    def test_validate_verified_during_reload(self):
+        # A request verified the token with the former admin token while
+        # another one reloaded the admin token file
+        user_token = jwt.encode({'exp': int(time.time() + 600)}, 'admin1')
+        self._write_admin_token('admin2')
+        tokens.get_admin_token(self.token_path)
+        tokens._add_verified('admin1', user_token, time.time() + 600)
+        self.assertRaises(exception.ZVMUnauthorized,
+                          self.validated, self._request(user_token))
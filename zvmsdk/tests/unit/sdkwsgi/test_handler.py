@@ -377,6 +377,21 @@ class GuestHandlerTest(unittest.TestCase):
         self.assertRaises(exception.ValidationError, h, self.env,
                           dummy)
 
+    @mock.patch.object(tokens, 'validate')
+    def test_guest_get_power_state_bulk(self, mock_validate):
+        self.env['wsgiorg.routing_args'] = ()
+        self.env['PATH_INFO'] = '/guests/power_state'
+        self.env['REQUEST_METHOD'] = 'GET'
+        self.env['QUERY_STRING'] = 'userid=l1,l2'
+        h = handler.SdkHandler()
+        func = 'zvmconnector.connector.ZVMConnector.send_request'
+        with mock.patch(func) as get_info:
+            get_info.return_value = {'overallRC': 0}
+            h(self.env, dummy)
+
+            get_info.assert_called_once_with('guest_get_power_state_bulk',
+                                             ['l1', 'l2'])
+
     @mock.patch.object(tokens, 'validate')
     def test_guest_get_interface_stats_empty_userid_list(self, mock_validate):
         self.env['wsgiorg.routing_args'] = ()
@@ -509,6 +524,56 @@ class GuestHandlerTest(unittest.TestCase):
 
             create_network_interface.assert_called_once_with('1', body={})
 
+    @mock.patch('zvmsdk.sdkwsgi.util.extract_json')
+    @mock.patch.object(tokens, 'validate')
+    def test_guests_action_start(self, mock_validate, mock_json):
+        mock_json.return_value = {'action': 'start',
+                                  'userid_list': ['ID1', 'ID2'],
+                                  'timeout': 300}
+        self.env['PATH_INFO'] = '/guests/action'
+        self.env['REQUEST_METHOD'] = 'POST'
+        h = handler.SdkHandler()
+        func = 'zvmconnector.connector.ZVMConnector.send_request'
+        with mock.patch(func) as start:
+            start.return_value = {'overallRC': 0}
+            h(self.env, dummy)
+
+            start.assert_called_once_with('guest_start_many',
+                                          ['ID1', 'ID2'], 300)
+
+    @mock.patch('zvmsdk.sdkwsgi.util.extract_json')
+    @mock.patch.object(tokens, 'validate')
+    def test_guests_action_softstop(self, mock_validate, mock_json):
+        mock_json.return_value = {'action': 'softstop',
+                                  'userid_list': ['ID1']}
+        self.env['PATH_INFO'] = '/guests/action'
+        self.env['REQUEST_METHOD'] = 'POST'
+        h = handler.SdkHandler()
+        func = 'zvmconnector.connector.ZVMConnector.send_request'
+        with mock.patch(func) as stop:
+            stop.return_value = {'overallRC': 0}
+            h(self.env, dummy)
+
+            stop.assert_called_once_with('guest_stop_many', ['ID1'],
+                                         soft=True, timeout=None,
+                                         poll_interval=None)
+
+    @mock.patch('zvmsdk.sdkwsgi.util.extract_json')
+    @mock.patch.object(tokens, 'validate')
+    def test_guests_action_invalid(self, mock_validate, mock_json):
+        mock_json.return_value = {'action': 'pause',
+                                  'userid_list': ['ID1']}
+        self.env['PATH_INFO'] = '/guests/action'
+        self.env['REQUEST_METHOD'] = 'POST'
+        h = handler.SdkHandler()
+        status = []
+        func = 'zvmconnector.connector.ZVMConnector.send_request'
+        with mock.patch(func) as send_request:
+            h(self.env, lambda st, headers: status.append(st))
+
+            send_request.assert_not_called()
+        self.assertTrue(status[0].startswith('400'))
+
 
 class ImageHandlerNegativeTest(unittest.TestCase):
 
@@ -589,6 +654,49 @@ class ImageHandlerTest(unittest.TestCase):
             query.assert_called_once_with('image_query', None)
 
 
+class JobHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.env = env
+
+    @mock.patch('zvmsdk.sdkwsgi.util.extract_json')
+    @mock.patch.object(tokens, 'validate')
+    def test_job_submit(self, mock_validate, mock_json):
+        mock_json.return_value = {}
+        self.env['PATH_INFO'] = '/jobs'
+        self.env['REQUEST_METHOD'] = 'POST'
+        h = handler.SdkHandler()
+        func = 'zvmsdk.sdkwsgi.handlers.job.JobAction.submit'
+        with mock.patch(func) as submit:
+            submit.return_value = {'overallRC': 0}
+            h(self.env, dummy)
+
+            submit.assert_called_once_with(body={})
+
+    @mock.patch.object(tokens, 'validate')
+    def test_job_get(self, mock_validate):
+        self.env['PATH_INFO'] = '/jobs/job1'
+        self.env['REQUEST_METHOD'] = 'GET'
+        self.env['QUERY_STRING'] = 'wait=30'
+        self.addCleanup(self.env.__setitem__, 'QUERY_STRING', '')
+        h = handler.SdkHandler()
+        func = 'zvmconnector.connector.ZVMConnector.send_request'
+        with mock.patch(func) as query:
+            query.return_value = {'overallRC': 0}
+            h(self.env, dummy)
+
+            query.assert_called_once_with('job_query', 'job1', wait=30)
+
+    @mock.patch.object(tokens, 'validate')
+    def test_job_get_invalid_wait(self, mock_validate):
+        self.env['PATH_INFO'] = '/jobs/job1'
+        self.env['REQUEST_METHOD'] = 'GET'
+        self.env['QUERY_STRING'] = 'wait=-1'
+        self.addCleanup(self.env.__setitem__, 'QUERY_STRING', '')
+        h = handler.SdkHandler()
+        self.assertRaises(exception.ValidationError, h, self.env, dummy)
+
+
 class HostHandlerNegativeTest(unittest.TestCase):
 
     def setUp(self):
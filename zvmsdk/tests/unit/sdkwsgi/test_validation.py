@@ -0,0 +1,46 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest
+
+from zvmsdk import exception
+from zvmsdk.sdkwsgi.schemas import guest
+from zvmsdk.sdkwsgi import validation
+
+
+class ValidationTest(unittest.TestCase):
+
+    def test_schema_validator_built_once(self):
+        with mock.patch.object(validation, '_SchemaValidator',
+                               wraps=validation._SchemaValidator) as cls:
+            @validation.schema(guest.deploy)
+            def deploy(body):
+                return body['image']
+
+            self.assertEqual('image1', deploy(body={'image': 'image1'}))
+            self.assertEqual('image2', deploy(body={'image': 'image2'}))
+            cls.assert_called_once_with(guest.deploy)
+        self.assertRaises(exception.ValidationError, deploy,
+                          body={'image': 'image1', 'fake': 1})
+
+    def test_validator_class_shared(self):
+        validator1 = validation._SchemaValidator(guest.deploy)
+        validator2 = validation._SchemaValidator(guest.capture)
+        self.assertIs(type(validator1.validator), type(validator2.validator))
+        self.assertIs(validator1.validator.format_checker,
+                      validator2.validator.format_checker)
@@ -18,11 +18,16 @@ import mock
 import six
 
 from zvmsdk import api
+from zvmsdk import config
 from zvmsdk import exception
+from zvmsdk import jobs
 from zvmsdk.tests.unit import base
 from zvmsdk import vmops
 
 
+CONF = config.CONF
+
+
 class SDKAPITestCase(base.SDKTestCase):
     """Testcases for compute APIs."""
 
@@ -42,6 +47,12 @@ class SDKAPITestCase(base.SDKTestCase):
         patcher_pchids.start()
         self.addCleanup(patcher_pchids.stop)
         self.api = api.SDKAPI()
+        patcher = mock.patch.object(self.api._monitor, 'namelist_add')
+        self.addCleanup(patcher.stop)
+        self.mock_namelist_add = patcher.start()
+        patcher = mock.patch.object(self.api._monitor, 'namelist_remove')
+        self.addCleanup(patcher.stop)
+        self.mock_namelist_remove = patcher.start()
 
     def test_init_ComputeAPI(self):
         self.assertTrue(isinstance(self.api, api.SDKAPI))
@@ -114,6 +125,14 @@ class SDKAPITestCase(base.SDKTestCase):
         chk_uid.assert_called_once_with(self.userid)
         gstate.assert_not_called()
 
+    @mock.patch("zvmsdk.vmops.VMOps.get_power_state_bulk")
+    def test_guest_get_power_state_bulk(self, gstates):
+        self.api.guest_get_power_state_bulk(self.userid_list)
+        gstates.assert_called_once_with(self.userid_list)
+        gstates.reset_mock()
+        self.api.guest_get_power_state_bulk(self.userid)
+        gstates.assert_called_once_with([self.userid])
+
     @mock.patch("zvmsdk.vmops.VMOps.get_info")
     def test_guest_get_info(self, ginfo):
         self.api.guest_get_info(self.userid)
@@ -149,6 +168,56 @@ class SDKAPITestCase(base.SDKTestCase):
                                         transportfiles, None, vdev,
                                         None, False)
 
+    @mock.patch("zvmsdk.vmops.VMOps.guest_deploy")
+    def test_guest_deploy_async(self, guest_deploy):
+        scheduler = jobs.JobScheduler(1, 1)
+        with mock.patch.object(self.api, '_deploy_scheduler', scheduler):
+            job = self.api.guest_deploy_async('fakevm', 'fakeimg',
+                                              vdev='0100')
+            self.assertEqual('FAKEVM', job['target'])
+            self.assertEqual(CONF.zvm.disk_pool, job['queue'])
+            self.assertTrue(scheduler.get(job['job_id']).wait(10))
+        job = scheduler.get(job['job_id']).to_dict()
+        self.assertEqual(jobs.JOB_SUCCEEDED, job['state'])
+        guest_deploy.assert_called_once_with('FAKEVM', 'fakeimg', None, None,
+                                             '0100', None, False,
+                                             progress=mock.ANY)
+
+    @mock.patch("zvmsdk.jobs.get_job_scheduler")
+    @mock.patch("zvmsdk.vmops.VMOps.guest_capture")
+    def test_job_submit(self, guest_capture, get_scheduler):
+        get_scheduler.return_value = jobs.JobScheduler(1, 1)
+        job = self.api.job_submit('guest_capture', userid='fakevm',
+                                  image_name='fakeimg')
+        self.assertEqual('guest_capture', job['operation'])
+        self.assertEqual('fakevm', job['target'])
+        self.assertEqual('guest_capture', job['queue'])
+        self.assertTrue(get_scheduler.return_value.get(
+            job['job_id']).wait(10))
+        guest_capture.assert_called_once_with('FAKEVM', 'fakeimg',
+                                              capture_type='rootonly',
+                                              compress_level=6)
+
+    def test_job_submit_invalid(self):
+        self.assertRaises(exception.SDKInvalidInputFormat,
+                          self.api.job_submit, 'guest_delete',
+                          userid='fakevm')
+        self.assertRaises(exception.SDKInvalidInputFormat,
+                          self.api.job_submit, 'guest_capture',
+                          userid='fakevm')
+        self.assertRaises(exception.SDKInvalidInputFormat,
+                          self.api.job_submit, 'guest_deploy',
+                          userid='fakevm', image_name='fakeimg',
+                          fakeparam='fake')
+
+    @mock.patch.object(api.SDKAPI, 'guest_deploy_async')
+    def test_job_submit_guest_deploy(self, deploy_async):
+        self.api.job_submit('guest_deploy', userid='fakevm',
+                            image_name='fakeimg', disk_pool='ECKD:POOL1')
+        deploy_async.assert_called_once_with(userid='fakevm',
+                                             image_name='fakeimg',
+                                             disk_pool='ECKD:POOL1')
+
     @mock.patch("zvmsdk.imageops.ImageOps.image_import")
     def test_image_import(self, image_import):
         image_name = '95a4da37-9f9b-4fb2-841f-f0bb441b7544'
@@ -182,6 +251,7 @@ class SDKAPITestCase(base.SDKTestCase):
                                   disk_list, user_profile, max_cpu, max_mem,
                                   '', '', '', [], {}, '', None, '', '', '',
                                   '')
+        self.mock_namelist_add.assert_called_once_with([self.userid])
 
     @mock.patch("zvmsdk.vmops.VMOps.create_vm")
     def test_guest_create_with_account(self, create_vm):
@@ -432,6 +502,7 @@ class SDKAPITestCase(base.SDKTestCase):
         self.api.guest_delete(self.userid)
         cge.assert_called_once_with(self.userid, raise_exc=False)
         delete_vm.assert_called_once_with(self.userid)
+        self.mock_namelist_remove.assert_called_once_with([self.userid])
 
     @mock.patch("zvmsdk.vmops.VMOps.delete_vm")
     @mock.patch("zvmsdk.vmops.VMOps.check_guests_exist_in_db")
@@ -495,6 +566,58 @@ class SDKAPITestCase(base.SDKTestCase):
         self.api.guest_softstop(self.userid, timeout=300)
         gss.assert_called_once_with(self.userid, timeout=300)
 
+    @mock.patch("zvmsdk.vmops.VMOps.get_power_state_bulk")
+    @mock.patch("zvmsdk.vmops.VMOps.guest_start")
+    def test_guest_start_many(self, gs, power_state):
+        power_state.return_value = {'ID1': 'off', 'ID2': 'on',
+                                    'ID3': 'off'}
+
+        def start(userid, timeout):
+            if userid == 'ID3':
+                raise exception.SDKSMTRequestFailed(
+                    {'overallRC': 8, 'rc': 200, 'rs': 4}, 'fake error')
+
+        gs.side_effect = start
+        results = self.api.guest_start_many(['id1', 'ID2', 'ID3', 'ID1'])
+        power_state.assert_called_once_with(['ID1', 'ID2', 'ID3'])
+        # ID2 is already on
+        gs.assert_has_calls([mock.call('ID1', 0), mock.call('ID3', 0)],
+                            any_order=True)
+        self.assertEqual(2, gs.call_count)
+        self.assertEqual(0, results['ID1']['overallRC'])
+        self.assertEqual(0, results['ID2']['overallRC'])
+        self.assertEqual(8, results['ID3']['overallRC'])
+        self.assertEqual(4, results['ID3']['rs'])
+
+    @mock.patch("zvmsdk.vmops.VMOps.get_power_state_bulk")
+    @mock.patch("zvmsdk.vmops.VMOps.guest_start")
+    def test_guest_start_many_wait_reachable(self, gs, power_state):
+        power_state.return_value = {'ID1': 'on'}
+        results = self.api.guest_start_many(['ID1'], timeout=300)
+        gs.assert_called_once_with('ID1', 300)
+        self.assertEqual(0, results['ID1']['overallRC'])
+
+    @mock.patch("zvmsdk.vmops.VMOps.get_power_state_bulk")
+    @mock.patch("zvmsdk.vmops.VMOps.guest_softstop")
+    @mock.patch("zvmsdk.vmops.VMOps.guest_stop")
+    def test_guest_stop_many(self, gs, gss, power_state):
+        power_state.side_effect = exception.SDKInternalError(msg='fake')
+
+        def check_exist(userids):
+            if userids == ['ID2']:
+                raise exception.SDKObjectNotExistError(
+                    obj_desc="Guest 'ID2'", modID='guest')
+
+        self.api._vmops.check_guests_exist_in_db.side_effect = check_exist
+        self.addCleanup(setattr, self.api._vmops.check_guests_exist_in_db,
+                        'side_effect', None)
+        results = self.api.guest_stop_many(['ID1', 'ID2'], soft=True,
+                                           timeout=300)
+        gss.assert_called_once_with('ID1', timeout=300)
+        gs.assert_not_called()
+        self.assertEqual(0, results['ID1']['overallRC'])
+        self.assertEqual(404, results['ID2']['overallRC'])
+
     @mock.patch("zvmsdk.vmops.VMOps.guest_pause")
     def test_guest_pause(self, gp):
         self.api.guest_pause(self.userid)
@@ -616,6 +739,17 @@ class SDKAPITestCase(base.SDKTestCase):
         self.api.volume_attach(connection_info)
         mock_attach.assert_called_once_with(connection_info)
 
+    @mock.patch("zvmsdk.volumeop.VolumeOperatorAPI.attach_volumes_to_instance")
+    def test_volume_attach_many(self, mock_attach):
+        connection_infos = [{'os_version': 'rhel7',
+                             'target_wwpn': ['1111'],
+                             'target_lun': lun,
+                             'zvm_fcp': ['b83c'],
+                             'assigner_id': 'user1'}
+                            for lun in ('2222', '2223')]
+        self.api.volume_attach_many('user1', connection_infos)
+        mock_attach.assert_called_once_with('user1', connection_infos)
+
     @mock.patch("zvmsdk.volumeop.VolumeOperatorAPI.volume_refresh_bootmap")
     def test_refresh_bootmap(self, mock_attach):
         fcpchannel = ['5d71']
@@ -674,6 +808,7 @@ class SDKAPITestCase(base.SDKTestCase):
         guestdb_reg.assert_called_once_with(self.userid, 'rhel7', '1')
         get_adapters_info.assert_called_once_with(self.userid)
         chk_usr.assert_called_once_with(self.userid)
+        self.mock_namelist_add.assert_called_once_with([self.userid])
 
     @mock.patch("zvmsdk.utils.check_userid_exist")
     @mock.patch("zvmsdk.smtclient.SMTClient.get_adapters_info")
@@ -778,6 +913,7 @@ class SDKAPITestCase(base.SDKTestCase):
         guestdb_del.assert_called_once_with(self.userid)
         networkdb_del.assert_called_once_with(self.userid)
         chk_db.assert_called_once_with(self.userid, raise_exc=False)
+        self.mock_namelist_remove.assert_called_once_with([self.userid])
 
     @mock.patch("zvmsdk.vmops.VMOps.check_guests_exist_in_db")
     @mock.patch("zvmsdk.database.NetworkDbOperator."
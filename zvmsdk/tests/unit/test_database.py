@@ -17,6 +17,8 @@
 
 
 import mock
+import os
+import threading
 import uuid
 import random
 from mock import Mock, patch
@@ -40,6 +42,67 @@ def mock_reset(*args):
             m.reset_mock(return_value=True, side_effect=True)
 
 
+class DBConnectionManagerTestCase(base.SDKTestCase):
+
+    def setUp(self):
+        super(DBConnectionManagerTestCase, self).setUp()
+        self.db_file = 'ut_conn_%s.sqlite' % uuid.uuid4().hex
+        self.addCleanup(self._remove_db)
+
+    def _remove_db(self):
+        for suffix in ('', '-wal', '-shm'):
+            path = os.path.join(CONF.database.dir, self.db_file + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _manager(self, wal_mode=True):
+        self.addCleanup(base.set_conf, 'database', 'wal_mode',
+                        CONF.database.wal_mode)
+        base.set_conf('database', 'wal_mode', wal_mode)
+        manager = database.DBConnectionManager(self.db_file)
+        with manager.writer() as conn:
+            conn.execute("CREATE TABLE t (id integer)")
+            conn.execute("INSERT INTO t VALUES (1)")
+        return manager
+
+    def _read_in_thread(self, manager):
+        result = []
+
+        def _read():
+            with manager.reader() as conn:
+                result.append(conn.execute("SELECT * FROM t").fetchall())
+
+        thread = threading.Thread(target=_read)
+        thread.start()
+        self.addCleanup(thread.join)
+        thread.join(1)
+        return result
+
+    def test_read_not_blocked_by_writer(self):
+        manager = self._manager()
+        self.assertTrue(manager.wal)
+        with manager.writer() as conn:
+            conn.execute("BEGIN")
+            conn.execute("INSERT INTO t VALUES (2)")
+            # Other threads read the last committed data in parallel
+            self.assertEqual([[(1,)]], self._read_in_thread(manager))
+            # The writer thread reads its own uncommitted data
+            with manager.reader() as rconn:
+                self.assertIs(conn, rconn)
+                self.assertEqual([(1,), (2,)],
+                                 rconn.execute("SELECT * FROM t").fetchall())
+            conn.execute("COMMIT")
+        self.assertEqual([[(1,), (2,)]], self._read_in_thread(manager))
+
+    def test_read_serialized_without_wal(self):
+        manager = self._manager(wal_mode=False)
+        self.assertFalse(manager.wal)
+        with manager.writer() as conn:
+            self.assertEqual([], self._read_in_thread(manager))
+            with manager.reader() as rconn:
+                self.assertIs(conn, rconn)
+
+
 class NetworkDbOperatorTestCase(base.SDKTestCase):
 
     @classmethod
@@ -444,6 +507,11 @@ class FCPDbOperatorTestCase(base.SDKTestCase):
             connections = result.fetchone()['connections']
             return connections
 
+    def _disable_free_fcp_index(self):
+        self.addCleanup(base.set_conf, 'volume', 'free_fcp_index',
+                        base.CONF.volume.free_fcp_index)
+        base.set_conf('volume', 'free_fcp_index', False)
+
     @staticmethod
     def _purge_fcp_db():
         """ Delete all records in the fcp related tables """
@@ -1115,13 +1183,16 @@ class FCPDbOperatorTestCase(base.SDKTestCase):
             self._purge_fcp_db()
 
     @patch('zvmsdk.database.FCPDbOperator.get_path_count')
-    @patch('zvmsdk.database._FCP_CONN')
+    @patch.object(database._FCP_DB, 'connection')
     @patch("zvmsdk.database.FCPDbOperator.get_free_pchids_by_fcp_template")
     @patch("zvmsdk.database.FCPDbOperator.get_min_fcp_paths_count")
     def test_get_fcp_devices(self, mock_min_path_count,
-                             mock_free_pchids_per_path, mock_conn,
+                             mock_free_pchids_per_path, mock_connection,
                              mock_total_path_count):
         '''Test get_fcp_devices'''
+        # query the free FCP devices from DB
+        self._disable_free_fcp_index()
+        mock_conn = mock_connection.return_value.__enter__.return_value
         fcp_template_id = 'fake_id'
         sql_string = (
             "SELECT fcp.fcp_id, fcp.wwpn_npiv, fcp.wwpn_phy, tf.path, fcp.pchid "
@@ -2020,9 +2091,10 @@ class FCPDbOperatorTestCase(base.SDKTestCase):
             self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
             self.db_op.bulk_delete_fcp_from_template(fcp_id_list, template_id)
 
-    @patch('zvmsdk.database._FCP_CONN')
-    def test_get_pchids_of_all_inuse_fcp_devices(self, mock_conn):
+    @patch.object(database._FCP_DB, 'connection')
+    def test_get_pchids_of_all_inuse_fcp_devices(self, mock_connection):
         """test get_pchids_of_all_inuse_fcp_devices"""
+        mock_conn = mock_connection.return_value.__enter__.return_value
         mock_conn.execute().fetchall.side_effect = [
             [],
             [   # all the keys and values must be in lower case,
@@ -2050,9 +2122,11 @@ class FCPDbOperatorTestCase(base.SDKTestCase):
         result = self.db_op.get_pchids_of_all_inuse_fcp_devices()
         self.assertDictEqual(expected, result)
 
-    @patch('zvmsdk.database._FCP_CONN')
-    def test_get_free_pchids_by_fcp_template(self, mock_conn):
+    @patch.object(database._FCP_DB, 'connection')
+    def test_get_free_pchids_by_fcp_template(self, mock_connection):
         """test get_free_pchids_by_fcp_template"""
+        self._disable_free_fcp_index()
+        mock_conn = mock_connection.return_value.__enter__.return_value
         mock_conn.execute().fetchall.side_effect = [
             [],
             [{'pchid': '01e0', 'path': '1'},
@@ -2070,6 +2144,135 @@ class FCPDbOperatorTestCase(base.SDKTestCase):
         result = self.db_op.get_free_pchids_by_fcp_template('fake_id')
         self.assertDictEqual(expected, result)
 
+    def _prepare_free_fcp_index_data(self):
+        self._purge_fcp_db()
+        tmpl_id = 'fake_id_' + str(random.randint(100000, 999999))
+        self.db_op.create_fcp_template(
+            tmpl_id, 'name', 'desc',
+            utils.expand_fcp_list('1A00-1A03;1B00-1B03'),
+            host_default=False, default_sp_list=[])
+        fcp_info = [
+            ('1a00', 'npiv_a0', 'phy_a0', '27', 'aaaa', 'free', 'none'),
+            ('1a01', 'npiv_a1', 'phy_a1', '27', 'aaaa', 'free', 'none'),
+            ('1a02', 'npiv_a2', 'phy_a2', '27', 'bbbb', 'free', 'none'),
+            ('1a03', 'npiv_a3', 'phy_a3', '27', 'bbbb', 'active', 'user1'),
+            ('1b00', 'npiv_b0', 'phy_b0', '30', 'cccc', 'free', 'none'),
+            ('1b01', '', 'phy_b1', '30', 'cccc', 'free', 'none'),
+            ('1b02', 'npiv_b2', 'phy_b2', '30', 'cccc', 'free', 'none')]
+        self.db_op.bulk_insert_zvm_fcp_info_into_fcp_table(fcp_info)
+        self.addCleanup(self._purge_fcp_db)
+        return tmpl_id
+
+    def _free_pchids_from_db(self, tmpl_id):
+        base.set_conf('volume', 'free_fcp_index', False)
+        try:
+            return self.db_op.get_free_pchids_by_fcp_template(tmpl_id)
+        finally:
+            base.set_conf('volume', 'free_fcp_index', True)
+
+    def test_free_fcp_index(self):
+        tmpl_id = self._prepare_free_fcp_index_data()
+        expected = {0: ['AAAA', 'BBBB'], 1: ['CCCC']}
+        self.assertEqual(expected, self._free_pchids_from_db(tmpl_id))
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        # reserve and connect
+        self.db_op.reserve_fcps(['1a02', '1b00'], 'user2', tmpl_id)
+        expected = {0: ['AAAA'], 1: ['CCCC']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        self.db_op.increase_connections_by_assigner('1a02', 'user2')
+        self.db_op.unreserve_fcps(['1a02', '1b00'])
+        expected = {0: ['AAAA'], 1: ['CCCC']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        self.db_op.decrease_connections('1a02')
+        expected = {0: ['AAAA', 'BBBB'], 1: ['CCCC']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        # synced from z/VM
+        self.db_op.bulk_update_state_in_fcp_table(['1b00', '1b02'],
+                                                  'notfound')
+        expected = {0: ['AAAA', 'BBBB']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        self.db_op.bulk_update_zvm_fcp_info_in_fcp_table(
+            [('1b02', 'npiv_b2', 'phy_b2', '30', 'dddd', 'free', 'none')])
+        expected = {0: ['AAAA', 'BBBB'], 1: ['DDDD']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        self.assertEqual(self._free_pchids_from_db(tmpl_id), expected)
+
+    def test_free_fcp_index_pick(self):
+        tmpl_id = self._prepare_free_fcp_index_data()
+        with database.get_fcp_conn() as conn:
+            fcp = database._FREE_FCP_INDEX.pick(conn, tmpl_id, 1, 'cccc')
+            # 1b01 has no NPIV WWPN
+            self.assertIn(fcp['fcp_id'], ('1B00', '1B02'))
+            suffix = fcp['fcp_id'][1::2].lower()
+            self.assertEqual({'fcp_id': fcp['fcp_id'],
+                              'wwpn_npiv': 'npiv_' + suffix,
+                              'wwpn_phy': 'phy_' + suffix,
+                              'path': 1, 'pchid': 'CCCC'}, fcp)
+            self.assertIsNone(
+                database._FREE_FCP_INDEX.pick(conn, tmpl_id, 0, 'cccc'))
+        self.db_op.reserve_fcps(['1b00', '1b02'], 'user2', tmpl_id)
+        with database.get_fcp_conn() as conn:
+            self.assertIsNone(
+                database._FREE_FCP_INDEX.pick(conn, tmpl_id, 1, 'cccc'))
+
+    def test_free_fcp_index_untracked_write(self):
+        tmpl_id = self._prepare_free_fcp_index_data()
+        expected = {0: ['AAAA', 'BBBB'], 1: ['CCCC']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        # the write not through the DMLs drops the index
+        self.increase_connections('1b00')
+        self.increase_connections('1b02')
+        expected = {0: ['AAAA', 'BBBB']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+        # so does the template change
+        self.db_op.edit_fcp_template(tmpl_id, fcp_devices='1A00-1A01;1B00')
+        expected = {0: ['AAAA']}
+        self.assertEqual(expected,
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+
+    def test_free_fcp_index_rollback(self):
+        tmpl_id = self._prepare_free_fcp_index_data()
+        try:
+            with database.get_fcp_conn():
+                self.db_op.reserve_fcps(['1b00', '1b02'], 'user2', tmpl_id)
+                self.assertEqual(
+                    {0: ['AAAA', 'BBBB']},
+                    self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+                raise exception.SDKVolumeOperationError(rs=11, userid='user2',
+                                                        msg='fake')
+        except exception.SDKVolumeOperationError:
+            pass
+        self.assertEqual({0: ['AAAA', 'BBBB'], 1: ['CCCC']},
+                         self.db_op.get_free_pchids_by_fcp_template(tmpl_id))
+
+    def test_get_fcp_devices_free_fcp_index(self):
+        tmpl_id = self._prepare_free_fcp_index_data()
+        pchid_info = {'AAAA': {'allocated': 0, 'max': 10},
+                      'BBBB': {'allocated': 0, 'max': 10},
+                      'CCCC': {'allocated': 0, 'max': 10}}
+        allocated = set()
+        for i in range(2):
+            fcp_list, empty_reason = self.db_op.get_fcp_devices(tmpl_id,
+                                                                pchid_info)
+            self.assertEqual('', empty_reason)
+            self.assertEqual([0, 1], [fcp['path'] for fcp in fcp_list])
+            fcp_ids = [fcp['fcp_id'] for fcp in fcp_list]
+            self.db_op.reserve_fcps(fcp_ids, 'user%d' % i, tmpl_id)
+            allocated.update(fcp_ids)
+        self.assertEqual({'1B00', '1B02'}, allocated & {'1B00', '1B02'})
+        # no free FCP device left in path 1
+        fcp_list, empty_reason = self.db_op.get_fcp_devices(tmpl_id,
+                                                            pchid_info)
+        self.assertEqual([], fcp_list)
+
 
 class GuestDbOperatorTestCase(base.SDKTestCase):
     @classmethod
@@ -2405,3 +2608,72 @@ class ImageDbOperatorTestCase(base.SDKTestCase):
         # Clean up the images
         self.db_op.image_delete_record(imagename1)
         self.db_op.image_delete_record(imagename2)
+
+
+class JobDbOperatorTestCase(base.SDKTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(JobDbOperatorTestCase, cls).setUpClass()
+        cls.db_op = database.JobDbOperator()
+
+    @classmethod
+    def tearDownClass(cls):
+        with database.get_job_conn() as conn:
+            conn.execute("DROP TABLE jobs")
+        super(JobDbOperatorTestCase, cls).tearDownClass()
+
+    def tearDown(self):
+        with database.get_job_conn() as conn:
+            conn.execute("DELETE FROM jobs")
+        super(JobDbOperatorTestCase, self).tearDown()
+
+    def _job(self, job_id, state='queued', target='USER1', updated_at=1.0):
+        return {'job_id': job_id, 'operation': 'guest_capture',
+                'target': target, 'queue': 'guest_capture', 'state': state,
+                'progress': 0, 'step': '', 'result': None, 'error': None,
+                'created_at': updated_at, 'updated_at': updated_at}
+
+    def test_save_get_job(self):
+        job = self._job('job1')
+        self.db_op.save_job(job)
+        self.assertEqual(job, self.db_op.get_job('job1'))
+        job.update({'state': 'succeeded', 'progress': 100,
+                    'result': {'image': 'image1'}})
+        self.db_op.save_job(job)
+        self.assertEqual(job, self.db_op.get_job('job1'))
+        self.assertIsNone(self.db_op.get_job('job2'))
+
+    def test_get_jobs(self):
+        self.db_op.save_job(self._job('job1', updated_at=1.0))
+        self.db_op.save_job(self._job('job2', state='running',
+                                      updated_at=2.0))
+        self.db_op.save_job(self._job('job3', target='USER2',
+                                      updated_at=3.0))
+        self.assertEqual(['job3', 'job2', 'job1'],
+                         [j['job_id'] for j in self.db_op.get_jobs()])
+        self.assertEqual(['job2', 'job1'],
+                         [j['job_id'] for j in
+                          self.db_op.get_jobs(target='USER1')])
+        self.assertEqual(['job2'],
+                         [j['job_id'] for j in
+                          self.db_op.get_jobs(target='USER1',
+                                              state='running')])
+
+    def test_fail_unfinished_delete_jobs(self):
+        self.db_op.save_job(self._job('job1', updated_at=1.0))
+        self.db_op.save_job(self._job('job2', state='running',
+                                      updated_at=2.0))
+        self.db_op.save_job(self._job('job3', state='succeeded',
+                                      updated_at=3.0))
+        error = {'overallRC': 500, 'errmsg': 'stopped'}
+        self.assertEqual(2, self.db_op.fail_unfinished_jobs(
+            ('queued', 'running'), error, 4.0))
+        job = self.db_op.get_job('job1')
+        self.assertEqual('failed', job['state'])
+        self.assertEqual(error, job['error'])
+        self.assertEqual(4.0, job['updated_at'])
+
+        self.db_op.delete_jobs_before(5.0, ('succeeded',))
+        self.assertEqual(['job2', 'job1'],
+                         [j['job_id'] for j in self.db_op.get_jobs()])
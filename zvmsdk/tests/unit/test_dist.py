@@ -16,7 +16,10 @@
 #    under the License.
 import mock
 import os
+import shutil
+import tempfile
 
+import jinja2
 from jinja2 import Template
 from zvmsdk import dist
 from zvmsdk import smtclient
@@ -680,3 +683,44 @@ class UBUNTU20TestCase(base.SDKTestCase):
                                                 lun_id='0x0100000000000000',
                                                 target_filename='sdz',
                                                 is_last_volume=1)
+
+
+class TemplateCacheTestCase(base.SDKTestCase):
+
+    def setUp(self):
+        super(TemplateCacheTestCase, self).setUp()
+        dist.reset_templates()
+        self.addCleanup(dist.reset_templates)
+
+    def test_get_template_compiled_once(self):
+        template = dist.get_template("volumeops", "rhel7_attach_volume.j2")
+        self.assertIs(template,
+                      dist.get_template("volumeops", "rhel7_attach_volume.j2"))
+        self.assertIs(template,
+                      dist.rhel7().get_template("volumeops",
+                                                "rhel7_attach_volume.j2"))
+        # same content as rendered from the template file
+        base_path = os.path.dirname(os.path.abspath(dist.__file__))
+        loader = jinja2.FileSystemLoader(
+            os.path.join(base_path, 'volumeops', 'templates'))
+        expected = jinja2.Environment(loader=loader).get_template(
+            "rhel7_attach_volume.j2")
+        kwargs = {'fcp_list': '1a10 1b10', 'wwpns': '5005076802100c1b',
+                  'lun': '0x0000000000000000', 'target_filename': 'sdb'}
+        self.assertEqual(expected.render(**kwargs), template.render(**kwargs))
+
+    def test_load_templates(self):
+        dist.load_templates()
+        self.assertIn('vmactions/grow_root_volume.j2', dist._templates)
+        self.assertIn('volumeops/sles_detach_volume.j2', dist._templates)
+        with mock.patch.object(dist._template_env, 'get_template') as get:
+            dist.get_template("volumeops", "ubuntu_attach_volume.j2")
+            get.assert_not_called()
+
+    def test_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        base.set_conf('guest', 'template_cache_dir', cache_dir)
+        self.addCleanup(base.set_conf, 'guest', 'template_cache_dir', '')
+        dist.get_template("vmactions", "grow_root_volume.j2")
+        self.assertEqual(1, len(os.listdir(cache_dir)))
@@ -22,6 +22,7 @@ from zvmsdk import config
 from zvmsdk import hostops
 from zvmsdk import exception
 from zvmsdk.tests.unit import base
+from zvmsdk import utils as zvmutils
 
 CONF = config.CONF
 
@@ -32,25 +33,37 @@ class SDKHostOpsTestCase(base.SDKTestCase):
 
     @mock.patch("zvmsdk.smtclient.SMTClient.host_get_ssi_info")
     @mock.patch("zvmsdk.smtclient.SMTClient.get_all_user_direct")
-    def test_guest_list(self, host_get_ssi_info, get_all_user_direct):
+    def test_guest_list(self, get_all_user_direct, host_get_ssi_info):
         host_get_ssi_info.return_value = []
         self._hostops.guest_list()
         get_all_user_direct.assert_called_once_with()
         host_get_ssi_info.assert_called_once()
 
+    @mock.patch("zvmsdk.utils.query_names")
     @mock.patch("zvmsdk.smtclient.SMTClient.host_get_ssi_info")
-    @mock.patch("zvmsdk.utils.check_userid_on_others")
     @mock.patch("zvmsdk.smtclient.SMTClient.get_all_user_direct")
-    def test_guest_list_ssi_host(self, host_get_ssi_info,
-                                 check_userid_on_others, get_all_user_direct):
+    def test_guest_list_ssi_host(self, get_all_user_direct,
+                                 host_get_ssi_info, query_names):
         res_ssi = ['ssi_name = SSI',
                    'ssi_mode = Stable',
                    'ssi_pdr = IAS7CM_on_139E']
         host_get_ssi_info.return_value = res_ssi
-        self._hostops.guest_list()
+        get_all_user_direct.return_value = ['USERID1', 'USERID2', 'USERID3']
+        query_names.return_value = {'USERID1': 'DSC', 'USERID2': 'SSI'}
+        self.addCleanup(base.set_conf, 'guest', 'index_refresh_interval',
+                        CONF.guest.index_refresh_interval)
+        base.set_conf('guest', 'index_refresh_interval', 300)
+        zvmutils.invalidate_userids_on_others()
+        self.addCleanup(zvmutils.invalidate_userids_on_others)
+        self.assertEqual(['USERID1', 'USERID3'], self._hostops.guest_list())
         get_all_user_direct.assert_called_once_with()
         host_get_ssi_info.assert_called_once()
-        check_userid_on_others.assert_called()
+        # The SSI residency is cached until a guest is created or deleted
+        self.assertEqual(['USERID1', 'USERID3'], self._hostops.guest_list())
+        query_names.assert_called_once_with()
+        zvmutils.invalidate_userids_on_others()
+        query_names.return_value = {'USERID3': 'SSI'}
+        self.assertEqual(['USERID1', 'USERID2'], self._hostops.guest_list())
 
     @mock.patch("zvmsdk.hostops.HOSTOps.diskpool_get_info")
     @mock.patch("zvmsdk.smtclient.SMTClient.get_host_info")
@@ -0,0 +1,185 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import mock
+import threading
+import time
+
+from zvmsdk import database
+from zvmsdk import exception
+from zvmsdk import jobs
+from zvmsdk.tests.unit import base
+
+
+class JobSchedulerTestCase(base.SDKTestCase):
+
+    def setUp(self):
+        super(JobSchedulerTestCase, self).setUp()
+        self.release = threading.Event()
+        self.started = []
+        self.lock = threading.Lock()
+
+    def _func(self, name):
+        def func(job):
+            with self.lock:
+                self.started.append(name)
+            job.set_progress(50, 'waiting')
+            self.release.wait(10)
+            return name
+        return func
+
+    def _wait(self, scheduler, jobs_list):
+        for i in range(1000):
+            if all(job.finished for job in jobs_list):
+                return
+            time.sleep(0.01)
+        self.fail("the jobs did not finish")
+
+    def test_submit(self):
+        scheduler = jobs.JobScheduler(2, 2)
+        job = scheduler.submit('op', self._func('a'), target='USER1',
+                               queue='POOL1')
+        self.assertIs(job, scheduler.get(job.job_id))
+        self.release.set()
+        self._wait(scheduler, [job])
+        info = job.to_dict()
+        self.assertEqual(jobs.JOB_SUCCEEDED, info['state'])
+        self.assertEqual(100, info['progress'])
+        self.assertEqual('a', info['result'])
+        self.assertEqual('USER1', info['target'])
+        self.assertEqual('POOL1', info['queue'])
+        self.assertIsNone(info['error'])
+
+    def test_submit_failed(self):
+        scheduler = jobs.JobScheduler(2, 2)
+
+        def func(job):
+            raise exception.SDKGuestOperationError(rs=3, userid='USER1',
+                                                   unpack_rc=1, err='')
+
+        def func_internal(job):
+            raise ValueError('fake error')
+
+        job = scheduler.submit('op', func)
+        job_internal = scheduler.submit('op', func_internal)
+        self._wait(scheduler, [job, job_internal])
+        self.assertEqual(jobs.JOB_FAILED, job.state)
+        self.assertEqual(3, job.error['rs'])
+        self.assertEqual(jobs.JOB_FAILED, job_internal.state)
+        self.assertEqual(500, job_internal.error['overallRC'])
+        self.assertIn('fake error', job_internal.error['errmsg'])
+
+    def test_get_not_exist(self):
+        scheduler = jobs.JobScheduler(2, 2)
+        self.assertIsNone(scheduler.get('fakeid'))
+
+    def test_job_saved(self):
+        job_db = mock.Mock()
+        scheduler = jobs.JobScheduler(2, 2, job_db)
+        job = scheduler.submit('op', self._func('a'), target='USER1')
+        self.release.set()
+        self.assertTrue(job.wait(10))
+        states = [(c[0][0]['state'], c[0][0]['progress'])
+                  for c in job_db.save_job.call_args_list]
+        self.assertEqual([(jobs.JOB_QUEUED, 0), (jobs.JOB_RUNNING, 0),
+                          (jobs.JOB_RUNNING, 50), (jobs.JOB_SUCCEEDED, 100)],
+                         states)
+        job_db.delete_jobs_before.assert_called_once_with(
+            mock.ANY, (jobs.JOB_SUCCEEDED, jobs.JOB_FAILED))
+
+    def test_queue_limit(self):
+        scheduler = jobs.JobScheduler(3, 1)
+        submitted = [scheduler.submit('op', self._func(name), queue=queue)
+                     for name, queue in (('a1', 'A'), ('a2', 'A'),
+                                         ('a3', 'A'), ('b1', 'B'),
+                                         ('c1', 'C'))]
+        time.sleep(0.1)
+        # One job per queue runs, the other jobs of queue A wait
+        self.assertEqual(['a1', 'b1', 'c1'], sorted(self.started))
+        self.assertEqual(jobs.JOB_QUEUED, submitted[1].state)
+        self.assertEqual(50, submitted[0].progress)
+        self.release.set()
+        self._wait(scheduler, submitted)
+        self.assertEqual(['a2', 'a3'], self.started[3:])
+
+    def test_queues_served_in_turn(self):
+        scheduler = jobs.JobScheduler(1, 1)
+        submitted = [scheduler.submit('op', self._func(name), queue=queue)
+                     for name, queue in (('a1', 'A'), ('a2', 'A'),
+                                         ('a3', 'A'), ('b1', 'B'),
+                                         ('b2', 'B'))]
+        self.release.set()
+        self._wait(scheduler, submitted)
+        self.assertEqual(['a1', 'b1', 'a2', 'b2', 'a3'], self.started)
+
+
+class JobQueryTestCase(base.SDKTestCase):
+
+    def setUp(self):
+        super(JobQueryTestCase, self).setUp()
+        for name in ('_SCHEDULERS', '_JOB_SCHEDULER', '_DEPLOY_SCHEDULER',
+                     '_JOB_DB'):
+            self.addCleanup(setattr, jobs, name, getattr(jobs, name))
+        jobs._SCHEDULERS = []
+        jobs._JOB_SCHEDULER = None
+        jobs._DEPLOY_SCHEDULER = None
+        jobs._JOB_DB = None
+        self.addCleanup(self._drop_jobs)
+
+    def _drop_jobs(self):
+        with database.get_job_conn() as conn:
+            conn.execute("DROP TABLE IF EXISTS jobs")
+
+    def test_query_job(self):
+        release = threading.Event()
+        job = jobs.get_job_scheduler().submit(
+            'guest_capture', lambda job: release.wait(10), target='USER1',
+            queue='guest_capture')
+        info = jobs.query_job(job.job_id)
+        self.assertIn(info['state'], (jobs.JOB_QUEUED, jobs.JOB_RUNNING))
+        release.set()
+        info = jobs.query_job(job.job_id, wait=10)
+        self.assertEqual(jobs.JOB_SUCCEEDED, info['state'])
+        self.assertEqual([info], jobs.list_jobs(target='USER1'))
+
+        # The finished jobs are got from the DB once out of memory
+        with mock.patch.object(jobs.JobScheduler, 'get', return_value=None):
+            self.assertEqual(info, jobs.query_job(job.job_id))
+        self.assertRaises(exception.SDKObjectNotExistError,
+                          jobs.query_job, 'fakeid')
+
+    @mock.patch.object(jobs, 'MAX_QUERY_WAIT', 0.1)
+    def test_query_job_wait_capped(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        job = jobs.get_job_scheduler().submit(
+            'guest_capture', lambda job: release.wait(10), target='USER1',
+            queue='guest_capture')
+        start = time.time()
+        info = jobs.query_job(job.job_id, wait=300)
+        self.assertLess(time.time() - start, 5)
+        self.assertIn(info['state'], (jobs.JOB_QUEUED, jobs.JOB_RUNNING))
+
+    def test_unfinished_jobs_failed_on_start(self):
+        job_db = database.JobDbOperator()
+        job_db.save_job({'job_id': 'job1', 'operation': 'guest_capture',
+                         'target': 'USER1', 'queue': 'guest_capture',
+                         'state': jobs.JOB_RUNNING, 'progress': 0,
+                         'step': '', 'result': None, 'error': None,
+                         'created_at': 1.0, 'updated_at': 1.0})
+        info = jobs.query_job('job1')
+        self.assertEqual(jobs.JOB_FAILED, info['state'])
+        self.assertEqual(500, info['error']['overallRC'])
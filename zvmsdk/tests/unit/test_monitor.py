@@ -16,7 +16,9 @@
 #    under the License.
 
 import mock
+import threading
 
+from zvmsdk import exception
 from zvmsdk import monitor
 from zvmsdk.tests.unit import base
 
@@ -149,7 +151,7 @@ class SDKMonitorTestCase(base.SDKTestCase):
         self._monitor = monitor.ZVMMonitor()
 
     @mock.patch("zvmsdk.monitor.MeteringCache.get")
-    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state_bulk")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._cache_enabled")
     def test_private_get_inspect_data_cache_hit_single(self, cache_enabled,
                                                        get_ps, cache_get):
@@ -166,7 +168,7 @@ class SDKMonitorTestCase(base.SDKTestCase):
         cache_enabled.assert_not_called()
 
     @mock.patch("zvmsdk.monitor.MeteringCache.get")
-    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state_bulk")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._cache_enabled")
     def test_private_get_inspect_data_cache_hit_multi(self, cache_enabled,
                                                        get_ps, cache_get):
@@ -189,19 +191,19 @@ class SDKMonitorTestCase(base.SDKTestCase):
         cache_enabled.assert_not_called()
 
     @mock.patch("zvmsdk.monitor.MeteringCache.get")
-    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state_bulk")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._update_cpumem_data")
     def test_private_get_inspect_data_cache_miss_single(self,
                                                         update_cpumem_data,
                                                         get_ps, cache_get):
         cache_get.return_value = None
-        get_ps.return_value = 'on'
+        get_ps.return_value = {'userid1': 'on'}
         update_cpumem_data.return_value = {
             'USERID1': CPUMEM_SAMPLE1,
             'USERID2': CPUMEM_SAMPLE2
             }
         rdata = self._monitor._get_inspect_data('cpumem', ['userid1'])
-        get_ps.assert_called_once_with('userid1')
+        get_ps.assert_called_once_with(['userid1'])
         update_cpumem_data.assert_called_once_with(['userid1'])
         self.assertEqual(sorted(rdata.keys()), sorted(['USERID1', 'USERID2']))
         self.assertEqual(sorted(rdata['USERID1'].keys()),
@@ -211,7 +213,7 @@ class SDKMonitorTestCase(base.SDKTestCase):
         self.assertEqual(rdata['USERID1']['used_memory'], '290232 KB')
 
     @mock.patch("zvmsdk.monitor.MeteringCache.get")
-    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state_bulk")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._update_cpumem_data")
     def test_private_get_inspect_data_cache_miss_multi(self,
                                                         update_cpumem_data,
@@ -230,14 +232,14 @@ class SDKMonitorTestCase(base.SDKTestCase):
             'min_memory': '0 KB',
             'shared_memory': '4222192 KB',
             }, None]
-        get_ps.return_value = 'on'
+        get_ps.return_value = {'userid2': 'on'}
         update_cpumem_data.return_value = {
             'USERID1': CPUMEM_SAMPLE1,
             'USERID2': CPUMEM_SAMPLE2
             }
         rdata = self._monitor._get_inspect_data('cpumem',
                                                 ['userid1', 'userid2'])
-        get_ps.assert_called_once_with('userid2')
+        get_ps.assert_called_once_with(['userid2'])
         update_cpumem_data.assert_called_once_with(['userid1', 'userid2'])
         self.assertEqual(sorted(rdata.keys()), sorted(['USERID1', 'USERID2']))
         self.assertEqual(sorted(rdata['USERID1'].keys()),
@@ -248,38 +250,52 @@ class SDKMonitorTestCase(base.SDKTestCase):
         self.assertEqual(rdata['USERID1']['shared_memory'], '5222192 KB')
 
     @mock.patch("zvmsdk.monitor.MeteringCache.get")
-    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state_bulk")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._update_cpumem_data")
     def test_private_get_inspect_data_guest_off(self,
                                                 update_cpumem_data,
                                                 get_ps, cache_get):
         cache_get.return_value = None
-        get_ps.return_value = 'off'
+        get_ps.return_value = {'userid1': 'off'}
         rdata = self._monitor._get_inspect_data('cpumem',
                                                 ['userid1'])
-        get_ps.assert_called_once_with('userid1')
+        get_ps.assert_called_once_with(['userid1'])
         update_cpumem_data.assert_not_called()
         self.assertEqual(rdata, {})
 
     @mock.patch("zvmsdk.monitor.MeteringCache.get")
-    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state_bulk")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._update_nic_data")
     def test_private_get_inspect_data_vnics(self,
                                             update_nic_data,
                                             get_ps, cache_get):
         cache_get.return_value = None
-        get_ps.return_value = 'on'
+        get_ps.return_value = {'USERID1': 'on'}
         update_nic_data.return_value = {'USERID1': INST_NICS_SAMPLE1,
                                         'USERID2': INST_NICS_SAMPLE2
                                         }
         rdata = self._monitor._get_inspect_data('vnics',
                                                 ['USERID1'])
-        get_ps.assert_called_once_with('USERID1')
+        get_ps.assert_called_once_with(['USERID1'])
         update_nic_data.assert_called_once_with()
         self.assertEqual(rdata, {'USERID1': INST_NICS_SAMPLE1,
                                  'USERID2': INST_NICS_SAMPLE2
                                  })
 
+    @mock.patch("zvmsdk.monitor.MeteringCache.get")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_power_state_bulk")
+    @mock.patch("zvmsdk.monitor.ZVMMonitor._update_cpumem_data")
+    def test_private_get_inspect_data_cache_miss_guests_off(self,
+                                                update_cpumem_data,
+                                                get_ps, cache_get):
+        cache_get.side_effect = [CPUMEM_SAMPLE1, None, None]
+        get_ps.return_value = {'USERID2': 'off', 'USERID3': 'off'}
+        rdata = self._monitor._get_inspect_data(
+            'cpumem', ['USERID1', 'USERID2', 'USERID3'])
+        get_ps.assert_called_once_with(['USERID2', 'USERID3'])
+        update_cpumem_data.assert_not_called()
+        self.assertEqual({'USERID1': CPUMEM_SAMPLE1}, rdata)
+
     @mock.patch("zvmsdk.smtclient.SMTClient.system_image_performance_query")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._cache_enabled")
     @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
@@ -297,7 +313,8 @@ class SDKMonitorTestCase(base.SDKTestCase):
             }
         rdata = self._monitor._update_cpumem_data(['userid1'])
         image_performance_query.assert_called_once_with('TSTNLIST')
-        namelist_query.assert_called_once_with('TSTNLIST')
+        namelist_query.assert_called_once_with('TSTNLIST',
+                                               raise_exception=True)
         get_vm_list.assert_called_once_with()
         self.assertEqual(sorted(rdata.keys()), sorted(['USERID1', 'USERID2']))
         self.assertEqual(rdata['USERID1']['guest_cpus'], '1')
@@ -324,7 +341,8 @@ class SDKMonitorTestCase(base.SDKTestCase):
             }
         rdata = self._monitor._update_cpumem_data(['USERID1', 'USERID2'])
         image_performance_query.assert_called_once_with('TSTNLIST')
-        namelist_query.assert_called_once_with('TSTNLIST')
+        namelist_query.assert_called_once_with('TSTNLIST',
+                                               raise_exception=True)
         get_vm_list.assert_called_once_with()
         namelist_add.assert_called_once_with('TSTNLIST', 'USERID2')
         self.assertEqual(sorted(rdata.keys()), sorted(['USERID1', 'USERID2']))
@@ -335,6 +353,116 @@ class SDKMonitorTestCase(base.SDKTestCase):
         self._monitor._cache._cache['cpumem']['data']['USERID2']['guest_cpus'],
         '3')
 
+    @mock.patch("zvmsdk.smtclient.SMTClient.system_image_performance_query")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_add")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_query")
+    @mock.patch("zvmsdk.monitor.ZVMMonitor._cache_enabled")
+    def test_private_update_cpumem_data_namelist_synced(self,
+                                cache_enabled, namelist_query, get_vm_list,
+                                namelist_add, image_performance_query):
+        cache_enabled.return_value = True
+        namelist_query.return_value = ['USERID1', 'USERID2']
+        get_vm_list.return_value = ['USERID1', 'USERID2']
+        image_performance_query.return_value = {}
+        self._monitor._update_cpumem_data(['USERID1'])
+        self._monitor._update_cpumem_data(['USERID1', 'USERID3'])
+        # The namelist is synced once, then no more namelist calls
+        namelist_query.assert_called_once_with('TSTNLIST',
+                                               raise_exception=True)
+        get_vm_list.assert_called_once_with()
+        namelist_add.assert_not_called()
+        self.assertEqual(2, image_performance_query.call_count)
+
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_remove")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_add")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_query")
+    def test_namelist_hooks(self, namelist_query, get_vm_list, namelist_add,
+                            namelist_remove):
+        namelist_query.return_value = ['USERID1', 'USERID2']
+        get_vm_list.return_value = ['USERID1', 'USERID2']
+        self._monitor.namelist_add(['userid2', 'userid3'])
+        namelist_add.assert_called_once_with('TSTNLIST', 'USERID3')
+        self._monitor.namelist_remove(['USERID1', 'USERID4'])
+        namelist_remove.assert_called_once_with('TSTNLIST', 'USERID1')
+        self.assertEqual({'USERID2', 'USERID3'},
+                         self._monitor._namelist_members)
+        namelist_query.assert_called_once_with('TSTNLIST',
+                                               raise_exception=True)
+
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_remove")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_add")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_query")
+    def test_reconcile_namelist(self, namelist_query, get_vm_list,
+                                namelist_add, namelist_remove):
+        namelist_query.return_value = ['USERID1', 'USERID2']
+        get_vm_list.return_value = ['USERID2', 'USERID3', 'USERID4']
+        namelist_add.return_value = True
+        self._monitor.reconcile_namelist()
+        namelist_add.assert_has_calls([mock.call('TSTNLIST', 'USERID3'),
+                                       mock.call('TSTNLIST', 'USERID4')])
+        # The guests not managed by SDK are left in the namelist
+        namelist_remove.assert_not_called()
+        self.assertEqual({'USERID1', 'USERID2', 'USERID3', 'USERID4'},
+                         self._monitor._namelist_members)
+
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_add")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_query")
+    def test_reconcile_namelist_add_failed(self, namelist_query, get_vm_list,
+                                           namelist_add):
+        namelist_query.return_value = ['USERID1']
+        get_vm_list.return_value = ['USERID1', 'USERID2']
+        namelist_add.return_value = False
+        self._monitor.reconcile_namelist()
+        self._monitor.namelist_add(['USERID3'])
+        # The failed adds are not mirrored, the next reconcile retries them
+        self.assertEqual({'USERID1'}, self._monitor._namelist_members)
+        namelist_add.return_value = True
+        self._monitor.reconcile_namelist()
+        self.assertEqual({'USERID1', 'USERID2'},
+                         self._monitor._namelist_members)
+        namelist_add.assert_has_calls([mock.call('TSTNLIST', 'USERID2'),
+                                       mock.call('TSTNLIST', 'USERID3'),
+                                       mock.call('TSTNLIST', 'USERID2')])
+
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_add")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_query")
+    def test_reconcile_namelist_query_failed(self, namelist_query,
+                                             get_vm_list, namelist_add):
+        namelist_query.side_effect = exception.SDKSMTRequestFailed({}, 'err')
+        get_vm_list.return_value = ['USERID1', 'USERID2']
+        namelist_add.return_value = True
+        self._monitor.reconcile_namelist()
+        # The namelist content is unknown, all the managed guests are added
+        self.assertIsNone(self._monitor._namelist_members)
+        namelist_add.assert_has_calls([mock.call('TSTNLIST', 'USERID1'),
+                                       mock.call('TSTNLIST', 'USERID2')])
+        namelist_query.side_effect = None
+        namelist_query.return_value = ['USERID1', 'USERID2']
+        self._monitor.namelist_add(['USERID2'])
+        self.assertEqual({'USERID1', 'USERID2'},
+                         self._monitor._namelist_members)
+        self.assertEqual(2, namelist_add.call_count)
+
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_add")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_query")
+    def test_namelist_reconciled_periodically(self, namelist_query,
+                                              get_vm_list, namelist_add):
+        namelist_query.return_value = ['USERID1']
+        get_vm_list.return_value = ['USERID1']
+        self._monitor.namelist_add(['USERID1'])
+        self._monitor.namelist_add(['USERID1'])
+        self.assertEqual(1, namelist_query.call_count)
+        self._monitor._namelist_expiration = 0
+        self._monitor.namelist_add(['USERID1'])
+        self.assertEqual(2, namelist_query.call_count)
+        namelist_add.assert_not_called()
+
     @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
     @mock.patch("zvmsdk.monitor.ZVMMonitor._cache_enabled")
     @mock.patch("zvmsdk.smtclient.SMTClient.system_image_performance_query")
@@ -349,7 +477,8 @@ class SDKMonitorTestCase(base.SDKTestCase):
             }
         get_vm_list.return_value = ['USERID1', 'USERID2']
         rdata = self._monitor._update_cpumem_data(['userid1'])
-        namelist_query.assert_called_once_with('TSTNLIST')
+        namelist_query.assert_called_once_with('TSTNLIST',
+                                               raise_exception=True)
         get_vm_list.assert_called_once_with()
         image_perform_query.assert_called_once_with('TSTNLIST')
         self.assertEqual(list(rdata.keys()), ['USERID1'])
@@ -467,3 +596,61 @@ class SDKMonitorTestCase(base.SDKTestCase):
                          None)
         self.assertEqual(self._monitor._cache.get('vnics', 'USERID2'),
                          None)
+
+    @mock.patch("zvmsdk.monitor.ZVMMonitor._update_data")
+    def test_refresher(self, update_data):
+        self.addCleanup(base.set_conf, 'monitor', 'cache_interval',
+                        base.CONF.monitor.cache_interval)
+        base.set_conf('monitor', 'cache_interval', 300)
+        refreshed = threading.Event()
+        update_data.side_effect = lambda type, uid_list: refreshed.set()
+        self._monitor.start_refresher()
+        self.assertTrue(refreshed.wait(5))
+        update_data.assert_any_call('cpumem', [])
+        refresher = self._monitor._refresher
+        self._monitor.start_refresher()
+        self.assertIs(refresher, self._monitor._refresher)
+
+
+class MeteringCacheTestCase(base.SDKTestCase):
+    def setUp(self):
+        super(MeteringCacheTestCase, self).setUp()
+        self.addCleanup(base.set_conf, 'monitor', 'cache_interval',
+                        base.CONF.monitor.cache_interval)
+        base.set_conf('monitor', 'cache_interval', 300)
+        self._cache = monitor.MeteringCache(('cpumem', 'vnics'),
+                                            max_entries=2)
+
+    @mock.patch("time.time")
+    def test_get_expired_per_key(self, now):
+        now.return_value = 1000
+        self._cache.set('cpumem', 'USERID1', CPUMEM_SAMPLE1)
+        now.return_value = 1200
+        self._cache.set('cpumem', 'USERID2', CPUMEM_SAMPLE2)
+        now.return_value = 1350
+        self.assertIsNone(self._cache.get('cpumem', 'USERID1'))
+        self.assertEqual(CPUMEM_SAMPLE2, self._cache.get('cpumem', 'USERID2'))
+
+    def test_set_evict_lru(self):
+        self._cache.set('cpumem', 'USERID1', CPUMEM_SAMPLE1)
+        self._cache.set('cpumem', 'USERID2', CPUMEM_SAMPLE2)
+        self._cache.get('cpumem', 'USERID1')
+        self._cache.set('cpumem', 'USERID3', CPUMEM_SAMPLE2)
+        self.assertIsNone(self._cache.get('cpumem', 'USERID2'))
+        self.assertEqual(CPUMEM_SAMPLE1, self._cache.get('cpumem', 'USERID1'))
+        self.assertEqual(CPUMEM_SAMPLE2, self._cache.get('cpumem', 'USERID3'))
+
+    def test_refresh(self):
+        self._cache.set('cpumem', 'USERID1', CPUMEM_SAMPLE1)
+        self._cache.refresh('cpumem', {'USERID2': CPUMEM_SAMPLE2})
+        self.assertIsNone(self._cache.get('cpumem', 'USERID1'))
+        self.assertEqual(CPUMEM_SAMPLE2, self._cache.get('cpumem', 'USERID2'))
+
+    def test_clear(self):
+        self._cache.set('cpumem', 'USERID1', CPUMEM_SAMPLE1)
+        self._cache.set('vnics', 'USERID1', INST_NICS_SAMPLE1)
+        self._cache.clear('vnics')
+        self.assertIsNone(self._cache.get('vnics', 'USERID1'))
+        self.assertEqual(CPUMEM_SAMPLE1, self._cache.get('cpumem', 'USERID1'))
+        self._cache.clear()
+        self.assertIsNone(self._cache.get('cpumem', 'USERID1'))
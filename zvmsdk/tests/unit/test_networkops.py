@@ -16,7 +16,10 @@
 #    under the License.
 
 import mock
+import os
 import shutil
+import tarfile
+import tempfile
 
 from zvmsdk.tests.unit import base
 from zvmsdk import dist
@@ -150,11 +153,10 @@ class SDKNetworkOpsTestCase(base.SDKTestCase):
     @mock.patch('zvmsdk.dist.LinuxDistManager.get_linux_dist')
     @mock.patch.object(dist.rhel7, 'create_network_configuration_files')
     @mock.patch('zvmsdk.networkops.NetworkOPS._create_znetconfig')
-    @mock.patch('zvmsdk.networkops.NetworkOPS._add_file')
     @mock.patch('zvmsdk.networkops.NetworkOPS._create_invokeScript')
     @mock.patch('zvmsdk.networkops.NetworkOPS._create_network_doscript')
     def test_generate_network_doscript_not_active(self, doscript, invokeScript,
-                                    add_file, znetconfig, config, linux_dist):
+                                    znetconfig, config, linux_dist):
         net_conf_files = [('target1', 'content1')]
         net_cmd_file = [('target2', 'content2')]
         net_conf_cmds = ''
@@ -174,8 +176,7 @@ class SDKNetworkOpsTestCase(base.SDKTestCase):
         linux_dist.return_value = dist.rhel7
         config.return_value = files_and_cmds
         znetconfig.return_value = net_cmd_file
-        add_file.return_value = None
-        invokeScript.return_value = None
+        invokeScript.return_value = 'invoke script'
         doscript.return_value = 'result1'
 
         r1, r2 = self.networkops._generate_network_doscript(userid,
@@ -184,9 +185,11 @@ class SDKNetworkOpsTestCase(base.SDKTestCase):
         linux_dist.assert_called_with(os_version)
         config.assert_called_with(network_file_path, network_info,
                                   first, active=False)
-        invokeScript.assert_called_with(network_file_path, clean_cmd,
-                                        files_map)
-        doscript.assert_called_with(network_file_path)
+        invokeScript.assert_called_with(clean_cmd, files_map)
+        doscript.assert_called_with(network_file_path,
+                                    [('0000', 'content1'),
+                                     ('0001', 'content2'),
+                                     ('invokeScript.sh', 'invoke script')])
 
         self.assertEqual(r1, 'result1')
         self.assertEqual(r2, '')
@@ -195,11 +198,10 @@ class SDKNetworkOpsTestCase(base.SDKTestCase):
     @mock.patch.object(dist.rhel7, 'create_network_configuration_files')
     @mock.patch.object(dist.rhel7, 'create_active_net_interf_cmd')
     @mock.patch('zvmsdk.networkops.NetworkOPS._create_znetconfig')
-    @mock.patch('zvmsdk.networkops.NetworkOPS._add_file')
     @mock.patch('zvmsdk.networkops.NetworkOPS._create_invokeScript')
     @mock.patch('zvmsdk.networkops.NetworkOPS._create_network_doscript')
     def test_generate_network_doscript_active(self, doscript, invokeScript,
-                                    add_file, znetconfig, active_cmd,
+                                    znetconfig, active_cmd,
                                     config, linux_dist):
         net_conf_files = [('target1', 'content1')]
         net_cmd_file = [('target2', 'content2')]
@@ -222,8 +224,7 @@ class SDKNetworkOpsTestCase(base.SDKTestCase):
         config.return_value = files_and_cmds
         active_cmd.return_value = active_net_cmd
         znetconfig.return_value = net_cmd_file
-        add_file.return_value = None
-        invokeScript.return_value = None
+        invokeScript.return_value = 'invoke script'
         doscript.return_value = 'result1'
 
         r1, r2 = self.networkops._generate_network_doscript(userid,
@@ -232,13 +233,32 @@ class SDKNetworkOpsTestCase(base.SDKTestCase):
         linux_dist.assert_called_with(os_version)
         config.assert_called_with(network_file_path, network_info,
                                   first, active=True)
-        invokeScript.assert_called_with(network_file_path, clean_cmd,
-                                        files_map)
-        doscript.assert_called_with(network_file_path)
+        invokeScript.assert_called_with(clean_cmd, files_map)
+        doscript.assert_called_with(network_file_path,
+                                    [('0000', 'content1'),
+                                     ('0001', 'content2'),
+                                     ('invokeScript.sh', 'invoke script')])
 
         self.assertEqual(r1, 'result1')
         self.assertEqual(r2, active_net_cmd)
 
+    def test_create_network_doscript(self):
+        network_file_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, network_file_path)
+        files_map = [{'target_path': '/etc/netplan/0.yaml',
+                      'source_file': '0000'}]
+        script = self.networkops._create_invokeScript('rm -f x\n', files_map)
+        self.assertIn('cat 0000 > /etc/netplan/0.yaml\n', script)
+        members = [('0000', 'network: {}\n'), ('invokeScript.sh', script)]
+        doscript = self.networkops._create_network_doscript(network_file_path,
+                                                            members)
+        # only the doscript is written to the folder
+        self.assertEqual(['network.doscript'], os.listdir(network_file_path))
+        with tarfile.open(doscript) as tar:
+            self.assertEqual(['0000', 'invokeScript.sh'], tar.getnames())
+            self.assertEqual(script.encode(),
+                             tar.extractfile('invokeScript.sh').read())
+
     @mock.patch('zvmsdk.smtclient.SMTClient.query_vswitch')
     def test_vswitch_query(self, query_vswitch):
         self.networkops.vswitch_query("vswitch_name")
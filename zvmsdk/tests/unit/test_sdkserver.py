@@ -0,0 +1,339 @@
+#  Copyright Contributors to the Feilong Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+# Copyright 2026 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import mock
+import socket
+import threading
+import time
+
+from zvmconnector import socketclient
+from zvmsdk import sdkserver
+from zvmsdk.tests.unit import base
+
+
+class FakeSDKAPI(object):
+
+    def guest_get_power_state(self, userid):
+        return {'USERID1': 'on'}.get(userid, 'off')
+
+    def slow_echo(self, value, delay=0):
+        time.sleep(delay)
+        return value
+
+
+class SDKServerTestCase(base.SDKTestCase):
+
+    server_class = sdkserver.SDKServer
+
+    @classmethod
+    def setUpClass(cls):
+        super(SDKServerTestCase, cls).setUpClass()
+        cls.old_bind_port = base.CONF.sdkserver.bind_port
+        base.set_conf('sdkserver', 'bind_port', 0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super(SDKServerTestCase, cls).tearDownClass()
+        base.set_conf('sdkserver', 'bind_port', cls.old_bind_port)
+
+    @mock.patch('zvmsdk.api.SDKAPI')
+    def setUp(self, sdkapi):
+        super(SDKServerTestCase, self).setUp()
+        sdkapi.return_value = FakeSDKAPI()
+        self.server = self.server_class()
+        self.server.setup()
+        self.port = self.server.server_socket.getsockname()[1]
+        thread = threading.Thread(target=self._run_server)
+        thread.daemon = True
+        thread.start()
+
+    def _run_server(self):
+        try:
+            self.server.run()
+        except Exception:
+            pass
+
+    def tearDown(self):
+        self.server.server_socket.close()
+        super(SDKServerTestCase, self).tearDown()
+
+    def _client(self, **kwargs):
+        return socketclient.SDKSocketClient('127.0.0.1', self.port, 10,
+                                            **kwargs)
+
+    def test_call_one_shot(self):
+        results = self._client().call('guest_get_power_state', 'USERID1')
+        self.assertEqual(0, results['overallRC'])
+        self.assertEqual('on', results['output'])
+
+    def test_call_one_shot_large(self):
+        value = ['x' * 100] * 5000
+        results = self._client().call('slow_echo', value)
+        self.assertEqual(0, results['overallRC'])
+        self.assertEqual(value, results['output'])
+
+    def test_call_one_shot_compressed(self):
+        value = {'userid%d' % i: 'on' for i in range(5000)}
+        results = self._client(compress=True).call('slow_echo', value)
+        self.assertEqual(0, results['overallRC'])
+        self.assertEqual(value, results['output'])
+
+    def test_call_unframed(self):
+        # Clients not using the framed protocol may send the request in
+        # several pieces and read the results until the server closes.
+        value = 'x' * 10000
+        data = json.dumps(['slow_echo', [value], {}]).encode()
+        sock = socket.create_connection(('127.0.0.1', self.port), 10)
+        self.addCleanup(sock.close)
+        sock.sendall(data[:5000])
+        time.sleep(0.1)
+        sock.sendall(data[5000:])
+        blocks = []
+        while True:
+            block = sock.recv(4096)
+            if not block:
+                break
+            blocks.append(block)
+        results = json.loads(b''.join(blocks).decode())
+        self.assertEqual(0, results['overallRC'])
+        self.assertEqual(value, results['output'])
+
+    def test_call_one_shot_sends_unframed(self):
+        # Without persistent connection nor compression the client sends
+        # the plain JSON request understood by older servers.
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        received = []
+
+        def serve():
+            conn, _addr = listener.accept()
+            data = b''
+            while True:
+                data += conn.recv(4096)
+                try:
+                    json.loads(data.decode())
+                    break
+                except ValueError:
+                    continue
+            received.append(data)
+            conn.sendall(json.dumps({'overallRC': 0, 'rc': 0, 'rs': 0,
+                                     'output': 'on'}).encode())
+            conn.close()
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        client = socketclient.SDKSocketClient(
+            '127.0.0.1', listener.getsockname()[1], 10)
+        results = client.call('guest_get_power_state', 'USERID1')
+        thread.join(10)
+        self.assertEqual('on', results['output'])
+        self.assertEqual([json.dumps(('guest_get_power_state',
+                                      ('USERID1',), {})).encode()],
+                         received)
+
+    def test_call_persistent(self):
+        client = self._client(persistent=True, pool_size=1)
+        for userid, state in (('USERID1', 'on'), ('USERID2', 'off')):
+            results = client.call('guest_get_power_state', userid)
+            self.assertEqual(0, results['overallRC'])
+            self.assertEqual(state, results['output'])
+        pool = socketclient.get_connection_pool('127.0.0.1', self.port, 1,
+                                                10)
+        self.assertEqual(1, len(pool._conns))
+        pool.close()
+
+    def test_call_persistent_multiplexed(self):
+        client = self._client(persistent=True, pool_size=1)
+        results = {}
+
+        def _call(value, delay):
+            results[value] = client.call('slow_echo', value, delay=delay)
+
+        # The slow request is answered after the fast ones which share
+        # the same connection.
+        threads = [threading.Thread(target=_call, args=(i, 0.5 if i else 0))
+                   for i in range(4)]
+        threads[1].start()
+        time.sleep(0.1)
+        for thread in threads[:1] + threads[2:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i in range(4):
+            self.assertEqual(0, results[i]['overallRC'])
+            self.assertEqual(i, results[i]['output'])
+        pool = socketclient.get_connection_pool('127.0.0.1', self.port, 1,
+                                                10)
+        self.assertEqual(1, len(pool._conns))
+        pool.close()
+
+    def test_call_persistent_server_unreachable(self):
+        self.server.server_socket.close()
+        results = self._client(persistent=True).call('guest_get_power_state',
+                                                     'USERID1')
+        self.assertEqual(101, results['overallRC'])
+        self.assertEqual(2, results['rs'])
+
+
+class SDKServerQueueTestCase(base.SDKTestCase):
+
+    @mock.patch('zvmsdk.api.SDKAPI')
+    def setUp(self, sdkapi):
+        super(SDKServerQueueTestCase, self).setUp()
+        self.server = sdkserver.SDKServer()
+        self.conn = mock.Mock()
+        self.conn.addr = ('127.0.0.1', 12345)
+
+    @mock.patch.object(sdkserver.SDKServer, 'start_worker')
+    def test_submit_message(self, start_worker):
+        self.server.submit_message(self.conn, 5, 0, b'[]')
+        self.assertEqual((self.server.serve_message,
+                          (self.conn, 5, 0, b'[]')),
+                         self.server.request_queue.get_nowait())
+        start_worker.assert_called_once_with()
+        self.conn.acquire.assert_called_once_with()
+        self.conn.send.assert_not_called()
+        self.conn.release.assert_not_called()
+
+    @mock.patch.object(sdkserver.SDKServer, 'start_worker')
+    def test_start_persistent(self, start_worker):
+        self.server.request_queue = sdkserver.Queue.Queue(maxsize=1)
+        self.server.request_queue.put_nowait('item')
+        reader = mock.Mock()
+        reader.read_message.return_value = None
+        # The worker does not block on the full queue, the reader thread
+        # queues the first request once a slot is free
+        client = mock.Mock()
+        self.server.start_persistent(client, ('127.0.0.1', 12345), reader,
+                                     (5, 0, b'[]'))
+        self.assertEqual('item', self.server.request_queue.get(timeout=10))
+        handler, args = self.server.request_queue.get(timeout=10)
+        self.assertEqual(self.server.serve_message, handler)
+        self.assertEqual((5, 0, b'[]'), args[1:])
+
+
+class EventSDKServerTestCase(SDKServerTestCase):
+
+    server_class = sdkserver.EventSDKServer
+
+    def test_call_persistent_client_closed(self):
+        client = self._client(persistent=True, pool_size=1)
+        results = client.call('guest_get_power_state', 'USERID1')
+        self.assertEqual('on', results['output'])
+        pool = socketclient.get_connection_pool('127.0.0.1', self.port, 1,
+                                                10)
+        pool.close()
+        # The server closes its side once the client closed
+        for i in range(50):
+            if len(self.server.selector.get_map()) == 2:
+                break
+            time.sleep(0.02)
+        self.assertEqual(2, len(self.server.selector.get_map()))
+
+
+class APIExecutorTestCase(base.SDKTestCase):
+
+    def test_parse_api_limits(self):
+        limits = sdkserver.parse_api_limits(
+            'guest_deploy:8, guest_capture:0,invalid,x:y')
+        self.assertEqual({'guest_deploy': 8, 'guest_capture': 1}, limits)
+        self.assertEqual({}, sdkserver.parse_api_limits(''))
+
+    def test_submit_limited(self):
+        executor = sdkserver.APIExecutor(4, {'guest_capture': 1})
+        lock = threading.Lock()
+        running = {'now': 0, 'max': 0}
+        done = threading.Semaphore(0)
+
+        def _capture():
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            time.sleep(0.05)
+            with lock:
+                running['now'] -= 1
+            done.release()
+
+        for i in range(3):
+            executor.submit('guest_capture', _capture)
+        # Other APIs are not held back by the limited one
+        executor.submit('guest_get_power_state', done.release)
+        for i in range(4):
+            self.assertTrue(done.acquire(timeout=5))
+        self.assertEqual(1, running['max'])
+        self.assertEqual(0, executor.running['guest_capture'])
+
+
+class FrameReaderTestCase(base.SDKTestCase):
+
+    def _reader(self, data):
+        rsock, wsock = socket.socketpair()
+        self.addCleanup(rsock.close)
+        wsock.sendall(data)
+        wsock.close()
+        return socketclient.FrameReader(rsock)
+
+    def test_read_frames(self):
+        data = (socketclient.pack_frame(1, b'["a", [], {}]') +
+                socketclient.pack_frame(2, b''))
+        reader = self._reader(data)
+        self.assertEqual((1, 0, b'["a", [], {}]'), reader.read_frame())
+        self.assertEqual((2, 0, b''), reader.read_frame())
+        self.assertIsNone(reader.read_frame())
+
+    def test_read_message_interleaved(self):
+        first = list(socketclient.iter_frames(
+            1, [b'a' * socketclient.STREAM_CHUNK_SIZE, b'b']))
+        second = list(socketclient.iter_frames(
+            2, [b'c'], socketclient.FLAG_ZLIB))
+        self.assertEqual(2, len(first))
+        reader = self._reader(first[0] + second[0] + first[1])
+        self.assertEqual((2, socketclient.FLAG_ZLIB, b'c'),
+                         reader.read_message())
+        self.assertEqual((1, 0, b'a' * socketclient.STREAM_CHUNK_SIZE + b'b'),
+                         reader.read_message())
+        self.assertIsNone(reader.read_message())
+
+    def test_read_message_incomplete(self):
+        frames = list(socketclient.iter_frames(
+            1, [b'a' * socketclient.STREAM_CHUNK_SIZE, b'b']))
+        reader = self._reader(frames[0])
+        self.assertRaises(socketclient.FrameError, reader.read_message)
+
+    def test_decoder_feed(self):
+        data = b''.join(socketclient.iter_frames(
+            1, [b'a' * socketclient.STREAM_CHUNK_SIZE, b'b']))
+        decoder = socketclient.FrameDecoder()
+        messages = []
+        for i in range(0, len(data), 1000):
+            messages.extend(decoder.feed(data[i:i + 1000]))
+        self.assertEqual(
+            [(1, 0, b'a' * socketclient.STREAM_CHUNK_SIZE + b'b')], messages)
+        self.assertEqual(0, len(decoder.buffered))
+
+    def test_read_frame_truncated(self):
+        data = socketclient.pack_frame(1, b'["a", [], {}]')[:-2]
+        reader = self._reader(data)
+        self.assertRaises(socketclient.FrameError, reader.read_frame)
+
+    def test_read_frame_bad_magic(self):
+        reader = socketclient.FrameReader(mock.Mock(), b'XX' + b'\0' * 10)
+        self.assertRaises(socketclient.FrameError, reader.read_frame)
@@ -16,13 +16,19 @@
 #    under the License.
 
 
+import hashlib
+import io
 import os
 import mock
 from mock import call
+import shutil
 import tempfile
+import threading
 import time
 import subprocess
 
+from six.moves import BaseHTTPServer as http_server
+
 from smtLayer import smt
 
 from zvmsdk import config
@@ -186,6 +192,15 @@ class SDKSMTClientTestCases(base.SDKTestCase):
         request.assert_called_once_with(requestData)
         self.assertEqual('on', status)
 
+    @mock.patch.object(zvmutils, 'query_names')
+    def test_get_power_state_bulk(self, query_names):
+        query_names.return_value = {'USERID1': 'DSC', 'USERID3': 'SSI'}
+        states = self._smtclient.get_power_state_bulk(['USERID1', 'USERID2',
+                                                       'userid3'])
+        self.assertEqual({'USERID1': 'on', 'USERID2': 'off',
+                          'userid3': 'on'}, states)
+        query_names.assert_called_once_with()
+
     @mock.patch.object(smtclient.SMTClient, 'add_mdisks')
     @mock.patch.object(smtclient.SMTClient, '_request')
     @mock.patch.object(database.GuestDbOperator, 'add_guest')
@@ -1330,6 +1345,26 @@ class SDKSMTClientTestCases(base.SDKTestCase):
                           '10.10.0.29::10.10.0.1:24:fakehost:enc1000:none:'
                           '10.10.0.250:'])
 
+    def test_get_image_header(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        image_file = os.path.join(tmpdir, '0100')
+        with open(image_file, 'wb') as f:
+            f.write(b'h' * 100)
+        self.assertEqual(b'h' * 64,
+                         self._smtclient._get_image_header(image_file))
+        with mock.patch('zvmsdk.smtclient.open', create=True) as fake_open:
+            self.assertEqual(b'h' * 64,
+                             self._smtclient._get_image_header(image_file))
+            fake_open.assert_not_called()
+        # The header is read again when the image file changes
+        with open(image_file, 'wb') as f:
+            f.write(b'n' * 200)
+        self.assertEqual(b'n' * 64,
+                         self._smtclient._get_image_header(image_file))
+        self.assertIsNone(self._smtclient._get_image_header(
+            os.path.join(tmpdir, 'notexist')))
+
     @mock.patch.object(zvmutils, 'execute')
     @mock.patch.object(smtclient.SMTClient, '_request')
     @mock.patch.object(smtclient.SMTClient, '_get_image_path_by_name')
@@ -1364,9 +1399,7 @@ class SDKSMTClientTestCases(base.SDKTestCase):
         unpack_cmd = ['sudo', '/opt/zthin/bin/unpackdiskimage', 'fakeuser',
                       '0100',
                      imagefile]
-        execute.assert_has_calls([call(['/usr/bin/hexdump',
-                                  '-C', '-n', '64', imagefile]),
-                                  call(unpack_cmd)])
+        execute.assert_called_once_with(unpack_cmd)
 
     @mock.patch.object(zvmutils.PathUtils, 'clean_temp_folder')
     @mock.patch.object(tempfile, 'mkdtemp')
@@ -1378,7 +1411,7 @@ class SDKSMTClientTestCases(base.SDKTestCase):
         base.set_conf("zvm", "user_root_vdev", "0100")
         cp_error = ("/usr/bin/cp: cannot stat '/faketran': "
                     "No such file or directory\n")
-        execute.side_effect = [(0, "hexdump"), (0, ""), (1, cp_error)]
+        execute.side_effect = [(0, ""), (1, cp_error)]
         mkdtemp.return_value = '/tmp/tmpdir'
         userid = 'fakeuser'
         image_name = 'fakeimg'
@@ -2735,16 +2768,13 @@ class SDKSMTClientTestCases(base.SDKTestCase):
 
     @mock.patch.object(os, 'rename')
     @mock.patch.object(database.ImageDbOperator, 'image_add_record')
-    @mock.patch.object(smtclient.SMTClient, '_get_image_size')
-    @mock.patch.object(smtclient.SMTClient, '_get_disk_size_units')
-    @mock.patch.object(smtclient.SMTClient, '_get_md5sum')
+    @mock.patch.object(smtclient.SMTClient, '_parse_disk_size_units')
     @mock.patch.object(smtclient.FilesystemBackend, 'image_import')
     @mock.patch.object(zvmutils.PathUtils,
                        'create_import_image_repository')
     @mock.patch.object(database.ImageDbOperator, 'image_query_record')
     def test_image_import(self, image_query, create_path, image_import,
-                          get_md5sum, disk_size_units, image_size,
-                          image_add_record, rename):
+                          disk_size_units, image_add_record, rename):
         image_name = 'testimage'
         url = 'file:///tmp/testdummyimg'
         image_meta = {'os_version': 'rhel6.5',
@@ -2753,17 +2783,17 @@ class SDKSMTClientTestCases(base.SDKTestCase):
         final_image_fpath = '/home/netboot/rhel6.5/testimage/0100'
         image_query.return_value = []
         create_path.return_value = '/home/netboot/rhel6.5/testimage'
-        get_md5sum.return_value = 'c73ce117eef8077c3420bfc8f473ac2f'
+        image_import.return_value = mock.Mock(
+            md5sum='c73ce117eef8077c3420bfc8f473ac2f', size=512000,
+            header=b'fake header')
         disk_size_units.return_value = '3338:CYL'
-        image_size.return_value = '512000'
         self._smtclient.image_import(image_name, url, image_meta)
         image_query.assert_called_once_with(image_name)
         image_import.assert_called_once_with(image_name, url,
                                              import_image_fpath,
                                              remote_host=None)
-        get_md5sum.assert_called_once_with(import_image_fpath)
-        disk_size_units.assert_called_once_with(final_image_fpath)
-        image_size.assert_called_once_with(final_image_fpath)
+        disk_size_units.assert_called_once_with(b'fake header',
+                                                final_image_fpath)
         image_add_record.assert_called_once_with(image_name,
                                     'rhel6.5',
                                     'c73ce117eef8077c3420bfc8f473ac2f',
@@ -2774,41 +2804,33 @@ class SDKSMTClientTestCases(base.SDKTestCase):
 
     @mock.patch.object(os, 'rename')
     @mock.patch.object(database.ImageDbOperator, 'image_add_record')
-    @mock.patch.object(smtclient.SMTClient, '_get_image_size')
-    @mock.patch.object(smtclient.SMTClient, '_get_disk_size_units_rhcos')
-    @mock.patch.object(smtclient.SMTClient, '_get_md5sum')
     @mock.patch.object(smtclient.FilesystemBackend, 'image_import')
     @mock.patch.object(zvmutils.PathUtils,
                        'create_import_image_repository')
     @mock.patch.object(database.ImageDbOperator, 'image_query_record')
     def test_image_import_rhcos(self, image_query, create_path, image_import,
-                          get_md5sum, disk_size_units, image_size,
-                          image_add_record, rename):
+                                image_add_record, rename):
         image_name = 'testimage'
         url = 'file:///tmp/testdummyimg'
         image_meta = {'os_version': 'rhcos4.2',
                       'md5sum': 'c73ce117eef8077c3420bfc8f473ac2f',
                       'disk_type': 'DASD'}
         import_image_fpath = '/home/netboot/rhcos4.2/testimage/testdummyimg'
-        final_image_fpath = '/home/netboot/rhcos4.2/testimage/0100'
         image_query.return_value = []
         create_path.return_value = '/home/netboot/rhcos4.2/testimage'
-        get_md5sum.return_value = 'c73ce117eef8077c3420bfc8f473ac2f'
-        disk_size_units.return_value = '3338:CYL'
-        image_size.return_value = '512000'
+        image_import.return_value = mock.Mock(
+            md5sum='c73ce117eef8077c3420bfc8f473ac2f', size=737281,
+            header=b'')
         self._smtclient.image_import(image_name, url, image_meta)
         image_query.assert_called_once_with(image_name)
         image_import.assert_called_once_with(image_name, url,
                                              import_image_fpath,
                                              remote_host=None)
-        get_md5sum.assert_called_once_with(import_image_fpath)
-        disk_size_units.assert_called_once_with(final_image_fpath)
-        image_size.assert_called_once_with(final_image_fpath)
         image_add_record.assert_called_once_with(image_name,
                                     'rhcos4.2',
                                     'c73ce117eef8077c3420bfc8f473ac2f',
-                                    '3338:CYL',
-                                    '512000',
+                                    '2:CYL',
+                                    '737281',
                                     'rootonly',
                                     comments="{'disk_type': 'DASD'}")
 
@@ -2829,21 +2851,83 @@ class SDKSMTClientTestCases(base.SDKTestCase):
         image_query.assert_called_once_with(image_name)
         get_image_path.assert_not_called()
 
-    @mock.patch.object(smtclient.SMTClient, '_get_md5sum')
     @mock.patch.object(smtclient.FilesystemBackend, 'image_import')
     @mock.patch.object(database.ImageDbOperator, 'image_query_record')
-    def test_image_import_invalid_md5sum(self, image_query, image_import,
-                                         get_md5sum):
+    def test_image_import_invalid_md5sum(self, image_query, image_import):
         image_name = 'testimage'
         url = 'file:///tmp/testdummyimg'
         image_meta = {'os_version': 'rhel6.5',
                       'md5sum': 'c73ce117eef8077c3420bfc8f473ac2f'}
         image_query.return_value = []
-        get_md5sum.return_value = 'c73ce117eef8077c3420bfc000000'
+        image_import.return_value = mock.Mock(
+            md5sum='c73ce117eef8077c3420bfc000000')
         self.assertRaises(exception.SDKImageOperationError,
                           self._smtclient.image_import,
                           image_name, url, image_meta)
 
+    def test_image_import_stream(self):
+        data = b'x' * (smtclient.IMPORT_CHUNKSIZE + 100)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        source = os.path.join(tmpdir, 'source')
+        target = os.path.join(tmpdir, 'target')
+        with open(source, 'wb') as f:
+            f.write(data)
+        imported = smtclient.FilesystemBackend.image_import(
+            'testimage', 'file://' + source, target, remote_host=None)
+        self.assertEqual(hashlib.md5(data).hexdigest(), imported.md5sum)
+        self.assertEqual(len(data), imported.size)
+        self.assertEqual(data[:smtclient.IMAGE_HEADER_SIZE], imported.header)
+        with open(target, 'rb') as f:
+            self.assertEqual(data, f.read())
+
+    def test_image_import_stream_source_not_exist(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        with self.assertRaises(exception.SDKImageOperationError) as cm:
+            smtclient.FilesystemBackend.image_import(
+                'testimage', 'file:///tmp/notexistpath/image',
+                os.path.join(tmpdir, 'target'), remote_host=None)
+        self.assertEqual(12, cm.exception.results['rs'])
+
+    @mock.patch.object(subprocess, 'Popen')
+    def test_image_import_stream_remote(self, popen):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        proc = popen.return_value
+        proc.stdout = io.BytesIO(b'image data')
+        proc.stderr = io.BytesIO(b'')
+        proc.returncode = 0
+        imported = smtclient.FilesystemBackend.image_import(
+            'testimage', 'file:///tmp/image', os.path.join(tmpdir, 'target'),
+            remote_host='user@192.168.0.1')
+        self.assertEqual(hashlib.md5(b'image data').hexdigest(),
+                         imported.md5sum)
+        cmd = popen.call_args[0][0]
+        self.assertEqual(['user@192.168.0.1', 'cat /tmp/image'], cmd[-2:])
+
+        proc.stdout = io.BytesIO(b'')
+        proc.stderr = io.BytesIO(b'No such file')
+        proc.returncode = 1
+        with self.assertRaises(exception.SDKImageOperationError) as cm:
+            smtclient.FilesystemBackend.image_import(
+                'testimage', 'file:///tmp/image',
+                os.path.join(tmpdir, 'target'),
+                remote_host='user@192.168.0.1')
+        self.assertEqual(10, cm.exception.results['rs'])
+
+    def test_parse_disk_size_units(self):
+        header = b'CKD' + b'x' * 17 + b'000000003338 CYL' + b' ' * 12
+        self.assertEqual('3338:CYL', self._smtclient._parse_disk_size_units(
+            header, '/tmp/image'))
+        with self.assertRaises(exception.SDKImageOperationError) as cm:
+            self._smtclient._parse_disk_size_units(b'x' * 48, '/tmp/image')
+        self.assertEqual(6, cm.exception.results['rs'])
+        header = b'x' * 20 + b'000000003338 XXX' + b' ' * 12
+        with self.assertRaises(exception.SDKImageOperationError) as cm:
+            self._smtclient._parse_disk_size_units(header, '/tmp/image')
+        self.assertEqual(7, cm.exception.results['rs'])
+
     @mock.patch.object(smtclient.SMTClient, '_get_image_path_by_name')
     def test_get_image_access_time_image_not_exist(self, image_path):
         image_name = "testimage"
@@ -4130,6 +4214,18 @@ class SDKSMTClientTestCases(base.SDKTestCase):
         req.assert_called_once_with(rd)
         self.assertEqual(['t1', 't2'], resp)
 
+    @mock.patch.object(smtclient.SMTClient, '_request')
+    def test_namelist_query_raise_exception(self, req):
+        req.side_effect = exception.SDKSMTRequestFailed({}, 'err')
+        self.assertRaises(exception.SDKSMTRequestFailed,
+                          self._smtclient.namelist_query, 'tnlist',
+                          raise_exception=True)
+
+    @mock.patch.object(smtclient.SMTClient, '_request_with_error_ignored')
+    def test_namelist_add_failed(self, req):
+        req.return_value = None
+        self.assertFalse(self._smtclient.namelist_add('tnlist', 'testid'))
+
     @mock.patch.object(smtclient.SMTClient, '_request')
     def test_namelist_query_err(self, req):
         req.side_effect = exception.SDKSMTRequestFailed({}, 'err')
@@ -5437,3 +5533,166 @@ class SDKSMTClientTestCases(base.SDKTestCase):
         # case 3: error
         self.assertRaises(exception.SDKSMTRequestFailed,
                           self._smtclient.host_get_ssi_info)
+
+
+class FakeImageHTTPHandler(http_server.BaseHTTPRequestHandler):
+    """Serve the image of the server, with ranged requests unless the
+    server does not support them."""
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, code, length, content_range=None):
+        self.send_response(code)
+        self.send_header('Content-Length', str(length))
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+            if self.server.etag:
+                self.send_header('ETag', self.server.etag)
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers(200, len(self.server.image))
+
+    def do_GET(self):
+        image = self.server.image
+        start, end = 0, len(image) - 1
+        range_header = self.headers.get('Range')
+        if range_header and self.server.ranges:
+            start, end = [int(i) for i in
+                          range_header.split('=')[1].split('-')]
+        self.server.requests.append(start)
+        if self.server.failures.get(start):
+            self.server.failures[start] -= 1
+            self.send_error(500)
+            return
+        if range_header and self.server.ranges:
+            self._send_headers(206, end - start + 1,
+                               'bytes %s-%s/%s' % (start, end, len(image)))
+        else:
+            self._send_headers(200, len(image))
+        self.wfile.write(image[start:end + 1])
+
+
+class MultiThreadDownloaderTestCase(base.SDKTestCase):
+
+    def setUp(self):
+        super(MultiThreadDownloaderTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        for name, value in (('sdk_image_repository', self.tmpdir),
+                            ('download_workers', 2),
+                            ('download_chunk_size', 1),
+                            ('download_retries', 1)):
+            self.addCleanup(base.set_conf, 'image', name,
+                            getattr(CONF.image, name))
+            base.set_conf('image', name, value)
+        self.addCleanup(setattr, smtclient, '_HTTP_SESSION', None)
+
+        self.server = http_server.HTTPServer(('127.0.0.1', 0),
+                                             FakeImageHTTPHandler)
+        self.server.daemon_threads = True
+        self.server.image = os.urandom(3 * 1024 * 1024 + 100)
+        self.server.ranges = True
+        self.server.etag = '"fake"'
+        self.server.failures = {}
+        self.server.requests = []
+        self.server_thread = threading.Thread(
+            target=self.server.serve_forever)
+        self.server_thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:%s/image.img' % self.server.server_port
+        self.target = os.path.join(self.tmpdir, 'image.img')
+        sleep = mock.patch.object(time, 'sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def _import(self):
+        return smtclient.HTTPBackend.image_import('testimage', self.url,
+                                                  self.target)
+
+    def _check_imported(self, imported):
+        image = self.server.image
+        self.assertEqual(hashlib.md5(image).hexdigest(), imported.md5sum)
+        self.assertEqual(len(image), imported.size)
+        self.assertEqual(image[:smtclient.IMAGE_HEADER_SIZE],
+                         imported.header)
+        with open(self.target, 'rb') as f:
+            self.assertEqual(image, f.read())
+        self.assertEqual([], os.listdir(os.path.join(self.tmpdir,
+                                                     'downloads')))
+
+    def test_download(self):
+        self._check_imported(self._import())
+        mb = 1024 * 1024
+        self.assertEqual([0, mb, 2 * mb, 3 * mb],
+                         sorted(self.server.requests))
+
+    def test_download_retry(self):
+        self.server.failures = {1024 * 1024: 1}
+        self._check_imported(self._import())
+        self.assertEqual(2, self.server.requests.count(1024 * 1024))
+
+    def test_download_without_ranges(self):
+        self.server.ranges = False
+        self._check_imported(self._import())
+        self.assertEqual([0], self.server.requests)
+
+    def test_download_resume(self):
+        mb = 1024 * 1024
+        self.server.failures = {2 * mb: 2}
+        with self.assertRaises(exception.SDKImageOperationError) as cm:
+            self._import()
+        self.assertEqual(9, cm.exception.results['rs'])
+        self.assertFalse(os.path.exists(self.target))
+
+        # The chunks downloaded before the failure are not downloaded again
+        self.server.requests = []
+        self._check_imported(self._import())
+        self.assertIn(2 * mb, self.server.requests)
+        self.assertNotIn(0, self.server.requests)
+        self.assertNotIn(mb, self.server.requests)
+
+    def test_download_resume_without_validator(self):
+        # Without ETag nor Last-Modified, a download is never resumed
+        mb = 1024 * 1024
+        self.server.etag = None
+        self.server.failures = {2 * mb: 2}
+        with self.assertRaises(exception.SDKImageOperationError):
+            self._import()
+
+        self.server.requests = []
+        self._check_imported(self._import())
+        self.assertEqual([0, mb, 2 * mb, 3 * mb],
+                         sorted(self.server.requests))
+
+    def test_download_expired_removed(self):
+        self.addCleanup(base.set_conf, 'image', 'download_max_age',
+                        CONF.image.download_max_age)
+        base.set_conf('image', 'download_max_age', 3600)
+        download_dir = os.path.join(self.tmpdir, 'downloads')
+        os.makedirs(download_dir)
+        old = os.path.join(download_dir, 'old')
+        recent = os.path.join(download_dir, 'recent')
+        for path in (old, recent):
+            with open(path, 'w') as f:
+                f.write('partial')
+        expired = time.time() - 7200
+        os.utime(old, (expired, expired))
+
+        smtclient.MultiThreadDownloader('testimage', self.url, self.target)
+        self.assertEqual(['recent'], os.listdir(download_dir))
+
+    def test_download_resume_image_changed(self):
+        mb = 1024 * 1024
+        self.server.failures = {2 * mb: 2}
+        with self.assertRaises(exception.SDKImageOperationError):
+            self._import()
+
+        self.server.image = os.urandom(2 * 1024 * 1024)
+        self.server.requests = []
+        self._check_imported(self._import())
+        self.assertEqual([0, mb], sorted(self.server.requests))
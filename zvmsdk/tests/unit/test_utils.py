@@ -15,8 +15,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import io
 import mock
 import subprocess
+import tarfile
 import time
 import threading
 from mock import Mock, call
@@ -442,6 +444,24 @@ class ZVMUtilsTestCases(base.SDKTestCase):
                                zvmutils.get_pchid_by_vmcp_query,
                                chpid)
 
+    @mock.patch.object(subprocess, 'check_output')
+    def test_query_names(self, vmcp):
+        vmcp.return_value = (b'OPERATOR - SYSC    , FTPSERVE - DSC     , '
+                             b'TCPIP    - DSC\n'
+                             b'USERID1  - SSI     , userid2  - L0003\n'
+                             b'VSM     - TCPIP\n')
+        names = zvmutils.query_names()
+        self.assertEqual({'OPERATOR': 'SYSC', 'FTPSERVE': 'DSC',
+                          'TCPIP': 'DSC', 'USERID1': 'SSI',
+                          'USERID2': 'L0003'}, names)
+        vmcp.assert_called_once_with(
+            ['sudo', '/sbin/vmcp', '--buffer=1M', 'query', 'names'],
+            close_fds=True, stderr=subprocess.STDOUT, timeout=None)
+
+        vmcp.side_effect = subprocess.CalledProcessError(
+            returncode=1, cmd=['vmcp'], output=b'Error: no vmcp')
+        self.assertRaises(exception.SDKInternalError, zvmutils.query_names)
+
     @mock.patch.object(subprocess, 'check_output')
     def test_get_pchid_by_lschp(self, lschp):
         # Normal case
@@ -731,3 +751,32 @@ class ZVMUtilsTestCases(base.SDKTestCase):
         self.assertEqual(expect, result)
         result = zvmutils.get_lpar_name(zhypinfo={'aaa': {}})
         self.assertEqual(expect, result)
+
+    def test_build_tar(self):
+        members = [('openstack', None),
+                   ('openstack/meta_data.json', '{}'),
+                   ('openstack/script.sh', b'#!/bin/bash\n')]
+        archive = zvmutils.build_tar(members, compression='gz')
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            self.assertEqual([m[0] for m in members], tar.getnames())
+            self.assertTrue(tar.getmember('openstack').isdir())
+            self.assertEqual(b'{}', tar.extractfile(
+                'openstack/meta_data.json').read())
+        # the same content is served from the cache
+        self.assertIs(archive, zvmutils.build_tar(list(members),
+                                                  compression='gz'))
+        # other content, compression or layout builds another archive
+        self.assertIsNot(archive, zvmutils.build_tar(members))
+        self.assertIsNot(archive, zvmutils.build_tar(
+            members[:1] + [('openstack/meta_data.json', '{ }')] + members[2:],
+            compression='gz'))
+        self.assertIsNot(archive, zvmutils.build_tar(
+            [('openstack/meta_data.json', '{}'), ('openstack', None),
+             ('openstack/script.sh', b'#!/bin/bash\n')], compression='gz'))
+
+    def test_build_tar_cache_size(self):
+        with mock.patch.object(zvmutils, '_TAR_CACHE_SIZE', 2):
+            zvmutils._TAR_CACHE.clear()
+            for i in range(3):
+                zvmutils.build_tar([('file', str(i))])
+            self.assertEqual(2, len(zvmutils._TAR_CACHE))
@@ -18,11 +18,17 @@
 
 import mock
 import tempfile
+import threading
 
 from zvmsdk import dist
 from zvmsdk import exception
 from zvmsdk import vmops
 from zvmsdk.tests.unit import base
+from zvmsdk import utils as zvmutils
+
+
+# Other test cases replace check_guests_exist_in_db with a mock
+_check_guests_exist_in_db = vmops.VMOps.check_guests_exist_in_db
 
 
 class SDKVMOpsTestCase(base.SDKTestCase):
@@ -69,9 +75,8 @@ class SDKVMOpsTestCase(base.SDKTestCase):
         self.vmops.guest_unpause('cbi00063')
         guest_unpause.assert_called_once_with('cbi00063')
 
-    @mock.patch("zvmsdk.smtclient.SMTClient.namelist_add")
     @mock.patch("zvmsdk.smtclient.SMTClient.create_vm")
-    def test_create_vm(self, create_vm, namelistadd):
+    def test_create_vm(self, create_vm):
         userid = 'fakeuser'
         cpu = 2
         memory = '2g'
@@ -90,7 +95,6 @@ class SDKVMOpsTestCase(base.SDKTestCase):
                                           user_profile, max_cpu, max_mem,
                                           '', '', '', vdevs, loaddev, account,
                                           comment_list, '', '', '', '')
-        namelistadd.assert_called_once_with('TSTNLIST', userid)
 
     @mock.patch("zvmsdk.smtclient.SMTClient.process_additional_minidisks")
     def test_guest_config_minidisks(self, process_additional_minidisks):
@@ -436,7 +440,7 @@ class SDKVMOpsTestCase(base.SDKTestCase):
         image_get_os_distro.assert_called_once_with('fakeimg')
         deploy_image_to_vm.assert_called_with('fakevm', 'fakeimg',
                                               '/test/transport.tgz', None,
-                                              None, False)
+                                              None, False, progress=None)
 
     @mock.patch("zvmsdk.smtclient.SMTClient._get_image_last_access_time")
     @mock.patch('zvmsdk.vmops.VMOps.set_hostname')
@@ -450,7 +454,7 @@ class SDKVMOpsTestCase(base.SDKTestCase):
         self.vmops.guest_deploy('fakevm', 'fakeimg',
                                 hostname=fake_hostname)
         deploy_image_to_vm.assert_called_with('fakevm', 'fakeimg', None, None,
-                                              None, False)
+                                              None, False, progress=None)
         img_query.assert_called_once_with('fakeimg')
         set_hostname.assert_called_once_with('fakevm', fake_hostname,
                                              'rhel6.7')
@@ -474,7 +478,10 @@ class SDKVMOpsTestCase(base.SDKTestCase):
     @mock.patch("zvmsdk.smtclient.SMTClient.delete_vm")
     def test_delete_vm(self, delete_vm):
         userid = 'userid'
-        self.vmops.delete_vm(userid)
+        with mock.patch.object(zvmutils,
+                               'invalidate_userids_on_others') as invalidate:
+            self.vmops.delete_vm(userid)
+            invalidate.assert_called_once_with()
         delete_vm.assert_called_once_with(userid)
 
     @mock.patch("zvmsdk.smtclient.SMTClient.execute_cmd")
@@ -654,3 +661,115 @@ class SDKVMOpsTestCase(base.SDKTestCase):
         punch_file.assert_called_once_with(userid,
                                            ("%s/gpartvol.sh" % tmp_inst_dir),
                                            "X")
+
+
+class GuestIndexTestCase(base.SDKTestCase):
+    def setUp(self):
+        super(GuestIndexTestCase, self).setUp()
+        self.index = vmops.GuestIndex()
+
+    @mock.patch("zvmsdk.utils.get_userids_on_others")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    def test_check(self, get_vm_list, on_others):
+        get_vm_list.return_value = ['USERID1', 'USERID2']
+        on_others.return_value = frozenset(['USERID2', 'USERID3'])
+        self.assertEqual((['USERID3'], ['USERID2']),
+                         self.index.check(['userid1', 'USERID2', 'USERID3']))
+        # Answered from the index until it expires
+        self.assertEqual(([], []), self.index.check(['USERID1']))
+        get_vm_list.assert_called_once_with()
+        on_others.assert_called_once_with()
+
+        self.index.invalidate()
+        get_vm_list.return_value = ['USERID1']
+        self.assertEqual((['USERID2'], []), self.index.check(['USERID2']))
+        self.assertEqual(2, get_vm_list.call_count)
+
+    @mock.patch("zvmsdk.utils.get_userids_on_others")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    def test_add_remove(self, get_vm_list, on_others):
+        get_vm_list.return_value = ['USERID1']
+        on_others.return_value = frozenset(['USERID2'])
+        self.index.check([])
+        self.index.add('userid2')
+        self.index.remove('USERID1')
+        self.assertEqual((['USERID1'], []),
+                         self.index.check(['USERID1', 'USERID2']))
+
+    @mock.patch("zvmsdk.utils.get_userids_on_others")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    def test_change_during_rebuild(self, get_vm_list, on_others):
+        def _get_vm_list():
+            # A guest created while the database is read
+            self.index.add('USERID2')
+            return ['USERID1']
+
+        get_vm_list.side_effect = _get_vm_list
+        on_others.return_value = frozenset()
+        self.assertEqual(([], []), self.index.check(['USERID1', 'USERID2']))
+
+    @mock.patch("zvmsdk.utils.get_userids_on_others")
+    @mock.patch("zvmsdk.smtclient.SMTClient.get_vm_list")
+    def test_check_single_rebuild(self, get_vm_list, on_others):
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def _get_vm_list():
+            started.set()
+            release.wait(10)
+            return ['USERID1']
+
+        get_vm_list.side_effect = _get_vm_list
+        on_others.return_value = frozenset()
+        results = []
+
+        def _check():
+            results.append(self.index.check(['USERID1']))
+
+        # Without index, the checks wait for the rebuild in progress
+        threads = [threading.Thread(target=_check) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        started.wait(10)
+        release.set()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual([([], [])] * 5, results)
+        self.assertEqual(1, get_vm_list.call_count)
+
+        # With an expired index, the checks use it during the rebuild
+        started.clear()
+        release.clear()
+        self.index.invalidate()
+        thread = threading.Thread(target=_check)
+        thread.start()
+        started.wait(10)
+        self.assertEqual(([], []), self.index.check(['USERID1']))
+        release.set()
+        thread.join(10)
+        self.assertEqual(2, get_vm_list.call_count)
+
+    @mock.patch("zvmsdk.database.GuestDbOperator.update_guest_by_userid")
+    @mock.patch("zvmsdk.database.GuestDbOperator.get_comments_by_userid")
+    def test_check_guests_exist_in_db(self, get_comments, update_guest):
+        vmops_obj = vmops.get_vmops()
+        get_comments.return_value = {}
+        with mock.patch.object(vmops_obj, '_guest_index') as index:
+            index.check.return_value = (['USERID3'], [])
+            self.assertRaises(exception.SDKObjectNotExistError,
+                              _check_guests_exist_in_db, vmops_obj,
+                              ['USERID1', 'USERID3'])
+            self.assertFalse(_check_guests_exist_in_db(
+                vmops_obj, 'USERID3', raise_exc=False))
+
+            index.check.return_value = ([], ['USERID2'])
+            self.assertFalse(_check_guests_exist_in_db(
+                vmops_obj, ['USERID1', 'USERID2']))
+            update_guest.assert_called_once_with(
+                'USERID2', comments={'migrated': 1})
+            index.remove.assert_called_once_with('USERID2')
+
+            index.check.return_value = ([], [])
+            self.assertTrue(_check_guests_exist_in_db(vmops_obj,
+                                                      ['USERID1']))
@@ -19,6 +19,7 @@
 import mock
 from mock import call, Mock, patch
 import shutil
+import threading
 import uuid
 
 from zvmsdk import config
@@ -375,6 +376,27 @@ class TestVolumeConfiguratorAPI(base.SDKTestCase):
                                                 mount_point, connections)
         punch_file.assert_called_once_with(assigner_id, config_file, 'X')
 
+    @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI._run_attach_scripts")
+    @mock.patch("zvmsdk.volumeop.VolumeConfiguratorAPI.configure_volume_attach")
+    @mock.patch("zvmsdk.dist.LinuxDistManager.get_linux_dist")
+    def test_config_attach_many(self, get_dist, configure_attach, run_scripts):
+        linuxdist = dist.rhel7()
+        get_dist.return_value = mock.Mock(return_value=linuxdist)
+        volumes = [{'fcp_list': ['1a11', '1b11'],
+                    'target_wwpns': ['1111', '1112'],
+                    'target_lun': lun, 'multipath': True,
+                    'mount_point': '/dev/sd' + lun[-1]}
+                   for lun in ('2222', '2223')]
+        self.configurator.config_attach_many('userid1', 'rhel7', volumes)
+        # one attach script punched per volume, run all at once
+        configure_attach.assert_has_calls(
+            [mock.call(['1a11', '1b11'], 'userid1', ['1111', '1112'], lun,
+                       True, 'rhel7', '/dev/sd' + lun[-1], linuxdist)
+             for lun in ('2222', '2223')])
+        run_scripts.assert_called_once_with(['1a11', '1b11'], 'userid1',
+                                            ['1111', '1112'], '2222,2223',
+                                            linuxdist)
+
 
 class TestFCP(base.SDKTestCase):
 
@@ -1027,6 +1049,96 @@ class TestFCPManager(base.SDKTestCase):
         finally:
             self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
 
+    @staticmethod
+    def _zvm_fcp(fcp_id, status='Free', owner='NONE', chpid='27'):
+        return volumeop.FCP([
+            'opnstk1: FCP device number: %s' % fcp_id,
+            'opnstk1:   Status: %s' % status,
+            'opnstk1:   NPIV world wide port number: c05076de3300%s' % fcp_id,
+            'opnstk1:   Channel path ID: %s' % chpid,
+            'opnstk1:   Physical world wide port number: 20076D8500005181',
+            'Owner: %s' % owner])
+
+    @mock.patch("zvmsdk.utils.get_pchid", mock.Mock(return_value='02e4'))
+    def test_sync_fcp_table_with_zvm_incremental(self):
+        """Only the FCP devices changed in z/VM are synced"""
+        _purge_fcp_db()
+        self.addCleanup(_purge_fcp_db)
+        base.set_conf('volume', 'fcp_sync_batch_size', 2)
+        self.addCleanup(base.set_conf, 'volume', 'fcp_sync_batch_size', 200)
+        fcp_dict_in_zvm = {fcp: self._zvm_fcp(fcp)
+                           for fcp in ('1a01', '1a02', '1a03')}
+        drift = self.fcpops.sync_fcp_table_with_zvm(fcp_dict_in_zvm)
+        self.assertEqual({'added': 3, 'deleted': 0, 'notfound': 0,
+                          'updated': 0}, drift)
+        # nothing changed, no batch synced
+        with mock.patch.object(self.fcpops,
+                               '_sync_fcp_batch_with_zvm') as sync_batch:
+            self.fcpops.sync_fcp_table_with_zvm(fcp_dict_in_zvm)
+            sync_batch.assert_not_called()
+        # 1a01 attached, 1a02 removed, 1b01 added in z/VM
+        self.db_op.reserve_fcps(['1a02'], 'user1', '')
+        fcp_dict_in_zvm = {'1a01': self._zvm_fcp('1a01', 'Active', 'USER1'),
+                           '1a03': self._zvm_fcp('1a03'),
+                           '1b01': self._zvm_fcp('1b01')}
+        batches = []
+        sync_batch = self.fcpops._sync_fcp_batch_with_zvm
+
+        def _sync_batch(fcp_dict_in_zvm, fcp_ids):
+            batches.append(fcp_ids)
+            return sync_batch(fcp_dict_in_zvm, fcp_ids)
+
+        with mock.patch.object(self.fcpops, '_sync_fcp_batch_with_zvm',
+                               side_effect=_sync_batch):
+            drift = self.fcpops.sync_fcp_table_with_zvm(fcp_dict_in_zvm)
+        self.assertEqual([['1a01', '1a02'], ['1b01']], batches)
+        self.assertEqual({'added': 1, 'deleted': 0, 'notfound': 1,
+                          'updated': 1}, drift)
+        fcp_dict_in_db = self.fcpops.get_fcp_dict_in_db()
+        self.assertEqual('active', fcp_dict_in_db['1a01']['state'])
+        self.assertEqual('notfound', fcp_dict_in_db['1a02']['state'])
+        self.assertIn('1b01', fcp_dict_in_db)
+        # the in-use FCP device not in z/VM is not marked again
+        drift = self.fcpops.sync_fcp_table_with_zvm(fcp_dict_in_zvm)
+        self.assertEqual({'added': 0, 'deleted': 0, 'notfound': 0,
+                          'updated': 0}, drift)
+
+    @mock.patch("zvmsdk.volumeop.FCPManager.sync_db", mock.Mock())
+    @mock.patch("zvmsdk.volumeop.FCPManager.sync_fcp_table_with_zvm")
+    @mock.patch("zvmsdk.volumeop.FCPManager.get_fcp_dict_in_zvm")
+    def test_sync_db_with_zvm_stats(self, fcp_dict_in_zvm, sync_table):
+        fcpops = volumeop.FCPManager()
+        sync_table.return_value = {'added': 1, 'deleted': 2, 'notfound': 0,
+                                   'updated': 3}
+        fcpops._sync_db_with_zvm()
+        fcpops._sync_db_with_zvm()
+        sync_table.side_effect = exception.SDKInternalError(msg='fake')
+        self.assertRaises(exception.SDKInternalError,
+                          fcpops._sync_db_with_zvm)
+        stats = fcpops.get_sync_stats()
+        self.assertEqual(3, stats['runs'])
+        self.assertEqual(1, stats['failures'])
+        self.assertEqual(6, stats['last_drift'])
+        self.assertEqual((2, 4, 0, 6), (stats['added'], stats['deleted'],
+                                        stats['notfound'], stats['updated']))
+        self.assertGreaterEqual(stats['total_duration'],
+                                stats['last_duration'])
+
+    @mock.patch("zvmsdk.utils.print_all_pchids")
+    @mock.patch("zvmsdk.volumeop.FCPManager.sync_db")
+    def test_reconciler(self, sync_db, print_all_pchids):
+        base.set_conf('volume', 'fcp_sync_interval', 60)
+        self.addCleanup(base.set_conf, 'volume', 'fcp_sync_interval', 0)
+        synced = volumeop.threading.Event()
+        sync_db.side_effect = synced.set
+        fcpops = volumeop.FCPManager()
+        # the sync runs in background
+        self.assertTrue(synced.wait(5))
+        print_all_pchids.assert_called_once_with()
+        reconciler = fcpops._reconciler
+        fcpops.start_reconciler()
+        self.assertIs(reconciler, fcpops._reconciler)
+
     @mock.patch("zvmsdk.utils.get_zvm_name")
     @patch('zvmsdk.utils.get_zhypinfo')
     @mock.patch.object(uuid, 'uuid1')
@@ -2191,8 +2303,8 @@ class TestFCPVolumeManager(base.SDKTestCase):
 
         try:
             self.volumeops.attach(connection_info)
-            self.assertEqual(mock_dedicate.call_args_list,
-                             [call('c123', 'USER1'), call('d123', 'USER1')])
+            self.assertCountEqual(mock_dedicate.call_args_list,
+                                  [call('c123', 'USER1'), call('d123', 'USER1')])
             mock_add_disk.assert_called_once_with(['c123', 'd123'],
                                                   'USER1', wwpns,
                                                   '2222', False, 'rhel7',
@@ -2201,6 +2313,138 @@ class TestFCPVolumeManager(base.SDKTestCase):
             self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
             self.db_op.bulk_delete_fcp_from_template(fcp_id_list, template_id)
 
+    def _attach_many_connection_infos(self, template_id):
+        return [{'os_version': 'rhel7',
+                 'multipath': True,
+                 'target_wwpn': ['20076D8500005182', '20076D8500005183'],
+                 'target_lun': lun,
+                 'zvm_fcp': ['c123', 'd123'],
+                 'mount_point': '/dev/sd' + lun[-1],
+                 'assigner_id': 'user1',
+                 'fcp_template_id': template_id}
+                for lun in ('2222', '2223')]
+
+    @mock.patch("zvmsdk.utils.check_userid_exist")
+    @mock.patch("zvmsdk.volumeop.FCPVolumeManager._add_disks_many")
+    @mock.patch("zvmsdk.volumeop.FCPVolumeManager._dedicate_fcp")
+    def test_attach_many(self, mock_dedicate, mock_add_disks, mock_check):
+        """Test attach_many() method."""
+        _purge_fcp_db()
+        template_id = 'fakehost-1111-1111-1111-111111111111'
+        mock_check.return_value = True
+        fcp_info_list = [('c123', '', 0, 1, 'c05076de3300011c',
+                          'c05076de33002641', '27', '02e4', 'free', 'none',
+                          template_id),
+                         ('d123', '', 0, 1, 'c05076de3300011d',
+                          'c05076de33002641', '27', '02e4', 'free', 'none',
+                          template_id)]
+        fcp_id_list = [fcp_info[0] for fcp_info in fcp_info_list]
+        self._insert_data_into_fcp_table(fcp_info_list)
+        connection_infos = self._attach_many_connection_infos(template_id)
+        try:
+            self.volumeops.attach_many('user1', connection_infos)
+            # each FCP device is dedicated once for both volumes
+            self.assertCountEqual([call('c123', 'USER1'), call('d123', 'USER1')],
+                                  mock_dedicate.call_args_list)
+            wwpns = ['20076d8500005182', '20076d8500005183']
+            mock_add_disks.assert_called_once_with(
+                'USER1', 'rhel7',
+                [{'fcp_list': ['c123', 'd123'], 'target_wwpns': wwpns,
+                  'target_lun': lun, 'multipath': True,
+                  'mount_point': '/dev/sd' + lun[-1],
+                  'fcp_template_id': template_id}
+                 for lun in ('2222', '2223')])
+            for fcp in fcp_id_list:
+                self.assertEqual(('USER1', 1, 2, template_id),
+                                 self.volumeops.get_fcp_usage(fcp))
+        finally:
+            self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+
+    def test_attach_many_invalid_input(self):
+        """Test attach_many() with volumes of other guests or root volumes."""
+        connection_infos = self._attach_many_connection_infos('fake_tmpl')
+        connection_infos[1]['assigner_id'] = 'user2'
+        self.assertRaises(exception.SDKInvalidInputFormat,
+                          self.volumeops.attach_many, 'user1', connection_infos)
+        connection_infos = self._attach_many_connection_infos('fake_tmpl')
+        connection_infos[1]['is_root_volume'] = True
+        self.assertRaises(exception.SDKInvalidInputFormat,
+                          self.volumeops.attach_many, 'user1', connection_infos)
+
+    @mock.patch("zvmsdk.utils.check_userid_exist")
+    @mock.patch("zvmsdk.volumeop.FCPVolumeManager._remove_disks")
+    @mock.patch("zvmsdk.volumeop.FCPVolumeManager._undedicate_fcp")
+    @mock.patch("zvmsdk.volumeop.FCPVolumeManager._add_disks_many")
+    @mock.patch("zvmsdk.volumeop.FCPVolumeManager._dedicate_fcp")
+    def test_attach_many_with_rollback(self, mock_dedicate, mock_add_disks,
+                                       mock_undedicate, mock_remove_disks,
+                                       mock_check):
+        """Test attach_many() method when _add_disks_many() failed."""
+        _purge_fcp_db()
+        template_id = 'fakehost-1111-1111-1111-111111111111'
+        mock_check.return_value = True
+        mock_add_disks.side_effect = exception.SDKVolumeOperationError(
+            rs=8, userid="USER1", msg="fake error")
+        fcp_info_list = [('c123', '', 0, 1, 'c05076de3300011c',
+                          'c05076de33002641', '27', '02e4', 'free', 'none',
+                          template_id),
+                         ('d123', '', 0, 1, 'c05076de3300011d',
+                          'c05076de33002641', '27', '02e4', 'free', 'none',
+                          template_id)]
+        fcp_id_list = [fcp_info[0] for fcp_info in fcp_info_list]
+        self._insert_data_into_fcp_table(fcp_info_list)
+        connection_infos = self._attach_many_connection_infos(template_id)
+        try:
+            self.assertRaises(exception.SDKVolumeOperationError,
+                              self.volumeops.attach_many, 'user1',
+                              connection_infos)
+            # the volumes are offlined from the last one, the FCP devices
+            # with the first one
+            wwpns = ['20076d8500005182', '20076d8500005183']
+            self.assertEqual(
+                [call(['c123', 'd123'], 'USER1', wwpns, '2223', True,
+                      'rhel7', '/dev/sd3', 2),
+                 call(['c123', 'd123'], 'USER1', wwpns, '2222', True,
+                      'rhel7', '/dev/sd2', 0)],
+                mock_remove_disks.call_args_list)
+            self.assertCountEqual([call('c123', 'USER1'), call('d123', 'USER1')],
+                                  mock_undedicate.call_args_list)
+            for fcp in fcp_id_list:
+                self.assertEqual(('USER1', 0, 0, ''),
+                                 self.volumeops.get_fcp_usage(fcp))
+        finally:
+            self.db_op.bulk_delete_from_fcp_table(fcp_id_list)
+
+    def test_run_per_fcp(self):
+        """Test _run_per_fcp() waits for all the calls and raises in order."""
+        fcp_list = ['1a01', '1b01', '1c01', '1d01']
+        called = []
+        lock = threading.Lock()
+
+        def _func(fcp, assigner_id):
+            with lock:
+                called.append((fcp, assigner_id))
+            if fcp in ('1b01', '1d01'):
+                raise exception.SDKVolumeOperationError(rs=11, userid=assigner_id,
+                                                        msg=fcp)
+
+        for workers in (8, 1):
+            del called[:]
+            base.set_conf('volume', 'fcp_workers', workers)
+            try:
+                with self.assertRaises(exception.SDKVolumeOperationError) as cm:
+                    self.volumeops._run_per_fcp(_func, fcp_list, 'fake_id')
+            finally:
+                base.set_conf('volume', 'fcp_workers', 8)
+            self.assertIn('1b01', cm.exception.format_message())
+            if workers == 1:
+                # one after another, stopped at the first failure
+                self.assertEqual([('1a01', 'fake_id'), ('1b01', 'fake_id')],
+                                 called)
+            else:
+                self.assertCountEqual([(fcp, 'fake_id') for fcp in fcp_list],
+                                      called)
+
     @mock.patch("zvmsdk.volumeop.FCPVolumeManager.get_fcp_usage")
     @mock.patch("zvmsdk.utils.check_userid_exist")
     @mock.patch("zvmsdk.volumeop.FCPVolumeManager._do_attach")
@@ -2589,8 +2833,8 @@ class TestFCPVolumeManager(base.SDKTestCase):
             connection_info['fcp_template_id'], do_rollback=False
         )
         mock_increase_conn.assert_called_once()
-        self.assertEqual(mock_dedicate_fcp.call_args_list,
-                         [call('183c', 'user1'), call('283c', 'user1')])
+        self.assertCountEqual(mock_dedicate_fcp.call_args_list,
+                              [call('183c', 'user1'), call('283c', 'user1')])
         mock_add_disks.assert_called_once()
         mock_rb_increased_conn.assert_not_called()
         mock_rb_reserved_fcp.assert_not_called()
@@ -2612,7 +2856,9 @@ class TestFCPVolumeManager(base.SDKTestCase):
                           connection_info['mount_point'], connection_info['is_root_volume'],
                           connection_info['fcp_template_id'], do_rollback=True)
         mock_increase_conn.assert_called_once()
-        mock_dedicate_fcp.assert_called_once_with('183c', 'user1')
+        # the FCP devices are handled concurrently, all of them are tried
+        self.assertCountEqual(mock_dedicate_fcp.call_args_list,
+                              [call('183c', 'user1'), call('283c', 'user1')])
         mock_rb_increased_conn.assert_called_once()
         mock_rb_reserved_fcp.assert_called_once()
         mock_rb_dedicated_fcp.assert_called_once()
@@ -2789,8 +3035,8 @@ class TestFCPVolumeManager(base.SDKTestCase):
             connection_info['update_connections_only'], do_rollback=False
         )
         mock_remove_disks.assert_called_once()
-        self.assertEqual(mock_undedicate_fcp.call_args_list,
-                         [call('183c', 'user1'), call('283c', 'user1')])
+        self.assertCountEqual(mock_undedicate_fcp.call_args_list,
+                              [call('183c', 'user1'), call('283c', 'user1')])
         mock_rb_decreased_conn.assert_not_called()
         mock_rb_removed_disk.assert_not_called()
         mock_rb_undedicate_fcp.assert_not_called()
@@ -2811,7 +3057,9 @@ class TestFCPVolumeManager(base.SDKTestCase):
             connection_info['update_connections_only'], do_rollback=True
         )
         mock_remove_disks.assert_called_once()
-        mock_undedicate_fcp.assert_called_once_with('183c', 'user1')
+        # the FCP devices are handled concurrently, all of them are tried
+        self.assertCountEqual(mock_undedicate_fcp.call_args_list,
+                              [call('183c', 'user1'), call('283c', 'user1')])
         mock_rb_decreased_conn.assert_called_once()
         mock_rb_removed_disk.assert_called_once()
         mock_rb_undedicate_fcp.assert_called_once()
@@ -3087,8 +3335,8 @@ class TestFCPVolumeManager(base.SDKTestCase):
         fcp_list = ['1a01', '1b01', '1c01', '1d01']
         assigner_id = 'fake_id'
         self.volumeops._rollback_dedicated_fcp_devices(fcp_list, assigner_id)
-        expected_calls_in_order = [call('1a01', 'fake_id'), call('1c01', 'fake_id')]
-        self.assertEqual(mock_undedicate.call_args_list, expected_calls_in_order)
+        expected_calls = [call('1a01', 'fake_id'), call('1c01', 'fake_id')]
+        self.assertCountEqual(expected_calls, mock_undedicate.call_args_list)
 
     @mock.patch("zvmsdk.volumeop.FCPVolumeManager._remove_disks")
     @mock.patch("zvmsdk.database.FCPDbOperator.get_connections_from_fcp")
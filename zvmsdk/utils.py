@@ -17,10 +17,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import contextlib
 import errno
 import functools
+import hashlib
 import inspect
+import io
 import json
 import netaddr
 import os
@@ -31,12 +34,15 @@ import shutil
 import six
 import subprocess
 import sys
+import tarfile
 import tempfile
 import time
 import traceback
 import threading
 import string
 
+from smtLayer import vmUtils
+
 from zvmsdk import config
 from zvmsdk import constants
 from zvmsdk import exception
@@ -778,6 +784,56 @@ def check_userid_exist(userid, needLogon=False):
     return False
 
 
+def query_names():
+    """Get all the users logged on to z/VM with one 'vmcp query names'.
+
+    The output is parsed by smtLayer, TERM is 'SSI' for users logged on
+    to another member of the SSI cluster.
+
+    :returns: dict of {userid: term}, the userids in upper case
+    """
+    cmd = ['sudo', '/sbin/vmcp', '--buffer=1M', 'query', 'names']
+    rc, output = execute(cmd)
+    if rc != 0:
+        msg = ("Failed to query the logged on users, rc: %(rc)s, "
+               "output: %(output)s" % {'rc': rc, 'output': output})
+        raise exception.SDKInternalError(msg=msg)
+    return vmUtils.parseQueryNames(output)
+
+
+_SSI_OTHERS_CACHE = {'userids': None, 'expiration': 0}
+_SSI_OTHERS_LOCK = threading.Lock()
+
+
+def get_userids_on_others():
+    """Get the users logged on to other members of the SSI cluster.
+
+    All the users are got with one 'vmcp query names'. The result is
+    cached for [guest] index_refresh_interval seconds, and dropped by
+    invalidate_userids_on_others when guests are created or deleted.
+
+    :returns: set of userids in upper case
+    """
+    with _SSI_OTHERS_LOCK:
+        if (_SSI_OTHERS_CACHE['userids'] is not None and
+                time.time() < _SSI_OTHERS_CACHE['expiration']):
+            return _SSI_OTHERS_CACHE['userids']
+
+    userids = frozenset(userid for userid, term in query_names().items()
+                        if term == 'SSI')
+    if CONF.guest.index_refresh_interval > 0:
+        with _SSI_OTHERS_LOCK:
+            _SSI_OTHERS_CACHE['userids'] = userids
+            _SSI_OTHERS_CACHE['expiration'] = (
+                time.time() + CONF.guest.index_refresh_interval)
+    return userids
+
+
+def invalidate_userids_on_others():
+    with _SSI_OTHERS_LOCK:
+        _SSI_OTHERS_CACHE['userids'] = None
+
+
 def check_userid_on_others(userid):
     try:
         check_userid_exist(userid)
@@ -1315,3 +1371,73 @@ def get_lpar_name(zhypinfo=None):
         zhypinfo = get_zhypinfo(filter='all')
         lpar_name = zhypinfo['lpar']['layer_name']
     return lpar_name
+
+
+# Max number of archives kept by build_tar
+_TAR_CACHE_SIZE = 64
+_TAR_CACHE = collections.OrderedDict()
+_TAR_CACHE_LOCK = threading.Lock()
+
+
+def _tar_key(members, compression):
+    digest = hashlib.sha256(compression.encode())
+    for name, data in members:
+        digest.update(b'\0d' if data is None else b'\0f')
+        digest.update(name.encode())
+        if data is not None:
+            data = to_utf8(data)
+            digest.update(b'\0%d\0' % len(data))
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _make_tar(members, compression):
+    buf = io.BytesIO()
+    mtime = time.time()
+    with tarfile.open(fileobj=buf, mode='w:' + compression) as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.mtime = mtime
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                tar.addfile(info)
+            else:
+                data = to_utf8(data)
+                info.size = len(data)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def build_tar(members, compression=''):
+    """Build a tar archive in memory.
+
+    :param members: list of (name, data) tuples in archive order, data is
+        the str or bytes content of a regular file, or None for a directory
+    :param compression: '' for no compression, or 'gz', 'bz2', 'xz'
+    :returns: bytes of the archive
+
+    The archives are cached by their content, so building again the same
+    members returns the archive already built.
+    """
+    key = _tar_key(members, compression)
+    with _TAR_CACHE_LOCK:
+        archive = _TAR_CACHE.get(key)
+        if archive is not None:
+            _TAR_CACHE.move_to_end(key)
+            return archive
+    archive = _make_tar(members, compression)
+    with _TAR_CACHE_LOCK:
+        _TAR_CACHE[key] = archive
+        while len(_TAR_CACHE) > _TAR_CACHE_SIZE:
+            _TAR_CACHE.popitem(last=False)
+    return archive
+
+
+def write_tar(path, members, compression=''):
+    """Build the tar archive of members with build_tar and write it to path."""
+    archive = build_tar(members, compression)
+    with open(path, 'wb') as f:
+        f.write(archive)
+    return path
@@ -19,6 +19,8 @@
 import os
 import six
 import shutil
+import threading
+import time
 
 from zvmsdk import config
 from zvmsdk import dist
@@ -30,6 +32,7 @@ from zvmsdk import utils as zvmutils
 
 
 _VMOPS = None
+_GUEST_INDEX = None
 CONF = config.CONF
 LOG = log.LOG
 
@@ -41,13 +44,132 @@ def get_vmops():
     return _VMOPS
 
 
+def get_guest_index():
+    global _GUEST_INDEX
+    if _GUEST_INDEX is None:
+        _GUEST_INDEX = GuestIndex()
+    return _GUEST_INDEX
+
+
+class GuestIndex(object):
+    """In-memory index of the guests managed by SDK.
+
+    It holds the userids in the guest database that are not migrated and
+    the userids logged on to other SSI members. It is rebuilt from the
+    database and z/VM each [guest] index_refresh_interval seconds, and is
+    kept current in between by the guest create, delete, register and
+    migrate paths through add and remove.
+
+    One thread rebuilds the index at a time. While it does, the other
+    checks use the expired index, or wait for the rebuild when there is
+    no index yet.
+    """
+
+    def __init__(self):
+        self._smtclient = smtclient.get_smtclient()
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._managed = None
+        self._on_others = set()
+        self._expiration = 0
+        # Number of rebuilds done, a check waiting for a rebuild uses the
+        # index of the rebuild that finished in the meantime.
+        self._builds = 0
+        # Changes made while a rebuild reads the database, they are
+        # replayed on the rebuilt index.
+        self._generation = 0
+        self._changes = []
+        self._rebuilding = False
+
+    def _refresh(self):
+        with self._lock:
+            builds = self._builds
+        with self._rebuild_lock:
+            with self._lock:
+                if self._builds != builds:
+                    return
+            self._rebuild()
+
+    def _rebuild(self):
+        # Caller holds self._rebuild_lock
+        with self._lock:
+            generation = self._generation
+            self._rebuilding = True
+        try:
+            managed = set(uid.upper()
+                          for uid in self._smtclient.get_vm_list())
+            on_others = set(zvmutils.get_userids_on_others())
+            with self._lock:
+                for gen, userid, is_managed in self._changes:
+                    if gen > generation:
+                        self._apply(managed, on_others, userid, is_managed)
+                self._managed = managed
+                self._on_others = on_others
+                self._expiration = (time.time() +
+                                    CONF.guest.index_refresh_interval)
+                self._builds += 1
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._changes = []
+
+    def _apply(self, managed, on_others, userid, is_managed):
+        if is_managed:
+            managed.add(userid)
+            on_others.discard(userid)
+        else:
+            managed.discard(userid)
+
+    def _change(self, userid, is_managed):
+        userid = userid.upper()
+        with self._lock:
+            self._generation += 1
+            if self._rebuilding:
+                self._changes.append((self._generation, userid, is_managed))
+            if self._managed is not None:
+                self._apply(self._managed, self._on_others, userid,
+                            is_managed)
+
+    def add(self, userid):
+        """The guest is created or registered on this host."""
+        self._change(userid, True)
+
+    def remove(self, userid):
+        """The guest is deleted, deregistered or migrated away."""
+        self._change(userid, False)
+
+    def invalidate(self):
+        with self._lock:
+            self._expiration = 0
+
+    def check(self, userids):
+        """Check the guests against the index.
+
+        :param userids: list of userids
+        :returns: a tuple of the list of userids not managed by SDK and the
+                  list of managed userids logged on to other SSI members
+        """
+        userids = [uid.upper() for uid in userids]
+        with self._lock:
+            fresh = (self._managed is not None and
+                     (time.time() < self._expiration or self._rebuilding))
+        if not fresh:
+            self._refresh()
+        with self._lock:
+            not_managed = [uid for uid in userids
+                           if uid not in self._managed]
+            on_others = [uid for uid in userids
+                         if uid in self._managed and uid in self._on_others]
+        return not_managed, on_others
+
+
 class VMOps(object):
 
     def __init__(self):
         self._smtclient = smtclient.get_smtclient()
         self._dist_manager = dist.LinuxDistManager()
         self._pathutils = zvmutils.PathUtils()
-        self._namelist = zvmutils.get_namelist()
+        self._guest_index = get_guest_index()
         self._GuestDbOperator = database.GuestDbOperator()
         self._ImageDbOperator = database.ImageDbOperator()
 
@@ -55,6 +177,10 @@ class VMOps(object):
         """Get power status of a z/VM instance."""
         return self._smtclient.get_power_state(userid)
 
+    def get_power_state_bulk(self, userid_list):
+        """Get power status of several z/VM instances."""
+        return self._smtclient.get_power_state_bulk(userid_list)
+
     def _get_cpu_num_from_user_dict(self, dict_info):
         cpu_num = 0
         for inf in dict_info:
@@ -309,8 +435,8 @@ class VMOps(object):
                                    comment_list, cschedule, cshare, rdomain,
                                    pcif)
 
-        # add userid into smapi namelist
-        self._smtclient.namelist_add(self._namelist, userid)
+        zvmutils.invalidate_userids_on_others()
+        self._guest_index.add(userid)
         return info
 
     def create_disks(self, userid, disk_list):
@@ -385,6 +511,8 @@ class VMOps(object):
         """Delete z/VM userid for the instance."""
         LOG.info("Begin to delete vm %s", userid)
         self._smtclient.delete_vm(userid)
+        zvmutils.invalidate_userids_on_others()
+        self._guest_index.remove(userid)
         LOG.info("Complete delete vm %s", userid)
 
     def execute_cmd(self, userid, cmdStr):
@@ -425,7 +553,7 @@ class VMOps(object):
 
     def guest_deploy(self, userid, image_name, transportfiles=None,
                      remotehost=None, vdev=None, hostname=None,
-                     skipdiskcopy=False):
+                     skipdiskcopy=False, progress=None):
         LOG.info("Begin to deploy image on vm %s", userid)
         if not skipdiskcopy:
             os_version = self._smtclient.image_get_os_distro(image_name)
@@ -433,7 +561,8 @@ class VMOps(object):
             os_version = image_name
         if not self._smtclient.is_rhcos(os_version):
             self._smtclient.guest_deploy(userid, image_name, transportfiles,
-                                         remotehost, vdev, skipdiskcopy)
+                                         remotehost, vdev, skipdiskcopy,
+                                         progress=progress)
 
             # punch scripts to set hostname
             if (transportfiles is None) and hostname:
@@ -441,7 +570,7 @@ class VMOps(object):
         else:
             self._smtclient.guest_deploy_rhcos(userid, image_name,
                             transportfiles, remotehost, vdev, hostname,
-                            skipdiskcopy)
+                            skipdiskcopy, progress=progress)
 
     def guest_capture(self, userid, image_name, capture_type='rootonly',
                       compress_level=6):
@@ -515,47 +644,28 @@ class VMOps(object):
             # convert userid string to list
             userids = [userids]
 
-        all_userids = self.guest_list()
-
-        userids_not_in_db = list(set(userids) - set(all_userids))
-        if userids_not_in_db:
+        not_managed, on_others = self._guest_index.check(userids)
+        if not_managed:
             if raise_exc:
                 # log and raise exception
-                userids_not_in_db = ' '.join(userids_not_in_db)
+                userids_not_in_db = ' '.join(not_managed)
                 LOG.error("Guest '%s' does not exist in guests database" %
                           userids_not_in_db)
                 raise exception.SDKObjectNotExistError(
                     obj_desc=("Guest '%s'" % userids_not_in_db), modID='guest')
             else:
                 return False
-        else:
-            userids_migrated = self._GuestDbOperator.get_migrated_guest_list()
-            userids_in_migrated = list(set(userids) & set(userids_migrated))
-
-            # case1 userid has been migrated.
-            if userids_in_migrated:
-                if raise_exc:
-                    migrated_userids = ' '.join(userids_in_migrated)
-                    LOG.error("Guest(s) '%s' has been migrated." %
-                              migrated_userids)
-                    raise exception.SDKObjectNotExistError(
-                                obj_desc=("Guest(s) '%s'" % migrated_userids),
-                                modID='guest')
-                else:
-                    return False
-
-            flag = True
-            for uid in userids:
-                # case2 userid has been shudown and started on other host.
-                if zvmutils.check_userid_on_others(uid):
-                    flag = False
-                    comment = self._GuestDbOperator.get_comments_by_userid(uid)
-                    comment['migrated'] = 1
-                    action = "update guest '%s' in database" % uid
-                    with zvmutils.log_and_reraise_sdkbase_error(action):
-                        self._GuestDbOperator.update_guest_by_userid(
-                                        uid, comments=comment)
-            return flag
+
+        # The guests shut down here and started on other host are migrated.
+        for uid in on_others:
+            comment = self._GuestDbOperator.get_comments_by_userid(uid)
+            comment['migrated'] = 1
+            action = "update guest '%s' in database" % uid
+            with zvmutils.log_and_reraise_sdkbase_error(action):
+                self._GuestDbOperator.update_guest_by_userid(
+                                uid, comments=comment)
+            self._guest_index.remove(uid)
+        return not on_others
 
     def live_resize_cpus(self, userid, count, cpu_share):
         # Check power state is 'on'
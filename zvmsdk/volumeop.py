@@ -17,11 +17,13 @@
 
 
 import abc
+from concurrent import futures
 import re
 import shutil
 import uuid
 import six
 import threading
+import time
 import os
 
 from zvmsdk import config
@@ -89,6 +91,9 @@ class VolumeOperatorAPI(object):
     def attach_volume_to_instance(self, connection_info):
         self._volume_manager.attach(connection_info)
 
+    def attach_volumes_to_instance(self, assigner_id, connection_infos):
+        self._volume_manager.attach_many(assigner_id, connection_infos)
+
     def detach_volume_from_instance(self, connection_info):
         self._volume_manager.detach(connection_info)
 
@@ -165,6 +170,8 @@ class VolumeConfiguratorAPI(object):
         self._vmop = vmops.get_vmops()
         self._dist_manager = dist.LinuxDistManager()
         self._smtclient = smtclient.get_smtclient()
+        # compile the volume configuration script templates at startup
+        dist.load_templates()
 
     def check_IUCV_is_ready(self, assigner_id):
         # Make sure the iucv channel is ready for communication with VM
@@ -219,6 +226,45 @@ class VolumeConfiguratorAPI(object):
         self.configure_volume_attach(fcp_list, assigner_id, target_wwpns,
                                      target_lun, multipath, os_version,
                                      mount_point, linuxdist)
+        self._run_attach_scripts(fcp_list, assigner_id, target_wwpns,
+                                 target_lun, linuxdist)
+        LOG.info("Configuration of volume (WWPN:%s, LUN:%s) on the "
+                 "target virtual machine %s with FCP devices "
+                 "%s is done." % (target_wwpns, target_lun, assigner_id,
+                                  fcp_list))
+
+    def config_attach_many(self, assigner_id, os_version, volumes):
+        """Configure several volumes on the virtual machine in one pass.
+
+        The attach script of each volume is punched to the virtual machine,
+        then zvmguestconfigure is restarted once to run all of them.
+
+        :param volumes: (list) a dict per volume with the keys fcp_list,
+            target_wwpns, target_lun, multipath and mount_point
+        """
+        LOG.info("Begin to configure %d volumes on the virtual machine "
+                 "%s." % (len(volumes), assigner_id))
+        linuxdist = self._dist_manager.get_linux_dist(os_version)()
+        fcp_list = []
+        target_wwpns = []
+        target_luns = []
+        for vol in volumes:
+            self.configure_volume_attach(vol['fcp_list'], assigner_id,
+                                         vol['target_wwpns'],
+                                         vol['target_lun'],
+                                         vol['multipath'], os_version,
+                                         vol['mount_point'], linuxdist)
+            fcp_list.extend(f for f in vol['fcp_list'] if f not in fcp_list)
+            target_wwpns.extend(w for w in vol['target_wwpns']
+                                if w not in target_wwpns)
+            target_luns.append(vol['target_lun'])
+        self._run_attach_scripts(fcp_list, assigner_id, target_wwpns,
+                                 ','.join(target_luns), linuxdist)
+        LOG.info("Configuration of %d volumes on the target virtual machine "
+                 "%s is done." % (len(volumes), assigner_id))
+
+    def _run_attach_scripts(self, fcp_list, assigner_id, target_wwpns,
+                            target_lun, linuxdist):
         iucv_is_ready = self.check_IUCV_is_ready(assigner_id)
         if iucv_is_ready:
             # If VM is active rather than shutdown, then restart zvmguestconfigure
@@ -286,10 +332,6 @@ class VolumeConfiguratorAPI(object):
                 raise exception.SDKVolumeOperationError(rs=8,
                                                         userid=assigner_id,
                                                         msg=errmsg)
-        LOG.info("Configuration of volume (WWPN:%s, LUN:%s) on the "
-                 "target virtual machine %s with FCP devices "
-                 "%s is done." % (target_wwpns, target_lun, assigner_id,
-                                  fcp_list))
 
     def config_detach(self, fcp_list, assigner_id, target_wwpns, target_lun,
                       multipath, os_version, mount_point, connections):
@@ -525,6 +567,14 @@ class FCP(object):
                 self.get_physical_port(), self.get_chpid(), self.get_pchid(),
                 self.get_dev_status(), self.get_owner())
 
+    def fingerprint(self):
+        """Return the z/VM info of this FCP device as a tuple of
+           (wwpn_npiv, wwpn_phy, chpid, pchid, state, owner)
+        It equals the fingerprint of the record in FCP table
+        if the record is in sync with z/VM.
+        """
+        return self.to_tuple()[1:]
+
 
 class FCPManager(object):
 
@@ -533,16 +583,70 @@ class FCPManager(object):
         self._fcp_path_mapping = {}
         self.db = database.FCPDbOperator()
         self._smtclient = smtclient.get_smtclient()
-        # Sync FCP DB
-        self.sync_db()
-        # Get available channel-paths from linux command lschp and log the info
-        zvmutils.print_all_pchids()
+        # metrics of the syncs of FCP DB with z/VM
+        self._sync_stats = dict(runs=0, failures=0, last_duration=0.0,
+                                total_duration=0.0, last_drift=0,
+                                **{k: 0 for k in self._DRIFT_KEYS})
+        self._sync_stats_lock = threading.Lock()
+        self._reconciler = None
+        if CONF.volume.fcp_sync_interval > 0:
+            # Sync FCP DB in background, not to block the startup
+            self.start_reconciler()
+        else:
+            # Sync FCP DB
+            self.sync_db()
+            # Get available channel-paths from linux command lschp and log the info
+            zvmutils.print_all_pchids()
+
+    # the kinds of drift between FCP DB and z/VM fixed by a sync
+    _DRIFT_KEYS = ('added', 'deleted', 'notfound', 'updated')
 
     def sync_db(self):
         """Sync FCP DB with the FCP info queried from zVM"""
         with zvmutils.ignore_errors():
             self._sync_db_with_zvm()
 
+    def start_reconciler(self):
+        """Start the thread which syncs FCP DB with z/VM periodically."""
+        if self._reconciler is not None:
+            return
+        self._reconciler = threading.Thread(target=self._reconcile_loop)
+        self._reconciler.daemon = True
+        self._reconciler.start()
+
+    def _reconcile_loop(self):
+        with zvmutils.ignore_errors():
+            zvmutils.print_all_pchids()
+        while True:
+            self.sync_db()
+            time.sleep(CONF.volume.fcp_sync_interval)
+
+    def _record_sync(self, duration, drift=None):
+        with self._sync_stats_lock:
+            stats = self._sync_stats
+            stats['runs'] += 1
+            stats['last_duration'] = duration
+            stats['total_duration'] += duration
+            if drift is None:
+                stats['failures'] += 1
+                return
+            stats['last_drift'] = 0
+            for key in self._DRIFT_KEYS:
+                stats[key] += drift[key]
+                stats['last_drift'] += drift[key]
+
+    def get_sync_stats(self):
+        """Return the metrics of the syncs of FCP DB with z/VM, e.g.
+        {'runs': 12, 'failures': 0,
+         'last_duration': 0.35, 'total_duration': 4.2,
+         'last_drift': 2,
+         'added': 1, 'deleted': 0, 'notfound': 0, 'updated': 5}
+        added/deleted/notfound/updated count the FCP records changed
+        by all the syncs, last_drift counts those of the last sync.
+        """
+        with self._sync_stats_lock:
+            return dict(self._sync_stats)
+
     def _get_all_fcp_info(self, assigner_id, status=None):
         fcp_info = self._smtclient.get_fcp_info_by_status(assigner_id, status)
 
@@ -876,8 +980,8 @@ class FCPManager(object):
             all_fcp_pool[dev_no] = fcp
         return all_fcp_pool
 
-    def get_fcp_dict_in_db(self):
-        """Return a dict of all FCPs in FCP_DB
+    def get_fcp_dict_in_db(self, fcp_ids=None):
+        """Return a dict of all FCPs in FCP_DB, or of the FCPs in fcp_ids
 
         Note: the key of the returned dict is in lowercase.
         example (key=FCP)
@@ -893,6 +997,9 @@ class FCPManager(object):
         }
         """
 
+        if fcp_ids is not None:
+            fcp_in_db = self.db.get_fcps_by_ids(fcp_ids)
+            return {fcp['fcp_id'].lower(): fcp for fcp in fcp_in_db}
         try:
             # Get all FCPs found in DB.
             fcp_in_db = self.db.get_all_fcps_of_assigner()
@@ -930,14 +1037,48 @@ class FCPManager(object):
         return fcp_id_to_object
 
     def sync_fcp_table_with_zvm(self, fcp_dict_in_zvm):
-        """Update FCP records queried from zVM into FCP table."""
+        """Update FCP records queried from zVM into FCP table.
+
+        The fingerprint of each FCP device queried from z/VM is compared
+        with the one of its FCP record, read without holding the FCP DB
+        lock. Only the FCP devices added, removed or changed in z/VM are
+        synced, in batches of [volume] fcp_sync_batch_size FCP devices,
+        each batch in a transaction of its own.
+
+        :return: (dict) the count of FCP records changed, for example:
+            {'added': 1, 'deleted': 0, 'notfound': 0, 'updated': 2}
+        """
+        fingerprints_in_db = {
+            fcp['fcp_id'].lower(): tuple(fcp)[1:]
+            for fcp in self.db.get_zvm_info_of_all_fcps()}
+        changed = set(fingerprints_in_db) - set(fcp_dict_in_zvm)
+        for fcp in fcp_dict_in_zvm:
+            if (fcp_dict_in_zvm[fcp].fingerprint() !=
+                    fingerprints_in_db.get(fcp)):
+                changed.add(fcp)
+        LOG.info("FCP devices changed in z/VM: {}".format(
+            utils.shrink_fcp_list(list(changed))))
+        drift = {key: 0 for key in self._DRIFT_KEYS}
+        changed = sorted(changed)
+        batch_size = max(CONF.volume.fcp_sync_batch_size, 1)
+        for i in range(0, len(changed), batch_size):
+            batch_drift = self._sync_fcp_batch_with_zvm(
+                fcp_dict_in_zvm, changed[i:i + batch_size])
+            for key in drift:
+                drift[key] += batch_drift[key]
+        return drift
+
+    def _sync_fcp_batch_with_zvm(self, fcp_dict_in_zvm, fcp_ids):
+        """Sync the FCP records of fcp_ids with the FCP info queried from
+        z/VM, in one transaction."""
         with database.get_fcp_conn():
-            # Get a dict of all FCPs already existed in FCP table
-            fcp_dict_in_db = self.get_fcp_dict_in_db()
+            # Get a dict of the FCPs already existed in FCP table
+            fcp_dict_in_db = self.get_fcp_dict_in_db(fcp_ids)
+            fcp_in_zvm = set(fcp_ids) & set(fcp_dict_in_zvm)
             # Divide FCPs into three sets
-            inter_set = set(fcp_dict_in_zvm) & set(fcp_dict_in_db)
+            inter_set = fcp_in_zvm & set(fcp_dict_in_db)
             del_fcp_set = set(fcp_dict_in_db) - inter_set
-            add_fcp_set = set(fcp_dict_in_zvm) - inter_set
+            add_fcp_set = fcp_in_zvm - inter_set
 
             # Add new records into FCP table
             fcp_info_need_insert = [fcp_dict_in_zvm[fcp].to_tuple()
@@ -961,7 +1102,7 @@ class FCPManager(object):
                  fcp_owner_db, tmpl_id) = fcp_dict_in_db[fcp]
                 if connections == 0 and reserved == 0:
                     fcp_ids_secure_to_delete.add(fcp)
-                else:
+                elif fcp_state_db != 'notfound':
                     # these records not found in z/VM
                     # but still in-use in FCP table
                     fcp_ids_not_found.add(fcp)
@@ -1046,17 +1187,30 @@ class FCPManager(object):
             self.db.bulk_update_zvm_fcp_info_in_fcp_table(fcp_info_need_update)
             LOG.info("FCP devices need to update records in "
                      "fcp table: {}".format(fcp_info_need_update))
+        return {'added': len(add_fcp_set),
+                'deleted': len(fcp_ids_secure_to_delete),
+                'notfound': len(fcp_ids_not_found),
+                'updated': len(fcp_ids_need_update)}
 
     def _sync_db_with_zvm(self):
         """Sync FCP DB with the FCP info queried from zVM"""
 
         LOG.info("Enter: Sync FCP DB with FCP info queried from z/VM.")
         LOG.info("Querying FCP status on z/VM.")
-        # Get a dict of all FCPs in ZVM
-        fcp_dict_in_zvm = self.get_fcp_dict_in_zvm()
-        # Update the dict of all FCPs into FCP table in database
-        self.sync_fcp_table_with_zvm(fcp_dict_in_zvm)
-        LOG.info("Exit: Sync FCP DB with FCP info queried from z/VM.")
+        start = time.time()
+        try:
+            # Get a dict of all FCPs in ZVM
+            fcp_dict_in_zvm = self.get_fcp_dict_in_zvm()
+            # Update the dict of all FCPs into FCP table in database
+            drift = self.sync_fcp_table_with_zvm(fcp_dict_in_zvm)
+        except Exception:
+            self._record_sync(time.time() - start)
+            raise
+        duration = time.time() - start
+        self._record_sync(duration, drift)
+        LOG.info("Exit: Sync FCP DB with FCP info queried from z/VM "
+                 "in {:.3f} seconds, FCP records changed: {}."
+                 .format(duration, drift))
 
     def create_fcp_template(self, name, description: str = '',
                             fcp_devices: str = '',
@@ -1994,16 +2148,73 @@ class FCPVolumeManager(object):
         # just do following variable redirection to avoid too much
         # reference code changes
         self.db = self.fcp_mgr.db
+        # pool shared by all the volume operations to dedicate and
+        # undedicate FCP devices, created on first use
+        self._fcp_executor = None
+        self._fcp_executor_lock = threading.Lock()
+
+    def _get_fcp_executor(self):
+        with self._fcp_executor_lock:
+            if self._fcp_executor is None:
+                self._fcp_executor = futures.ThreadPoolExecutor(
+                    max_workers=CONF.volume.fcp_workers)
+            return self._fcp_executor
+
+    def _run_per_fcp(self, func, fcp_list, assigner_id):
+        """Call func(fcp, assigner_id) for each FCP device in fcp_list.
+
+        The calls run concurrently in the shared pool of
+        [volume] fcp_workers threads, or one after another when the pool
+        size is 1. All the calls are waited for before returning, so a
+        rollback never overlaps the operations it rolls back. If any call
+        failed, the error of the first failed FCP device in fcp_list order
+        is raised.
+        """
+        if CONF.volume.fcp_workers <= 1 or len(fcp_list) <= 1:
+            for fcp in fcp_list:
+                func(fcp, assigner_id)
+            return
+        executor = self._get_fcp_executor()
+        tasks = [executor.submit(func, fcp, assigner_id) for fcp in fcp_list]
+        futures.wait(tasks)
+        for task in tasks:
+            task.result()
 
     def _dedicate_fcp(self, fcp, assigner_id):
         self._smtclient.dedicate_device(assigner_id, fcp, fcp, 0)
 
+    def _dedicate_fcps(self, fcp_list, assigner_id):
+        def _dedicate(fcp, assigner_id):
+            LOG.info("Start to dedicate FCP %s to "
+                     "%s in z/VM." % (fcp, assigner_id))
+            # dedicate the FCP to the assigner in z/VM
+            self._dedicate_fcp(fcp, assigner_id)
+            LOG.info("Dedicating FCP %s to %s in z/VM is "
+                     "done." % (fcp, assigner_id))
+
+        self._run_per_fcp(_dedicate, fcp_list, assigner_id)
+
+    def _undedicate_fcps(self, fcp_list, assigner_id):
+        def _undedicate(fcp, assigner_id):
+            # As _remove_disks() has been run successfully,
+            # we need to try our best to undedicate every FCP device
+            LOG.info("Start to undedicate FCP %s from "
+                     "%s on z/VM." % (fcp, assigner_id))
+            self._undedicate_fcp(fcp, assigner_id)
+            LOG.info("FCP %s undedicated from %s on z/VM is "
+                     "done." % (fcp, assigner_id))
+
+        self._run_per_fcp(_undedicate, fcp_list, assigner_id)
+
     def _add_disks(self, fcp_list, assigner_id, target_wwpns, target_lun,
                    multipath, os_version, mount_point):
         self.config_api.config_attach(fcp_list, assigner_id, target_wwpns,
                                       target_lun, multipath, os_version,
                                       mount_point)
 
+    def _add_disks_many(self, assigner_id, os_version, volumes):
+        self.config_api.config_attach_many(assigner_id, os_version, volumes)
+
     def _rollback_reserved_fcp_devices(self, fcp_list):
         """
         Rollback for the following completed operations:
@@ -2071,15 +2282,21 @@ class FCPVolumeManager(object):
                            for fcp in fcp_list}
         # Operation on z/VM:
         # undedicate FCP device from assigner_id
+        undedicate_fcps = []
         for fcp in fcp_list:
+            if fcp_connections[fcp] == 1:
+                undedicate_fcps.append(fcp)
+            else:
+                LOG.info("Skip undedicate FCP device {},"
+                         "because its connections is greater than 1".format(fcp))
+
+        def _undedicate(fcp, assigner_id):
             with zvmutils.ignore_errors():
-                if fcp_connections[fcp] == 1:
-                    self._undedicate_fcp(fcp, assigner_id)
-                    LOG.info("Rollback on z/VM: undedicate FCP device {}, "
-                             "because its connections is 1".format(fcp))
-                else:
-                    LOG.info("Skip undedicate FCP device {},"
-                             "because its connections is greater than 1".format(fcp))
+                self._undedicate_fcp(fcp, assigner_id)
+                LOG.info("Rollback on z/VM: undedicate FCP device {}, "
+                         "because its connections is 1".format(fcp))
+
+        self._run_per_fcp(_undedicate, undedicate_fcps, assigner_id)
         LOG.info("Exit rollback function: _rollback_dedicated_fcp_devices")
 
     def _rollback_added_disks(self, fcp_list, assigner_id, target_wwpns, target_lun,
@@ -2158,23 +2375,20 @@ class FCPVolumeManager(object):
 
         # Operation on z/VM: dedicate FCP devices to the assigner_id in z/VM
         try:
+            # Dedicate the FCP device on z/VM only when connections are 1,
+            # which means this is 1st volume attached to this FCP device,
+            # otherwise the FCP device has been dedicated already.
+            # if _dedicate_fcp() raise exception for an FCP device, we must stop
+            # the whole attachment to go to except-block to do rollback operations.
+            dedicate_fcps = []
             for fcp in fcp_list:
-                # Dedicate the FCP device on z/VM only when connections are 1,
-                # which means this is 1st volume attached to this FCP device,
-                # otherwise the FCP device has been dedicated already.
-                # if _dedicate_fcp() raise exception for an FCP device, we must stop
-                # the whole attachment to go to except-block to do rollback operations.
                 if fcp_connections[fcp] == 1:
-                    LOG.info("Start to dedicate FCP %s to "
-                             "%s in z/VM." % (fcp, assigner_id))
-                    # dedicate the FCP to the assigner in z/VM
-                    self._dedicate_fcp(fcp, assigner_id)
-                    LOG.info("Dedicating FCP %s to %s in z/VM is "
-                             "done." % (fcp, assigner_id))
+                    dedicate_fcps.append(fcp)
                 else:
                     LOG.info("This is not the first time to "
                              "attach volume to FCP %s, "
                              "skip dedicating the FCP device in z/VM." % fcp)
+            self._dedicate_fcps(dedicate_fcps, assigner_id)
         except Exception as err:
             LOG.error("Failed to dedicate FCP devices to %s in "
                       "z/VM because %s." % (assigner_id, str(err)))
@@ -2248,14 +2462,18 @@ class FCPVolumeManager(object):
         """
         LOG.info("Enter rollback function: _rollback_undedicated_fcp_devices")
         # Operation on z/VM: dedicate FCP devices to the virtual machine
-        for fcp in fcp_connections:
+        # _undedicate_fcp() has been done in _do_detach() if fcp_connections[fcp] == 0,
+        # so we do _dedicate_fcp() as rollback with the same if-condition
+        dedicate_fcps = [fcp for fcp in fcp_connections
+                         if fcp_connections[fcp] == 0]
+
+        def _dedicate(fcp, assigner_id):
             with zvmutils.ignore_errors():
-                # _undedicate_fcp() has been done in _do_detach() if fcp_connections[fcp] == 0,
-                # so we do _dedicate_fcp() as rollback with the same if-condition
-                if fcp_connections[fcp] == 0:
-                    # dedicate the FCP to the assigner in z/VM
-                    self._dedicate_fcp(fcp, assigner_id)
-                    LOG.info("Rollback on z/VM: dedicate FCP device: %s" % fcp)
+                # dedicate the FCP to the assigner in z/VM
+                self._dedicate_fcp(fcp, assigner_id)
+                LOG.info("Rollback on z/VM: dedicate FCP device: %s" % fcp)
+
+        self._run_per_fcp(_dedicate, dedicate_fcps, assigner_id)
         LOG.info("Exit rollback function: _rollback_undedicated_fcp_devices")
 
     def _rollback_removed_disks(self, fcp_connections, assigner_id, target_wwpns, target_lun,
@@ -2354,6 +2572,174 @@ class FCPVolumeManager(object):
                                  % (fcp, _userid, _reserved, _conns, _tmpl_id))
                 raise
 
+    def _rollback_attached_volumes(self, volumes, assigner_id, os_version,
+                                   fcp_connections, dedicated_fcps,
+                                   disks_added):
+        """
+        Rollback for the operations completed by _do_attach_many(),
+        in the reverse order they were done:
+            1. operations on VM OS done by _add_disks_many()
+            2. operations on z/VM done by _dedicate_fcps()
+            3. operations on FCP DB done by increase_fcp_connections()
+            4. operations on FCP DB done by get_volume_connector() and reserve_fcp_devices()
+
+        :param fcp_connections: (dict) the connections of the FCP devices
+            after all the volumes were counted in FCP DB
+        :param dedicated_fcps: (list) the FCP devices dedicated by this batch
+        :param disks_added: (bool) whether the volumes were configured in VM OS
+        """
+        LOG.info("Enter rollback function: _rollback_attached_volumes")
+        if disks_added:
+            # Offline the volumes from the last one, the FCP devices are
+            # offlined with the volume that was the first to use them.
+            connections = dict(fcp_connections)
+            for vol in reversed(volumes):
+                for fcp in vol['fcp_list']:
+                    connections[fcp] -= 1
+                total_connections = sum(connections[fcp] for fcp in vol['fcp_list'])
+                with zvmutils.ignore_errors():
+                    self._remove_disks(vol['fcp_list'], assigner_id, vol['target_wwpns'],
+                                       vol['target_lun'], vol['multipath'], os_version,
+                                       vol['mount_point'], total_connections)
+                    LOG.info("Rollback on VM OS: offline the volume (LUN:%s) from VM OS"
+                             % vol['target_lun'])
+
+        def _undedicate(fcp, assigner_id):
+            with zvmutils.ignore_errors():
+                self._undedicate_fcp(fcp, assigner_id)
+                LOG.info("Rollback on z/VM: undedicate FCP device %s" % fcp)
+
+        self._run_per_fcp(_undedicate, dedicated_fcps, assigner_id)
+        with zvmutils.ignore_errors():
+            with database.get_fcp_conn():
+                for vol in reversed(volumes):
+                    self.fcp_mgr.decrease_fcp_connections(vol['fcp_list'])
+        all_fcps = []
+        for vol in volumes:
+            all_fcps.extend(f for f in vol['fcp_list'] if f not in all_fcps)
+        self._rollback_reserved_fcp_devices(all_fcps)
+        LOG.info("Exit rollback function: _rollback_attached_volumes")
+
+    def _do_attach_many(self, volumes, assigner_id, os_version):
+        """Attach several volumes to a virtual machine in one pass
+
+        The FCP DB is updated for all the volumes in one transaction,
+        every FCP device not yet used by the virtual machine is dedicated
+        once, then all the volumes are configured in the VM OS with one
+        run of the attach scripts. If any phase fails, the completed
+        operations of all the volumes are rolled back.
+        """
+        LOG.info("Start to attach %d volumes to virtual machine %s."
+                 % (len(volumes), assigner_id))
+        all_fcps = []
+        for vol in volumes:
+            all_fcps.extend(f for f in vol['fcp_list'] if f not in all_fcps)
+        # Operation on FCP DB: reserve the FCP devices and increase the
+        # connections for every volume, in one transaction which is rolled
+        # back as a whole if any update fails.
+        fcp_connections = {}
+        dedicate_fcps = []
+        try:
+            with database.get_fcp_conn():
+                for vol in volumes:
+                    self.fcp_mgr.reserve_fcp_devices(vol['fcp_list'], assigner_id,
+                                                     vol['fcp_template_id'])
+                for vol in volumes:
+                    conns = self.fcp_mgr.increase_fcp_connections(vol['fcp_list'],
+                                                                  assigner_id)
+                    dedicate_fcps.extend(fcp for fcp in vol['fcp_list']
+                                         if conns[fcp] == 1)
+                    fcp_connections.update(conns)
+            LOG.info("The connections of FCP devices after "
+                     "being increased is: {}.".format(fcp_connections))
+        except Exception as err:
+            LOG.error("Failed to increase connections of the FCP devices on %s in "
+                      "database because %s." % (assigner_id, str(err)))
+            self._rollback_reserved_fcp_devices(all_fcps)
+            raise
+
+        # Operation on z/VM: dedicate the FCP devices used the first time
+        try:
+            self._dedicate_fcps(dedicate_fcps, assigner_id)
+        except Exception as err:
+            LOG.error("Failed to dedicate FCP devices to %s in "
+                      "z/VM because %s." % (assigner_id, str(err)))
+            self._rollback_attached_volumes(volumes, assigner_id, os_version,
+                                            fcp_connections, dedicate_fcps,
+                                            False)
+            raise
+
+        # Operation on VM operating system: online all the volumes
+        try:
+            self._add_disks_many(assigner_id, os_version, volumes)
+            LOG.info("Attaching %d volumes to virtual machine %s is done."
+                     % (len(volumes), assigner_id))
+        except Exception as err:
+            LOG.error("Failed to configure volumes in the OS of %s "
+                      "because %s." % (assigner_id, str(err)))
+            self._rollback_attached_volumes(volumes, assigner_id, os_version,
+                                            fcp_connections, dedicate_fcps,
+                                            True)
+            raise
+
+    @utils.synchronized('volumeAttachOrDetach-{assigner_id}')
+    def attach_many(self, assigner_id, connection_infos):
+        """Attach several volumes to one guest
+
+        Each connection_info is the one of attach(), and all of them must
+        have the same assigner_id and os_version. Root volumes are attached
+        by attach() only. The volumes are attached all together or, if any
+        of them fails, none of them.
+        """
+        assigner_id = assigner_id.upper()
+        volumes = []
+        os_versions = set()
+        for connection_info in connection_infos:
+            if connection_info['assigner_id'].upper() != assigner_id:
+                errmsg = ("The volumes attached at once must be attached "
+                          "to the same virtual machine %s, got %s."
+                          % (assigner_id, connection_info['assigner_id']))
+                raise exception.SDKInvalidInputFormat(msg=errmsg)
+            if connection_info.get('is_root_volume', False):
+                errmsg = ("The root volume of virtual machine %s can not be "
+                          "attached with other volumes." % assigner_id)
+                raise exception.SDKInvalidInputFormat(msg=errmsg)
+            os_versions.add(connection_info['os_version'])
+            # transfer to lower cases
+            volumes.append({
+                'fcp_list': [x.lower() for x in connection_info['zvm_fcp']],
+                'target_wwpns': [w.lower() for w in connection_info['target_wwpn']],
+                'target_lun': connection_info['target_lun'],
+                'multipath': connection_info.get('multipath', False),
+                'mount_point': connection_info['mount_point'],
+                'fcp_template_id': connection_info['fcp_template_id']})
+        if not volumes:
+            return
+        if len(os_versions) > 1:
+            errmsg = ("The volumes attached at once to virtual machine %s "
+                      "must have the same os_version, got %s."
+                      % (assigner_id, sorted(os_versions)))
+            raise exception.SDKInvalidInputFormat(msg=errmsg)
+
+        if not zvmutils.check_userid_exist(assigner_id):
+            LOG.error("The virtual machine '%s' does not exist on z/VM." % assigner_id)
+            raise exception.SDKObjectNotExistError(
+                    obj_desc=("Guest '%s'" % assigner_id), modID='volume')
+        try:
+            self._do_attach_many(volumes, assigner_id, os_versions.pop())
+        except Exception:
+            fcp_list = []
+            for vol in volumes:
+                fcp_list.extend(f for f in vol['fcp_list'] if f not in fcp_list)
+            for fcp in fcp_list:
+                with zvmutils.ignore_errors():
+                    _userid, _reserved, _conns, _tmpl_id = self.get_fcp_usage(fcp)
+                    LOG.info("After rollback, property of FCP device %s "
+                             "is (assigner_id: %s, reserved:%s, "
+                             "connections: %s, FCP Multipath Template id: %s)."
+                             % (fcp, _userid, _reserved, _conns, _tmpl_id))
+            raise
+
     def _undedicate_fcp(self, fcp, assigner_id):
         try:
             self._smtclient.undedicate_device(assigner_id, fcp)
@@ -2472,18 +2858,14 @@ class FCPVolumeManager(object):
 
         # Operation on z/VM: undedicate FCP device from the virtual machine
         try:
+            undedicate_fcps = []
             for fcp in fcp_list:
                 if fcp_connections[fcp] == 0:
-                    # As _remove_disks() has been run successfully,
-                    # we need to try our best to undedicate every FCP device
-                    LOG.info("Start to undedicate FCP %s from "
-                             "%s on z/VM." % (fcp, assigner_id))
-                    self._undedicate_fcp(fcp, assigner_id)
-                    LOG.info("FCP %s undedicated from %s on z/VM is "
-                         "done." % (fcp, assigner_id))
+                    undedicate_fcps.append(fcp)
                 else:
                     LOG.info("The connections of FCP device %s is not 0, "
                              "skip undedicating the FCP device on z/VM." % fcp)
+            self._undedicate_fcps(undedicate_fcps, assigner_id)
             LOG.info("Detaching volume on virtual machine %s from FCP devices %s is "
                      "done." % (assigner_id, fcp_list))
         except Exception as err: